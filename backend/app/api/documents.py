@@ -1,144 +1,588 @@
-from fastapi import APIRouter, Depends, UploadFile, File, HTTPException
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import delete, func, insert, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from typing import Any, AsyncIterator, Dict, List, Optional
+from datetime import date, datetime, timezone
+import asyncio
+import json
 import os
 import uuid
-import shutil
 
-from ..database.database import get_db
-from ..models.models import Document, DocumentStatus
-from ..schemas.schemas import DocumentResponse
-from ..core.document_processor import DocumentProcessor
+from ..database.database import get_async_db
+from ..models.models import (
+    BankTransaction, Document, DocumentContent, DocumentStatus, ProcessingJob, UploadBatch
+)
+from ..schemas.schemas import (
+    BankTransactionResponse, DocumentResponse, DocumentUploadResponse, DocumentStatusResponse,
+    ExtractionCacheStats, UploadBatchCreatedResponse, UploadBatchResponse
+)
+from ..core.bank_transactions import copy_transactions_statement, transaction_source_query
+from ..core.extraction_cache import extraction_cache
+from ..core.job_queue import job_queue
+from ..core.return_totals import link_document
+from ..core.status_events import FINAL_STATUSES, Subscription, status_broker, status_payload
+from ..core.upload_stream import MULTIPART_OVERHEAD_BYTES, UploadError, receive_upload, receive_uploads
 from ..config import settings
+from .pagination import decode_cursor, encode_cursor
 
 router = APIRouter()
-document_processor = DocumentProcessor()
 
 
-@router.post("/upload", response_model=DocumentResponse)
+def _stored_filename(filename: str) -> str:
+    return f"{uuid.uuid4()}{os.path.splitext(filename)[1]}"
+
+
+@router.post(
+    "/upload",
+    response_model=DocumentUploadResponse,
+    status_code=202,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "multipart/form-data": {
+                    "schema": {
+                        "type": "object",
+                        "properties": {"file": {"type": "string", "format": "binary"}},
+                        "required": ["file"]
+                    }
+                }
+            }
+        }
+    }
+)
 async def upload_document(
-    file: UploadFile = File(...),
-    db: Session = Depends(get_db)
+    request: Request,
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Upload and process a document"""
+    """Upload a document and queue it for background processing
     
-    # Validate file type
-    if not any(file.filename.lower().endswith(ext) for ext in settings.allowed_file_types):
-        raise HTTPException(
-            status_code=400,
-            detail=f"File type not allowed. Supported types: {settings.allowed_file_types}"
-        )
+    The multipart body is streamed straight to disk: size, type and content
+    hash are all checked in the same pass, and oversized or mislabelled
+    uploads are rejected without reading the rest of the body.
+    """
     
-    # Validate file size
-    if file.size and file.size > settings.max_file_size:
+    # Reject a declared-oversize body before reading any of it
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and \
+            int(content_length) > settings.max_file_size + MULTIPART_OVERHEAD_BYTES:
         raise HTTPException(
             status_code=400,
             detail=f"File too large. Maximum size: {settings.max_file_size / (1024*1024):.1f}MB"
         )
     
     try:
-        # Generate unique filename
-        file_extension = os.path.splitext(file.filename)[1]
-        unique_filename = f"{uuid.uuid4()}{file_extension}"
-        file_path = os.path.join(settings.upload_directory, unique_filename)
-        
-        # Save file
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        
-        # Get file size
-        file_size = os.path.getsize(file_path)
-        
+        received = await receive_upload(
+            request.stream(),
+            request.headers.get("content-type"),
+            field_name="file",
+            upload_directory=settings.upload_directory,
+            max_size=settings.max_file_size,
+            allowed_extensions=settings.allowed_file_types,
+            make_filename=_stored_filename
+        )
+    except UploadError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
+    
+    file_path = received.file_path
+    content_hash = received.content_hash
+    
+    try:
         # Create database record
         db_document = Document(
-            filename=unique_filename,
-            original_filename=file.filename,
+            filename=os.path.basename(file_path),
+            original_filename=received.filename,
             file_path=file_path,
-            file_size=file_size,
-            content_type=file.content_type or "application/octet-stream",
+            file_size=received.size,
+            content_type=received.content_type,
+            content_hash=content_hash,
             status=DocumentStatus.PENDING.value
         )
-        
         db.add(db_document)
-        db.commit()
-        db.refresh(db_document)
         
-        # Process document asynchronously (in a real app, this would be a background task)
-        try:
-            db_document.status = DocumentStatus.PROCESSING.value
-            db.commit()
-            
-            # Process the document
-            result = document_processor.process_document(
-                file_path=file_path,
-                content_type=file.content_type or "application/octet-stream",
-                filename=file.filename
-            )
-            
-            if result['success']:
-                db_document.status = DocumentStatus.COMPLETED.value
-                db_document.ocr_text = result['ocr_text']
-                db_document.document_type = result['document_type']
-                db_document.extracted_data = result['extracted_data']
-            else:
-                db_document.status = DocumentStatus.ERROR.value
-                
-            db.commit()
-            db.refresh(db_document)
-            
-        except Exception as e:
-            db_document.status = DocumentStatus.ERROR.value
-            db.commit()
-            raise HTTPException(status_code=500, detail=f"Processing failed: {str(e)}")
+        # Reuse the extraction of an identical earlier upload, otherwise queue a job
+        job = None
+        cached = await db.run_sync(lambda session: extraction_cache.lookup(session, content_hash))
+        transaction_source = None
+        if cached and (cached['extracted_data'] or {}).get('transaction_count'):
+            # A statement's transactions are copied from an earlier upload of it
+            transaction_source = await db.scalar(transaction_source_query(content_hash))
+            if transaction_source is None:
+                cached = None  # Those uploads are gone; extract again
+        if cached:
+            db_document.status = DocumentStatus.COMPLETED.value
+            db_document.ocr_text = cached['ocr_text']
+            db_document.document_type = cached['document_type']
+            db_document.classification_confidence = cached['classification_confidence']
+            db_document.extracted_data = cached['extracted_data']
+            db_document.processed_at = datetime.now(timezone.utc)
+            if transaction_source is not None:
+                await db.flush()
+                await db.execute(copy_transactions_statement(transaction_source, db_document.id))
+        else:
+            await db.flush()
+            job = job_queue.enqueue(db, db_document)
         
-        return db_document
+        await db.commit()
+        await db.refresh(db_document)
+        await db.refresh(db_document, ["content"])  # Relationships aren't reloaded by a plain refresh
         
     except Exception as e:
         # Clean up file if database operation fails
         if os.path.exists(file_path):
-            os.remove(file_path)
+            await asyncio.to_thread(os.remove, file_path)
+        raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
+    
+    # OCR runs in the worker pool; clients follow /events or poll /{id}/status for progress
+    status_broker.publish(status_payload(db_document))
+    if job:
+        job_queue.notify()
+    
+    return DocumentUploadResponse(
+        **DocumentResponse.model_validate(db_document).model_dump(),
+        job_id=job.id if job else None,
+        cached=job is None
+    )
+
+
+async def _batch_progress(db: AsyncSession, batch: UploadBatch) -> Dict[str, Any]:
+    status_counts = dict((await db.execute(
+        select(Document.status, func.count())
+        .where(Document.batch_id == batch.id)
+        .group_by(Document.status)
+    )).all())
+    total = sum(status_counts.values())
+    final = sum(count for status, count in status_counts.items() if status in FINAL_STATUSES)
+    return {
+        'id': batch.id,
+        'created_at': batch.created_at,
+        'document_count': batch.document_count,
+        'rejected': batch.rejected or [],
+        'status_counts': status_counts,
+        'progress': round(final / total, 4) if total else 1.0,
+        'finished': final == total,
+    }
+
+
+@router.post(
+    "/upload/batch",
+    response_model=UploadBatchCreatedResponse,
+    response_model_exclude_unset=True,
+    status_code=202,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "multipart/form-data": {
+                    "schema": {
+                        "type": "object",
+                        "properties": {
+                            "file": {"type": "array", "items": {"type": "string", "format": "binary"}}
+                        },
+                        "required": ["file"]
+                    }
+                }
+            }
+        }
+    }
+)
+async def upload_document_batch(
+    request: Request,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Upload many documents at once, as repeated ``file`` parts or ZIP archives
+    
+    Files are streamed to disk and archives unpacked a member at a time, each
+    checked like a single upload. Unsupported or invalid files are listed in
+    ``rejected`` instead of failing the batch. All documents are inserted
+    together, queued for the worker pool and followed with
+    ``GET /batches/{id}`` or ``/events``.
+    """
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and \
+            int(content_length) > settings.bulk_upload_max_size + MULTIPART_OVERHEAD_BYTES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Upload too large. Maximum total size: {settings.bulk_upload_max_size / (1024*1024):.1f}MB"
+        )
+    
+    try:
+        received, rejected = await receive_uploads(
+            request.stream(),
+            request.headers.get("content-type"),
+            field_name="file",
+            upload_directory=settings.upload_directory,
+            max_size=settings.max_file_size,
+            max_files=settings.bulk_upload_max_files,
+            max_total_size=settings.bulk_upload_max_size,
+            allowed_extensions=settings.allowed_file_types,
+            make_filename=_stored_filename
+        )
+    except UploadError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
+    
+    if not received:
+        reasons = "; ".join(f"{item.filename}: {item.error}" for item in rejected)
+        raise HTTPException(
+            status_code=400,
+            detail="No supported documents in upload" + (f" ({reasons})" if reasons else "")
+        )
+    
+    try:
+        batch = UploadBatch(
+            document_count=len(received),
+            rejected=[item._asdict() for item in rejected] or None
+        )
+        db.add(batch)
+        await db.flush()
+        
+        # Earlier extractions of any of the files, in one lookup
+        cached = await db.run_sync(
+            lambda session: extraction_cache.lookup_many(session, (item.content_hash for item in received))
+        )
+        transaction_sources = {}
+        for content_hash, result in list(cached.items()):
+            if (result['extracted_data'] or {}).get('transaction_count'):
+                transaction_sources[content_hash] = await db.scalar(transaction_source_query(content_hash))
+                if transaction_sources[content_hash] is None:
+                    del cached[content_hash]  # Those uploads are gone; extract again
+        
+        # One executemany INSERT for the whole batch; ORM objects would be
+        # inserted a statement at a time to fetch each generated id
+        processed_at = datetime.now(timezone.utc)
+        rows = []
+        for item in received:
+            result = cached.get(item.content_hash)
+            rows.append({
+                'filename': os.path.basename(item.file_path),
+                'original_filename': item.filename,
+                'file_path': item.file_path,
+                'file_size': item.size,
+                'content_type': item.content_type,
+                'content_hash': item.content_hash,
+                'status': DocumentStatus.COMPLETED.value if result else DocumentStatus.PENDING.value,
+                'document_type': result['document_type'] if result else None,
+                'classification_confidence': result['classification_confidence'] if result else None,
+                'processed_at': processed_at if result else None,
+                'batch_id': batch.id
+            })
+        await db.execute(insert(Document), rows)
+        document_ids = dict((await db.execute(
+            select(Document.file_path, Document.id).where(Document.batch_id == batch.id)
+        )).all())
+        
+        reused = [item for item in received if item.content_hash in cached]
+        if reused:
+            await db.execute(insert(DocumentContent), [
+                {
+                    'document_id': document_ids[item.file_path],
+                    'ocr_text': cached[item.content_hash]['ocr_text'],
+                    'extracted_data': cached[item.content_hash]['extracted_data']
+                }
+                for item in reused
+            ])
+        for item in reused:
+            if transaction_sources.get(item.content_hash) is not None:
+                await db.execute(copy_transactions_statement(
+                    transaction_sources[item.content_hash], document_ids[item.file_path]
+                ))
+        queued = [document_ids[item.file_path] for item in received if item.content_hash not in cached]
+        if queued:
+            await db.execute(job_queue.enqueue_statement(queued))
+        await db.commit()
+        
+    except Exception as e:
+        for item in received:
+            if os.path.exists(item.file_path):
+                await asyncio.to_thread(os.remove, item.file_path)
         raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
+    
+    documents = (await db.scalars(
+        select(Document)
+        .options(selectinload(Document.content))
+        .where(Document.batch_id == batch.id)
+        .order_by(Document.id)
+    )).all()
+    jobs = dict((await db.execute(
+        select(ProcessingJob.document_id, ProcessingJob.id).where(ProcessingJob.document_id.in_(queued))
+    )).all()) if queued else {}
+    for document in documents:
+        status_broker.publish(status_payload(document))
+    if jobs:
+        job_queue.notify()
+    
+    return UploadBatchCreatedResponse(
+        **await _batch_progress(db, batch),
+        documents=[
+            DocumentUploadResponse(
+                **{column.key: getattr(document, column.key) for column in SUMMARY_COLUMNS},
+                job_id=jobs.get(document.id),
+                cached=document.id not in jobs
+            )
+            for document in documents
+        ]
+    )
 
+# Columns only returned when asked for with ?include=, read from document_contents
+HEAVY_COLUMNS = {'ocr_text': DocumentContent.ocr_text, 'extracted_data': DocumentContent.extracted_data}
+SUMMARY_COLUMNS = list(Document.__table__.columns)
 
-@router.get("/", response_model=List[DocumentResponse])
+
+@router.get("/", response_model=List[DocumentResponse], response_model_exclude_unset=True)
 async def list_documents(
-    skip: int = 0,
-    limit: int = 100,
-    db: Session = Depends(get_db)
+    request: Request,
+    response: Response,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    status: Optional[str] = None,
+    document_type: Optional[str] = None,
+    batch_id: Optional[int] = None,
+    include: Optional[str] = Query(None, description="Comma-separated heavy fields: ocr_text, extracted_data"),
+    skip: int = Query(0, ge=0, deprecated=True),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """List uploaded documents, oldest first, a page at a time
+    
+    Rows are summaries without ``ocr_text`` and ``extracted_data`` unless they
+    are named in ``include``. When more rows follow, the ``X-Next-Cursor`` and
+    ``Link`` headers carry the cursor for the next page.
+    """
+    included = {name.strip() for name in include.split(",") if name.strip()} if include else set()
+    unknown = included - HEAVY_COLUMNS.keys()
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown include field(s): {', '.join(sorted(unknown))}"
+        )
+    
+    columns = SUMMARY_COLUMNS + [HEAVY_COLUMNS[name] for name in sorted(included)]
+    query = select(*columns).order_by(Document.created_at, Document.id)
+    if included:
+        query = query.outerjoin(DocumentContent, DocumentContent.document_id == Document.id)
+    if status:
+        query = query.where(Document.status == status)
+    if document_type:
+        query = query.where(Document.document_type == document_type)
+    if batch_id is not None:
+        query = query.where(Document.batch_id == batch_id)
+    if cursor:
+        created_at, document_id = decode_cursor(cursor)
+        query = query.where(tuple_(Document.created_at, Document.id) > tuple_(created_at, document_id))
+    elif skip:
+        query = query.offset(skip)
+    
+    # One extra row tells us whether there is a next page
+    rows = (await db.execute(query.limit(limit + 1))).mappings().all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]['created_at'], rows[-1]['id'])
+        response.headers["X-Next-Cursor"] = next_cursor
+        next_url = request.url.remove_query_params("skip").include_query_params(cursor=next_cursor)
+        response.headers["Link"] = f'<{next_url}>; rel="next"'
+    
+    return [DocumentResponse(**row) for row in rows]
+
+
+@router.get("/batches/{batch_id}", response_model=UploadBatchResponse)
+async def get_upload_batch(
+    batch_id: int,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Poll a bulk upload's progress: its documents per status"""
+    batch = await db.get(UploadBatch, batch_id)
+    if not batch:
+        raise HTTPException(status_code=404, detail="Upload batch not found")
+    return await _batch_progress(db, batch)
+
+
+@router.get("/cache/stats", response_model=ExtractionCacheStats)
+async def get_extraction_cache_stats(db: AsyncSession = Depends(get_async_db)):
+    """Report extraction cache hit/miss counters and size"""
+    return await db.run_sync(extraction_cache.stats)
+
+
+def _sse(event: str, data: str, event_id: Optional[int] = None) -> str:
+    prefix = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{prefix}event: {event}\ndata: {data}\n\n"
+
+
+async def _status_stream(subscription: Subscription, snapshot: List[dict]) -> AsyncIterator[str]:
+    try:
+        # Documents followed by id that have yet to finish; the stream ends once none are left
+        unfinished = set(subscription.document_ids) if subscription.document_ids is not None else None
+        for payload in snapshot:
+            yield _sse("status", json.dumps(payload))
+            if payload['status'] in FINAL_STATUSES:
+                unfinished.discard(payload['document_id'])
+        
+        while unfinished is None or unfinished:
+            events = await subscription.next_events(settings.status_stream_keepalive)
+            if subscription.lagged:
+                subscription.lagged = False
+                yield _sse("lagged", json.dumps({'dropped': subscription.dropped}))
+            elif not events:
+                yield ": keepalive\n\n"
+            for event in events:
+                yield _sse("status", event.data, event.id)
+                if unfinished is not None and event.status in FINAL_STATUSES:
+                    unfinished.discard(event.document_id)
+        yield _sse("done", "{}")
+    finally:
+        status_broker.unsubscribe(subscription)
+
+
+@router.get("/events", response_class=StreamingResponse)
+async def stream_document_events(
+    document_id: Optional[List[int]] = Query(None, description="Documents to follow; every document when omitted"),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """List all uploaded documents"""
-    documents = db.query(Document).offset(skip).limit(limit).all()
-    return documents
+    """Stream document status changes as server-sent events
+    
+    Each ``status`` event carries a document's new status, and its extracted
+    data once completed. Followed by id, the documents' current statuses are
+    sent first and the stream ends with a ``done`` event once all of them are
+    completed or failed. Following every document, only changes are sent; a
+    ``lagged`` event means some were dropped for a slow reader, so re-read
+    the document list.
+    """
+    # Subscribe before reading the snapshot so no change in between is missed
+    subscription = status_broker.subscribe(document_id)
+    try:
+        snapshot = []
+        if document_id:
+            documents = (await db.scalars(
+                select(Document)
+                .options(selectinload(Document.content))
+                .where(Document.id.in_(subscription.document_ids))
+                .order_by(Document.id)
+            )).all()
+            missing = subscription.document_ids - {document.id for document in documents}
+            if missing:
+                raise HTTPException(
+                    status_code=404,
+                    detail=f"Document(s) not found: {', '.join(map(str, sorted(missing)))}"
+                )
+            snapshot = [status_payload(document) for document in documents]
+        # Hand the connection back now rather than holding it for the life of the stream
+        await db.close()
+    except BaseException:
+        status_broker.unsubscribe(subscription)
+        raise
+    
+    return StreamingResponse(
+        _status_stream(subscription, snapshot),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 
 @router.get("/{document_id}", response_model=DocumentResponse)
 async def get_document(
     document_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get a specific document by ID"""
-    document = db.query(Document).filter(Document.id == document_id).first()
+    document = await db.get(Document, document_id, options=[selectinload(Document.content)])
     if not document:
         raise HTTPException(status_code=404, detail="Document not found")
     return document
 
 
+@router.get("/{document_id}/status", response_model=DocumentStatusResponse)
+async def get_document_status(
+    document_id: int,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Poll the processing status of a document and its latest job"""
+    document = await db.get(Document, document_id)
+    if not document:
+        raise HTTPException(status_code=404, detail="Document not found")
+    
+    job = await db.scalar(
+        select(ProcessingJob)
+        .where(ProcessingJob.document_id == document_id)
+        .order_by(ProcessingJob.id.desc())
+        .limit(1)
+    )
+    
+    return DocumentStatusResponse(
+        document_id=document.id,
+        status=document.status,
+        document_type=document.document_type,
+        classification_confidence=document.classification_confidence,
+        processed_at=document.processed_at,
+        job=job
+    )
+
+
+@router.get("/{document_id}/transactions", response_model=List[BankTransactionResponse])
+async def list_document_transactions(
+    document_id: int,
+    request: Request,
+    response: Response,
+    limit: int = Query(500, ge=1, le=5000),
+    cursor: Optional[int] = Query(None, ge=0, description="row_number of the last row of the previous page"),
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """List a bank statement's transactions in statement order, a page at a time
+    
+    When more rows follow, the ``X-Next-Cursor`` and ``Link`` headers carry
+    the cursor for the next page.
+    """
+    document = await db.get(Document, document_id)
+    if not document:
+        raise HTTPException(status_code=404, detail="Document not found")
+    
+    query = (
+        select(BankTransaction)
+        .where(BankTransaction.document_id == document_id)
+        .order_by(BankTransaction.row_number)
+    )
+    if cursor is not None:
+        query = query.where(BankTransaction.row_number > cursor)
+    if date_from:
+        query = query.where(BankTransaction.transaction_date >= date_from)
+    if date_to:
+        query = query.where(BankTransaction.transaction_date <= date_to)
+    
+    rows = (await db.scalars(query.limit(limit + 1))).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = str(rows[-1].row_number)
+        response.headers["X-Next-Cursor"] = next_cursor
+        response.headers["Link"] = f'<{request.url.include_query_params(cursor=next_cursor)}>; rel="next"'
+    
+    return rows
+
+
 @router.delete("/{document_id}")
 async def delete_document(
     document_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Delete a document"""
-    document = db.query(Document).filter(Document.id == document_id).first()
+    document = await db.get(Document, document_id)
     if not document:
         raise HTTPException(status_code=404, detail="Document not found")
     
     # Delete file from filesystem
     if os.path.exists(document.file_path):
-        os.remove(document.file_path)
+        await asyncio.to_thread(os.remove, document.file_path)
     
-    # Delete from database
-    db.delete(document)
-    db.commit()
+    # Delete from database, taking its amounts out of any linked tax return
+    await db.run_sync(lambda session: link_document(session, document, None))
+    await db.execute(delete(ProcessingJob).where(ProcessingJob.document_id == document_id))
+    await db.execute(delete(BankTransaction).where(BankTransaction.document_id == document_id))
+    await db.execute(delete(DocumentContent).where(DocumentContent.document_id == document_id))
+    await db.delete(document)
+    await db.commit()
     
     return {"message": "Document deleted successfully"}
\ No newline at end of file
@@ -0,0 +1,30 @@
+"""
+Keyset (cursor) pagination helpers
+
+A cursor is the ``(created_at, id)`` of the last row on a page, encoded as
+an opaque URL-safe token. The next page is everything strictly after it in
+that order, which an index on the same columns answers without scanning the
+rows that came before, however deep the client has paged.
+"""
+
+import base64
+import json
+from datetime import datetime
+from typing import Tuple
+
+from fastapi import HTTPException
+
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    payload = json.dumps([created_at.isoformat(), row_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Parse a cursor from a client, rejecting malformed tokens with 400"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
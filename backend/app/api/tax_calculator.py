@@ -1,29 +1,125 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import Dict, Any
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import JSONResponse, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from typing import Dict, Any, AsyncIterator, Callable, Optional
+import asyncio
 
-from ..database.database import get_db
-from ..models.models import TaxReturn
+from ..database.database import get_async_db
+from ..models.models import Document, TaxReturn
 from ..schemas.schemas import (
     TaxReturnCreate, TaxReturnUpdate, TaxReturnResponse,
-    WorkFromHomeCalculation, WorkFromHomeResponse
+    WorkFromHomeCalculation, WorkFromHomeResponse,
+    BatchTaxCalculationRequest, BatchTaxCalculationResponse,
+    WhatIfRequest, WhatIfResponse, EstimateCacheStats
 )
 from ..core.tax_calculator import TaxCalculator
+from ..core.return_totals import CALCULATED_FIELDS, calculation_inputs, link_document, recalculate, settle
+from ..core.tax_rules import UnknownTaxYearError, tax_rules
+from ..core.estimate_cache import estimate_cache, estimate_key
+from ..core.bulk_calculator import stream_calculations
+from ..core.what_if import SweepError, SweepVariable, what_if
+from ..config import settings
 
 router = APIRouter()
 
 
+def calculator_for_year(tax_year: Optional[str]) -> type:
+    """TaxCalculator for a requested tax year, or 400 if it is not supported"""
+    try:
+        return TaxCalculator.for_year(tax_year)
+    except UnknownTaxYearError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def cacheable_response(request: Request, etag: str, content: Callable[[], Any]) -> Response:
+    """JSON response with ETag/Cache-Control, or 304 when the client's copy is current
+    
+    ``content`` is only called when a body has to be sent.
+    """
+    headers = {
+        "ETag": etag,
+        "Cache-Control": f"public, max-age={settings.http_cache_max_age}"
+    }
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        if etag in tags or "*" in tags:
+            return Response(status_code=304, headers=headers)
+    return JSONResponse(content(), headers=headers)
+
+
+class DuplexStreamingResponse(Response):
+    """Streams a response body computed from the request body as it arrives
+    
+    A single reader task owns ``receive``: it feeds request chunks into a
+    bounded queue (back-pressuring the client) and turns ``http.disconnect``
+    into end of input, so nothing else competes for the body messages the way
+    StreamingResponse's disconnect listener does.
+    """
+    
+    def __init__(
+        self,
+        body: Callable[[AsyncIterator[bytes]], AsyncIterator[bytes]],
+        media_type: str,
+        queue_size: int = 8
+    ):
+        super().__init__(media_type=media_type)
+        # The body length is unknown up front; drop the Content-Length: 0 Response adds
+        self.raw_headers = [(key, value) for key, value in self.raw_headers if key != b"content-length"]
+        self.body_factory = body
+        self.queue_size = queue_size
+    
+    async def __call__(self, scope, receive, send):
+        chunks: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        disconnected = False
+        
+        async def read_body():
+            nonlocal disconnected
+            try:
+                while True:
+                    message = await receive()
+                    if message["type"] == "http.disconnect":
+                        disconnected = True
+                        return
+                    body = message.get("body", b"")
+                    if body:
+                        await chunks.put(body)
+                    if not message.get("more_body", False):
+                        return
+            finally:
+                await chunks.put(None)
+        
+        async def request_chunks():
+            while (chunk := await chunks.get()) is not None:
+                yield chunk
+        
+        reader = asyncio.create_task(read_body())
+        try:
+            await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+            async for output in self.body_factory(request_chunks()):
+                if disconnected:
+                    break
+                await send({"type": "http.response.body", "body": output, "more_body": True})
+            if not disconnected:
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+        finally:
+            reader.cancel()
+
+
 @router.post("/calculate", response_model=Dict[str, Any])
 async def calculate_tax(
     income_data: Dict[str, float],
-    deduction_data: Dict[str, float] = None
+    deduction_data: Dict[str, float] = None,
+    tax_year: Optional[str] = None
 ):
     """Calculate tax based on income and deduction data"""
     if deduction_data is None:
         deduction_data = {}
+    calculator = calculator_for_year(tax_year)
     
     try:
-        result = TaxCalculator.calculate_total_tax(income_data, deduction_data)
+        result = calculator.calculate_total_tax(income_data, deduction_data)
         return {
             "success": True,
             "data": result,
@@ -33,6 +129,93 @@ async def calculate_tax(
         raise HTTPException(status_code=400, detail=f"Calculation failed: {str(e)}")
 
 
+@router.post("/calculate/batch", response_model=BatchTaxCalculationResponse)
+async def calculate_tax_batch(request: BatchTaxCalculationRequest, tax_year: Optional[str] = None):
+    """Calculate tax for many returns at once from column arrays"""
+    calculator = calculator_for_year(tax_year)
+    lengths = {len(values) for values in (*request.income_data.values(), *request.deduction_data.values())}
+    if len(lengths) > 1:
+        raise HTTPException(status_code=400, detail="All input columns must have the same length")
+    count = lengths.pop() if lengths else 0
+    if count > settings.batch_max_rows:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Batch too large. Maximum rows: {settings.batch_max_rows}"
+        )
+    
+    try:
+        result = calculator.calculate_total_tax_batch(request.income_data, request.deduction_data)
+        return {
+            "success": True,
+            "count": count,
+            "data": {field: values.tolist() for field, values in result.items()},
+            "error": None
+        }
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Calculation failed: {str(e)}")
+
+
+@router.post("/calculate/stream")
+async def calculate_tax_stream(request: Request, tax_year: Optional[str] = None):
+    """Calculate tax for an NDJSON or CSV stream of scenarios, streaming NDJSON results back
+    
+    NDJSON rows look like ``{"id": ..., "income_data": {...}, "deduction_data": {...}}``;
+    CSV input (``Content-Type: text/csv``) needs a header row naming the income and
+    deduction fields plus an optional ``id`` column. Input is read with back-pressure,
+    so clients sending large bodies must read results while they are still writing.
+    """
+    content_type = request.headers.get("content-type", "")
+    input_format = "csv" if content_type.startswith("text/csv") else "ndjson"
+    calculator = calculator_for_year(tax_year)
+    
+    return DuplexStreamingResponse(
+        lambda chunks: stream_calculations(chunks, input_format, settings.stream_max_line_bytes, calculator),
+        media_type="application/x-ndjson"
+    )
+
+
+@router.post("/what-if", response_model=WhatIfResponse)
+async def calculate_what_if(
+    request: WhatIfRequest,
+    tax_year: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Sweep one or two amounts over a range and return the tax curve
+    
+    For example, ``work_related_expenses`` from 0 to 20,000 in $100 steps
+    gives the tax, tax saved and take-home income at every step, the
+    marginal rate between steps and the break-even points where that rate
+    changes, all from one vectorized calculation. The base return is the
+    request's income and deduction data, or a stored return's inputs and
+    tax year when ``tax_return_id`` is given.
+    """
+    income_data, deduction_data = request.income_data, request.deduction_data
+    if request.tax_return_id is not None:
+        tax_return = await db.get(TaxReturn, request.tax_return_id)
+        if not tax_return:
+            raise HTTPException(status_code=404, detail="Tax return not found")
+        tax_year, income_data, deduction_data = calculation_inputs(tax_return)
+    calculator = calculator_for_year(tax_year)
+    
+    try:
+        variables = [
+            SweepVariable(variable.field, variable.start, variable.stop, variable.step)
+            for variable in request.sweep
+        ]
+        result = what_if(calculator, income_data, deduction_data, variables, settings.batch_max_rows)
+    except SweepError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Calculation failed: {str(e)}")
+    
+    return {
+        "success": True,
+        "tax_year": calculator.RULES.tax_year,
+        **result,
+        "error": None
+    }
+
+
 @router.post("/work-from-home", response_model=WorkFromHomeResponse)
 async def calculate_work_from_home_deduction(
     calculation: WorkFromHomeCalculation
@@ -53,57 +236,42 @@ async def calculate_work_from_home_deduction(
 
 
 @router.get("/brackets")
-async def get_tax_brackets():
-    """Get current tax brackets and rates"""
+async def get_tax_brackets(request: Request, tax_year: Optional[str] = None):
+    """Get tax brackets and rates for a tax year (the current year by default)"""
+    rules = calculator_for_year(tax_year).RULES
+    return cacheable_response(request, f'"{rules.tax_year}-{rules.version}"', lambda: rules.summary)
+
+
+@router.get("/tax-years")
+async def get_tax_years():
+    """List the tax years with rule sets"""
     return {
-        "tax_year": "2024-25",
-        "brackets": [
-            {"min": 0, "max": 18200, "rate": 0.0, "description": "Tax-free threshold"},
-            {"min": 18201, "max": 45000, "rate": 0.19, "description": "19% tax rate"},
-            {"min": 45001, "max": 120000, "rate": 0.325, "description": "32.5% tax rate"},
-            {"min": 120001, "max": 180000, "rate": 0.37, "description": "37% tax rate"},
-            {"min": 180001, "max": None, "rate": 0.45, "description": "45% tax rate"}
-        ],
-        "medicare_levy": {
-            "rate": TaxCalculator.MEDICARE_LEVY_RATE,
-            "threshold": TaxCalculator.MEDICARE_LEVY_THRESHOLD
-        },
-        "lito": {
-            "max_offset": TaxCalculator.LITO_MAX_OFFSET,
-            "threshold_1": TaxCalculator.LITO_THRESHOLD_1,
-            "threshold_2": TaxCalculator.LITO_THRESHOLD_2
-        },
-        "small_business_offset": {
-            "max_offset": TaxCalculator.SMALL_BUSINESS_OFFSET_MAX,
-            "threshold": TaxCalculator.SMALL_BUSINESS_THRESHOLD,
-            "cutoff": TaxCalculator.SMALL_BUSINESS_CUTOFF
-        },
-        "super_guarantee_rate": TaxCalculator.SUPER_GUARANTEE_RATE,
-        "work_from_home_rate": TaxCalculator.WORK_FROM_HOME_RATE,
-        "instant_asset_writeoff": TaxCalculator.INSTANT_ASSET_WRITEOFF_THRESHOLD
+        "default": tax_rules.default_year,
+        "tax_years": tax_rules.years
     }
 
 
 @router.post("/tax-return", response_model=TaxReturnResponse)
 async def create_tax_return(
     tax_return: TaxReturnCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Create a new tax return"""
+    calculator_for_year(tax_return.tax_year)
     db_tax_return = TaxReturn(**tax_return.dict())
     db.add(db_tax_return)
-    db.commit()
-    db.refresh(db_tax_return)
+    await db.commit()
+    await db.refresh(db_tax_return)
     return db_tax_return
 
 
 @router.get("/tax-return/{tax_return_id}", response_model=TaxReturnResponse)
 async def get_tax_return(
     tax_return_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get a specific tax return"""
-    tax_return = db.query(TaxReturn).filter(TaxReturn.id == tax_return_id).first()
+    tax_return = await db.get(TaxReturn, tax_return_id)
     if not tax_return:
         raise HTTPException(status_code=404, detail="Tax return not found")
     return tax_return
@@ -113,45 +281,30 @@ async def get_tax_return(
 async def update_tax_return(
     tax_return_id: int,
     tax_return_update: TaxReturnUpdate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Update a tax return and recalculate"""
-    tax_return = db.query(TaxReturn).filter(TaxReturn.id == tax_return_id).first()
+    """Update a tax return, recalculating only if the calculation's inputs changed"""
+    tax_return = await db.get(TaxReturn, tax_return_id)
     if not tax_return:
         raise HTTPException(status_code=404, detail="Tax return not found")
     
     # Update provided fields
     update_data = tax_return_update.dict(exclude_unset=True)
+    inputs_before = calculation_inputs(tax_return)
     for field, value in update_data.items():
         setattr(tax_return, field, value)
     
-    # Recalculate tax
-    income_data = {
-        'employment_income': tax_return.employment_income,
-        'investment_income': tax_return.investment_income,
-        'business_income': tax_return.business_income
-    }
-    
-    deduction_data = {
-        'work_related_expenses': tax_return.work_related_expenses,
-        'work_from_home_deduction': tax_return.work_from_home_deduction
-    }
+    calculator_for_year(tax_return.tax_year)
     
     try:
-        calculations = TaxCalculator.calculate_total_tax(income_data, deduction_data)
-        
-        # Update calculated fields
-        tax_return.total_income = calculations['total_income']
-        tax_return.total_deductions = calculations['total_deductions']
-        tax_return.taxable_income = calculations['taxable_income']
-        tax_return.income_tax = calculations['income_tax']
-        tax_return.medicare_levy = calculations['medicare_levy']
-        tax_return.low_income_tax_offset = calculations['low_income_tax_offset']
-        tax_return.small_business_offset = calculations['small_business_offset']
-        tax_return.total_tax = calculations['total_tax']
+        # Writing a calculated field directly is overridden by a recalculation, as before
+        if calculation_inputs(tax_return) != inputs_before or update_data.keys() & set(CALCULATED_FIELDS):
+            recalculate(tax_return)
+        else:
+            settle(tax_return)
         
-        db.commit()
-        db.refresh(tax_return)
+        await db.commit()
+        await db.refresh(tax_return)
         
         return tax_return
         
@@ -159,25 +312,77 @@ async def update_tax_return(
         raise HTTPException(status_code=400, detail=f"Calculation failed: {str(e)}")
 
 
+async def _tax_return_and_document(db: AsyncSession, tax_return_id: int, document_id: int):
+    tax_return = await db.get(TaxReturn, tax_return_id)
+    if not tax_return:
+        raise HTTPException(status_code=404, detail="Tax return not found")
+    document = await db.get(Document, document_id, options=[selectinload(Document.content)])
+    if not document:
+        raise HTTPException(status_code=404, detail="Document not found")
+    return tax_return, document
+
+
+@router.put("/tax-return/{tax_return_id}/documents/{document_id}", response_model=TaxReturnResponse)
+async def link_tax_return_document(
+    tax_return_id: int,
+    document_id: int,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Count a document's extracted amounts in a tax return
+    
+    PAYG summaries add gross payments and tax withheld, receipts their total
+    as a work-related deduction. A document counts towards one return at a
+    time, so linking it here moves it from any other. Documents still being
+    processed are counted when they complete.
+    """
+    tax_return, document = await _tax_return_and_document(db, tax_return_id, document_id)
+    calculator_for_year(tax_return.tax_year)
+    await db.run_sync(lambda session: link_document(session, document, tax_return_id))
+    await db.commit()
+    await db.refresh(tax_return)
+    return tax_return
+
+
+@router.delete("/tax-return/{tax_return_id}/documents/{document_id}", response_model=TaxReturnResponse)
+async def unlink_tax_return_document(
+    tax_return_id: int,
+    document_id: int,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Stop counting a document in a tax return"""
+    tax_return, document = await _tax_return_and_document(db, tax_return_id, document_id)
+    if document.tax_return_id != tax_return_id:
+        raise HTTPException(status_code=404, detail="Document is not linked to this tax return")
+    await db.run_sync(lambda session: link_document(session, document, None))
+    await db.commit()
+    await db.refresh(tax_return)
+    return tax_return
+
+
+@router.get("/estimate")
 @router.post("/estimate")
 async def estimate_tax(
-    taxable_income: float
+    request: Request,
+    taxable_income: float,
+    tax_year: Optional[str] = None
 ):
-    """Quick tax estimate for a given taxable income"""
+    """Quick tax estimate for a given taxable income
+    
+    Results are memoized per cent of income and tax year. GET responses are
+    cacheable by browsers and CDNs; both methods honour If-None-Match.
+    """
+    calculator = calculator_for_year(tax_year)
+    
     try:
-        income_tax = TaxCalculator.calculate_income_tax(taxable_income)
-        medicare_levy = TaxCalculator.calculate_medicare_levy(taxable_income)
-        lito = TaxCalculator.calculate_low_income_tax_offset(taxable_income)
-        
-        total_tax = max(0, income_tax + medicare_levy - lito)
-        
-        return {
-            "taxable_income": taxable_income,
-            "income_tax": income_tax,
-            "medicare_levy": medicare_levy,
-            "low_income_tax_offset": lito,
-            "estimated_total_tax": total_tax,
-            "take_home_income": taxable_income - total_tax
-        }
+        etag = '"{}-{}-{}"'.format(*estimate_key(calculator, taxable_income))
+        return cacheable_response(
+            request, etag, lambda: estimate_cache.estimate(calculator, taxable_income)
+        )
     except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Estimation failed: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=400, detail=f"Estimation failed: {str(e)}")
+
+
+@router.get("/estimate/cache/stats", response_model=EstimateCacheStats)
+async def get_estimate_cache_stats():
+    """Report /estimate memo hit/miss counters and size"""
+    return estimate_cache.stats()
\ No newline at end of file
@@ -8,6 +8,11 @@ class Settings(BaseSettings):
     # Database
     database_url: str = "sqlite:///./numeri.db"
     database_url_async: str = "sqlite+aiosqlite:///./numeri.db"
+    db_pool_size: int = 10  # Connections kept open per engine
+    db_max_overflow: int = 20  # Extra connections allowed under burst load
+    db_pool_timeout: float = 30.0  # Seconds to wait for a free connection
+    db_pool_pre_ping: bool = True  # Test connections on checkout so restarts don't surface as errors
+    db_pool_recycle: int = 1800  # Seconds before a connection is replaced
     
     # Application
     app_name: str = "Numeri - ATO Tax Preparation"
@@ -21,13 +26,65 @@ class Settings(BaseSettings):
     # Document processing
     upload_directory: str = "./uploads"
     max_file_size: int = 10 * 1024 * 1024  # 10MB
-    allowed_file_types: list = [".pdf", ".png", ".jpg", ".jpeg"]
+    allowed_file_types: list = [".pdf", ".png", ".jpg", ".jpeg", ".tif", ".tiff", ".heic", ".heif"]
+    bulk_upload_max_files: int = 500  # Documents per bulk upload, counting each ZIP archive member
+    bulk_upload_max_size: int = 500 * 1024 * 1024  # Whole request body, ZIP archives included
     
     # OCR settings
     tesseract_cmd: Optional[str] = None  # Will use system default
+    ocr_resolution: int = 300  # DPI used to rasterize PDF pages without a text layer
+    ocr_preprocess: bool = True  # Clean images up before OCR; the steps below apply only when on
+    ocr_target_dpi: int = 300  # Larger images are scaled down to this resolution
+    ocr_deskew: bool = True
+    ocr_max_skew_degrees: float = 10.0
+    ocr_binarize: bool = True
+    ocr_crop: bool = True  # Crop to the inked area
+    ocr_page_segmentation_mode: int = 3  # Tesseract --psm; 4 or 6 suit single-column receipts
+    ocr_language: str = "eng"  # Tesseract language data, e.g. "eng+chi_sim"
+    ocr_tessdata_dir: Optional[str] = None  # Directory holding the language data files
+    ocr_persistent_engine: bool = True  # Keep Tesseract loaded between images (needs tesserocr installed)
+    ocr_engine_pool_size: int = 1  # Loaded engines per OCR worker process; each reads one image at a time
+    ocr_engine_max_jobs: int = 500  # Images an engine reads before it is re-initialised, bounding memory growth
+    ocr_engine_health_check_after: float = 60.0  # Seconds idle after which an engine is probed before reuse
+    
+    # Multi-page extraction
+    pdf_parallel_min_pages: int = 8  # Larger PDFs are split into page batches
+    image_parallel_min_frames: int = 2  # Every frame of a TIFF/HEIF scan is OCRed, so even short ones are split
+    
+    # Classification
+    classifier_max_chars: int = 64 * 1024  # Leading OCR text scored; documents announce their type early
+    
+    # Background processing
+    # OCR worker processes; this is the whole CPU budget for document processing,
+    # since page batches of large PDFs are scheduled on the same pool as whole jobs
+    ocr_worker_count: int = 2
+    job_poll_interval: float = 1.0  # Seconds between queue scans when idle
+    job_max_attempts: int = 3
+    job_retry_backoff: float = 5.0  # Seconds, doubled on every retry
+    
+    # Instrumentation
+    metrics_enabled: bool = True  # Request timing middleware and the /metrics endpoint
+    metrics_count_queries: bool = True  # SQL statements per request; SQLAlchemy events add ~10µs per statement
+    
+    # Status streaming
+    status_stream_max_pending: int = 256  # Undelivered events buffered per client before it is told it lagged
+    status_stream_keepalive: float = 15.0  # Seconds between comments that keep idle streams open through proxies
+    
+    # Extraction cache
+    extraction_cache_max_entries: int = 10000  # Least recently used entries are evicted
     
     # Tax year settings
     current_tax_year: str = "2024-25"
+    tax_rules_directory: Optional[str] = None  # Rule files per tax year; defaults to app/core/tax_years
+    tax_exact_cents: bool = True  # Integer-cent tax arithmetic; off falls back to float dollars
+    
+    # Estimate caching
+    estimate_cache_max_entries: int = 50000  # Memoized /estimate results, least recently used evicted
+    http_cache_max_age: int = 3600  # Seconds clients and CDNs may reuse /estimate and /brackets responses
+    
+    # Bulk calculation
+    batch_max_rows: int = 100000  # Largest columnar batch accepted per request
+    stream_max_line_bytes: int = 64 * 1024  # Longest NDJSON/CSV row accepted when streaming
     
     # Security
     secret_key: str = "your-secret-key-change-in-production"
@@ -1,4 +1,6 @@
 from .tax_calculator import TaxCalculator
 from .document_processor import DocumentProcessor
+from .extraction_cache import ExtractionCache
+from .job_queue import DocumentJobQueue
 
-__all__ = ["TaxCalculator", "DocumentProcessor"]
\ No newline at end of file
+__all__ = ["TaxCalculator", "DocumentProcessor", "ExtractionCache", "DocumentJobQueue"]
\ No newline at end of file
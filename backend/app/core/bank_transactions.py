@@ -0,0 +1,382 @@
+"""
+Streaming extraction of bank statement transactions
+
+Statement lines are read a page at a time: from the PDF word layout, so
+debit, credit and balance amounts are placed by the column they sit under,
+or from OCR text when the statement has no text layer. Rows are yielded one
+at a time and spilled to a JSON-lines file in the worker process, then
+inserted in batches into the ``bank_transactions`` table by the job queue, so
+even a thousand-page statement is never held in memory as a whole.
+"""
+
+import json
+import os
+import re
+import tempfile
+from datetime import date
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+import pdfplumber
+from sqlalchemy import delete, insert, literal, select
+from sqlalchemy.orm import Session
+
+from ..models.models import BankTransaction, Document
+
+
+class Word(NamedTuple):
+    """A word on a statement line and its horizontal extent"""
+    text: str
+    x0: float
+    x1: float
+
+
+class Transaction(NamedTuple):
+    page: Optional[int]
+    date: Optional[date]
+    description: str
+    debit: Optional[float]
+    credit: Optional[float]
+    balance: Optional[float]
+
+
+MONTHS = {
+    name: number
+    for number, names in enumerate((
+        ("jan", "january"), ("feb", "february"), ("mar", "march"), ("apr", "april"),
+        ("may",), ("jun", "june"), ("jul", "july"), ("aug", "august"),
+        ("sep", "sept", "september"), ("oct", "october"), ("nov", "november"), ("dec", "december")
+    ), start=1)
+    for name in names
+}
+
+NUMERIC_DATE = re.compile(r'(\d{1,2})[/.-](\d{1,2})(?:[/.-](\d{2}|\d{4}))?$')
+AMOUNT = re.compile(r'(\()?(-)?\$?((?:\d{1,3}(?:,\d{3})+|\d+)\.\d{2})(\))?(CR|DR)?$', re.IGNORECASE)
+SIGN_SUFFIXES = ("CR", "DR")
+
+# Column headings, by the column they name
+HEADINGS = {
+    'debit': ("debit", "debits", "withdrawal", "withdrawals"),
+    'credit': ("credit", "credits", "deposit", "deposits"),
+    'balance': ("balance",),
+}
+OPENING_BALANCE = re.compile(r'(opening|brought\s+forward|previous)\s+balance|balance\s+(brought|b/f)', re.IGNORECASE)
+# Summary and footer lines that are not transactions
+NOT_A_TRANSACTION = re.compile(
+    r'(closing|final)\s+balance|balance\s+(carried|c/f)|^totals?\b|^page\s+\d+', re.IGNORECASE
+)
+
+# Words on one PDF line can sit a point or two apart vertically
+LINE_TOLERANCE = 3.0
+
+
+def words_from_text(line: str) -> List[Word]:
+    """Words of a plain-text line, positioned by character offset"""
+    return [Word(match.group(), match.start(), match.end()) for match in re.finditer(r'\S+', line)]
+
+
+def text_statement_lines(text: str) -> Iterator[Tuple[Optional[int], List[Word]]]:
+    """Lines of OCR text; page boundaries are not known"""
+    for match in re.finditer(r'[^\n]+', text or ""):
+        words = words_from_text(match.group())
+        if words:
+            yield None, words
+
+
+def pdf_statement_lines(file_path: str) -> Iterator[Tuple[int, List[Word]]]:
+    """Lines of each PDF page's text layer, one page in memory at a time"""
+    with pdfplumber.open(file_path) as pdf:
+        for page_number, page in enumerate(pdf.pages, start=1):
+            line: List[Dict[str, Any]] = []
+            for word in sorted(page.extract_words(), key=lambda word: (round(word['top']), word['x0'])):
+                if line and abs(word['top'] - line[0]['top']) > LINE_TOLERANCE:
+                    yield page_number, [Word(w['text'], w['x0'], w['x1']) for w in sorted(line, key=lambda w: w['x0'])]
+                    line = []
+                line.append(word)
+            if line:
+                yield page_number, [Word(w['text'], w['x0'], w['x1']) for w in sorted(line, key=lambda w: w['x0'])]
+            page.flush_cache()
+
+
+def statement_lines(
+    file_path: Optional[str],
+    content_type: Optional[str],
+    ocr_text: str
+) -> Iterator[Tuple[Optional[int], List[Word]]]:
+    """A statement's lines, from its PDF layout when it has one, else from OCR text
+
+    Scanned pages of a PDF that also has a text layer contribute no rows;
+    their positions were lost when the pages were OCRed.
+    """
+    if file_path and content_type == "application/pdf":
+        found = False
+        for line in pdf_statement_lines(file_path):
+            found = True
+            yield line
+        if found:
+            return
+    yield from text_statement_lines(ocr_text)
+
+
+def parse_amount(text: str) -> Optional[float]:
+    """Statement amount; parentheses, a leading minus or DR make it negative"""
+    match = AMOUNT.match(text)
+    if not match:
+        return None
+    value = float(match.group(3).replace(',', ''))
+    negative = bool(match.group(1) and match.group(4)) or bool(match.group(2)) \
+        or (match.group(5) or "").upper() == "DR"
+    return -value if negative else value
+
+
+def _parse_date(words: List[Word], year_hint: Optional[int]) -> Tuple[Optional[date], int, bool]:
+    """Date at the start of a line: (date, words used, whether it had a year)"""
+    if not words:
+        return None, 0, False
+
+    match = NUMERIC_DATE.match(words[0].text)
+    if match:
+        day, month, year = int(match.group(1)), int(match.group(2)), match.group(3)
+        used = 1
+    elif words[0].text.isdigit() and len(words) > 1 and words[1].text.lower().rstrip('.') in MONTHS:
+        day, month = int(words[0].text), MONTHS[words[1].text.lower().rstrip('.')]
+        used = 2
+        year = words[2].text if len(words) > 2 and re.fullmatch(r'\d{4}', words[2].text) else None
+        used += 1 if year else 0
+    else:
+        return None, 0, False
+
+    has_year = year is not None
+    if has_year:
+        year = int(year) + (2000 if len(year) == 2 else 0)
+    elif year_hint is None:
+        return None, used, False
+    else:
+        year = year_hint
+    try:
+        return date(year, month, day), used, has_year
+    except ValueError:
+        return None, 0, False
+
+
+def _split_amounts(words: List[Word]) -> Tuple[List[Word], List[Tuple[float, Word]]]:
+    """Separate trailing amounts (up to three) from the description words"""
+    amounts: List[Tuple[float, Word]] = []
+    end = len(words)
+    while end > 0 and len(amounts) < 3:
+        word = words[end - 1]
+        if word.text.upper() in SIGN_SUFFIXES and end > 1:
+            # "1,234.56 CR" split over two words
+            merged = Word(words[end - 2].text + word.text.upper(), words[end - 2].x0, word.x1)
+            value = parse_amount(merged.text)
+            if value is None:
+                break
+            amounts.insert(0, (value, merged))
+            end -= 2
+            continue
+        value = parse_amount(word.text)
+        if value is None:
+            break
+        amounts.insert(0, (value, word))
+        end -= 1
+    return words[:end], amounts
+
+
+def _heading_columns(words: List[Word]) -> Optional[Dict[str, float]]:
+    """Column centres from a table heading line, if this is one"""
+    columns = {}
+    for word in words:
+        text = word.text.lower().strip(':($)')
+        for column, names in HEADINGS.items():
+            if text in names:
+                columns[column] = (word.x0 + word.x1) / 2
+    return columns if 'balance' in columns and len(columns) >= 2 else None
+
+
+def parse_transactions(
+    lines: Iterable[Tuple[Optional[int], List[Word]]],
+    year_hint: Optional[int] = None
+) -> Iterator[Transaction]:
+    """Transactions from statement lines, yielded as each one is complete
+
+    A row starts with a date and ends in its amounts; a line of amounts
+    without a date is another transaction on the previous date, and a line
+    with neither continues the previous description. Amounts are assigned to
+    debit, credit or balance by the heading they are under when the table
+    has headings, and otherwise by sign and by the change in balance.
+    Year-less dates take ``year_hint`` (then the year of the last full
+    date), rolling into the next year when the month goes backwards.
+    """
+    columns: Optional[Dict[str, float]] = None
+    previous_balance: Optional[float] = None
+    current_year = year_hint
+    last_date: Optional[date] = None
+    pending: Optional[Dict[str, Any]] = None
+
+    for page, words in lines:
+        heading = _heading_columns(words)
+        if heading:
+            columns = heading
+            continue
+
+        transaction_date, used, has_year = _parse_date(words, current_year)
+        if transaction_date is not None:
+            if has_year:
+                current_year = transaction_date.year
+            elif last_date is not None and transaction_date < last_date and transaction_date.month < last_date.month:
+                current_year += 1
+                transaction_date = transaction_date.replace(year=current_year)
+        description_words, amounts = _split_amounts(words[used:])
+        description = " ".join(word.text for word in description_words)
+        if NOT_A_TRANSACTION.search(description):
+            continue
+
+        if not amounts:
+            if transaction_date is None and pending is not None and pending['page'] == page:
+                pending['description'] = f"{pending['description']} {description}".strip()
+            continue
+
+        if OPENING_BALANCE.search(description):
+            previous_balance = amounts[-1][0]
+            continue
+
+        if transaction_date is None:
+            if last_date is None or not description:
+                continue
+            transaction_date = last_date
+
+        debit, credit, balance = _assign_amounts(amounts, columns, previous_balance)
+        if pending is not None:
+            yield Transaction(**pending)
+        pending = {
+            'page': page, 'date': transaction_date, 'description': description,
+            'debit': debit, 'credit': credit, 'balance': balance,
+        }
+        last_date = transaction_date
+        if balance is not None:
+            previous_balance = balance
+
+    if pending is not None:
+        yield Transaction(**pending)
+
+
+def _assign_amounts(
+    amounts: List[Tuple[float, Word]],
+    columns: Optional[Dict[str, float]],
+    previous_balance: Optional[float]
+) -> Tuple[Optional[float], Optional[float], Optional[float]]:
+    debit = credit = balance = None
+
+    if columns:
+        for value, word in amounts:
+            centre = (word.x0 + word.x1) / 2
+            column = min(columns, key=lambda name: abs(columns[name] - centre))
+            if column == 'debit':
+                debit = abs(value)
+            elif column == 'credit':
+                credit = abs(value)
+            else:
+                balance = value
+        return debit, credit, balance
+
+    if len(amounts) >= 2:
+        balance = amounts[-1][0]
+        amounts = amounts[:-1]
+    if len(amounts) == 2:
+        return abs(amounts[0][0]), abs(amounts[1][0]), balance
+
+    value, word = amounts[0]
+    signed = value < 0 or word.text.upper().endswith(SIGN_SUFFIXES)
+    if signed:
+        is_credit = value > 0
+    elif balance is not None and previous_balance is not None:
+        is_credit = abs(previous_balance + value - balance) < abs(previous_balance - value - balance)
+    else:
+        is_credit = False  # Nothing to go on; most statement rows are withdrawals
+    if is_credit:
+        credit = abs(value)
+    else:
+        debit = abs(value)
+    return debit, credit, balance
+
+
+def spill_transactions(transactions: Iterable[Transaction], directory: Optional[str] = None) -> Tuple[str, int]:
+    """Write transactions to a JSON-lines file, returning its path and row count"""
+    descriptor, path = tempfile.mkstemp(prefix="transactions-", suffix=".jsonl", dir=directory)
+    count = 0
+    try:
+        with os.fdopen(descriptor, "w") as spill:
+            for transaction in transactions:
+                row = transaction._replace(date=transaction.date.isoformat() if transaction.date else None)
+                spill.write(json.dumps(row, separators=(",", ":")))
+                spill.write("\n")
+                count += 1
+    except BaseException:
+        os.remove(path)
+        raise
+    return path, count
+
+
+def read_spilled_batches(path: str, batch_size: int) -> Iterator[List[Dict[str, Any]]]:
+    """Rows of a spill file as bank_transactions insert parameters, ``batch_size`` at a time"""
+    batch: List[Dict[str, Any]] = []
+    with open(path) as spill:
+        for row_number, line in enumerate(spill):
+            page, transaction_date, description, debit, credit, balance = json.loads(line)
+            batch.append({
+                'row_number': row_number,
+                'page': page,
+                'transaction_date': date.fromisoformat(transaction_date) if transaction_date else None,
+                'description': description,
+                'debit': debit,
+                'credit': credit,
+                'balance': balance,
+            })
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+
+def discard_spill(path: str):
+    """Remove a spill file once its rows are stored (or given up on)"""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def store_transactions(db: Session, document_id: int, path: str, batch_size: int = 1000) -> int:
+    """Replace a document's transactions with the rows of a spill file (caller commits)"""
+    db.execute(delete(BankTransaction).where(BankTransaction.document_id == document_id))
+    stored = 0
+    for batch in read_spilled_batches(path, batch_size):
+        for row in batch:
+            row['document_id'] = document_id
+        db.execute(insert(BankTransaction), batch)
+        stored += len(batch)
+    return stored
+
+
+def transaction_source_query(content_hash: str):
+    """Another document with the same content whose transactions can be copied"""
+    return (
+        select(BankTransaction.document_id)
+        .join(Document, Document.id == BankTransaction.document_id)
+        .where(Document.content_hash == content_hash)
+        .limit(1)
+    )
+
+
+COPIED_COLUMNS = ('row_number', 'page', 'transaction_date', 'description', 'debit', 'credit', 'balance')
+
+
+def copy_transactions_statement(source_id: int, target_id: int):
+    """INSERT ... SELECT of one document's transactions onto another"""
+    return insert(BankTransaction).from_select(
+        [BankTransaction.document_id, *(getattr(BankTransaction, column) for column in COPIED_COLUMNS)],
+        select(
+            literal(target_id),
+            *(getattr(BankTransaction, column) for column in COPIED_COLUMNS)
+        ).where(BankTransaction.document_id == source_id)
+    )
@@ -0,0 +1,142 @@
+"""
+Streaming bulk tax calculation over NDJSON or CSV input
+
+Scenarios are parsed line by line as request chunks arrive and each result
+is emitted as one NDJSON line, so memory stays bounded by the chunk and line
+size regardless of how many scenarios are sent. A malformed row produces an
+error line for that row instead of failing the whole batch.
+"""
+
+import codecs
+import csv
+import json
+from typing import AsyncIterator, Dict, Any, List, Optional, Tuple
+
+from .tax_calculator import TaxCalculator
+
+INCOME_FIELDS = ('employment_income', 'investment_income', 'business_income')
+DEDUCTION_FIELDS = ('work_related_expenses', 'work_from_home_deduction', 'other_deductions')
+
+
+class RowError(ValueError):
+    """A single input row could not be parsed"""
+
+
+async def iter_lines(chunks: AsyncIterator[bytes], max_line_bytes: int) -> AsyncIterator[List[Optional[str]]]:
+    """Split a byte stream into text lines, one list of lines per chunk
+
+    Lines longer than ``max_line_bytes`` are reported as ``None`` rather than
+    buffered, so a missing newline cannot grow memory without bound.
+    """
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    pending = ""
+    overflow = False
+
+    async for chunk in chunks:
+        text = pending + decoder.decode(chunk)
+        *lines, pending = text.split('\n')
+        if overflow and lines:
+            lines[0] = None
+            overflow = False
+        if len(pending) > max_line_bytes:
+            pending = ""
+            overflow = True
+        if lines:
+            yield lines
+
+    tail = pending + decoder.decode(b'', final=True)
+    if overflow:
+        yield [None]
+    elif tail:
+        yield [tail]
+
+
+def _amounts(values: Dict[str, Any], label: str) -> Dict[str, float]:
+    if not isinstance(values, dict):
+        raise RowError(f"{label} must be an object")
+    try:
+        return {key: float(value) for key, value in values.items() if value not in (None, "")}
+    except (TypeError, ValueError):
+        raise RowError(f"{label} values must be numbers")
+
+
+def parse_ndjson_row(line: str) -> Tuple[Any, Dict[str, float], Dict[str, float]]:
+    """Parse ``{"id": ..., "income_data": {...}, "deduction_data": {...}}``"""
+    try:
+        row = json.loads(line)
+    except json.JSONDecodeError as e:
+        raise RowError(f"Invalid JSON: {e.msg}")
+    if not isinstance(row, dict):
+        raise RowError("Row must be a JSON object")
+
+    income_data = _amounts(row.get('income_data') or {}, "income_data")
+    deduction_data = _amounts(row.get('deduction_data') or {}, "deduction_data")
+    return row.get('id'), income_data, deduction_data
+
+
+def parse_csv_row(header: List[str], line: str) -> Tuple[Any, Dict[str, float], Dict[str, float]]:
+    """Parse a CSV row whose header names the income/deduction components"""
+    values = next(csv.reader([line]))
+    if len(values) != len(header):
+        raise RowError(f"Expected {len(header)} columns, got {len(values)}")
+
+    row = dict(zip(header, values))
+    income_data = _amounts({key: row[key] for key in INCOME_FIELDS if key in row}, "income")
+    deduction_data = _amounts({key: row[key] for key in DEDUCTION_FIELDS if key in row}, "deduction")
+    return row.get('id'), income_data, deduction_data
+
+
+def _result_line(row_number: int, row_id: Any, data: Optional[Dict[str, float]], error: Optional[str]) -> str:
+    return json.dumps({
+        'row': row_number,
+        'id': row_id,
+        'success': error is None,
+        'data': data,
+        'error': error
+    })
+
+
+async def stream_calculations(
+    chunks: AsyncIterator[bytes],
+    input_format: str = "ndjson",
+    max_line_bytes: int = 64 * 1024,
+    calculator: type = TaxCalculator
+) -> AsyncIterator[bytes]:
+    """Calculate tax for each input row, yielding NDJSON result lines
+
+    ``calculator`` is TaxCalculator or a tax year's ``TaxCalculator.for_year``.
+    """
+    header: Optional[List[str]] = None
+    row_number = 0
+
+    async for lines in iter_lines(chunks, max_line_bytes):
+        output = []
+        for line in lines:
+            if line is not None:
+                line = line.strip()
+                if not line:
+                    continue
+
+            if input_format == "csv" and header is None:
+                if line is None:
+                    yield (_result_line(0, None, None, "CSV header line too long") + "\n").encode()
+                    return
+                header = [column.strip() for column in next(csv.reader([line]))]
+                continue
+
+            row_number += 1
+            row_id = None
+            try:
+                if line is None:
+                    raise RowError(f"Line exceeds {max_line_bytes} bytes")
+                if input_format == "csv":
+                    row_id, income_data, deduction_data = parse_csv_row(header, line)
+                else:
+                    row_id, income_data, deduction_data = parse_ndjson_row(line)
+                data = calculator.calculate_total_tax(income_data, deduction_data)
+                output.append(_result_line(row_number, row_id, data, None))
+            except Exception as e:
+                output.append(_result_line(row_number, row_id, None, str(e)))
+
+        if output:
+            yield ("\n".join(output) + "\n").encode()
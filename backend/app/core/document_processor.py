@@ -4,58 +4,155 @@ Document processing service for OCR and data extraction
 
 import os
 import io
+import math
 import re
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, Iterator, List
 from PIL import Image
 import pytesseract
 import pdfplumber
 from PyPDF2 import PdfReader
 
 from ..models.models import DocumentType
+from .bank_transactions import Transaction, parse_transactions, spill_transactions, statement_lines
+from .document_classifier import Classification, document_classifier
+from .field_extraction import extract_fields
+from .image_preprocessing import PreprocessOptions, open_for_ocr, preprocess_for_ocr
+from .metrics import stage
+from .ocr_engine import engine_pool
+
+
+# Image formats that can hold several pages, OCRed frame by frame
+MULTI_PAGE_IMAGE_TYPES = {"image/tiff", "image/heic", "image/heif"}
+
+
+def ocr_image(image: Image.Image, options: PreprocessOptions, dpi: Optional[float] = None) -> str:
+    """Preprocess an image and OCR it with the configured Tesseract settings"""
+    with stage("ocr"):
+        prepared = preprocess_for_ocr(image, options, dpi)
+        return engine_pool(options).recognize(prepared)
+
+
+def _ocr_pdf_page(page, resolution: int) -> str:
+    """Rasterize a PDF page and OCR it"""
+    image = page.to_image(resolution=resolution).original
+    return ocr_image(image, PreprocessOptions.from_settings(), dpi=resolution)
+
+
+def pdf_page_count(file_path: str) -> int:
+    """Number of pages in a PDF"""
+    with pdfplumber.open(file_path) as pdf:
+        return len(pdf.pages)
+
+
+def pdf_page_batches(page_count: int, workers: int) -> List[List[int]]:
+    """Split page numbers into contiguous batches for ``workers`` processes"""
+    # Several small batches per worker keep slow OCR pages from serializing the rest
+    batch_size = max(1, math.ceil(page_count / (workers * 4)))
+    return [
+        list(range(start, min(start + batch_size, page_count)))
+        for start in range(0, page_count, batch_size)
+    ]
+
+
+def extract_pdf_pages(file_path: str, page_numbers: List[int], ocr_resolution: int) -> List[str]:
+    """Extract text from a batch of PDF pages, OCRing pages without a text layer"""
+    texts = []
+    with pdfplumber.open(file_path) as pdf:
+        for number in page_numbers:
+            page = pdf.pages[number]
+            with stage("pdf_text"):
+                page_text = page.extract_text() or ""
+            if not page_text.strip():
+                page_text = _ocr_pdf_page(page, ocr_resolution)
+            page.flush_cache()
+            texts.append(page_text)
+    return texts
+
+
+def image_frame_count(file_path: str) -> int:
+    """Number of frames (pages) in an image, read without decoding any of them"""
+    with Image.open(file_path) as image:
+        return getattr(image, "n_frames", 1)
+
+
+def extract_image_frames(
+    file_path: str,
+    frame_numbers: List[int],
+    options: Optional[PreprocessOptions] = None
+) -> List[str]:
+    """OCR a batch of frames of a multi-page image, decoding one frame at a time"""
+    options = options or PreprocessOptions.from_settings()
+    texts = []
+    with Image.open(file_path) as image:
+        for number in frame_numbers:
+            # Seeking drops the previous frame's pixels; only this frame is decoded
+            image.seek(number)
+            texts.append(ocr_image(image, options).strip())
+    return texts
+
+
+def join_page_texts(page_texts: List[str]) -> str:
+    """Join per-page text in page order, skipping empty pages"""
+    return "\n".join(text for text in page_texts if text).strip()
 
 
 class DocumentProcessor:
     """Service for processing uploaded documents"""
     
+    # Bump whenever extraction output changes so cached results are not reused
+    VERSION = "5"
+    
     def __init__(self):
         # Configure tesseract if path is provided
         from ..config import settings
         if settings.tesseract_cmd:
             pytesseract.pytesseract.tesseract_cmd = settings.tesseract_cmd
+        
+        self.ocr_resolution = settings.ocr_resolution
+        self.ocr_options = PreprocessOptions.from_settings()
+    
+    def warm_up_ocr(self) -> Dict[str, Any]:
+        """Start this process's OCR engines now rather than on the first image"""
+        return engine_pool(self.ocr_options).warm_up()
     
     def extract_text_from_pdf(self, file_path: str) -> str:
-        """Extract text from PDF using pdfplumber"""
+        """Extract text from PDF using pdfplumber, OCRing pages without a text layer
+        
+        Pages are read one after another; the job queue splits large PDFs
+        into page batches across its workers before they get here.
+        """
         try:
-            text = ""
-            with pdfplumber.open(file_path) as pdf:
-                for page in pdf.pages:
-                    page_text = page.extract_text()
-                    if page_text:
-                        text += page_text + "\n"
-            return text.strip()
+            page_count = pdf_page_count(file_path)
+            page_texts = extract_pdf_pages(file_path, list(range(page_count)), self.ocr_resolution)
+            return join_page_texts(page_texts)
         except Exception as e:
             # Fallback to PyPDF2
             try:
-                text = ""
-                with open(file_path, 'rb') as file:
+                with stage("pdf_text"), open(file_path, 'rb') as file:
                     pdf_reader = PdfReader(file)
-                    for page in pdf_reader.pages:
-                        text += page.extract_text() + "\n"
-                return text.strip()
+                    page_texts = [page.extract_text() for page in pdf_reader.pages]
+                return join_page_texts(page_texts)
             except Exception:
                 raise Exception(f"Failed to extract text from PDF: {str(e)}")
     
     def extract_text_from_image(self, file_path: str) -> str:
         """Extract text from image using OCR"""
         try:
-            image = Image.open(file_path)
-            # Convert to RGB if necessary
-            if image.mode != 'RGB':
-                image = image.convert('RGB')
+            with stage("ocr"):
+                image, dpi = open_for_ocr(file_path, self.ocr_options)
+            return ocr_image(image, self.ocr_options, dpi).strip()
+        except Exception as e:
+            raise Exception(f"Failed to extract text from image: {str(e)}")
+    
+    def extract_text_from_multipage_image(self, file_path: str) -> str:
+        """OCR every frame of a TIFF/HEIF image in order (the job queue splits long scans)"""
+        try:
+            frame_count = image_frame_count(file_path)
+            if frame_count == 1:
+                return self.extract_text_from_image(file_path)
             
-            # Perform OCR
-            text = pytesseract.image_to_string(image)
-            return text.strip()
+            frame_texts = extract_image_frames(file_path, list(range(frame_count)), self.ocr_options)
+            return join_page_texts(frame_texts)
         except Exception as e:
             raise Exception(f"Failed to extract text from image: {str(e)}")
     
@@ -63,181 +160,77 @@ class DocumentProcessor:
         """Extract text from document based on file type"""
         if content_type == "application/pdf":
             return self.extract_text_from_pdf(file_path)
+        elif content_type in MULTI_PAGE_IMAGE_TYPES:
+            return self.extract_text_from_multipage_image(file_path)
         elif content_type.startswith("image/"):
             return self.extract_text_from_image(file_path)
         else:
             raise ValueError(f"Unsupported file type: {content_type}")
     
+    def classify(self, text: str, filename: str) -> Classification:
+        """Classify a document, with a confidence score and per-category scores"""
+        return document_classifier.classify(text, filename)
+    
     def classify_document(self, text: str, filename: str) -> DocumentType:
-        """Classify document type based on content"""
-        text_lower = text.lower()
-        filename_lower = filename.lower()
-        
-        # PAYG Summary indicators
-        payg_indicators = [
-            "payment summary", "payg", "group certificate", "employer",
-            "gross payments", "tax withheld", "abn", "tfn"
-        ]
-        
-        # Receipt indicators  
-        receipt_indicators = [
-            "receipt", "invoice", "tax invoice", "gst", "abn",
-            "amount paid", "total", "purchase", "sale"
-        ]
-        
-        # Bank statement indicators
-        bank_indicators = [
-            "bank statement", "account statement", "transaction",
-            "balance", "deposit", "withdrawal", "interest"
-        ]
-        
-        # Check for PAYG summary
-        if any(indicator in text_lower for indicator in payg_indicators):
-            return DocumentType.PAYG_SUMMARY
-        
-        # Check for receipt/invoice
-        if any(indicator in text_lower for indicator in receipt_indicators):
-            return DocumentType.RECEIPT
-        
-        # Check for bank statement
-        if any(indicator in text_lower for indicator in bank_indicators):
-            return DocumentType.BANK_STATEMENT
-        
-        # Check filename for hints
-        if any(term in filename_lower for term in ["payg", "payment", "summary"]):
-            return DocumentType.PAYG_SUMMARY
-        
-        if any(term in filename_lower for term in ["receipt", "invoice"]):
-            return DocumentType.RECEIPT
-        
-        if any(term in filename_lower for term in ["statement", "bank"]):
-            return DocumentType.BANK_STATEMENT
-        
-        return DocumentType.OTHER
+        """Classify document type based on content and filename"""
+        return self.classify(text, filename).document_type
     
     def extract_structured_data(self, text: str, document_type: DocumentType) -> Dict[str, Any]:
         """Extract structured data based on document type"""
-        data = {}
-        
-        if document_type == DocumentType.PAYG_SUMMARY:
-            data.update(self._extract_payg_data(text))
-        elif document_type == DocumentType.RECEIPT:
-            data.update(self._extract_receipt_data(text))
-        elif document_type == DocumentType.BANK_STATEMENT:
-            data.update(self._extract_bank_statement_data(text))
-        
-        return data
+        return extract_fields(text, document_type)
     
-    def _extract_payg_data(self, text: str) -> Dict[str, Any]:
-        """Extract data from PAYG summary"""
-        data = {}
-        
-        # Extract gross payments
-        gross_match = re.search(r'gross\s+payments?\s*:?\s*\$?([\d,]+\.?\d*)', text, re.IGNORECASE)
-        if gross_match:
-            amount_str = gross_match.group(1).replace(',', '')
-            try:
-                data['gross_payments'] = float(amount_str)
-            except ValueError:
-                pass
-        
-        # Extract tax withheld
-        tax_match = re.search(r'tax\s+withheld\s*:?\s*\$?([\d,]+\.?\d*)', text, re.IGNORECASE)
-        if tax_match:
-            amount_str = tax_match.group(1).replace(',', '')
-            try:
-                data['tax_withheld'] = float(amount_str)
-            except ValueError:
-                pass
-        
-        # Extract TFN
-        tfn_match = re.search(r'tfn\s*:?\s*(\d{3}\s*\d{3}\s*\d{3})', text, re.IGNORECASE)
-        if tfn_match:
-            data['tfn'] = tfn_match.group(1).replace(' ', '')
-        
-        # Extract ABN
-        abn_match = re.search(r'abn\s*:?\s*(\d{2}\s*\d{3}\s*\d{3}\s*\d{3})', text, re.IGNORECASE)
-        if abn_match:
-            data['abn'] = abn_match.group(1).replace(' ', '')
-        
-        return data
+    def extract_transactions(
+        self,
+        ocr_text: str,
+        extracted_data: Dict[str, Any],
+        file_path: Optional[str] = None,
+        content_type: Optional[str] = None
+    ) -> Iterator[Transaction]:
+        """Stream a bank statement's transaction rows"""
+        year_hint = None
+        period_start = extracted_data.get('period_start')
+        if period_start:
+            year = re.split(r'[/-]', period_start)[-1]
+            year_hint = int(year) + (2000 if len(year) == 2 else 0)
+        return parse_transactions(statement_lines(file_path, content_type, ocr_text), year_hint)
     
-    def _extract_receipt_data(self, text: str) -> Dict[str, Any]:
-        """Extract data from receipt/invoice"""
-        data = {}
-        
-        # Extract total amount
-        total_patterns = [
-            r'total\s*:?\s*\$?([\d,]+\.?\d*)',
-            r'amount\s*:?\s*\$?([\d,]+\.?\d*)',
-            r'grand\s+total\s*:?\s*\$?([\d,]+\.?\d*)'
-        ]
-        
-        for pattern in total_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                amount_str = match.group(1).replace(',', '')
-                try:
-                    data['total_amount'] = float(amount_str)
-                    break
-                except ValueError:
-                    continue
-        
-        # Extract GST
-        gst_match = re.search(r'gst\s*:?\s*\$?([\d,]+\.?\d*)', text, re.IGNORECASE)
-        if gst_match:
-            amount_str = gst_match.group(1).replace(',', '')
-            try:
-                data['gst_amount'] = float(amount_str)
-            except ValueError:
-                pass
-        
-        # Extract date
-        date_patterns = [
-            r'(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})',
-            r'(\d{1,2}\s+\w+\s+\d{2,4})',
-        ]
-        
-        for pattern in date_patterns:
-            match = re.search(pattern, text)
-            if match:
-                data['date'] = match.group(1)
-                break
-        
-        return data
-    
-    def _extract_bank_statement_data(self, text: str) -> Dict[str, Any]:
-        """Extract data from bank statement"""
-        data = {}
-        
-        # Extract account number
-        account_match = re.search(r'account\s+(?:number\s*:?\s*)?(\d{6,})', text, re.IGNORECASE)
-        if account_match:
-            data['account_number'] = account_match.group(1)
-        
-        # Extract statement period
-        period_match = re.search(r'statement\s+period\s*:?\s*(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})\s*(?:to|-)?\s*(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})', text, re.IGNORECASE)
-        if period_match:
-            data['period_start'] = period_match.group(1)
-            data['period_end'] = period_match.group(2)
-        
-        # Extract balance information
-        balance_patterns = [
-            r'closing\s+balance\s*:?\s*\$?([\d,]+\.?\d*)',
-            r'final\s+balance\s*:?\s*\$?([\d,]+\.?\d*)'
-        ]
-        
-        for pattern in balance_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                amount_str = match.group(1).replace(',', '')
-                try:
-                    data['closing_balance'] = float(amount_str)
-                    break
-                except ValueError:
-                    continue
+    def process_text(
+        self,
+        ocr_text: str,
+        filename: str,
+        file_path: Optional[str] = None,
+        content_type: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Classify already-extracted text and pull out structured data
+        
+        A bank statement's transactions are spilled to a JSON-lines file named
+        by ``transactions_path`` in the result, for the caller to store.
+        """
+        # Classify document
+        with stage("classification"):
+            classification = self.classify(ocr_text, filename)
+        document_type = classification.document_type
+        
+        # Extract structured data
+        with stage("field_extraction"):
+            extracted_data = self.extract_structured_data(ocr_text, document_type)
         
-        return data
+        transactions_path = None
+        if document_type == DocumentType.BANK_STATEMENT:
+            with stage("transactions"):
+                transactions_path, extracted_data['transaction_count'] = spill_transactions(
+                    self.extract_transactions(ocr_text, extracted_data, file_path, content_type)
+                )
+        
+        return {
+            'success': True,
+            'ocr_text': ocr_text,
+            'document_type': document_type.value,
+            'classification_confidence': classification.confidence,
+            'extracted_data': extracted_data,
+            'transactions_path': transactions_path,
+            'error': None
+        }
     
     def process_document(self, file_path: str, content_type: str, filename: str) -> Dict[str, Any]:
         """Complete document processing pipeline"""
@@ -245,25 +238,14 @@ class DocumentProcessor:
             # Extract text
             ocr_text = self.extract_text(file_path, content_type)
             
-            # Classify document
-            document_type = self.classify_document(ocr_text, filename)
-            
-            # Extract structured data
-            extracted_data = self.extract_structured_data(ocr_text, document_type)
-            
-            return {
-                'success': True,
-                'ocr_text': ocr_text,
-                'document_type': document_type.value,
-                'extracted_data': extracted_data,
-                'error': None
-            }
+            return self.process_text(ocr_text, filename, file_path, content_type)
             
         except Exception as e:
             return {
                 'success': False,
                 'ocr_text': None,
                 'document_type': None,
+                'classification_confidence': None,
                 'extracted_data': None,
                 'error': str(e)
             }
\ No newline at end of file
@@ -0,0 +1,72 @@
+"""
+In-process memo of /estimate results
+
+An estimate is a pure function of the taxable income and the tax year's
+rules, so results are kept in a bounded LRU keyed on the income in cents and
+the rule set's version. Editing a rule file changes its version, so stale
+entries can never be served after a rates update.
+"""
+
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Dict, Optional, Tuple
+
+from ..config import settings
+
+
+def estimate_key(calculator: type, taxable_income: float) -> Tuple[str, str, int]:
+    """Cache key: tax year, rule-set version and the income in whole cents"""
+    rules = calculator.RULES
+    return rules.tax_year, rules.version, int(round(taxable_income * 100))
+
+
+class EstimateCache:
+    """Bounded LRU of TaxCalculator.calculate_estimate results"""
+
+    def __init__(self, max_entries: Optional[int] = None):
+        self.max_entries = max_entries or settings.estimate_cache_max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[Tuple[str, str, int], Dict[str, Any]]" = OrderedDict()
+        self._lock = Lock()
+
+    def estimate(self, calculator: type, taxable_income: float) -> Dict[str, Any]:
+        """Estimate for the income rounded to the cent, computed at most once per key"""
+        key = estimate_key(calculator, taxable_income)
+        with self._lock:
+            result = self._entries.get(key)
+            if result is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return dict(result)
+            self.misses += 1
+
+        result = calculator.calculate_estimate(key[2] / 100)
+
+        with self._lock:
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return dict(result)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and current size"""
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            'evictions': self.evictions,
+            'entries': len(self._entries),
+            'max_entries': self.max_entries
+        }
+
+
+estimate_cache = EstimateCache()
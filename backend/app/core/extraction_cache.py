@@ -0,0 +1,171 @@
+"""
+Content-addressed cache of document extraction results
+
+Results are keyed by the SHA-256 of the uploaded file plus the
+``DocumentProcessor.VERSION`` that produced them, so re-uploads of the same
+PAYG summary or statement reuse the stored OCR output instead of running
+pdfplumber/Tesseract again. Entries live in the database and survive
+restarts; the least recently used entries are evicted beyond the size cap.
+"""
+
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Optional
+
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..models.models import ExtractionCacheEntry
+from .document_processor import DocumentProcessor
+
+
+class ExtractionCache:
+    """Persistent LRU cache of processing results keyed by content hash"""
+
+    def __init__(self, max_entries: Optional[int] = None, processor_version: str = DocumentProcessor.VERSION):
+        self.max_entries = max_entries or settings.extraction_cache_max_entries
+        self.processor_version = processor_version
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # Running entry count so eviction does not count(*) on every store;
+        # it is re-read from the table only once the estimate passes the cap
+        self._entry_count: Optional[int] = None
+
+    def lookup(self, db: Session, content_hash: str) -> Optional[Dict[str, Any]]:
+        """Return a cached processing result for the content, if any"""
+        entry = (
+            db.query(ExtractionCacheEntry)
+            .filter(ExtractionCacheEntry.content_hash == content_hash)
+            .filter(ExtractionCacheEntry.processor_version == self.processor_version)
+            .first()
+        )
+        if entry is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        entry.hit_count = (entry.hit_count or 0) + 1
+        entry.last_used_at = datetime.now(timezone.utc)
+
+        return self._result(entry)
+
+    @staticmethod
+    def _result(entry: ExtractionCacheEntry) -> Dict[str, Any]:
+        return {
+            'success': True,
+            'ocr_text': entry.ocr_text,
+            'document_type': entry.document_type,
+            'classification_confidence': entry.classification_confidence,
+            'extracted_data': entry.extracted_data,
+            'error': None
+        }
+
+    def lookup_many(self, db: Session, content_hashes: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """Cached processing results for many contents in one query, keyed by hash"""
+        uses = Counter(content_hashes)
+        entries = (
+            db.query(ExtractionCacheEntry)
+            .filter(ExtractionCacheEntry.content_hash.in_(uses))
+            .filter(ExtractionCacheEntry.processor_version == self.processor_version)
+            .all()
+        )
+        now = datetime.now(timezone.utc)
+        results = {}
+        for entry in entries:
+            entry.hit_count = (entry.hit_count or 0) + uses[entry.content_hash]
+            entry.last_used_at = now
+            results[entry.content_hash] = self._result(entry)
+        hits = sum(count for content_hash, count in uses.items() if content_hash in results)
+        self.hits += hits
+        self.misses += sum(uses.values()) - hits
+        return results
+
+    def store(self, db: Session, content_hash: str, result: Dict[str, Any]):
+        """Cache a successful processing result (caller commits)"""
+        # Write pending LRU touches from lookup() before eviction orders by them
+        db.flush()
+        values = {
+            'ocr_text': result['ocr_text'],
+            'document_type': result['document_type'],
+            'classification_confidence': result.get('classification_confidence'),
+            'extracted_data': result['extracted_data'],
+            'last_used_at': datetime.now(timezone.utc)
+        }
+        key = (content_hash, self.processor_version)
+        existing = db.get(ExtractionCacheEntry, key)
+        is_new = existing is None
+
+        # Identical uploads finishing together both miss; upsert so neither insert fails
+        dialect = db.get_bind().dialect.name
+        if dialect in ('sqlite', 'postgresql'):
+            insert = sqlite.insert if dialect == 'sqlite' else postgresql.insert
+            statement = insert(ExtractionCacheEntry).values(
+                content_hash=content_hash,
+                processor_version=self.processor_version,
+                hit_count=0,
+                **values
+            )
+            db.execute(statement.on_conflict_do_update(
+                index_elements=['content_hash', 'processor_version'],
+                set_=values
+            ))
+            if existing is not None:
+                db.expire(existing)
+        elif is_new:
+            db.add(ExtractionCacheEntry(
+                content_hash=content_hash,
+                processor_version=self.processor_version,
+                hit_count=0,
+                **values
+            ))
+            db.flush()
+        else:
+            db.query(ExtractionCacheEntry).filter(
+                ExtractionCacheEntry.content_hash == content_hash,
+                ExtractionCacheEntry.processor_version == self.processor_version
+            ).update(values)
+
+        if is_new and self._entry_count is not None:
+            self._entry_count += 1
+        self._evict(db)
+
+    def _evict(self, db: Session):
+        if self._entry_count is not None and self._entry_count <= self.max_entries:
+            return
+
+        self._entry_count = db.query(ExtractionCacheEntry).count()
+        excess = self._entry_count - self.max_entries
+        if excess <= 0:
+            return
+
+        stale = (
+            db.query(ExtractionCacheEntry.content_hash, ExtractionCacheEntry.processor_version)
+            .order_by(ExtractionCacheEntry.last_used_at, ExtractionCacheEntry.created_at)
+            .limit(excess)
+            .all()
+        )
+        for content_hash, processor_version in stale:
+            db.query(ExtractionCacheEntry).filter(
+                ExtractionCacheEntry.content_hash == content_hash,
+                ExtractionCacheEntry.processor_version == processor_version
+            ).delete()
+        self.evictions += len(stale)
+        self._entry_count -= len(stale)
+
+    def stats(self, db: Session) -> Dict[str, Any]:
+        """Hit/miss counters for this process plus the persisted entry count"""
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            'evictions': self.evictions,
+            'entries': db.query(ExtractionCacheEntry).count(),
+            'max_entries': self.max_entries,
+            'processor_version': self.processor_version
+        }
+
+
+extraction_cache = ExtractionCache()
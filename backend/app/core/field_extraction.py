@@ -0,0 +1,156 @@
+"""
+Declarative field extraction rules for classified documents
+
+Each document type lists the fields to pull out of its OCR text as
+FieldRules: one or more regex patterns tried in priority order, plus a parser
+for the captured text. Rules are compiled once at import into an
+ExtractionProfile per type.
+
+Case-insensitive patterns are run against a single lower-cased copy of the
+text rather than with re.IGNORECASE, which keeps the regex engine on its
+literal-prefix fast path; captured values are then sliced from the original
+text so they keep their case.
+"""
+
+import re
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from ..models.models import DocumentType
+
+# Returned by a parser when a captured value is unusable, so the next pattern is tried
+INVALID = object()
+
+
+def parse_amount(value: str) -> Any:
+    """Dollar amount with thousands separators"""
+    try:
+        return float(value.replace(',', ''))
+    except ValueError:
+        return INVALID
+
+
+def strip_spaces(value: str) -> str:
+    return value.replace(' ', '')
+
+
+@dataclass(frozen=True)
+class FieldRule:
+    """One or more fields filled from the first pattern that yields a usable value
+
+    ``fields`` name the pattern's capture groups in order; ``parse`` converts
+    each captured string, returning INVALID to fall through to the next
+    pattern.
+    """
+    fields: Tuple[str, ...]
+    patterns: Tuple[str, ...]
+    parse: Optional[Callable[[str], Any]] = None
+    ignore_case: bool = True
+
+
+def rule(
+    fields,
+    *patterns: str,
+    parse: Optional[Callable[[str], Any]] = None,
+    ignore_case: bool = True
+) -> FieldRule:
+    if isinstance(fields, str):
+        fields = (fields,)
+    return FieldRule(tuple(fields), patterns, parse, ignore_case)
+
+
+AMOUNT = r'\s*:?\s*\$?([\d,]+\.?\d*)'
+DATE = r'(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})'
+
+EXTRACTION_RULES: Dict[DocumentType, List[FieldRule]] = {
+    DocumentType.PAYG_SUMMARY: [
+        rule('gross_payments', r'gross\s+payments?' + AMOUNT, parse=parse_amount),
+        rule('tax_withheld', r'tax\s+withheld' + AMOUNT, parse=parse_amount),
+        rule('tfn', r'tfn\s*:?\s*(\d{3}\s*\d{3}\s*\d{3})', parse=strip_spaces),
+        rule('abn', r'abn\s*:?\s*(\d{2}\s*\d{3}\s*\d{3}\s*\d{3})', parse=strip_spaces),
+    ],
+    DocumentType.RECEIPT: [
+        rule('total_amount', r'total' + AMOUNT, r'amount' + AMOUNT, r'grand\s+total' + AMOUNT, parse=parse_amount),
+        rule('gst_amount', r'gst' + AMOUNT, parse=parse_amount),
+        rule('date', DATE, r'(\d{1,2}\s+\w+\s+\d{2,4})', ignore_case=False),
+    ],
+    DocumentType.BANK_STATEMENT: [
+        rule('account_number', r'account\s+(?:number\s*:?\s*)?(\d{6,})'),
+        rule(('period_start', 'period_end'), r'statement\s+period\s*:?\s*' + DATE + r'\s*(?:to|-)?\s*' + DATE),
+        rule('closing_balance', r'closing\s+balance' + AMOUNT, r'final\s+balance' + AMOUNT, parse=parse_amount),
+    ],
+}
+
+
+class _CompiledRule:
+    __slots__ = ('fields', 'parse', 'ignore_case', 'folded', 'exact')
+
+    def __init__(self, field_rule: FieldRule):
+        self.fields = field_rule.fields
+        self.parse = field_rule.parse
+        self.ignore_case = field_rule.ignore_case
+        if field_rule.ignore_case:
+            for pattern in field_rule.patterns:
+                if pattern != pattern.lower():
+                    raise ValueError(f"Case-insensitive pattern must be lower case: {pattern!r}")
+        # Lower-case-text patterns for the fast path, IGNORECASE ones for text lower() resizes
+        self.folded = tuple(re.compile(pattern) for pattern in field_rule.patterns)
+        self.exact = tuple(
+            re.compile(pattern, re.IGNORECASE if field_rule.ignore_case else 0)
+            for pattern in field_rule.patterns
+        )
+
+    def extract(self, text: str, folded: Optional[str]) -> Optional[Dict[str, Any]]:
+        if self.ignore_case and folded is not None:
+            patterns, haystack = self.folded, folded
+        else:
+            patterns, haystack = self.exact, text
+
+        for pattern in patterns:
+            match = pattern.search(haystack)
+            if not match:
+                continue
+            values = {}
+            for group, field in enumerate(self.fields, start=1):
+                value = text[match.start(group):match.end(group)]
+                if self.parse is not None:
+                    value = self.parse(value)
+                    if value is INVALID:
+                        break
+                values[field] = value
+            else:
+                return values
+        return None
+
+
+class ExtractionProfile:
+    """A document type's rules, compiled once and applied in declaration order"""
+
+    def __init__(self, rules: List[FieldRule]):
+        self.rules = [_CompiledRule(field_rule) for field_rule in rules]
+        self._needs_folding = any(compiled.ignore_case for compiled in self.rules)
+
+    def extract(self, text: str) -> Dict[str, Any]:
+        folded = None
+        if self._needs_folding:
+            folded = text.lower()
+            if len(folded) != len(text):
+                folded = None  # A few non-ASCII characters change length; spans would not line up
+        data: Dict[str, Any] = {}
+        for compiled in self.rules:
+            values = compiled.extract(text, folded)
+            if values:
+                data.update(values)
+        return data
+
+
+EXTRACTION_PROFILES: Dict[DocumentType, ExtractionProfile] = {
+    document_type: ExtractionProfile(rules)
+    for document_type, rules in EXTRACTION_RULES.items()
+}
+
+
+def extract_fields(text: str, document_type: DocumentType) -> Dict[str, Any]:
+    """Structured fields for a document of the given type ({} for types without rules)"""
+    profile = EXTRACTION_PROFILES.get(document_type)
+    return profile.extract(text) if profile is not None else {}
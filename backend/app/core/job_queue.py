@@ -0,0 +1,481 @@
+"""
+Background job queue for document processing
+
+Jobs are persisted in the ``processing_jobs`` table so no external broker is
+required. A dispatcher running on the application event loop claims due jobs
+and hands the OCR work to a pool of worker processes, keeping request
+handlers free of blocking Tesseract/pdfplumber calls. The queue's own
+database work (claiming jobs, storing results with their transactions,
+cache entries and tax return totals) runs in threads for the same reason.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Dict, Any, List, NamedTuple, Sequence, Tuple, Union
+
+from sqlalchemy import func, insert, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, selectinload
+
+from ..config import settings
+from ..database.database import SessionLocal
+from ..models.models import Document, DocumentStatus, ProcessingJob, JobStatus
+from .bank_transactions import discard_spill, store_transactions
+from .document_processor import (
+    MULTI_PAGE_IMAGE_TYPES, DocumentProcessor, extract_image_frames, extract_pdf_pages,
+    image_frame_count, join_page_texts, pdf_page_batches, pdf_page_count
+)
+from .extraction_cache import ExtractionCache, extraction_cache
+from .metrics import collect_stages, merge_stages, page_parallel_fallbacks, record_job
+from .return_totals import count_document
+from .status_events import StatusBroker, status_broker, status_payload
+
+logger = logging.getLogger(__name__)
+
+# One processor per worker process, created lazily on the first job
+_worker_processor: Optional[DocumentProcessor] = None
+
+
+def _init_worker():
+    """Runs as each OCR worker process starts: load its Tesseract engines up front"""
+    global _worker_processor
+    try:
+        _worker_processor = DocumentProcessor()
+        _worker_processor.warm_up_ocr()
+    except Exception:
+        # Raising here would break the whole pool; jobs report OCR failures themselves
+        logger.exception("OCR worker warm-up failed")
+
+
+def _worker_ready() -> bool:
+    return True
+
+
+def _run_processing(file_path: str, content_type: str, filename: str) -> Dict[str, Any]:
+    """Entry point executed inside the OCR worker processes"""
+    global _worker_processor
+    if _worker_processor is None:
+        _worker_processor = DocumentProcessor()
+    with collect_stages() as stage_seconds:
+        result = _worker_processor.process_document(
+            file_path=file_path,
+            content_type=content_type,
+            filename=filename
+        )
+    result['stage_seconds'] = stage_seconds
+    return result
+
+
+def _run_text_processing(ocr_text: str, filename: str, file_path: str, content_type: str) -> Dict[str, Any]:
+    """Classify and extract fields from text whose pages were extracted separately"""
+    global _worker_processor
+    if _worker_processor is None:
+        _worker_processor = DocumentProcessor()
+    with collect_stages() as stage_seconds:
+        result = _worker_processor.process_text(ocr_text, filename, file_path, content_type)
+    result['stage_seconds'] = stage_seconds
+    return result
+
+
+def _run_page_batch(extract, file_path: str, page_numbers: List[int], *args) -> Tuple[List[str], Dict[str, float]]:
+    """Extract a batch of pages, with the time spent per stage"""
+    with collect_stages() as stage_seconds:
+        texts = extract(file_path, page_numbers, *args)
+    return texts, stage_seconds
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class ClaimedJob(NamedTuple):
+    """Detached snapshot of a job handed to a worker"""
+    job_id: int
+    document_id: int
+    file_path: str
+    content_type: str
+    filename: str
+
+
+class DocumentJobQueue:
+    """DB-backed queue feeding a process pool of OCR workers"""
+
+    def __init__(
+        self,
+        session_factory=SessionLocal,
+        max_workers: Optional[int] = None,
+        poll_interval: Optional[float] = None,
+        max_attempts: Optional[int] = None,
+        retry_backoff: Optional[float] = None,
+        cache: Optional[ExtractionCache] = None,
+        events: Optional[StatusBroker] = None
+    ):
+        self.session_factory = session_factory
+        self.cache = cache or extraction_cache
+        self.events = events or status_broker
+        self.max_workers = max_workers or settings.ocr_worker_count
+        self.poll_interval = poll_interval or settings.job_poll_interval
+        self.max_attempts = max_attempts or settings.job_max_attempts
+        self.retry_backoff = retry_backoff if retry_backoff is not None else settings.job_retry_backoff
+
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._in_flight: set = set()
+        self._stopping = False
+
+    def enqueue(self, db: Union[Session, AsyncSession], document: Document) -> ProcessingJob:
+        """Add a processing job for a document (caller commits)"""
+        job = ProcessingJob(
+            document_id=document.id,
+            status=JobStatus.QUEUED.value,
+            attempts=0,
+            max_attempts=self.max_attempts,
+            next_run_at=_utcnow()
+        )
+        db.add(job)
+        return job
+
+    def enqueue_statement(self, document_ids: Sequence[int]):
+        """One INSERT of jobs for many documents (caller executes and commits)"""
+        now = _utcnow()
+        return insert(ProcessingJob).values([
+            {
+                'document_id': document_id,
+                'status': JobStatus.QUEUED.value,
+                'attempts': 0,
+                'max_attempts': self.max_attempts,
+                'next_run_at': now
+            }
+            for document_id in document_ids
+        ])
+
+    def notify(self):
+        """Wake the dispatcher so newly committed jobs start immediately"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def claim_due_jobs(self, db: Session, limit: int) -> List[ClaimedJob]:
+        """Mark up to ``limit`` due jobs as running and return their snapshots"""
+        now = _utcnow()
+        candidates = (
+            db.query(ProcessingJob, Document)
+            .join(Document, Document.id == ProcessingJob.document_id)
+            .filter(ProcessingJob.status == JobStatus.QUEUED.value)
+            .filter(ProcessingJob.next_run_at <= now)
+            .order_by(ProcessingJob.next_run_at, ProcessingJob.id)
+            .limit(limit)
+            .all()
+        )
+
+        claimed = []
+        events = []
+        for job, document in candidates:
+            # Conditional update so concurrent dispatchers never claim the same job
+            result = db.execute(
+                update(ProcessingJob)
+                .where(ProcessingJob.id == job.id)
+                .where(ProcessingJob.status == JobStatus.QUEUED.value)
+                .values(
+                    status=JobStatus.RUNNING.value,
+                    attempts=ProcessingJob.attempts + 1,
+                    started_at=now
+                )
+            )
+            if result.rowcount != 1:
+                continue
+
+            document.status = DocumentStatus.PROCESSING.value
+            events.append(status_payload(document))
+            claimed.append(ClaimedJob(
+                job_id=job.id,
+                document_id=document.id,
+                file_path=document.file_path,
+                content_type=document.content_type,
+                filename=document.original_filename
+            ))
+
+        db.commit()
+        for event in events:
+            self.events.publish(event)
+        return claimed
+
+    def record_result(self, db: Session, job_id: int, result: Dict[str, Any]):
+        """Store a worker result, scheduling a retry with backoff on failure"""
+        job = db.query(ProcessingJob).filter(ProcessingJob.id == job_id).first()
+        if not job:
+            return
+        document = (
+            db.query(Document)
+            .options(selectinload(Document.content))
+            .filter(Document.id == job.document_id)
+            .first()
+        )
+        now = _utcnow()
+
+        if result.get('success'):
+            job.status = JobStatus.COMPLETED.value
+            job.finished_at = now
+            job.last_error = None
+            if document:
+                document.status = DocumentStatus.COMPLETED.value
+                document.ocr_text = result['ocr_text']
+                document.document_type = result['document_type']
+                document.classification_confidence = result.get('classification_confidence')
+                document.extracted_data = result['extracted_data']
+                document.processed_at = now
+                if result.get('transactions_path'):
+                    store_transactions(db, document.id, result['transactions_path'])
+                if document.content_hash:
+                    self.cache.store(db, document.content_hash, result)
+        elif job.attempts < job.max_attempts:
+            job.status = JobStatus.QUEUED.value
+            job.last_error = result.get('error')
+            job.next_run_at = now + timedelta(
+                seconds=self.retry_backoff * (2 ** (job.attempts - 1))
+            )
+            if document:
+                document.status = DocumentStatus.PENDING.value
+        else:
+            job.status = JobStatus.FAILED.value
+            job.last_error = result.get('error')
+            job.finished_at = now
+            if document:
+                document.status = DocumentStatus.ERROR.value
+                document.processed_at = now
+
+        event = None
+        if document:
+            # Only completed documents count towards a linked tax return
+            count_document(db, document)
+            event = status_payload(document, error=job.last_error)
+        db.commit()
+        if event:
+            self.events.publish(event)
+
+    def release_job(self, db: Session, job: ClaimedJob):
+        """Return a running job to the queue without counting the attempt"""
+        db.execute(
+            update(ProcessingJob)
+            .where(ProcessingJob.id == job.job_id)
+            .where(ProcessingJob.status == JobStatus.RUNNING.value)
+            .values(
+                status=JobStatus.QUEUED.value,
+                attempts=ProcessingJob.attempts - 1,
+                next_run_at=_utcnow()
+            )
+        )
+        db.execute(
+            update(Document)
+            .where(Document.id == job.document_id)
+            .values(status=DocumentStatus.PENDING.value)
+        )
+        db.commit()
+        document = db.get(Document, job.document_id)
+        if document:
+            self.events.publish(status_payload(document))
+
+    def depth(self) -> Dict[Tuple[str, ...], float]:
+        """Jobs waiting and running, by status, for the queue depth gauge"""
+        waiting = (JobStatus.QUEUED.value, JobStatus.RUNNING.value)
+        with self.session_factory() as db:
+            counts = dict(
+                db.query(ProcessingJob.status, func.count())
+                .filter(ProcessingJob.status.in_(waiting))
+                .group_by(ProcessingJob.status)
+                .all()
+            )
+        return {(status,): counts.get(status, 0) for status in waiting}
+
+    def requeue_interrupted(self, db: Session) -> int:
+        """Return jobs left running by a previous process to the queue"""
+        result = db.execute(
+            update(ProcessingJob)
+            .where(ProcessingJob.status == JobStatus.RUNNING.value)
+            .values(status=JobStatus.QUEUED.value, next_run_at=_utcnow())
+        )
+        db.commit()
+        return result.rowcount
+
+    async def start(self):
+        """Start the worker pool and the dispatcher loop"""
+        if self._dispatcher is not None:
+            return
+
+        def requeue():
+            with self.session_factory() as db:
+                self.requeue_interrupted(db)
+        await asyncio.to_thread(requeue)
+
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        self._executor = self._create_executor()
+        self._dispatcher = asyncio.create_task(self._dispatch_loop())
+
+    async def stop(self):
+        """Stop dispatching and shut the worker pool down"""
+        if self._dispatcher is None:
+            return
+
+        self._stopping = True
+        self._wakeup.set()
+        await self._dispatcher
+        if self._in_flight:
+            await asyncio.gather(*self._in_flight, return_exceptions=True)
+        self._executor.shutdown(wait=True)
+
+        self._dispatcher = None
+        self._executor = None
+        self._wakeup = None
+
+    def _create_executor(self) -> ProcessPoolExecutor:
+        executor = ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker
+        )
+        # Workers otherwise start on demand; start them all now so their engines
+        # are warm before the first upload arrives
+        for _ in range(self.max_workers):
+            executor.submit(_worker_ready)
+        return executor
+
+    def _replace_broken_executor(self, broken: ProcessPoolExecutor):
+        """Swap in a fresh pool once a worker death has broken the current one"""
+        # Every in-flight job sees the same broken pool; only the first replaces it
+        if self._executor is not broken or self._stopping:
+            return
+        logger.warning("OCR worker pool is broken, starting a new one")
+        broken.shutdown(wait=False, cancel_futures=True)
+        self._executor = self._create_executor()
+
+    async def _dispatch_loop(self):
+        while not self._stopping:
+            free_slots = self.max_workers - len(self._in_flight)
+            if free_slots > 0:
+                try:
+                    claimed = await asyncio.to_thread(self._claim, free_slots)
+                except Exception:
+                    logger.exception("Failed to claim processing jobs")
+                    claimed = []
+                for job in claimed:
+                    task = asyncio.create_task(self._execute(job))
+                    self._in_flight.add(task)
+                    task.add_done_callback(self._in_flight.discard)
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def _claim(self, limit: int) -> List[ClaimedJob]:
+        with self.session_factory() as db:
+            return self.claim_due_jobs(db, limit)
+
+    def _release(self, job: ClaimedJob):
+        with self.session_factory() as db:
+            self.release_job(db, job)
+
+    async def _execute(self, job: ClaimedJob):
+        executor = self._executor
+        started = time.perf_counter()
+        try:
+            result = await self._process(executor, job)
+        except BrokenProcessPool:
+            # A dead worker (OOM, Tesseract crash) says nothing about this job
+            self._replace_broken_executor(executor)
+            try:
+                await asyncio.to_thread(self._release, job)
+            except Exception:
+                logger.exception("Failed to requeue job %s; it is requeued on restart", job.job_id)
+            record_job("requeued", time.perf_counter() - started)
+            self.notify()
+            return
+        except Exception as e:
+            result = {'success': False, 'error': f"Worker failed: {str(e)}"}
+
+        await asyncio.to_thread(self._store_result, job, result)
+        record_job(
+            "completed" if result.get('success') else "failed",
+            time.perf_counter() - started,
+            result.get('stage_seconds')
+        )
+        self.notify()
+
+    def _paged_extraction(self, job: ClaimedJob):
+        """(count pages, extract a page batch, extra arguments, minimum pages to split) for multi-page formats"""
+        if job.content_type == "application/pdf":
+            return pdf_page_count, extract_pdf_pages, (settings.ocr_resolution,), settings.pdf_parallel_min_pages
+        if job.content_type in MULTI_PAGE_IMAGE_TYPES:
+            return image_frame_count, extract_image_frames, (), settings.image_parallel_min_frames
+        return None
+
+    async def _process(self, executor: ProcessPoolExecutor, job: ClaimedJob) -> Dict[str, Any]:
+        """Run a job on the pool, spreading large PDFs' pages and scans' frames across all workers"""
+        loop = asyncio.get_running_loop()
+        paged = self._paged_extraction(job)
+        
+        if paged is not None and self.max_workers > 1:
+            count_pages, extract_pages, extra_args, min_pages = paged
+            try:
+                page_count = await loop.run_in_executor(None, count_pages, job.file_path)
+            except Exception:
+                page_count = 0  # Let the whole-document path apply its own fallback
+            
+            if page_count >= min_pages:
+                try:
+                    batches = await asyncio.gather(*(
+                        loop.run_in_executor(
+                            executor, _run_page_batch, extract_pages, job.file_path, pages, *extra_args
+                        )
+                        for pages in pdf_page_batches(page_count, self.max_workers)
+                    ))
+                    ocr_text = join_page_texts([text for texts, _ in batches for text in texts])
+                    result = await loop.run_in_executor(
+                        executor, _run_text_processing, ocr_text, job.filename,
+                        job.file_path, job.content_type
+                    )
+                    for _, stage_seconds in batches:
+                        merge_stages(result.setdefault('stage_seconds', {}), stage_seconds)
+                    return result
+                except BrokenProcessPool:
+                    raise
+                except Exception:
+                    logger.exception("Page-parallel processing failed for job %s; falling back", job.job_id)
+                    page_parallel_fallbacks.inc()
+        
+        return await loop.run_in_executor(
+            executor,
+            _run_processing,
+            job.file_path,
+            job.content_type,
+            job.filename
+        )
+
+    def _store_result(self, job: ClaimedJob, result: Dict[str, Any]):
+        try:
+            with self.session_factory() as db:
+                self.record_result(db, job.job_id, result)
+            return
+        except Exception as e:
+            logger.exception("Failed to store result for job %s", job.job_id)
+            error = f"Failed to store result: {str(e)}"
+        finally:
+            if result.get('transactions_path'):
+                discard_spill(result['transactions_path'])
+
+        # Count it as a failed attempt so the job is retried or marked failed
+        try:
+            with self.session_factory() as db:
+                self.record_result(db, job.job_id, {'success': False, 'error': error})
+        except Exception:
+            logger.exception("Failed to record failure for job %s; it is requeued on restart", job.job_id)
+
+
+job_queue = DocumentJobQueue()
@@ -0,0 +1,300 @@
+"""
+Performance metrics in the Prometheus text exposition format
+
+A small in-process registry rather than a client library: everything worth
+measuring is observed in the API process (OCR workers send their stage
+timings back with each result), so there is no multi-process aggregation
+to do. Observing is a bucket search and a few additions under an
+uncontended lock.
+
+- ``http_request_duration_seconds``: per route template, method and status
+- ``http_request_db_queries``: SQL statements a request executed (zero
+  when ``metrics_count_queries`` is off)
+- ``document_processing_stage_seconds``: per job, time in PDF text
+  extraction, OCR, classification and field extraction
+- ``document_jobs_total`` / ``document_job_duration_seconds``: job outcomes
+- ``document_page_parallel_fallbacks_total``: large documents whose page
+  batches failed and were processed again whole
+- gauges read at scrape time, such as queue depth
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STAGE_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """A monotonically increasing count per label set"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labelvalues: str, amount: float = 1):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def value(self, *labelvalues: str) -> float:
+        with self._lock:
+            return self._values.get(labelvalues, 0)
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            values = list(self._values.items())
+        for labelvalues, value in values:
+            yield f"{self.name}{_labels(self.labelnames, labelvalues)} {_number(value)}"
+
+
+class Gauge:
+    """Values read from a callback when scraped, one per label set"""
+
+    kind = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        read: Optional[Callable[[], Dict[Tuple[str, ...], float]]] = None
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.read = read
+
+    def samples(self) -> Iterator[str]:
+        if self.read is None:
+            return
+        for labelvalues, value in self.read().items():
+            yield f"{self.name}{_labels(self.labelnames, labelvalues)} {_number(value)}"
+
+
+class Histogram:
+    """Observations counted into cumulative buckets per label set"""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: a count per bucket (the last one is +Inf), then the sum
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labelvalues: str):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def count(self, *labelvalues: str) -> int:
+        with self._lock:
+            series = self._series.get(labelvalues)
+            return sum(series[:-1]) if series else 0
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            snapshot = [(labelvalues, list(series)) for labelvalues, series in self._series.items()]
+        for labelvalues, series in snapshot:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                cumulative += count
+                le = f'le="{_number(bound)}"'
+                yield f"{self.name}_bucket{_labels(self.labelnames, labelvalues, le)} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labelnames, labelvalues)} {_number(series[-1])}"
+            yield f"{self.name}_count{_labels(self.labelnames, labelvalues)} {cumulative}"
+
+
+class MetricsRegistry:
+    """The metrics a process exposes, rendered in registration order"""
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+request_duration = registry.register(Histogram(
+    "http_request_duration_seconds", "Time to handle an HTTP request",
+    ("method", "route", "status")
+))
+request_db_queries = registry.register(Histogram(
+    "http_request_db_queries", "SQL statements executed while handling an HTTP request",
+    ("method", "route"), buckets=QUERY_COUNT_BUCKETS
+))
+processing_stage_duration = registry.register(Histogram(
+    "document_processing_stage_seconds", "Time a document processing job spent in each stage",
+    ("stage",), buckets=STAGE_BUCKETS
+))
+job_duration = registry.register(Histogram(
+    "document_job_duration_seconds", "Time from claiming a processing job to storing its result",
+    ("outcome",), buckets=STAGE_BUCKETS
+))
+jobs_total = registry.register(Counter(
+    "document_jobs_total", "Processing jobs finished, by outcome", ("outcome",)
+))
+page_parallel_fallbacks = registry.register(Counter(
+    "document_page_parallel_fallbacks_total",
+    "Jobs whose page-parallel extraction failed and fell back to whole-document processing"
+))
+
+
+# Stage timings of the document being processed in this context, when collected
+_stage_seconds: ContextVar[Optional[Dict[str, float]]] = ContextVar("stage_seconds", default=None)
+
+
+@contextmanager
+def collect_stages() -> Iterator[Dict[str, float]]:
+    """Gather the seconds spent per stage by the code run inside the block"""
+    totals: Dict[str, float] = {}
+    token = _stage_seconds.set(totals)
+    try:
+        yield totals
+    finally:
+        _stage_seconds.reset(token)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Time a processing stage; a no-op unless stages are being collected"""
+    totals = _stage_seconds.get()
+    if totals is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        totals[name] = totals.get(name, 0.0) + time.perf_counter() - started
+
+
+def merge_stages(totals: Dict[str, float], more: Dict[str, float]):
+    for name, seconds in more.items():
+        totals[name] = totals.get(name, 0.0) + seconds
+
+
+def record_job(outcome: str, seconds: float, stage_seconds: Optional[Dict[str, float]] = None):
+    """Record a finished processing job and the time it spent per stage"""
+    jobs_total.inc(outcome)
+    job_duration.observe(seconds, outcome)
+    for name, stage_time in (stage_seconds or {}).items():
+        processing_stage_duration.observe(stage_time, name)
+
+
+# SQL statements executed by the request being handled in this context
+_request_queries: ContextVar[Optional[List[int]]] = ContextVar("request_queries", default=None)
+
+
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    counter = _request_queries.get()
+    if counter is not None:
+        counter[0] += 1
+
+
+def count_queries(engines: Iterable[Engine]):
+    """Count the statements these engines execute towards the current request"""
+    for engine in engines:
+        if not event.contains(engine, "before_cursor_execute", _count_query):
+            event.listen(engine, "before_cursor_execute", _count_query)
+
+
+class MetricsMiddleware:
+    """ASGI middleware timing each request and counting its SQL statements
+
+    Requests are labelled by route template (``/api/documents/{document_id}``),
+    keeping the number of series bounded; anything not served by an API route
+    is labelled ``other``. Event streams are left out of the latency histogram,
+    since their duration is how long the client stayed connected.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = ["500"]
+        streaming = [False]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = str(message["status"])
+                streaming[0] = any(
+                    name == b"content-type" and value.startswith(b"text/event-stream")
+                    for name, value in message.get("headers", ())
+                )
+            await send(message)
+
+        queries = [0]
+        token = _request_queries.set(queries)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            _request_queries.reset(token)
+            route = scope.get("route")
+            route = getattr(route, "path", None) or "other"
+            method = scope["method"]
+            if not streaming[0]:
+                request_duration.observe(elapsed, method, route, status[0])
+            request_db_queries.observe(queries[0], method, route)
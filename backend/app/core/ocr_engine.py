@@ -0,0 +1,244 @@
+"""
+Long-lived Tesseract engines for OCR
+
+pytesseract runs the ``tesseract`` binary once per image: a process spawn,
+a language-data load and two temporary files every time, which is most of
+the OCR latency for a small receipt. When the tesserocr bindings are
+installed, each process instead keeps a small pool of initialised engines
+(TessBaseAPI) for its lifetime:
+
+- warmed up when an OCR worker starts, so the first upload does not pay for
+  loading language data;
+- probed on a known image before reuse after sitting idle, and replaced if
+  the probe fails or an engine raises mid-image;
+- re-initialised after ``ocr_engine_max_jobs`` images, bounding the memory
+  Tesseract's adaptive classifier accumulates.
+
+Without tesserocr, or with ``ocr_persistent_engine`` off, engines fall back
+to running pytesseract per image as before.
+"""
+
+import logging
+import threading
+import time
+from functools import lru_cache, partial
+from typing import Any, Callable, Dict, List
+
+import pytesseract
+from PIL import Image, ImageDraw, ImageFont
+
+from .image_preprocessing import PreprocessOptions
+
+try:
+    import tesserocr
+except ImportError:  # Optional: builds against the system libtesseract
+    tesserocr = None
+
+logger = logging.getLogger(__name__)
+
+# Text of the health-check image; any working engine reads it back
+PROBE_TEXT = "0123456789"
+
+
+@lru_cache(maxsize=1)
+def probe_image() -> Image.Image:
+    image = Image.new("L", (420, 90), 255)
+    ImageDraw.Draw(image).text((20, 20), PROBE_TEXT, font=ImageFont.load_default(size=40), fill=0)
+    return image
+
+
+class SubprocessEngine:
+    """Runs the tesseract binary once per image through pytesseract"""
+
+    persistent = False
+
+    def __init__(self, options: PreprocessOptions):
+        self.options = options
+
+    def recognize(self, image: Image.Image) -> str:
+        return pytesseract.image_to_string(
+            image, lang=self.options.language, config=self.options.tesseract_config
+        )
+
+    def close(self):
+        pass
+
+
+class TesserocrEngine:
+    """An initialised Tesseract API reused across images"""
+
+    persistent = True
+
+    def __init__(self, options: PreprocessOptions):
+        kwargs: Dict[str, Any] = {'lang': options.language, 'psm': options.page_segmentation_mode}
+        if options.tessdata_dir:
+            kwargs['path'] = options.tessdata_dir
+        self._api = tesserocr.PyTessBaseAPI(**kwargs)
+
+    def recognize(self, image: Image.Image) -> str:
+        self._api.SetImage(image)
+        try:
+            return self._api.GetUTF8Text()
+        finally:
+            self._api.Clear()
+
+    def close(self):
+        self._api.End()
+
+
+def create_engine(options: PreprocessOptions):
+    """A persistent engine when tesserocr is available and enabled, else a subprocess one"""
+    from ..config import settings
+    if tesserocr is not None and settings.ocr_persistent_engine:
+        return TesserocrEngine(options)
+    return SubprocessEngine(options)
+
+
+class _PooledEngine:
+    __slots__ = ("engine", "jobs", "last_used")
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.jobs = 0
+        self.last_used = time.monotonic()
+
+
+class OcrEnginePool:
+    """A bounded set of long-lived engines, each used by one caller at a time"""
+
+    def __init__(
+        self,
+        factory: Callable[[], Any],
+        size: int = 1,
+        max_jobs: int = 500,
+        health_check_after: float = 60.0
+    ):
+        self.factory = factory
+        self.size = size
+        self.max_jobs = max_jobs
+        self.health_check_after = health_check_after
+        self.recycled = 0  # Engines re-initialised after max_jobs images
+        self.replaced = 0  # Engines dropped after failing a probe or an image
+        # Most recently used last, so the warmest engines keep getting reused
+        self._idle: List[_PooledEngine] = []
+        self._lock = threading.Lock()
+        self._available = threading.BoundedSemaphore(size)
+
+    def _discard(self, pooled: _PooledEngine):
+        try:
+            pooled.engine.close()
+        except Exception:
+            logger.warning("Failed to close OCR engine", exc_info=True)
+
+    def _healthy(self, pooled: _PooledEngine) -> bool:
+        """Whether the engine reads the probe image back correctly"""
+        if not pooled.engine.persistent:
+            return True  # Nothing is kept between images that could go stale
+        try:
+            text = pooled.engine.recognize(probe_image())
+        except Exception:
+            logger.warning("OCR engine health check raised", exc_info=True)
+            return False
+        return PROBE_TEXT in "".join(text.split())
+
+    def _checkout(self) -> _PooledEngine:
+        self._available.acquire()
+        try:
+            with self._lock:
+                pooled = self._idle.pop() if self._idle else None
+            if pooled is not None and pooled.jobs >= self.max_jobs:
+                self._discard(pooled)
+                self.recycled += 1
+                pooled = None
+            if pooled is not None and time.monotonic() - pooled.last_used >= self.health_check_after:
+                if not self._healthy(pooled):
+                    logger.warning("OCR engine failed its health check, replacing it")
+                    self._discard(pooled)
+                    self.replaced += 1
+                    pooled = None
+            return pooled or _PooledEngine(self.factory())
+        except BaseException:
+            self._available.release()
+            raise
+
+    def _checkin(self, pooled: _PooledEngine):
+        pooled.last_used = time.monotonic()
+        with self._lock:
+            self._idle.append(pooled)
+        self._available.release()
+
+    def recognize(self, image: Image.Image) -> str:
+        pooled = self._checkout()
+        try:
+            text = pooled.engine.recognize(image)
+        except BaseException:
+            # An engine that failed mid-image may be in any state; never reuse it
+            self._discard(pooled)
+            self.replaced += 1
+            self._available.release()
+            raise
+        pooled.jobs += 1
+        self._checkin(pooled)
+        return text
+
+    def warm_up(self) -> Dict[str, Any]:
+        """Start engines up to the pool size, loading language data with a probe read
+
+        Engines that fail the probe are dropped rather than pooled, so a
+        broken install shows up here and in the logs instead of as empty
+        OCR text on the first documents.
+        """
+        engines = []
+        try:
+            for _ in range(self.size):
+                pooled = self._checkout()
+                if pooled.engine.persistent and not self._healthy(pooled):
+                    logger.warning("Newly started OCR engine failed its health check")
+                    self._discard(pooled)
+                    self.replaced += 1
+                    self._available.release()
+                    continue
+                engines.append(pooled)
+        finally:
+            for pooled in engines:
+                self._checkin(pooled)
+        return self.status()
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            idle = list(self._idle)
+        return {
+            'engine': type(idle[-1].engine).__name__ if idle else None,
+            'size': self.size,
+            'idle': len(idle),
+            'jobs': sum(pooled.jobs for pooled in idle),
+            'recycled': self.recycled,
+            'replaced': self.replaced,
+        }
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for pooled in idle:
+            self._discard(pooled)
+
+
+# This process's pools, one per distinct set of OCR options
+_pools: Dict[PreprocessOptions, OcrEnginePool] = {}
+_pools_lock = threading.Lock()
+
+
+def engine_pool(options: PreprocessOptions) -> OcrEnginePool:
+    """The engine pool for a set of OCR options, created on first use"""
+    from ..config import settings
+    with _pools_lock:
+        pool = _pools.get(options)
+        if pool is None:
+            pool = _pools[options] = OcrEnginePool(
+                partial(create_engine, options),
+                size=settings.ocr_engine_pool_size,
+                max_jobs=settings.ocr_engine_max_jobs,
+                health_check_after=settings.ocr_engine_health_check_after
+            )
+        return pool
+
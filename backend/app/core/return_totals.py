@@ -0,0 +1,130 @@
+"""
+Running totals of linked documents' amounts on tax returns
+
+A document linked to a tax return adds its extracted amounts to the return's
+``documented_*`` totals: PAYG summaries their gross payments and tax
+withheld, receipts their total as a work-related deduction. What each
+document added is recorded on it (``return_contribution``), so when it
+completes, is re-processed, unlinked or deleted only the difference is
+applied, as an atomic increment; no event rescans the return's documents.
+
+The tax itself is recalculated only when the calculator's inputs actually
+changed; ``tax_paid`` and ``refund_or_amount_owed`` are settled every time.
+"""
+
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from ..models.models import Document, DocumentStatus, DocumentType, TaxReturn
+from .tax_calculator import TaxCalculator
+
+# Running total on TaxReturn fed by each extracted field, per document type
+CONTRIBUTING_FIELDS: Dict[str, Dict[str, str]] = {
+    DocumentType.PAYG_SUMMARY.value: {
+        'documented_employment_income': 'gross_payments',
+        'documented_tax_withheld': 'tax_withheld',
+    },
+    DocumentType.RECEIPT.value: {
+        'documented_deductions': 'total_amount',
+    },
+}
+
+# Fields TaxCalculator.calculate_total_tax fills in
+CALCULATED_FIELDS = (
+    'total_income', 'total_deductions', 'taxable_income', 'income_tax', 'medicare_levy',
+    'low_income_tax_offset', 'small_business_offset', 'total_tax',
+)
+
+
+def document_contribution(document: Document) -> Dict[str, float]:
+    """Amounts a document adds to its linked return, by running total"""
+    if document.tax_return_id is None or document.status != DocumentStatus.COMPLETED.value:
+        return {}
+    extracted_data = document.extracted_data or {}
+    contribution = {}
+    for total, field in CONTRIBUTING_FIELDS.get(document.document_type, {}).items():
+        value = extracted_data.get(field)
+        if isinstance(value, (int, float)) and value:
+            contribution[total] = round(float(value), 2)
+    return contribution
+
+
+def calculation_inputs(tax_return: TaxReturn) -> Tuple[str, Dict[str, float], Dict[str, float]]:
+    """Tax year, income and deductions TaxCalculator works from: typed-in plus documented amounts"""
+    income_data = {
+        'employment_income':
+            (tax_return.employment_income or 0.0) + (tax_return.documented_employment_income or 0.0),
+        'investment_income': tax_return.investment_income or 0.0,
+        'business_income': tax_return.business_income or 0.0,
+    }
+    deduction_data = {
+        'work_related_expenses':
+            (tax_return.work_related_expenses or 0.0) + (tax_return.documented_deductions or 0.0),
+        'work_from_home_deduction': tax_return.work_from_home_deduction or 0.0,
+    }
+    return tax_return.tax_year, income_data, deduction_data
+
+
+def recalculate(tax_return: TaxReturn):
+    """Recompute the calculated fields from the return's current inputs"""
+    tax_year, income_data, deduction_data = calculation_inputs(tax_return)
+    calculations = TaxCalculator.for_year(tax_year).calculate_total_tax(income_data, deduction_data)
+    for field in CALCULATED_FIELDS:
+        setattr(tax_return, field, calculations[field])
+    settle(tax_return)
+
+
+def settle(tax_return: TaxReturn):
+    """Tax paid through withholding, and the refund (positive) or amount owed (negative)"""
+    tax_return.tax_paid = round(tax_return.documented_tax_withheld or 0.0, 2)
+    tax_return.refund_or_amount_owed = round(tax_return.tax_paid - (tax_return.total_tax or 0.0), 2)
+
+
+def _shift_totals(db: Session, tax_return_id: int, delta: Dict[str, float]):
+    """Apply a change in running totals atomically, then recalculate the return"""
+    columns = TaxReturn.__mapper__.columns
+    db.execute(
+        update(TaxReturn)
+        .where(TaxReturn.id == tax_return_id)
+        .values({columns[total]: columns[total] + amount for total, amount in delta.items()})
+    )
+    # Re-read the totals just written, including any concurrent updates before ours
+    tax_return = db.get(TaxReturn, tax_return_id, populate_existing=True)
+    if tax_return is not None:
+        recalculate(tax_return)
+
+
+def count_document(db: Session, document: Document) -> bool:
+    """Bring the document's linked return in line with its current extraction
+
+    Call after the document's status, extracted data or link change; the
+    caller commits. Returns whether the return's totals changed.
+    """
+    previous = document.return_contribution or {}
+    current = document_contribution(document)
+    delta = {
+        total: round(current.get(total, 0.0) - previous.get(total, 0.0), 2)
+        for total in previous.keys() | current.keys()
+    }
+    delta = {total: amount for total, amount in delta.items() if amount}
+    document.return_contribution = current or None
+    if not delta or document.tax_return_id is None:
+        return False
+    _shift_totals(db, document.tax_return_id, delta)
+    return True
+
+
+def link_document(db: Session, document: Document, tax_return_id: Optional[int]) -> bool:
+    """Count a document in another return, or in none with None; the caller commits"""
+    changed = False
+    if document.tax_return_id != tax_return_id and document.return_contribution:
+        # Take its amounts out of the return they are counted in first
+        _shift_totals(db, document.tax_return_id, {
+            total: -amount for total, amount in document.return_contribution.items()
+        })
+        document.return_contribution = None
+        changed = True
+    document.tax_return_id = tax_return_id
+    return count_document(db, document) or changed
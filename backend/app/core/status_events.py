@@ -0,0 +1,168 @@
+"""
+In-process fan-out of document status changes to streaming clients
+
+The job queue publishes an event whenever a document changes state (queued,
+processing, retrying, completed with its extraction, failed) and every
+subscription following that document, or all documents, receives it. The
+event is serialised once per change however many clients follow it.
+
+Subscriptions are cheap enough to hold thousands of idle ones per process:
+no task, queue or timer of their own until a client is actually waiting.
+Each buffers at most ``status_stream_max_pending`` undelivered events, and
+since an event carries a document's whole status only the latest one per
+document is kept. A client that falls further behind than that (only
+possible when following every document) has its buffer dropped and is told
+it lagged, so it re-reads the document list instead of holding the process's
+memory hostage.
+
+Events reach subscribers on the event loop they subscribed from, so
+publishing is safe from any thread.
+"""
+
+import asyncio
+import itertools
+import json
+import threading
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Set
+
+from ..config import settings
+from ..models.models import Document, DocumentStatus
+
+# Statuses a document does not leave on its own
+FINAL_STATUSES = frozenset({DocumentStatus.COMPLETED.value, DocumentStatus.ERROR.value})
+
+
+class StatusEvent(NamedTuple):
+    id: int  # Increases with every event this process publishes
+    document_id: int
+    status: str
+    data: str  # JSON payload, shared by every subscriber
+
+
+def status_payload(document: Document, error: Optional[str] = None) -> Dict[str, Any]:
+    """What a client is told about a document's new state"""
+    processed_at: Optional[datetime] = document.processed_at
+    payload = {
+        'document_id': document.id,
+        'status': document.status,
+        'document_type': document.document_type,
+        'classification_confidence': document.classification_confidence,
+        'processed_at': processed_at.isoformat() if processed_at else None,
+    }
+    if document.status == DocumentStatus.COMPLETED.value:
+        payload['extracted_data'] = document.extracted_data
+    if error:
+        payload['error'] = error
+    return payload
+
+
+class Subscription:
+    """One client's view of the status stream: undelivered events, latest per document"""
+
+    __slots__ = ("document_ids", "max_pending", "lagged", "dropped", "_loop", "_pending", "_ready")
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, document_ids: Optional[Set[int]], max_pending: int):
+        self.document_ids = document_ids  # None follows every document
+        self.max_pending = max_pending
+        self.lagged = False  # Events were dropped since the client last heard
+        self.dropped = 0
+        self._loop = loop
+        self._pending: Dict[int, StatusEvent] = {}
+        self._ready = asyncio.Event()
+
+    def _offer(self, event: StatusEvent):
+        # Re-inserting moves the document to the back, so dicts stay in event order
+        self._pending.pop(event.document_id, None)
+        self._pending[event.document_id] = event
+        if len(self._pending) > self.max_pending:
+            self.dropped += len(self._pending)
+            self._pending.clear()
+            self.lagged = True
+        self._ready.set()
+
+    async def next_events(self, timeout: float) -> List[StatusEvent]:
+        """Events received since the last call, waiting up to ``timeout`` seconds for one"""
+        if not self._pending and not self.lagged:
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        self._ready.clear()
+        events = list(self._pending.values())
+        self._pending.clear()
+        return events
+
+
+class StatusBroker:
+    """Routes published status events to the subscriptions following each document"""
+
+    def __init__(self, max_pending: Optional[int] = None):
+        self.max_pending = max_pending or settings.status_stream_max_pending
+        self.published = 0
+        self._ids = itertools.count(1)
+        self._all: Set[Subscription] = set()
+        self._by_document: Dict[int, Set[Subscription]] = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, document_ids: Optional[Iterable[int]] = None) -> Subscription:
+        """Follow some documents, or all of them; call from the event loop that will read it"""
+        followed = set(document_ids) if document_ids is not None else None
+        # A client following specific documents can always hold one event for each
+        max_pending = max(self.max_pending, len(followed)) if followed is not None else self.max_pending
+        subscription = Subscription(asyncio.get_running_loop(), followed, max_pending)
+        with self._lock:
+            if followed is None:
+                self._all.add(subscription)
+            else:
+                for document_id in followed:
+                    self._by_document.setdefault(document_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            if subscription.document_ids is None:
+                self._all.discard(subscription)
+                return
+            for document_id in subscription.document_ids:
+                followers = self._by_document.get(document_id)
+                if followers is not None:
+                    followers.discard(subscription)
+                    if not followers:
+                        del self._by_document[document_id]
+
+    def publish(self, payload: Dict[str, Any]):
+        """Send a document's new status to everyone following it"""
+        document_id = payload['document_id']
+        with self._lock:
+            subscribers = [*self._all, *self._by_document.get(document_id, ())]
+            if not subscribers:
+                return
+            event = StatusEvent(next(self._ids), document_id, payload['status'], json.dumps(payload))
+            self.published += 1
+
+        try:
+            current_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            current_loop = None
+        for subscription in subscribers:
+            if subscription._loop is current_loop:
+                subscription._offer(event)
+            else:
+                try:
+                    subscription._loop.call_soon_threadsafe(subscription._offer, event)
+                except RuntimeError:
+                    pass  # Its loop has closed; the subscription is going away with it
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'subscribers': len(self._all) + len({
+                    subscription for followers in self._by_document.values() for subscription in followers
+                }),
+                'followed_documents': len(self._by_document),
+                'published': self.published,
+            }
+
+
+status_broker = StatusBroker()
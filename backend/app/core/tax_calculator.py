@@ -1,116 +1,222 @@
 """
-Australian Tax Calculator for 2024-25 Financial Year
-Implements current ATO tax rates, brackets, and offsets
+Australian Tax Calculator, 2024-25 Financial Year by default
+Implements ATO tax rates, brackets, and offsets from the tax year rule sets
+
+With ``tax_exact_cents`` on (the default) amounts are taken to whole cents on
+the way in and everything is worked out in integers: each of income tax,
+Medicare levy and the offsets is rounded to the cent once, half a cent up,
+and totals are exact sums of those. The ``*_cents`` methods take and return
+cents directly; the float-dollar methods convert at the edges.
 """
 
-from typing import Dict, Tuple
+from typing import Dict, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from ..config import settings
+from .tax_rules import TaxRuleSet, round_scaled, round_scaled_array, tax_rules, to_cents, to_cents_array
+
+ArrayLike = Union[Sequence[float], np.ndarray]
+
+
+def _round_cents(values: np.ndarray) -> np.ndarray:
+    """Round to cents exactly as the builtin round(x, 2) would"""
+    rounded = np.round(values, 2)
+    # np.round scales by 100 first, which can tip values sitting on a half cent
+    scaled = values * 100
+    ambiguous = np.flatnonzero(np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6)
+    for index in ambiguous:
+        rounded[index] = round(float(values[index]), 2)
+    return rounded
+
+
+def _cents_columns(data: Dict[str, ArrayLike]) -> Dict[str, np.ndarray]:
+    return {key: to_cents_array(values) for key, values in data.items()}
 
 
 class TaxCalculator:
-    """Australian Tax Calculator for 2024-25"""
+    """Australian Tax Calculator for 2024-25 (see for_year for other years)"""
+    
+    # Rates for the default tax year; for_year() binds another year's
+    RULES: TaxRuleSet = tax_rules.default
     
-    # 2024-25 Tax brackets (includes Stage 3 cuts)
-    TAX_BRACKETS = [
-        (18200, 0.0),      # Tax-free threshold
-        (45000, 0.19),     # 19% tax rate
-        (120000, 0.325),   # 32.5% tax rate  
-        (180000, 0.37),    # 37% tax rate
-        (float('inf'), 0.45)  # 45% tax rate
-    ]
+    # Tax brackets as (upper threshold, marginal rate)
+    TAX_BRACKETS = list(RULES.brackets)
     
     # Medicare Levy
-    MEDICARE_LEVY_RATE = 0.02  # 2%
-    MEDICARE_LEVY_THRESHOLD = 24276  # 2024-25 threshold
+    MEDICARE_LEVY_RATE = RULES.medicare_levy_rate
+    MEDICARE_LEVY_THRESHOLD = RULES.medicare_levy_threshold
     
-    # Low Income Tax Offset (LITO) 2024-25
-    LITO_MAX_OFFSET = 700
-    LITO_THRESHOLD_1 = 37500
-    LITO_THRESHOLD_2 = 45000
-    LITO_RATE_1 = 0.05
-    LITO_RATE_2 = 0.015
+    # Low Income Tax Offset (LITO)
+    LITO_MAX_OFFSET = RULES.lito_max_offset
+    LITO_THRESHOLD_1 = RULES.lito_threshold_1
+    LITO_THRESHOLD_2 = RULES.lito_threshold_2
+    LITO_RATE_1 = RULES.lito_rate_1
+    LITO_RATE_2 = RULES.lito_rate_2
     
     # Small Business Income Tax Offset
-    SMALL_BUSINESS_OFFSET_MAX = 1000
-    SMALL_BUSINESS_THRESHOLD = 5000
-    SMALL_BUSINESS_CUTOFF = 25000
+    SMALL_BUSINESS_OFFSET_MAX = RULES.small_business_offset_max
+    SMALL_BUSINESS_THRESHOLD = RULES.small_business_threshold
+    SMALL_BUSINESS_CUTOFF = RULES.small_business_cutoff
+    SMALL_BUSINESS_RATE = RULES.small_business_rate
     
     # Superannuation Guarantee
-    SUPER_GUARANTEE_RATE = 0.115  # 11.5% for 2024-25
+    SUPER_GUARANTEE_RATE = RULES.super_guarantee_rate
     
-    # Work from Home deduction
-    WORK_FROM_HOME_RATE = 0.70  # 70 cents per hour
+    # Work from Home deduction (rate per hour)
+    WORK_FROM_HOME_RATE = RULES.work_from_home_rate
     
     # Instant Asset Write-off threshold
-    INSTANT_ASSET_WRITEOFF_THRESHOLD = 20000
+    INSTANT_ASSET_WRITEOFF_THRESHOLD = RULES.instant_asset_writeoff_threshold
+    
+    # Compiled with the rule set; every calculation is a lookup plus one multiply
+    _INCOME_TAX = RULES.income_tax
+    _MEDICARE_LEVY = RULES.medicare_levy
+    _LITO = RULES.low_income_tax_offset
+    _CENTS = RULES.cents
+    
+    # Integer-cent arithmetic rather than float dollars
+    EXACT_CENTS: bool = settings.tax_exact_cents
+    
+    # Calculator subclasses bound to other tax years or modes, built on first use
+    _BY_YEAR: Dict[Tuple[str, bool], type] = {}
+    
+    @classmethod
+    def for_year(cls, tax_year: Optional[str] = None, exact_cents: Optional[bool] = None) -> type:
+        """TaxCalculator using the rules for ``tax_year`` (the default year when None)
+        
+        ``exact_cents`` picks integer-cent or float arithmetic; None keeps the
+        configured mode. Raises UnknownTaxYearError for years without a rule set.
+        """
+        rules = tax_rules.get(tax_year)
+        if exact_cents is None:
+            exact_cents = TaxCalculator.EXACT_CENTS
+        if rules is TaxCalculator.RULES and exact_cents == TaxCalculator.EXACT_CENTS:
+            return TaxCalculator
+        calculator = TaxCalculator._BY_YEAR.get((rules.tax_year, exact_cents))
+        if calculator is None:
+            name = f"TaxCalculator{rules.tax_year.replace('-', '_')}{'' if exact_cents else 'Float'}"
+            calculator = type(name, (TaxCalculator,), {
+                'RULES': rules,
+                'TAX_BRACKETS': list(rules.brackets),
+                'MEDICARE_LEVY_RATE': rules.medicare_levy_rate,
+                'MEDICARE_LEVY_THRESHOLD': rules.medicare_levy_threshold,
+                'LITO_MAX_OFFSET': rules.lito_max_offset,
+                'LITO_THRESHOLD_1': rules.lito_threshold_1,
+                'LITO_THRESHOLD_2': rules.lito_threshold_2,
+                'LITO_RATE_1': rules.lito_rate_1,
+                'LITO_RATE_2': rules.lito_rate_2,
+                'SMALL_BUSINESS_OFFSET_MAX': rules.small_business_offset_max,
+                'SMALL_BUSINESS_THRESHOLD': rules.small_business_threshold,
+                'SMALL_BUSINESS_CUTOFF': rules.small_business_cutoff,
+                'SMALL_BUSINESS_RATE': rules.small_business_rate,
+                'SUPER_GUARANTEE_RATE': rules.super_guarantee_rate,
+                'WORK_FROM_HOME_RATE': rules.work_from_home_rate,
+                'INSTANT_ASSET_WRITEOFF_THRESHOLD': rules.instant_asset_writeoff_threshold,
+                '_INCOME_TAX': rules.income_tax,
+                '_MEDICARE_LEVY': rules.medicare_levy,
+                '_LITO': rules.low_income_tax_offset,
+                '_CENTS': rules.cents,
+                'EXACT_CENTS': exact_cents
+            })
+            TaxCalculator._BY_YEAR[(rules.tax_year, exact_cents)] = calculator
+        return calculator
     
     @classmethod
     def calculate_income_tax(cls, taxable_income: float) -> float:
-        """Calculate income tax based on 2024-25 tax brackets"""
-        if taxable_income <= 0:
-            return 0.0
-            
-        total_tax = 0.0
-        remaining_income = taxable_income
-        previous_threshold = 0
-        
-        for threshold, rate in cls.TAX_BRACKETS:
-            if remaining_income <= 0:
-                break
-                
-            taxable_amount = min(remaining_income, threshold - previous_threshold)
-            total_tax += taxable_amount * rate
-            remaining_income -= taxable_amount
-            previous_threshold = threshold
-            
-        return round(total_tax, 2)
+        """Calculate income tax based on the tax year's brackets"""
+        if cls.EXACT_CENTS:
+            return cls._INCOME_TAX.cents(to_cents(taxable_income)) / 100
+        return round(cls._INCOME_TAX(taxable_income), 2)
     
     @classmethod
     def calculate_medicare_levy(cls, taxable_income: float) -> float:
-        """Calculate Medicare Levy (2% for 2024-25)"""
-        if taxable_income <= cls.MEDICARE_LEVY_THRESHOLD:
-            return 0.0
-        return round(taxable_income * cls.MEDICARE_LEVY_RATE, 2)
+        """Calculate Medicare Levy (2% above the low-income threshold)"""
+        if cls.EXACT_CENTS:
+            return cls._MEDICARE_LEVY.cents(to_cents(taxable_income)) / 100
+        return round(cls._MEDICARE_LEVY(taxable_income), 2)
     
     @classmethod
     def calculate_low_income_tax_offset(cls, taxable_income: float) -> float:
-        """Calculate Low Income Tax Offset (LITO) for 2024-25"""
-        if taxable_income <= cls.LITO_THRESHOLD_1:
-            return cls.LITO_MAX_OFFSET
-        elif taxable_income <= cls.LITO_THRESHOLD_2:
-            # Reduce offset by 5 cents for every dollar over $37,500
-            reduction = (taxable_income - cls.LITO_THRESHOLD_1) * cls.LITO_RATE_1
-            return max(0, cls.LITO_MAX_OFFSET - reduction)
-        else:
-            # Further reduction by 1.5 cents for every dollar over $45,000
-            reduction_1 = (cls.LITO_THRESHOLD_2 - cls.LITO_THRESHOLD_1) * cls.LITO_RATE_1
-            reduction_2 = (taxable_income - cls.LITO_THRESHOLD_2) * cls.LITO_RATE_2
-            total_reduction = reduction_1 + reduction_2
-            return max(0, cls.LITO_MAX_OFFSET - total_reduction)
+        """Calculate Low Income Tax Offset (LITO) for 2024-25
+        
+        $700 up to $37,500, reduced by 5 cents per dollar to $45,000 and by
+        1.5 cents per dollar above that.
+        """
+        if cls.EXACT_CENTS:
+            return cls._LITO.cents(to_cents(taxable_income)) / 100
+        return cls._LITO(taxable_income)
+    
+    @classmethod
+    def calculate_estimate(cls, taxable_income: float) -> Dict[str, float]:
+        """Quick estimate of tax and take-home pay for a taxable income"""
+        if cls.EXACT_CENTS:
+            income = to_cents(taxable_income)
+            income_tax = cls._INCOME_TAX.cents(income)
+            medicare_levy = cls._MEDICARE_LEVY.cents(income)
+            lito = cls._LITO.cents(income)
+            total_tax = max(0, income_tax + medicare_levy - lito)
+            return {
+                "taxable_income": taxable_income,
+                "income_tax": income_tax / 100,
+                "medicare_levy": medicare_levy / 100,
+                "low_income_tax_offset": lito / 100,
+                "estimated_total_tax": total_tax / 100,
+                "take_home_income": (income - total_tax) / 100
+            }
+        
+        income_tax = cls.calculate_income_tax(taxable_income)
+        medicare_levy = cls.calculate_medicare_levy(taxable_income)
+        lito = cls.calculate_low_income_tax_offset(taxable_income)
+        
+        total_tax = max(0, income_tax + medicare_levy - lito)
+        
+        return {
+            "taxable_income": taxable_income,
+            "income_tax": income_tax,
+            "medicare_levy": medicare_levy,
+            "low_income_tax_offset": lito,
+            "estimated_total_tax": total_tax,
+            "take_home_income": taxable_income - total_tax
+        }
     
     @classmethod
     def calculate_small_business_offset(cls, business_income: float) -> float:
         """Calculate Small Business Income Tax Offset"""
+        if cls.EXACT_CENTS:
+            return cls.calculate_small_business_offset_cents(to_cents(business_income)) / 100
         if business_income < cls.SMALL_BUSINESS_THRESHOLD:
             return 0.0
         elif business_income <= cls.SMALL_BUSINESS_CUTOFF:
             # 8% of business income up to $1,000 maximum
-            return min(business_income * 0.08, cls.SMALL_BUSINESS_OFFSET_MAX)
+            return min(business_income * cls.SMALL_BUSINESS_RATE, cls.SMALL_BUSINESS_OFFSET_MAX)
         else:
             return cls.SMALL_BUSINESS_OFFSET_MAX
     
     @classmethod
     def calculate_work_from_home_deduction(cls, hours_worked: float) -> float:
         """Calculate work from home deduction (70 cents per hour method)"""
+        if cls.EXACT_CENTS:
+            # Hours to the hundredth, times the rate in RATE_SCALE parts of a dollar, is 1/RATE_SCALE cents
+            return round_scaled(round(hours_worked * 100) * cls._CENTS.work_from_home_rate) / 100
         return round(hours_worked * cls.WORK_FROM_HOME_RATE, 2)
     
     @classmethod
     def calculate_superannuation_guarantee(cls, ordinary_earnings: float) -> float:
         """Calculate Superannuation Guarantee (11.5% for 2024-25)"""
+        if cls.EXACT_CENTS:
+            return round_scaled(to_cents(ordinary_earnings) * cls._CENTS.super_guarantee_rate) / 100
         return round(ordinary_earnings * cls.SUPER_GUARANTEE_RATE, 2)
     
     @classmethod
     def calculate_total_tax(cls, income_data: Dict[str, float], deduction_data: Dict[str, float]) -> Dict[str, float]:
         """Calculate complete tax return summary"""
+        if cls.EXACT_CENTS:
+            result = cls.calculate_total_tax_cents(
+                {key: to_cents(value) for key, value in income_data.items()},
+                {key: to_cents(value) for key, value in deduction_data.items()}
+            )
+            return {field: cents / 100 for field, cents in result.items()}
         
         # Extract income components
         employment_income = income_data.get('employment_income', 0.0)
@@ -153,4 +259,233 @@ class TaxCalculator:
             'total_tax': round(total_tax, 2),
             'total_tax_before_offsets': round(total_tax_before_offsets, 2),
             'total_offsets': round(total_offsets, 2)
+        }
+    
+    @classmethod
+    def calculate_income_tax_batch(cls, taxable_incomes: ArrayLike) -> np.ndarray:
+        """Vectorized income tax for an array of taxable incomes"""
+        if cls.EXACT_CENTS:
+            return cls._INCOME_TAX.evaluate_cents(to_cents_array(taxable_incomes)) / 100
+        return _round_cents(cls._INCOME_TAX.evaluate(np.asarray(taxable_incomes, dtype=float)))
+    
+    @classmethod
+    def calculate_medicare_levy_batch(cls, taxable_incomes: ArrayLike) -> np.ndarray:
+        """Vectorized Medicare Levy for an array of taxable incomes"""
+        if cls.EXACT_CENTS:
+            return cls._MEDICARE_LEVY.evaluate_cents(to_cents_array(taxable_incomes)) / 100
+        return _round_cents(cls._MEDICARE_LEVY.evaluate(np.asarray(taxable_incomes, dtype=float)))
+    
+    @classmethod
+    def calculate_low_income_tax_offset_batch(cls, taxable_incomes: ArrayLike) -> np.ndarray:
+        """Vectorized Low Income Tax Offset for an array of taxable incomes"""
+        if cls.EXACT_CENTS:
+            return cls._LITO.evaluate_cents(to_cents_array(taxable_incomes)) / 100
+        return cls._LITO.evaluate(np.asarray(taxable_incomes, dtype=float))
+    
+    @classmethod
+    def calculate_small_business_offset_batch(cls, business_incomes: ArrayLike) -> np.ndarray:
+        """Vectorized Small Business Income Tax Offset"""
+        if cls.EXACT_CENTS:
+            return cls.calculate_small_business_offset_cents_batch(to_cents_array(business_incomes)) / 100
+        incomes = np.asarray(business_incomes, dtype=float)
+        offset = np.where(
+            incomes <= cls.SMALL_BUSINESS_CUTOFF,
+            np.minimum(incomes * cls.SMALL_BUSINESS_RATE, cls.SMALL_BUSINESS_OFFSET_MAX),
+            float(cls.SMALL_BUSINESS_OFFSET_MAX)
+        )
+        return np.where(incomes < cls.SMALL_BUSINESS_THRESHOLD, 0.0, offset)
+    
+    @classmethod
+    def calculate_total_tax_batch(
+        cls,
+        income_data: Dict[str, ArrayLike],
+        deduction_data: Dict[str, ArrayLike]
+    ) -> Dict[str, np.ndarray]:
+        """Vectorized calculate_total_tax over column arrays of returns
+        
+        Each key holds one value per return; missing components are treated
+        as zero. Results match the scalar path to the cent.
+        """
+        if cls.EXACT_CENTS:
+            result = cls.calculate_total_tax_cents_batch(_cents_columns(income_data), _cents_columns(deduction_data))
+            return {field: cents / 100 for field, cents in result.items()}
+        
+        columns = [np.asarray(values, dtype=float) for values in (*income_data.values(), *deduction_data.values())]
+        size = np.broadcast_shapes(*(column.shape for column in columns)) if columns else (0,)
+        
+        def column(data: Dict[str, ArrayLike], key: str) -> np.ndarray:
+            if key not in data:
+                return np.zeros(size)
+            return np.broadcast_to(np.asarray(data[key], dtype=float), size)
+        
+        # Extract income components
+        employment_income = column(income_data, 'employment_income')
+        investment_income = column(income_data, 'investment_income')
+        business_income = column(income_data, 'business_income')
+        
+        total_income = employment_income + investment_income + business_income
+        
+        # Extract deduction components
+        work_related_expenses = column(deduction_data, 'work_related_expenses')
+        work_from_home_deduction = column(deduction_data, 'work_from_home_deduction')
+        other_deductions = column(deduction_data, 'other_deductions')
+        
+        total_deductions = work_related_expenses + work_from_home_deduction + other_deductions
+        
+        # Calculate taxable income
+        taxable_income = np.maximum(0, total_income - total_deductions)
+        
+        # Calculate tax components
+        income_tax = cls.calculate_income_tax_batch(taxable_income)
+        medicare_levy = cls.calculate_medicare_levy_batch(taxable_income)
+        
+        # Calculate offsets
+        lito = cls.calculate_low_income_tax_offset_batch(taxable_income)
+        small_business_offset = cls.calculate_small_business_offset_batch(business_income)
+        
+        # Calculate total tax after offsets
+        total_tax_before_offsets = income_tax + medicare_levy
+        total_offsets = lito + small_business_offset
+        total_tax = np.maximum(0, total_tax_before_offsets - total_offsets)
+        
+        return {
+            'total_income': _round_cents(total_income),
+            'total_deductions': _round_cents(total_deductions),
+            'taxable_income': _round_cents(taxable_income),
+            'income_tax': _round_cents(income_tax),
+            'medicare_levy': _round_cents(medicare_levy),
+            'low_income_tax_offset': _round_cents(lito),
+            'small_business_offset': _round_cents(small_business_offset),
+            'total_tax': _round_cents(total_tax),
+            'total_tax_before_offsets': _round_cents(total_tax_before_offsets),
+            'total_offsets': _round_cents(total_offsets)
+        }
+    
+    @classmethod
+    def calculate_small_business_offset_cents(cls, business_income: int) -> int:
+        """Small Business Income Tax Offset in cents on business income in cents"""
+        amounts = cls._CENTS
+        if business_income < amounts.small_business_threshold:
+            return 0
+        if business_income > amounts.small_business_cutoff:
+            return amounts.small_business_offset_max
+        return min(round_scaled(business_income * amounts.small_business_rate), amounts.small_business_offset_max)
+    
+    @classmethod
+    def calculate_small_business_offset_cents_batch(cls, business_incomes: np.ndarray) -> np.ndarray:
+        """Vectorized calculate_small_business_offset_cents"""
+        amounts = cls._CENTS
+        offset = np.where(
+            business_incomes <= amounts.small_business_cutoff,
+            np.minimum(
+                round_scaled_array(business_incomes * amounts.small_business_rate),
+                amounts.small_business_offset_max
+            ),
+            amounts.small_business_offset_max
+        )
+        return np.where(business_incomes < amounts.small_business_threshold, 0, offset)
+    
+    @classmethod
+    def calculate_total_tax_cents(cls, income_data: Dict[str, int], deduction_data: Dict[str, int]) -> Dict[str, int]:
+        """calculate_total_tax in integer cents, exactly"""
+        
+        # Extract income components
+        employment_income = income_data.get('employment_income', 0)
+        investment_income = income_data.get('investment_income', 0)
+        business_income = income_data.get('business_income', 0)
+        
+        total_income = employment_income + investment_income + business_income
+        
+        # Extract deduction components
+        work_related_expenses = deduction_data.get('work_related_expenses', 0)
+        work_from_home_deduction = deduction_data.get('work_from_home_deduction', 0)
+        other_deductions = deduction_data.get('other_deductions', 0)
+        
+        total_deductions = work_related_expenses + work_from_home_deduction + other_deductions
+        
+        # Calculate taxable income
+        taxable_income = max(0, total_income - total_deductions)
+        
+        # Calculate tax components, each rounded to the cent once
+        income_tax = cls._INCOME_TAX.cents(taxable_income)
+        medicare_levy = cls._MEDICARE_LEVY.cents(taxable_income)
+        
+        # Calculate offsets
+        lito = cls._LITO.cents(taxable_income)
+        small_business_offset = cls.calculate_small_business_offset_cents(business_income)
+        
+        # Calculate total tax after offsets
+        total_tax_before_offsets = income_tax + medicare_levy
+        total_offsets = lito + small_business_offset
+        total_tax = max(0, total_tax_before_offsets - total_offsets)
+        
+        return {
+            'total_income': total_income,
+            'total_deductions': total_deductions,
+            'taxable_income': taxable_income,
+            'income_tax': income_tax,
+            'medicare_levy': medicare_levy,
+            'low_income_tax_offset': lito,
+            'small_business_offset': small_business_offset,
+            'total_tax': total_tax,
+            'total_tax_before_offsets': total_tax_before_offsets,
+            'total_offsets': total_offsets
+        }
+    
+    @classmethod
+    def calculate_total_tax_cents_batch(
+        cls,
+        income_data: Dict[str, ArrayLike],
+        deduction_data: Dict[str, ArrayLike]
+    ) -> Dict[str, np.ndarray]:
+        """Vectorized calculate_total_tax_cents over int64 column arrays of cents"""
+        columns = [np.asarray(values, dtype=np.int64) for values in (*income_data.values(), *deduction_data.values())]
+        size = np.broadcast_shapes(*(column.shape for column in columns)) if columns else (0,)
+        
+        def column(data: Dict[str, ArrayLike], key: str) -> np.ndarray:
+            if key not in data:
+                return np.zeros(size, dtype=np.int64)
+            return np.broadcast_to(np.asarray(data[key], dtype=np.int64), size)
+        
+        # Extract income components
+        employment_income = column(income_data, 'employment_income')
+        investment_income = column(income_data, 'investment_income')
+        business_income = column(income_data, 'business_income')
+        
+        total_income = employment_income + investment_income + business_income
+        
+        # Extract deduction components
+        work_related_expenses = column(deduction_data, 'work_related_expenses')
+        work_from_home_deduction = column(deduction_data, 'work_from_home_deduction')
+        other_deductions = column(deduction_data, 'other_deductions')
+        
+        total_deductions = work_related_expenses + work_from_home_deduction + other_deductions
+        
+        # Calculate taxable income
+        taxable_income = np.maximum(0, total_income - total_deductions)
+        
+        # Calculate tax components, each rounded to the cent once
+        income_tax = cls._INCOME_TAX.evaluate_cents(taxable_income)
+        medicare_levy = cls._MEDICARE_LEVY.evaluate_cents(taxable_income)
+        
+        # Calculate offsets
+        lito = cls._LITO.evaluate_cents(taxable_income)
+        small_business_offset = cls.calculate_small_business_offset_cents_batch(business_income)
+        
+        # Calculate total tax after offsets
+        total_tax_before_offsets = income_tax + medicare_levy
+        total_offsets = lito + small_business_offset
+        total_tax = np.maximum(0, total_tax_before_offsets - total_offsets)
+        
+        return {
+            'total_income': total_income,
+            'total_deductions': total_deductions,
+            'taxable_income': taxable_income,
+            'income_tax': income_tax,
+            'medicare_levy': medicare_levy,
+            'low_income_tax_offset': lito,
+            'small_business_offset': small_business_offset,
+            'total_tax': total_tax,
+            'total_tax_before_offsets': total_tax_before_offsets,
+            'total_offsets': total_offsets
         }
\ No newline at end of file
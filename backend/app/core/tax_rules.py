@@ -0,0 +1,427 @@
+"""
+Tax rule sets by financial year
+
+Each year's rates live in a JSON file under ``tax_years/``. The files are
+parsed once at import into immutable rule sets whose brackets and offsets are
+precompiled, so calculations for any supported year are pure lookups and
+nothing is parsed per request.
+
+Every table is compiled twice: over float dollars, and over whole cents with
+rates as integer parts per ``RATE_SCALE``. The integer tables are exact: tax
+is worked out in 1/RATE_SCALE cents and each amount is rounded to the cent
+once, half a cent up, the way the ATO rounds.
+"""
+
+import hashlib
+import json
+import os
+from bisect import bisect_left
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from ..config import settings
+
+DEFAULT_RULES_DIRECTORY = os.path.join(os.path.dirname(__file__), "tax_years")
+
+# Rates in the integer tables are whole parts per RATE_SCALE (32.5% is 32500)
+RATE_SCALE = 100_000
+# Largest amount in cents ($100bn); three of them summed, times a rate, stay within int64
+MAX_CENTS = 10 ** 13
+
+
+def _scaled(value: float, scale: int) -> int:
+    units = round(value * scale)
+    if abs(units - value * scale) > 1e-6:
+        raise ValueError(f"{value} is not a whole number of 1/{scale} parts")
+    return units
+
+
+def rate_units(rate: float) -> int:
+    """A rate as a whole number of parts per RATE_SCALE; finer rates are rejected"""
+    return _scaled(rate, RATE_SCALE)
+
+
+def to_cents(amount: float) -> int:
+    """Dollars to whole cents, to the nearest cent"""
+    if not abs(amount) <= MAX_CENTS / 100:
+        raise ValueError(f"Amounts must be numbers of at most {MAX_CENTS // 100:,} dollars")
+    return round(amount * 100)
+
+
+def to_cents_array(amounts: Any) -> np.ndarray:
+    """Dollars to whole cents as int64, to the nearest cent"""
+    amounts = np.asarray(amounts, dtype=float)
+    if amounts.size and not np.all(np.abs(amounts) <= MAX_CENTS / 100):
+        raise ValueError(f"Amounts must be numbers of at most {MAX_CENTS // 100:,} dollars")
+    return np.rint(amounts * 100).astype(np.int64)
+
+
+def round_scaled(value: int) -> int:
+    """Cents from an amount in 1/RATE_SCALE cents, half a cent rounded away from zero"""
+    if value >= 0:
+        return (value + RATE_SCALE // 2) // RATE_SCALE
+    return -((RATE_SCALE // 2 - value) // RATE_SCALE)
+
+
+def round_scaled_array(values: np.ndarray) -> np.ndarray:
+    """Vectorized round_scaled"""
+    magnitude = (np.abs(values) + RATE_SCALE // 2) // RATE_SCALE
+    return np.where(values < 0, -magnitude, magnitude)
+
+
+class BracketTable:
+    """Progressive brackets compiled into a cumulative tax-at-threshold table
+
+    Tax on an income is the tax owed at its bracket's lower bound plus one
+    multiply, found with a binary search instead of walking every bracket.
+    ``cents``/``evaluate_cents`` do the same in integers, exactly.
+    """
+
+    def __init__(self, brackets: Sequence[Tuple[float, float]]):
+        lower_bounds = []
+        rates = []
+        base_tax = []
+        previous_threshold = 0
+        cumulative = 0.0
+        for threshold, rate in brackets:
+            lower_bounds.append(float(previous_threshold))
+            rates.append(rate)
+            base_tax.append(cumulative)
+            if threshold != float('inf'):
+                cumulative += (threshold - previous_threshold) * rate
+            previous_threshold = threshold
+
+        # Tuples for the scalar path, arrays for the vectorized one
+        self.lower_bounds = tuple(lower_bounds)
+        self.rates = tuple(rates)
+        self.base_tax = tuple(base_tax)
+        self._lower_bounds = np.array(lower_bounds)
+        self._rates = np.array(rates)
+        self._base_tax = np.array(base_tax)
+
+        # Bounds in cents, rates in RATE_SCALE parts, base tax in 1/RATE_SCALE cents
+        lower_cents = []
+        base_scaled = []
+        previous_cents = 0
+        cumulative_scaled = 0
+        for threshold, rate in brackets:
+            lower_cents.append(previous_cents)
+            base_scaled.append(cumulative_scaled)
+            if threshold != float('inf'):
+                threshold_cents = _scaled(threshold, 100)
+                cumulative_scaled += (threshold_cents - previous_cents) * rate_units(rate)
+                previous_cents = threshold_cents
+        self.lower_cents = tuple(lower_cents)
+        self.rate_units = tuple(rate_units(rate) for rate in rates)
+        self.base_scaled = tuple(base_scaled)
+        self._lower_cents = np.array(lower_cents, dtype=np.int64)
+        self._rate_units = np.array(self.rate_units, dtype=np.int64)
+        self._base_scaled = np.array(base_scaled, dtype=np.int64)
+
+    def __call__(self, income: float) -> float:
+        if income <= 0:
+            return 0.0
+        bracket = bisect_left(self.lower_bounds, income) - 1
+        return self.base_tax[bracket] + (income - self.lower_bounds[bracket]) * self.rates[bracket]
+
+    def evaluate(self, incomes: np.ndarray) -> np.ndarray:
+        brackets = np.clip(np.searchsorted(self._lower_bounds, incomes, side='left') - 1, 0, None)
+        tax = self._base_tax[brackets] + (incomes - self._lower_bounds[brackets]) * self._rates[brackets]
+        return np.where(incomes <= 0, 0.0, tax)
+
+    def cents(self, income: int) -> int:
+        """Tax in cents on an income in cents"""
+        if income <= 0:
+            return 0
+        bracket = bisect_left(self.lower_cents, income) - 1
+        return round_scaled(
+            self.base_scaled[bracket] + (income - self.lower_cents[bracket]) * self.rate_units[bracket]
+        )
+
+    def evaluate_cents(self, incomes: np.ndarray) -> np.ndarray:
+        brackets = np.clip(np.searchsorted(self._lower_cents, incomes, side='left') - 1, 0, None)
+        tax = round_scaled_array(
+            self._base_scaled[brackets] + (incomes - self._lower_cents[brackets]) * self._rate_units[brackets]
+        )
+        return np.where(incomes <= 0, 0, tax)
+
+
+class PiecewiseLinear:
+    """Piecewise-linear function of income with one anchored line per segment
+
+    Segment ``i`` covers ``(breakpoints[i - 1], breakpoints[i]]``, matching the
+    ATO's "up to and including" thresholds, and evaluates
+    ``values[i] + slopes[i] * (x - origins[i])``; results are clamped at ``minimum``.
+    Anchoring each line at its own threshold keeps float error to one rounding.
+
+    The integer version takes whole cents: breakpoints are rounded down to
+    the cent (``x <= b`` is ``x <= floor(b)`` for whole-cent ``x``), values
+    are held in 1/RATE_SCALE cents and slopes in RATE_SCALE parts.
+    """
+
+    def __init__(
+        self,
+        breakpoints: Sequence[float],
+        origins: Sequence[float],
+        values: Sequence[float],
+        slopes: Sequence[float],
+        minimum: float = float('-inf')
+    ):
+        if not len(origins) == len(values) == len(slopes) == len(breakpoints) + 1:
+            raise ValueError("Need one origin, value and slope per segment")
+        self.breakpoints = tuple(float(x) for x in breakpoints)
+        self.origins = tuple(float(x) for x in origins)
+        self.values = tuple(float(y) for y in values)
+        self.slopes = tuple(float(m) for m in slopes)
+        self.minimum = minimum
+        self._breakpoints = np.array(self.breakpoints)
+        self._origins = np.array(self.origins)
+        self._values = np.array(self.values)
+        self._slopes = np.array(self.slopes)
+
+        self.breakpoints_cents = tuple(int(np.floor(x * 100 + 1e-6)) for x in self.breakpoints)
+        self.origins_cents = tuple(_scaled(x, 100) for x in self.origins)
+        self.values_scaled = tuple(_scaled(y, 100 * RATE_SCALE) for y in self.values)
+        self.slope_units = tuple(rate_units(m) for m in self.slopes)
+        self.minimum_scaled = None if minimum == float('-inf') else _scaled(minimum, 100 * RATE_SCALE)
+        self._breakpoints_cents = np.array(self.breakpoints_cents, dtype=np.int64)
+        self._origins_cents = np.array(self.origins_cents, dtype=np.int64)
+        self._values_scaled = np.array(self.values_scaled, dtype=np.int64)
+        self._slope_units = np.array(self.slope_units, dtype=np.int64)
+
+    def __call__(self, x: float) -> float:
+        segment = bisect_left(self.breakpoints, x)
+        y = self.values[segment] + self.slopes[segment] * (x - self.origins[segment])
+        return y if y > self.minimum else self.minimum
+
+    def evaluate(self, x: np.ndarray) -> np.ndarray:
+        segments = np.searchsorted(self._breakpoints, x, side='left')
+        return np.maximum(
+            self.minimum,
+            self._values[segments] + self._slopes[segments] * (x - self._origins[segments])
+        )
+
+    def cents(self, x: int) -> int:
+        """Value in cents at ``x`` cents"""
+        segment = bisect_left(self.breakpoints_cents, x)
+        y = self.values_scaled[segment] + self.slope_units[segment] * (x - self.origins_cents[segment])
+        if self.minimum_scaled is not None and y < self.minimum_scaled:
+            y = self.minimum_scaled
+        return round_scaled(y)
+
+    def evaluate_cents(self, x: np.ndarray) -> np.ndarray:
+        segments = np.searchsorted(self._breakpoints_cents, x, side='left')
+        y = self._values_scaled[segments] + self._slope_units[segments] * (x - self._origins_cents[segments])
+        if self.minimum_scaled is not None:
+            y = np.maximum(self.minimum_scaled, y)
+        return round_scaled_array(y)
+
+
+def compile_medicare_levy(rate: float, threshold: float) -> PiecewiseLinear:
+    """Medicare Levy: nothing up to the threshold, then ``rate`` of all income"""
+    return PiecewiseLinear([threshold], [0.0, 0.0], [0.0, 0.0], [0.0, rate])
+
+
+def compile_low_income_tax_offset(
+    max_offset: float,
+    threshold_1: float,
+    threshold_2: float,
+    rate_1: float,
+    rate_2: float
+) -> PiecewiseLinear:
+    """LITO: full offset, then two phase-out rates, then zero"""
+    offset_at_threshold_2 = max_offset - (threshold_2 - threshold_1) * rate_1
+    cutout = threshold_2 + offset_at_threshold_2 / rate_2
+    return PiecewiseLinear(
+        [threshold_1, threshold_2, cutout],
+        [0.0, threshold_1, threshold_2, 0.0],
+        [max_offset, max_offset, offset_at_threshold_2, 0.0],
+        [0.0, -rate_1, -rate_2, 0.0],
+        minimum=0.0
+    )
+
+
+class CentAmounts(NamedTuple):
+    """A rule set's flat amounts in whole cents and rates in RATE_SCALE parts"""
+
+    small_business_threshold: int
+    small_business_cutoff: int
+    small_business_rate: int
+    small_business_offset_max: int
+    super_guarantee_rate: int
+    work_from_home_rate: int  # Per hour
+
+
+class UnknownTaxYearError(ValueError):
+    """No rule set is registered for the requested tax year"""
+
+
+@dataclass(frozen=True)
+class TaxRuleSet:
+    """Rates and thresholds for one financial year, compiled on construction"""
+
+    tax_year: str
+    brackets: Tuple[Tuple[float, float], ...]  # (upper threshold, marginal rate)
+    bracket_descriptions: Tuple[str, ...]
+    medicare_levy_rate: float
+    medicare_levy_threshold: float
+    lito_max_offset: float
+    lito_threshold_1: float
+    lito_threshold_2: float
+    lito_rate_1: float
+    lito_rate_2: float
+    small_business_offset_max: float
+    small_business_threshold: float
+    small_business_cutoff: float
+    small_business_rate: float
+    super_guarantee_rate: float
+    work_from_home_rate: float
+    instant_asset_writeoff_threshold: float
+    version: str = ""  # Content hash of the source data, changes whenever a rate does
+
+    income_tax: BracketTable = field(init=False, repr=False, compare=False)
+    medicare_levy: PiecewiseLinear = field(init=False, repr=False, compare=False)
+    low_income_tax_offset: PiecewiseLinear = field(init=False, repr=False, compare=False)
+    cents: CentAmounts = field(init=False, repr=False, compare=False)
+    summary: Dict[str, Any] = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        compiled = {
+            'income_tax': BracketTable(self.brackets),
+            'medicare_levy': compile_medicare_levy(self.medicare_levy_rate, self.medicare_levy_threshold),
+            'low_income_tax_offset': compile_low_income_tax_offset(
+                self.lito_max_offset,
+                self.lito_threshold_1,
+                self.lito_threshold_2,
+                self.lito_rate_1,
+                self.lito_rate_2
+            ),
+            'cents': CentAmounts(
+                small_business_threshold=_scaled(self.small_business_threshold, 100),
+                small_business_cutoff=_scaled(self.small_business_cutoff, 100),
+                small_business_rate=rate_units(self.small_business_rate),
+                small_business_offset_max=_scaled(self.small_business_offset_max, 100),
+                super_guarantee_rate=rate_units(self.super_guarantee_rate),
+                work_from_home_rate=rate_units(self.work_from_home_rate)
+            ),
+            'summary': self._summarize()
+        }
+        for name, value in compiled.items():
+            object.__setattr__(self, name, value)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "TaxRuleSet":
+        """Build a rule set from the parsed contents of a ``tax_years`` file"""
+        try:
+            brackets = data['brackets']
+            medicare_levy = data['medicare_levy']
+            lito = data['lito']
+            small_business = data['small_business_offset']
+            return cls(
+                tax_year=data['tax_year'],
+                brackets=tuple(
+                    (float('inf') if bracket['up_to'] is None else bracket['up_to'], bracket['rate'])
+                    for bracket in brackets
+                ),
+                bracket_descriptions=tuple(bracket.get('description', "") for bracket in brackets),
+                medicare_levy_rate=medicare_levy['rate'],
+                medicare_levy_threshold=medicare_levy['threshold'],
+                lito_max_offset=lito['max_offset'],
+                lito_threshold_1=lito['threshold_1'],
+                lito_threshold_2=lito['threshold_2'],
+                lito_rate_1=lito['rate_1'],
+                lito_rate_2=lito['rate_2'],
+                small_business_offset_max=small_business['max_offset'],
+                small_business_threshold=small_business['threshold'],
+                small_business_cutoff=small_business['cutoff'],
+                small_business_rate=small_business['rate'],
+                super_guarantee_rate=data['super_guarantee_rate'],
+                work_from_home_rate=data['work_from_home_rate'],
+                instant_asset_writeoff_threshold=data['instant_asset_writeoff'],
+                version=hashlib.sha256(json.dumps(data, sort_keys=True).encode()).hexdigest()[:16]
+            )
+        except KeyError as e:
+            raise ValueError(f"Tax rule set is missing {e}")
+
+    def _summarize(self) -> Dict[str, Any]:
+        """Public description of the rates, as served by ``/brackets``"""
+        brackets = []
+        previous_threshold = None
+        for (threshold, rate), description in zip(self.brackets, self.bracket_descriptions):
+            brackets.append({
+                "min": 0 if previous_threshold is None else previous_threshold + 1,
+                "max": None if threshold == float('inf') else threshold,
+                "rate": rate,
+                "description": description
+            })
+            previous_threshold = threshold
+
+        return {
+            "tax_year": self.tax_year,
+            "brackets": brackets,
+            "medicare_levy": {
+                "rate": self.medicare_levy_rate,
+                "threshold": self.medicare_levy_threshold
+            },
+            "lito": {
+                "max_offset": self.lito_max_offset,
+                "threshold_1": self.lito_threshold_1,
+                "threshold_2": self.lito_threshold_2
+            },
+            "small_business_offset": {
+                "max_offset": self.small_business_offset_max,
+                "threshold": self.small_business_threshold,
+                "cutoff": self.small_business_cutoff
+            },
+            "super_guarantee_rate": self.super_guarantee_rate,
+            "work_from_home_rate": self.work_from_home_rate,
+            "instant_asset_writeoff": self.instant_asset_writeoff_threshold
+        }
+
+
+class TaxRuleRegistry:
+    """Rule sets keyed by tax year, with a default for requests that name none"""
+
+    def __init__(self, rule_sets: Iterable[TaxRuleSet], default_year: str):
+        self._rule_sets = {rule_set.tax_year: rule_set for rule_set in rule_sets}
+        if default_year not in self._rule_sets:
+            raise UnknownTaxYearError(f"No tax rules for default tax year {default_year}")
+        self.default_year = default_year
+
+    @classmethod
+    def load(cls, directory: str, default_year: str) -> "TaxRuleRegistry":
+        """Parse every ``*.json`` rule file in ``directory``"""
+        rule_sets = []
+        for filename in sorted(os.listdir(directory)):
+            if not filename.endswith(".json"):
+                continue
+            with open(os.path.join(directory, filename), encoding="utf-8") as f:
+                rule_sets.append(TaxRuleSet.from_dict(json.load(f)))
+        return cls(rule_sets, default_year)
+
+    @property
+    def default(self) -> TaxRuleSet:
+        return self._rule_sets[self.default_year]
+
+    @property
+    def years(self) -> List[str]:
+        return sorted(self._rule_sets)
+
+    def get(self, tax_year: Optional[str] = None) -> TaxRuleSet:
+        """Rule set for ``tax_year``, or the default year when it is None"""
+        if tax_year is None:
+            return self.default
+        try:
+            return self._rule_sets[tax_year]
+        except KeyError:
+            raise UnknownTaxYearError(
+                f"Unsupported tax year {tax_year}. Supported years: {', '.join(self.years)}"
+            )
+
+
+tax_rules = TaxRuleRegistry.load(
+    settings.tax_rules_directory or DEFAULT_RULES_DIRECTORY,
+    settings.current_tax_year
+)
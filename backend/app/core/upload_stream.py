@@ -0,0 +1,507 @@
+"""
+Streaming receipt of uploaded documents
+
+The multipart request body is parsed as it arrives instead of being spooled
+by the framework first. In a single pass over the bytes each upload is size
+checked (aborting as soon as the limit is crossed), hashed, sniffed for its
+real file type and written to disk, with the disk writes done on a worker
+thread so the event loop never blocks on file I/O.
+
+Bulk uploads carry any number of file parts, and ZIP archives whose members
+are extracted to the upload directory one at a time under the same checks.
+"""
+
+import asyncio
+import hashlib
+import os
+import zipfile
+import zlib
+from typing import AsyncIterator, Callable, Collection, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from multipart.multipart import MultipartParser, parse_options_header
+
+# Leading bytes identifying each supported document format
+FILE_SIGNATURES = (
+    (b"%PDF-", "application/pdf"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"II*\x00", "image/tiff"),  # Little-endian
+    (b"MM\x00*", "image/tiff"),  # Big-endian
+    (b"PK\x03\x04", "application/zip"),
+    (b"PK\x05\x06", "application/zip"),  # An archive with no members
+)
+# HEIF files are ISO media containers: a size, then "ftyp" and the major brand
+HEIF_BRANDS = {
+    b"heic": "image/heic", b"heix": "image/heic", b"heim": "image/heic", b"heis": "image/heic",
+    b"mif1": "image/heif", b"msf1": "image/heif",
+}
+SNIFF_BYTES = max(12, *(len(signature) for signature, _ in FILE_SIGNATURES))
+
+EXTENSION_CONTENT_TYPES = {
+    ".pdf": "application/pdf",
+    ".png": "image/png",
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".tif": "image/tiff",
+    ".tiff": "image/tiff",
+    ".heic": "image/heic",
+    ".heif": "image/heif",
+}
+
+ARCHIVE_EXTENSIONS = (".zip",)
+ARCHIVE_TYPES = {"application/zip"}
+ARCHIVE_READ_BYTES = 1024 * 1024  # Decompressed bytes read from a member per trip to a worker thread
+
+# Allowance for multipart boundaries and part headers when pre-checking Content-Length
+MULTIPART_OVERHEAD_BYTES = 16 * 1024
+
+
+class UploadError(ValueError):
+    """The upload was rejected; the message is safe to return to the client"""
+
+
+class UploadTooLargeError(UploadError):
+    """The upload crossed the size limit"""
+
+
+class ReceivedFile(NamedTuple):
+    """An upload that has been fully written to disk"""
+    filename: str
+    file_path: str
+    declared_content_type: Optional[str]
+    content_type: str  # Sniffed from the file's leading bytes
+    size: int
+    content_hash: str
+
+
+class RejectedFile(NamedTuple):
+    """A file of a bulk upload that was left out, and why"""
+    filename: str
+    error: str
+
+
+def sniff_content_type(head: bytes) -> Optional[str]:
+    """MIME type identified from a file's first bytes, if it is a supported format"""
+    for signature, content_type in FILE_SIGNATURES:
+        if head.startswith(signature):
+            return content_type
+    if head[4:8] == b"ftyp":
+        return HEIF_BRANDS.get(head[8:12])
+    return None
+
+
+class UploadSink:
+    """Hashes, sniffs and writes one upload's bytes as they arrive
+
+    Content whose leading bytes are not one of ``allowed_types`` is rejected
+    before anything reaches the disk. Small parser callbacks are coalesced
+    into ``buffer_size`` writes so each trip to the writer thread moves a
+    useful amount of data.
+    """
+
+    def __init__(
+        self,
+        file_path: str,
+        max_size: int,
+        allowed_types: Collection[str],
+        buffer_size: int = 1024 * 1024
+    ):
+        self.file_path = file_path
+        self.max_size = max_size
+        self.allowed_types = allowed_types
+        self.buffer_size = buffer_size
+        self.size = 0
+        self._hasher = hashlib.sha256()
+        self._head = b""
+        self._pending: List[bytes] = []
+        self._pending_size = 0
+        self._file = None
+
+    @property
+    def content_hash(self) -> str:
+        return self._hasher.hexdigest()
+
+    @property
+    def content_type(self) -> Optional[str]:
+        return sniff_content_type(self._head)
+
+    async def write(self, data: bytes):
+        self.size += len(data)
+        if self.size > self.max_size:
+            raise UploadTooLargeError(
+                f"File too large. Maximum size: {self.max_size / (1024*1024):.1f}MB"
+            )
+        self._hasher.update(data)
+        if len(self._head) < SNIFF_BYTES:
+            self._head += data[:SNIFF_BYTES - len(self._head)]
+            if len(self._head) >= SNIFF_BYTES:
+                self._check_type()
+
+        self._pending.append(data)
+        self._pending_size += len(data)
+        if self._pending_size >= self.buffer_size:
+            await self._flush()
+
+    async def close(self):
+        """Write any buffered bytes and close the file"""
+        if len(self._head) < SNIFF_BYTES:
+            self._check_type()
+        await self._flush()
+        if self._file is None:
+            self._file = await asyncio.to_thread(open, self.file_path, "wb")
+        await asyncio.to_thread(self._file.close)
+
+    async def discard(self):
+        """Close and delete a partially written file"""
+        if self._file is not None:
+            await asyncio.to_thread(self._file.close)
+        if os.path.exists(self.file_path):
+            await asyncio.to_thread(os.remove, self.file_path)
+
+    def _check_type(self):
+        if self.content_type not in self.allowed_types:
+            raise UploadError("File content does not match a supported document type")
+
+    async def _flush(self):
+        if not self._pending:
+            return
+        data = b"".join(self._pending)
+        self._pending = []
+        self._pending_size = 0
+        if self._file is None:
+            self._file = await asyncio.to_thread(open, self.file_path, "wb")
+        await asyncio.to_thread(self._file.write, data)
+
+
+# Events reported by _FileParts.feed
+PART_START = "start"
+PART_DATA = "data"
+PART_END = "end"
+
+
+def _content_disposition(headers: Dict[bytes, bytes]) -> Dict[bytes, bytes]:
+    _, options = parse_options_header(headers.get(b"content-disposition"))
+    return options
+
+
+class _FileParts:
+    """Multipart parser reporting the ``field_name`` file parts of a body
+
+    Parser callbacks are synchronous, so ``feed`` returns the events a chunk
+    produced (``PART_START`` with the filename and declared type, then
+    ``PART_DATA`` and ``PART_END``) for the caller to await writes on.
+    """
+
+    def __init__(self, content_type_header: Optional[str], field_name: str):
+        content_type, options = parse_options_header(content_type_header)
+        boundary = options.get(b"boundary")
+        if content_type != b"multipart/form-data" or not boundary:
+            raise UploadError("Expected a multipart/form-data upload")
+
+        self.field_name = field_name
+        self._headers: Dict[bytes, bytes] = {}
+        self._header_field = bytearray()
+        self._header_value = bytearray()
+        self._in_file_part = False
+        self._events: List[Tuple] = []
+        self._parser = MultipartParser(boundary, {
+            'on_part_begin': self._headers.clear,
+            'on_header_field': self._on_header_field,
+            'on_header_value': self._on_header_value,
+            'on_header_end': self._on_header_end,
+            'on_headers_finished': self._on_headers_finished,
+            'on_part_data': self._on_part_data,
+            'on_part_end': self._on_part_end,
+        })
+
+    def feed(self, chunk: bytes) -> List[Tuple]:
+        self._parser.write(chunk)
+        events, self._events = self._events, []
+        return events
+
+    def _on_header_field(self, data, start, end):
+        self._header_field.extend(data[start:end])
+
+    def _on_header_value(self, data, start, end):
+        self._header_value.extend(data[start:end])
+
+    def _on_header_end(self):
+        self._headers[bytes(self._header_field).lower()] = bytes(self._header_value)
+        self._header_field.clear()
+        self._header_value.clear()
+
+    def _on_headers_finished(self):
+        disposition = _content_disposition(self._headers)
+        self._in_file_part = (
+            disposition.get(b"name", b"").decode("utf-8", "replace") == self.field_name
+            and b"filename" in disposition
+        )
+        if self._in_file_part:
+            content_type = self._headers.get(b"content-type")
+            self._events.append((
+                PART_START,
+                disposition[b"filename"].decode("utf-8", "replace"),
+                content_type.decode("latin-1") if content_type else None
+            ))
+
+    def _on_part_data(self, data, start, end):
+        if self._in_file_part:
+            self._events.append((PART_DATA, bytes(data[start:end])))
+
+    def _on_part_end(self):
+        if self._in_file_part:
+            self._in_file_part = False
+            self._events.append((PART_END,))
+
+
+async def receive_upload(
+    body: AsyncIterator[bytes],
+    content_type_header: Optional[str],
+    field_name: str,
+    upload_directory: str,
+    max_size: int,
+    allowed_extensions: Iterable[str],
+    make_filename: Callable[[str], str]
+) -> ReceivedFile:
+    """Stream the ``field_name`` file part of a multipart body to disk
+
+    ``make_filename(original_filename)`` names the stored file. The file's
+    extension is checked as soon as its part headers arrive, and its bytes are
+    sniffed, so a disallowed or mislabelled upload is rejected before the
+    rest of it is read. Raises UploadError on rejection.
+    """
+    parts = _FileParts(content_type_header, field_name)
+    allowed_extensions = tuple(extension.lower() for extension in allowed_extensions)
+    allowed_types = {EXTENSION_CONTENT_TYPES.get(extension) for extension in allowed_extensions}
+
+    sink: Optional[UploadSink] = None
+    filename = declared_content_type = None
+    finished = False
+    try:
+        async for chunk in body:
+            for event in parts.feed(chunk):
+                if event[0] == PART_START:
+                    _, filename, declared_content_type = event
+                    if not filename.lower().endswith(allowed_extensions):
+                        raise UploadError(f"File type not allowed. Supported types: {list(allowed_extensions)}")
+                    file_path = os.path.join(upload_directory, make_filename(filename))
+                    sink = UploadSink(file_path, max_size, allowed_types)
+                elif event[0] == PART_DATA:
+                    await sink.write(event[1])
+                else:
+                    finished = True
+                    break
+            if finished:
+                break
+
+        if not finished:
+            raise UploadError(f"No complete '{field_name}' file in upload")
+        await sink.close()
+    except BaseException:
+        if sink is not None:
+            await sink.discard()
+        raise
+
+    return ReceivedFile(
+        filename=filename,
+        file_path=sink.file_path,
+        declared_content_type=declared_content_type,
+        content_type=sink.content_type,
+        size=sink.size,
+        content_hash=sink.content_hash
+    )
+
+
+def _archive_members(archive: zipfile.ZipFile) -> List[zipfile.ZipInfo]:
+    """Files in an archive, leaving out directories and the metadata archivers add"""
+    return [
+        info for info in archive.infolist()
+        if not info.is_dir()
+        and not info.filename.startswith("__MACOSX/")
+        and not os.path.basename(info.filename).startswith(".")
+    ]
+
+
+async def unpack_archive(
+    archive_path: str,
+    archive_name: str,
+    upload_directory: str,
+    max_size: int,
+    max_files: int,
+    allowed_extensions: Tuple[str, ...],
+    make_filename: Callable[[str], str]
+) -> Tuple[List[ReceivedFile], List[RejectedFile]]:
+    """Extract the documents in a ZIP archive one member at a time
+
+    Each member is decompressed a chunk at a time into an UploadSink, so it
+    gets the same size limit, sniffing and hashing as a directly uploaded
+    file, and a member claiming to be small cannot inflate past ``max_size``.
+    Stored filenames come from ``make_filename``, never from member paths.
+    Unsupported, encrypted, oversized or corrupt members are rejected
+    individually; more than ``max_files`` members raises UploadError.
+    """
+    allowed_types = {EXTENSION_CONTENT_TYPES.get(extension) for extension in allowed_extensions}
+    try:
+        archive = await asyncio.to_thread(zipfile.ZipFile, archive_path)
+    except zipfile.BadZipFile:
+        return [], [RejectedFile(archive_name, "Not a readable ZIP archive")]
+
+    received: List[ReceivedFile] = []
+    rejected: List[RejectedFile] = []
+    try:
+        members = _archive_members(archive)
+        if len(members) > max_files:
+            raise UploadError(f"Too many files. Maximum per upload: {max_files}")
+
+        for info in members:
+            if not info.filename.lower().endswith(allowed_extensions):
+                rejected.append(RejectedFile(info.filename, "File type not allowed"))
+                continue
+            if info.flag_bits & 0x1:
+                rejected.append(RejectedFile(info.filename, "Encrypted archive members are not supported"))
+                continue
+            if info.file_size > max_size:
+                rejected.append(RejectedFile(
+                    info.filename, f"File too large. Maximum size: {max_size / (1024*1024):.1f}MB"
+                ))
+                continue
+
+            sink = UploadSink(os.path.join(upload_directory, make_filename(info.filename)), max_size, allowed_types)
+            try:
+                source = await asyncio.to_thread(archive.open, info)
+                try:
+                    while data := await asyncio.to_thread(source.read, ARCHIVE_READ_BYTES):
+                        await sink.write(data)
+                finally:
+                    source.close()
+                await sink.close()
+            except UploadError as e:
+                await sink.discard()
+                rejected.append(RejectedFile(info.filename, str(e)))
+                continue
+            except (zipfile.BadZipFile, zlib.error, EOFError, NotImplementedError):
+                await sink.discard()
+                rejected.append(RejectedFile(info.filename, "Archive member is corrupt or uses an unsupported compression"))
+                continue
+            received.append(ReceivedFile(
+                filename=info.filename,
+                file_path=sink.file_path,
+                declared_content_type=None,
+                content_type=sink.content_type,
+                size=sink.size,
+                content_hash=sink.content_hash
+            ))
+    except BaseException:
+        for item in received:
+            await asyncio.to_thread(os.remove, item.file_path)
+        raise
+    finally:
+        archive.close()
+
+    return received, rejected
+
+
+async def receive_uploads(
+    body: AsyncIterator[bytes],
+    content_type_header: Optional[str],
+    field_name: str,
+    upload_directory: str,
+    max_size: int,
+    max_files: int,
+    max_total_size: int,
+    allowed_extensions: Iterable[str],
+    make_filename: Callable[[str], str]
+) -> Tuple[List[ReceivedFile], List[RejectedFile]]:
+    """Stream every ``field_name`` file part of a multipart body to disk
+
+    Parts are handled as ``receive_upload`` handles its one, except that a
+    rejected file is recorded and skipped rather than failing the request.
+    ZIP archives are spooled to disk (never held in memory) and unpacked by
+    ``unpack_archive``. Only the request as a whole exceeding ``max_files``
+    files or ``max_total_size`` bytes raises UploadError, in which case
+    nothing received so far is kept.
+    """
+    parts = _FileParts(content_type_header, field_name)
+    allowed_extensions = tuple(extension.lower() for extension in allowed_extensions)
+    allowed_types = {EXTENSION_CONTENT_TYPES.get(extension) for extension in allowed_extensions}
+
+    received: List[ReceivedFile] = []
+    rejected: List[RejectedFile] = []
+    sink: Optional[UploadSink] = None
+    filename = declared_content_type = None
+    is_archive = False
+    body_size = 0
+    try:
+        async for chunk in body:
+            body_size += len(chunk)
+            if body_size > max_total_size + MULTIPART_OVERHEAD_BYTES:
+                raise UploadTooLargeError(
+                    f"Upload too large. Maximum total size: {max_total_size / (1024*1024):.1f}MB"
+                )
+
+            for event in parts.feed(chunk):
+                if event[0] == PART_START:
+                    _, filename, declared_content_type = event
+                    is_archive = filename.lower().endswith(ARCHIVE_EXTENSIONS)
+                    if not filename:
+                        continue  # A form's empty file input
+                    if len(received) >= max_files:
+                        raise UploadError(f"Too many files. Maximum per upload: {max_files}")
+                    if is_archive:
+                        sink = UploadSink(
+                            os.path.join(upload_directory, make_filename(filename)), max_total_size, ARCHIVE_TYPES
+                        )
+                    elif filename.lower().endswith(allowed_extensions):
+                        sink = UploadSink(
+                            os.path.join(upload_directory, make_filename(filename)), max_size, allowed_types
+                        )
+                    else:
+                        rejected.append(RejectedFile(filename, "File type not allowed"))
+                    continue
+
+                if sink is None:
+                    continue  # The rest of a skipped part
+                try:
+                    if event[0] == PART_DATA:
+                        await sink.write(event[1])
+                        continue
+                    await sink.close()
+                except UploadError as e:
+                    await sink.discard()
+                    sink = None
+                    rejected.append(RejectedFile(filename, str(e)))
+                    continue
+
+                completed, sink = sink, None
+                if is_archive:
+                    try:
+                        members, skipped = await unpack_archive(
+                            completed.file_path, filename, upload_directory, max_size,
+                            max_files - len(received), allowed_extensions, make_filename
+                        )
+                    finally:
+                        await completed.discard()
+                    received.extend(members)
+                    rejected.extend(skipped)
+                else:
+                    received.append(ReceivedFile(
+                        filename=filename,
+                        file_path=completed.file_path,
+                        declared_content_type=declared_content_type,
+                        content_type=completed.content_type,
+                        size=completed.size,
+                        content_hash=completed.content_hash
+                    ))
+    except BaseException:
+        if sink is not None:
+            await sink.discard()
+        for item in received:
+            if os.path.exists(item.file_path):
+                await asyncio.to_thread(os.remove, item.file_path)
+        raise
+
+    if sink is not None:
+        # The body ended part way through a file
+        await sink.discard()
+        rejected.append(RejectedFile(filename, "Upload ended before the file was complete"))
+    return received, rejected
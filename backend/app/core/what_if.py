@@ -0,0 +1,184 @@
+"""
+What-if sweeps of a tax return over one or two variables
+
+"How much would an extra $X of deductions save me" is answered for a whole
+range of X at once: every point of the sweep grid becomes one column entry
+and the grid is calculated in a single ``calculate_total_tax_batch`` pass,
+rather than one ``calculate_total_tax`` call (or request) per point.
+
+Swept amounts are added to the base return's field; ``salary_sacrifice``
+instead takes them out of employment income. Marginal rates are the change
+in total tax per extra dollar between neighbouring grid points, and the
+break-even points are where that rate changes: where taxable income crosses
+into another bracket, an offset's phase-out or the zero-tax floor, so the
+next dollar is worth a different amount from there on.
+"""
+
+from functools import cached_property
+from typing import Any, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from .bulk_calculator import DEDUCTION_FIELDS, INCOME_FIELDS
+
+SALARY_SACRIFICE = 'salary_sacrifice'
+SWEEP_FIELDS = INCOME_FIELDS + DEDUCTION_FIELDS + (SALARY_SACRIFICE,)
+MAX_VARIABLES = 2
+MIN_STEP = 0.01  # Swept amounts are whole cents
+
+# Each total_tax is rounded to the cent in up to three places, so a rate
+# between points ``step`` apart can be off by 0.03 / step either way; rate
+# changes smaller than twice that are not told apart from rounding
+ROUNDING_ERROR = 0.03
+
+
+class SweepError(ValueError):
+    """The sweep cannot be calculated; the message is safe to return to the client"""
+
+
+class SweepVariable:
+    """One swept field and the amounts added to it"""
+
+    def __init__(self, field: str, start: float, stop: float, step: float):
+        if field not in SWEEP_FIELDS:
+            raise SweepError(f"Cannot sweep '{field}'. Sweepable fields: {list(SWEEP_FIELDS)}")
+        if not step >= MIN_STEP:
+            raise SweepError(f"Step for '{field}' must be at least {MIN_STEP}")
+        if stop < start:
+            raise SweepError(f"Sweep of '{field}' stops before it starts")
+        self.field = field
+        self.start = start
+        self.step = step
+        self.count = int(np.floor((stop - start) / step + 1e-9)) + 1
+
+    @cached_property
+    def values(self) -> np.ndarray:
+        return np.round(self.start + self.step * np.arange(self.count), 2)
+
+
+def _per_dollar(change: np.ndarray, amounts: np.ndarray) -> np.ndarray:
+    """Change per dollar between points; zero where rounding left two points on the same amount"""
+    change, amounts = np.broadcast_arrays(change, amounts)
+    return np.divide(change, amounts, out=np.zeros(change.shape), where=amounts != 0)
+
+
+def sweep_grid(variables: Sequence[SweepVariable], max_points: int) -> Tuple[np.ndarray, ...]:
+    """Amounts of each variable at every grid point, shaped like the grid"""
+    if not 1 <= len(variables) <= MAX_VARIABLES:
+        raise SweepError(f"Sweep one to {MAX_VARIABLES} variables")
+    if len({variable.field for variable in variables}) != len(variables):
+        raise SweepError("Each variable can only be swept once")
+    points = 1
+    for variable in variables:
+        points *= variable.count
+    if points > max_points:
+        raise SweepError(f"Sweep too large: {points} points. Maximum points: {max_points}")
+    return tuple(np.meshgrid(*(variable.values for variable in variables), indexing='ij'))
+
+
+def _sweep_columns(
+    income_data: Dict[str, float],
+    deduction_data: Dict[str, float],
+    variables: Sequence[SweepVariable],
+    grid: Tuple[np.ndarray, ...]
+) -> Tuple[Dict[str, np.ndarray], Dict[str, np.ndarray]]:
+    income_columns = {key: np.full(grid[0].size, float(value)) for key, value in income_data.items()}
+    deduction_columns = {key: np.full(grid[0].size, float(value)) for key, value in deduction_data.items()}
+    for variable, amounts in zip(variables, grid):
+        amounts = amounts.ravel()
+        if variable.field == SALARY_SACRIFICE:
+            employment = income_columns.get('employment_income', np.zeros(amounts.size))
+            # Nothing is left to sacrifice beyond the whole salary
+            income_columns['employment_income'] = employment - np.clip(amounts, None, employment)
+        else:
+            columns = income_columns if variable.field in INCOME_FIELDS else deduction_columns
+            columns[variable.field] = columns.get(variable.field, 0.0) + amounts
+    return income_columns, deduction_columns
+
+
+def break_even_points(values: np.ndarray, tax: np.ndarray, step: float) -> List[Dict[str, float]]:
+    """Where the tax change per extra dollar changes along one swept variable
+
+    Total tax is piecewise linear in the variable, so between kinks the rate
+    is constant. A kink on a grid point changes the rate once; one between
+    grid points leaves a blended rate on its interval, and is placed where
+    the lines through the pure intervals either side intersect. Where the
+    tax jumps rather than bends (the Medicare levy cliff) the point is only
+    placed to within that interval.
+    """
+    # Rounding to the cent can put neighbouring points on the same amount
+    distinct = np.concatenate(([True], np.diff(values) != 0))
+    values, tax = values[distinct], tax[distinct]
+    if len(values) < 3:
+        return []
+    rates = np.diff(tax) / np.diff(values)
+    changed = np.abs(np.diff(rates)) > 2 * ROUNDING_ERROR / step
+    points = []
+    index = 0
+    while index < len(changed):
+        if not changed[index]:
+            index += 1
+            continue
+        before = rates[index]
+        if index + 1 < len(changed) and changed[index + 1]:
+            # Interval index + 1 is blended; intersect its neighbours' lines
+            after = rates[index + 2]
+            left_x, left_tax = values[index + 1], tax[index + 1]
+            right_x, right_tax = values[index + 2], tax[index + 2]
+            value = (right_tax - left_tax + before * left_x - after * right_x) / (before - after)
+            value = min(max(value, left_x), right_x)
+            index += 2
+        else:
+            after = rates[index + 1]
+            value = values[index + 1]
+            index += 1
+        points.append({
+            'value': round(float(value), 2),
+            'marginal_rate_before': round(float(before), 4),
+            'marginal_rate_after': round(float(after), 4),
+        })
+    return points
+
+
+def what_if(
+    calculator: type,
+    income_data: Dict[str, float],
+    deduction_data: Dict[str, float],
+    variables: Sequence[SweepVariable],
+    max_points: int
+) -> Dict[str, Any]:
+    """Tax curve, marginal rates and break-even points over a sweep of the base return
+
+    ``data`` holds every calculate_total_tax field plus ``tax_saved`` (against
+    the base return) and ``take_home_income`` at each grid point: a list for
+    one variable, a list of rows (one per value of the first) for two.
+    Marginal rates along each variable are between neighbouring points, so
+    one shorter along that axis. With two variables, break-even points along
+    each are found with the other held at the start of its range.
+    """
+    grid = sweep_grid(variables, max_points)
+    shape = grid[0].shape
+    base = calculator.calculate_total_tax(income_data, deduction_data)
+
+    income_columns, deduction_columns = _sweep_columns(income_data, deduction_data, variables, grid)
+    result = calculator.calculate_total_tax_batch(income_columns, deduction_columns)
+    curves = {field: values.reshape(shape) for field, values in result.items()}
+    curves['tax_saved'] = np.round(base['total_tax'] - curves['total_tax'], 2)
+    curves['take_home_income'] = np.round(curves['total_income'] - curves['total_tax'], 2)
+
+    total_tax = curves['total_tax']
+    marginal_rates = {}
+    break_even = {}
+    for axis, variable in enumerate(variables):
+        steps = np.diff(variable.values).reshape([-1 if dimension == axis else 1 for dimension in range(len(shape))])
+        marginal_rates[variable.field] = np.round(_per_dollar(np.diff(total_tax, axis=axis), steps), 4).tolist()
+        line = total_tax[tuple(slice(None) if dimension == axis else 0 for dimension in range(len(shape)))]
+        break_even[variable.field] = break_even_points(variable.values, line, variable.step)
+
+    return {
+        'base': base,
+        'values': {variable.field: variable.values.tolist() for variable in variables},
+        'data': {field: values.tolist() for field, values in curves.items()},
+        'marginal_rates': marginal_rates,
+        'break_even_points': break_even,
+    }
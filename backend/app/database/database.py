@@ -1,26 +1,72 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.pool import AsyncAdaptedQueuePool, StaticPool
 
 from ..config import settings
 
-# Synchronous database setup
+
+def engine_options(url: str, is_async: bool = False) -> dict:
+    """Connection pool and driver options for a database URL"""
+    database_url = make_url(url)
+    is_sqlite = database_url.get_backend_name() == "sqlite"
+
+    if is_sqlite and database_url.database in (None, "", ":memory:"):
+        # One shared in-memory database; there is nothing to pool
+        return {"poolclass": StaticPool, "connect_args": {"check_same_thread": False}}
+
+    options = {
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_timeout": settings.db_pool_timeout,
+        "pool_pre_ping": settings.db_pool_pre_ping,
+        "pool_recycle": settings.db_pool_recycle,
+    }
+    if is_sqlite:
+        # Wait for SQLite's single writer instead of failing with "database is locked"
+        options["connect_args"] = {"timeout": settings.db_pool_timeout}
+        if is_async:
+            options["poolclass"] = AsyncAdaptedQueuePool  # aiosqlite defaults to NullPool
+        else:
+            options["connect_args"]["check_same_thread"] = False
+    return options
+
+
+def use_sqlite_wal(sync_engine):
+    """Put file-backed SQLite in WAL mode so readers and the writer don't block each other"""
+    database_url = sync_engine.url
+    if database_url.get_backend_name() != "sqlite" or database_url.database in (None, "", ":memory:"):
+        return
+
+    @event.listens_for(sync_engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.close()
+
+
+# Synchronous database setup, used by the background job queue
 engine = create_engine(
     settings.database_url,
-    connect_args={"check_same_thread": False},  # Only needed for SQLite
+    **engine_options(settings.database_url),
 )
+use_sqlite_wal(engine)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
-# Asynchronous database setup
+# Asynchronous database setup, used by the API
 async_engine = create_async_engine(
     settings.database_url_async,
     echo=settings.debug,
+    **engine_options(settings.database_url_async, is_async=True),
 )
+use_sqlite_wal(async_engine.sync_engine)
 
 AsyncSessionLocal = sessionmaker(
-    async_engine, class_=AsyncSession, expire_on_commit=False
+    async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
 )
 
 Base = declarative_base()
@@ -36,4 +82,4 @@ def get_db():
 # Async dependency to get database session
 async def get_async_db():
     async with AsyncSessionLocal() as session:
-        yield session
\ No newline at end of file
+        yield session
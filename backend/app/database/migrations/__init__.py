@@ -0,0 +1,57 @@
+"""
+Schema upgrades of existing databases, as Alembic revisions in ``versions/``
+
+``Base.metadata.create_all`` adds missing tables but never alters existing
+ones; new columns on existing tables, type changes and data moved between
+tables are revisions. Databases created before revisions were tracked have no
+``alembic_version`` row and may be part-way through that history, so each
+revision checks what it still has to do.
+
+    python -m app.database.migrations    # what the app runs at startup
+"""
+
+import logging
+from pathlib import Path
+
+from alembic import command
+from alembic.config import Config
+from alembic.runtime.migration import MigrationContext
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+
+from ...models import Base
+
+logger = logging.getLogger(__name__)
+
+
+def alembic_config(connection: Connection) -> Config:
+    """Alembic configuration that runs revisions on ``connection``"""
+    config = Config()
+    config.set_main_option("script_location", str(Path(__file__).parent))
+    config.attributes["connection"] = connection
+    return config
+
+
+def current_revision(engine: Engine):
+    """The revision the database is at, or None if revisions were never run on it"""
+    with engine.connect() as connection:
+        return MigrationContext.configure(connection).get_current_revision()
+
+
+def upgrade_database(engine: Engine, revision: str = "head"):
+    """Create missing tables, then apply pending revisions
+
+    On SQLite the file is vacuumed after revisions ran, to hand the pages
+    freed by dropped columns back.
+    """
+    before = current_revision(engine)
+    with engine.begin() as connection:
+        Base.metadata.create_all(bind=connection)
+        command.upgrade(alembic_config(connection), revision)
+    after = current_revision(engine)
+
+    if after != before:
+        logger.info("Upgraded database from revision %s to %s", before, after)
+        if engine.url.get_backend_name() == "sqlite":
+            with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+                connection.execute(text("VACUUM"))
@@ -0,0 +1,7 @@
+import logging
+
+from ..database import engine
+from . import upgrade_database
+
+logging.basicConfig(level=logging.INFO)
+upgrade_database(engine)
@@ -0,0 +1,40 @@
+"""
+Alembic environment
+
+Runs revisions on the connection ``upgrade_database`` hands in, or, from the
+``alembic`` command line, on the app's configured database. Revisions inspect
+the live schema, so there is no offline (``--sql``) mode.
+"""
+
+from logging.config import fileConfig
+
+from alembic import context
+
+from app.database.database import engine
+from app.models import Base
+
+config = context.config
+if config.config_file_name is not None:
+    fileConfig(config.config_file_name, disable_existing_loggers=False)
+
+
+def run_migrations(connection):
+    context.configure(
+        connection=connection,
+        target_metadata=Base.metadata,
+        # SQLite can't ALTER constraints; autogenerate copy-and-move batches instead
+        render_as_batch=connection.dialect.name == "sqlite",
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+if context.is_offline_mode():
+    raise SystemExit("Revisions inspect the live database; run them online")
+
+connection = config.attributes.get("connection")
+if connection is not None:
+    run_migrations(connection)
+else:
+    with engine.begin() as connection:
+        run_migrations(connection)
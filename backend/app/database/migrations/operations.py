@@ -0,0 +1,55 @@
+"""Steps several revisions share"""
+
+from typing import Iterable, Set
+
+import sqlalchemy as sa
+from alembic import op
+
+
+def existing_columns(table_name: str) -> Set[str]:
+    """Names of the columns ``table_name`` has now; empty if there is no such table"""
+    inspector = sa.inspect(op.get_bind())
+    if table_name not in inspector.get_table_names():
+        return set()
+    return {info["name"] for info in inspector.get_columns(table_name)}
+
+
+def dollars_to_cents(table_name: str, names: Iterable[str], **column_options):
+    """Replace float dollar columns with whole-cent ``<name>_cents`` columns
+
+    Each amount is rounded to the nearest cent once, here. Cent columns whose
+    dollar column the table never had are added empty.
+    """
+    existing = existing_columns(table_name)
+    if not existing:
+        return
+    for name in names:
+        cents = f"{name}_cents"
+        if cents in existing:
+            continue
+        op.add_column(table_name, sa.Column(cents, sa.BigInteger, **column_options))
+        if name in existing:
+            amounts = sa.table(table_name, sa.column(name, sa.Float), sa.column(cents, sa.BigInteger))
+            op.execute(
+                amounts.update()
+                .where(amounts.c[name].is_not(None))
+                .values({cents: sa.cast(sa.func.round(amounts.c[name] * 100), sa.BigInteger)})
+            )
+            op.drop_column(table_name, name)
+
+
+def cents_to_dollars(table_name: str, names: Iterable[str], **column_options):
+    """Undo ``dollars_to_cents``"""
+    existing = existing_columns(table_name)
+    for name in names:
+        cents = f"{name}_cents"
+        if cents not in existing:
+            continue
+        op.add_column(table_name, sa.Column(name, sa.Float, **column_options))
+        amounts = sa.table(table_name, sa.column(name, sa.Float), sa.column(cents, sa.BigInteger))
+        op.execute(
+            amounts.update()
+            .where(amounts.c[cents].is_not(None))
+            .values({name: amounts.c[cents] / 100.0})
+        )
+        op.drop_column(table_name, cents)
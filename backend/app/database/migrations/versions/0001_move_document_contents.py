@@ -0,0 +1,82 @@
+"""Move OCR text and extracted data off documents rows into document_contents
+
+OCR text is compressed on the way.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17 09:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.database.migrations.operations import existing_columns
+from app.models.models import CompressedText
+
+# revision identifiers, used by Alembic.
+revision: str = '0001'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 500
+
+contents = sa.table(
+    "document_contents",
+    sa.column("document_id", sa.Integer),
+    sa.column("ocr_text", CompressedText),
+    sa.column("extracted_data", sa.JSON),
+)
+
+
+def upgrade() -> None:
+    if "ocr_text" not in existing_columns("documents"):
+        return
+    if not existing_columns("document_contents"):
+        op.create_table(
+            "document_contents",
+            sa.Column("document_id", sa.Integer, sa.ForeignKey("documents.id", ondelete="CASCADE"), primary_key=True),
+            sa.Column("ocr_text", CompressedText, nullable=True),
+            sa.Column("extracted_data", sa.JSON, nullable=True),
+        )
+
+    legacy = sa.table(
+        "documents", sa.column("id", sa.Integer), sa.column("ocr_text", sa.Text), sa.column("extracted_data", sa.JSON)
+    )
+    connection = op.get_bind()
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            sa.select(legacy.c.id, legacy.c.ocr_text, legacy.c.extracted_data)
+            .where(legacy.c.id > last_id)
+            .where(sa.or_(legacy.c.ocr_text.is_not(None), legacy.c.extracted_data.is_not(None)))
+            .order_by(legacy.c.id)
+            .limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        connection.execute(sa.insert(contents), [
+            {'document_id': row.id, 'ocr_text': row.ocr_text, 'extracted_data': row.extracted_data}
+            for row in rows
+        ])
+        last_id = rows[-1].id
+
+    op.drop_column("documents", "ocr_text")
+    op.drop_column("documents", "extracted_data")
+
+
+def downgrade() -> None:
+    op.add_column("documents", sa.Column("ocr_text", sa.Text, nullable=True))
+    op.add_column("documents", sa.Column("extracted_data", sa.JSON, nullable=True))
+    legacy = sa.table(
+        "documents", sa.column("id", sa.Integer), sa.column("ocr_text", sa.Text), sa.column("extracted_data", sa.JSON)
+    )
+    connection = op.get_bind()
+    for row in connection.execute(sa.select(contents)).all():
+        connection.execute(
+            legacy.update().where(legacy.c.id == row.document_id)
+            .values(ocr_text=row.ocr_text, extracted_data=row.extracted_data)
+        )
+    op.drop_table("document_contents")
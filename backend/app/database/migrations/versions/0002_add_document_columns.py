@@ -0,0 +1,60 @@
+"""Add the columns documents and extraction_cache gained after they were created
+
+Content hashes, classification confidence, links to tax returns and upload
+batches. SQLite can't add foreign keys in place, so documents is rebuilt
+there.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 09:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.database.migrations.operations import existing_columns
+
+# revision identifiers, used by Alembic.
+revision: str = '0002'
+down_revision: Union[str, None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def document_columns():
+    # (column, indexed, referenced table)
+    return [
+        (sa.Column("content_hash", sa.String(64), nullable=True), True, None),
+        (sa.Column("classification_confidence", sa.Float, nullable=True), False, None),
+        (sa.Column("tax_return_id", sa.Integer, nullable=True), True, "tax_returns"),
+        (sa.Column("return_contribution", sa.JSON, nullable=True), False, None),
+        (sa.Column("batch_id", sa.Integer, nullable=True), True, "upload_batches"),
+    ]
+
+
+def upgrade() -> None:
+    existing = existing_columns("documents")
+    missing = [spec for spec in document_columns() if existing and spec[0].name not in existing]
+    if missing:
+        with op.batch_alter_table("documents") as batch:
+            for column, indexed, referenced in missing:
+                batch.add_column(column)
+                if indexed:
+                    batch.create_index(f"ix_documents_{column.name}", [column.name])
+                if referenced:
+                    batch.create_foreign_key(f"fk_documents_{column.name}", referenced, [column.name], ["id"])
+
+    existing = existing_columns("extraction_cache")
+    if existing and "classification_confidence" not in existing:
+        op.add_column("extraction_cache", sa.Column("classification_confidence", sa.Float, nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("extraction_cache", "classification_confidence")
+    with op.batch_alter_table("documents") as batch:
+        for column, indexed, referenced in reversed(document_columns()):
+            if indexed:
+                batch.drop_index(f"ix_documents_{column.name}")
+            batch.drop_column(column.name)
@@ -0,0 +1,36 @@
+"""Store tax_returns amounts as whole cents in *_cents columns instead of float dollars
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17 09:00:00
+
+"""
+from typing import Sequence, Union
+
+from app.database.migrations.operations import cents_to_dollars, dollars_to_cents
+
+# revision identifiers, used by Alembic.
+revision: str = '0003'
+down_revision: Union[str, None] = '0002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+AMOUNTS = (
+    "total_income", "employment_income", "investment_income", "business_income",
+    "total_deductions", "work_related_expenses", "work_from_home_deduction",
+    "taxable_income", "income_tax", "medicare_levy",
+    "low_income_tax_offset", "small_business_offset",
+    "total_tax", "tax_paid", "refund_or_amount_owed",
+)
+# Running totals of linked documents, which older databases don't have at all
+DOCUMENTED = ("documented_employment_income", "documented_tax_withheld", "documented_deductions")
+
+
+def upgrade() -> None:
+    dollars_to_cents("tax_returns", AMOUNTS, nullable=True)
+    dollars_to_cents("tax_returns", DOCUMENTED, server_default="0", nullable=False)
+
+
+def downgrade() -> None:
+    cents_to_dollars("tax_returns", DOCUMENTED, server_default="0", nullable=False)
+    cents_to_dollars("tax_returns", AMOUNTS, nullable=True)
@@ -0,0 +1,76 @@
+"""Store extraction_cache OCR text zlib-compressed, as document_contents does
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17 09:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.database.migrations.operations import existing_columns
+from app.models.models import CompressedText
+
+# revision identifiers, used by Alembic.
+revision: str = '0004'
+down_revision: Union[str, None] = '0003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 500
+
+
+def convert_ocr_text(from_type, to_type):
+    """Rewrite every entry's ``ocr_text`` from one column type to the other"""
+    op.add_column("extraction_cache", sa.Column("converted_ocr_text", to_type, nullable=True))
+    cache = sa.table(
+        "extraction_cache",
+        sa.column("content_hash", sa.String),
+        sa.column("processor_version", sa.String),
+        sa.column("ocr_text", from_type),
+        sa.column("converted_ocr_text", to_type),
+    )
+    key = sa.tuple_(cache.c.content_hash, cache.c.processor_version)
+    rewrite = (
+        cache.update()
+        .where(cache.c.content_hash == sa.bindparam("key_hash"))
+        .where(cache.c.processor_version == sa.bindparam("key_version"))
+        .values(converted_ocr_text=sa.bindparam("text", type_=to_type))
+    )
+    connection = op.get_bind()
+    last_key = None
+    while True:
+        query = sa.select(cache.c.content_hash, cache.c.processor_version, cache.c.ocr_text)
+        if last_key is not None:
+            query = query.where(key > sa.tuple_(*last_key))
+        rows = connection.execute(
+            query.where(cache.c.ocr_text.is_not(None))
+            .order_by(cache.c.content_hash, cache.c.processor_version)
+            .limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        connection.execute(rewrite, [
+            {'key_hash': row.content_hash, 'key_version': row.processor_version, 'text': row.ocr_text}
+            for row in rows
+        ])
+        last_key = (rows[-1].content_hash, rows[-1].processor_version)
+
+    op.drop_column("extraction_cache", "ocr_text")
+    op.alter_column("extraction_cache", "converted_ocr_text", new_column_name="ocr_text")
+
+
+def upgrade() -> None:
+    if "ocr_text" not in existing_columns("extraction_cache"):
+        return
+    ocr_text = next(
+        info for info in sa.inspect(op.get_bind()).get_columns("extraction_cache") if info["name"] == "ocr_text"
+    )
+    if not isinstance(ocr_text["type"], sa.LargeBinary):
+        convert_ocr_text(sa.Text, CompressedText)
+
+
+def downgrade() -> None:
+    convert_ocr_text(CompressedText, sa.Text)
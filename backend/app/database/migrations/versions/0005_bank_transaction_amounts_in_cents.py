@@ -0,0 +1,26 @@
+"""Store bank_transactions amounts as whole cents in *_cents columns instead of float dollars
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17 10:00:00
+
+"""
+from typing import Sequence, Union
+
+from app.database.migrations.operations import cents_to_dollars, dollars_to_cents
+
+# revision identifiers, used by Alembic.
+revision: str = '0005'
+down_revision: Union[str, None] = '0004'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+AMOUNTS = ("debit", "credit", "balance")
+
+
+def upgrade() -> None:
+    dollars_to_cents("bank_transactions", AMOUNTS, nullable=True)
+
+
+def downgrade() -> None:
+    cents_to_dollars("bank_transactions", AMOUNTS, nullable=True)
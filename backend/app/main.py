@@ -1,22 +1,37 @@
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 import os
 
 from .config import settings
-from .database.database import engine
-from .models import Base
+from .database.database import async_engine, engine
+from .database.migrations import upgrade_database
+from .core import metrics
+from .core.job_queue import job_queue
+from .core.status_events import status_broker
 
 # Import API routers
 from .api import documents, tax_calculator
 
-# Create database tables
-Base.metadata.create_all(bind=engine)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Create database tables and bring existing ones up to date before taking work
+    await asyncio.to_thread(upgrade_database, engine)
+    # Start the OCR worker pool and job dispatcher for the app's lifetime
+    await job_queue.start()
+    yield
+    await job_queue.stop()
+
 
 app = FastAPI(
     title=settings.app_name,
     version=settings.app_version,
     description="Australian Tax Preparation Web Application for 2024-25",
+    lifespan=lifespan,
 )
 
 # Configure CORS
@@ -28,6 +43,19 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+if settings.metrics_enabled:
+    # Outermost, so the time CORS handling takes is counted too
+    app.add_middleware(metrics.MetricsMiddleware)
+    if settings.metrics_count_queries:
+        metrics.count_queries([engine, async_engine.sync_engine])
+    metrics.registry.register(metrics.Gauge(
+        "document_queue_depth", "Processing jobs waiting or running", ("status",), read=job_queue.depth
+    ))
+    metrics.registry.register(metrics.Gauge(
+        "status_stream_subscribers", "Clients following document status events",
+        read=lambda: {(): status_broker.stats()['subscribers']}
+    ))
+
 # Create upload directory if it doesn't exist
 os.makedirs(settings.upload_directory, exist_ok=True)
 
@@ -52,6 +80,12 @@ async def root():
 async def health_check():
     return {"status": "healthy"}
 
+if settings.metrics_enabled:
+    @app.get("/metrics", include_in_schema=False)
+    def prometheus_metrics():
+        # Sync, so reading the queue depth from the database runs off the event loop
+        return Response(metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
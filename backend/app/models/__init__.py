@@ -1,4 +1,10 @@
-from .models import Document, TaxReturn, DocumentStatus, DocumentType
+from .models import (
+    Document, DocumentContent, TaxReturn, ProcessingJob, ExtractionCacheEntry,
+    DocumentStatus, DocumentType, JobStatus
+)
 from ..database.database import Base
 
-__all__ = ["Document", "TaxReturn", "DocumentStatus", "DocumentType", "Base"]
\ No newline at end of file
+__all__ = [
+    "Document", "DocumentContent", "TaxReturn", "ProcessingJob", "ExtractionCacheEntry",
+    "DocumentStatus", "DocumentType", "JobStatus", "Base"
+]
\ No newline at end of file
@@ -1,5 +1,13 @@
-from sqlalchemy import Column, Integer, String, DateTime, Float, Text, Boolean, JSON
+import zlib
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+from sqlalchemy import (
+    BigInteger, Column, Integer, String, Date, DateTime, Float, Text, Boolean, JSON, ForeignKey, Index, LargeBinary
+)
+from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
+from sqlalchemy.types import TypeDecorator
 from enum import Enum as PyEnum
 
 from ..database.database import Base
@@ -20,8 +28,54 @@ class DocumentType(PyEnum):
     OTHER = "other"
 
 
+class JobStatus(PyEnum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class CompressedText(TypeDecorator):
+    """Text stored zlib-compressed; OCR output typically shrinks 3-5x"""
+    impl = LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return None if value is None else zlib.compress(value.encode("utf-8"), 6)
+
+    def process_result_value(self, value, dialect):
+        return None if value is None else zlib.decompress(value).decode("utf-8")
+
+
+class Cents(TypeDecorator):
+    """Dollar amounts stored exactly as whole cents in an integer column
+
+    Python sees float dollars; bound values, including the right-hand side of
+    ``column + amount`` increments, are rounded to the cent before storing,
+    so running totals never accumulate binary-fraction error.
+    """
+    impl = BigInteger
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return None if value is None else round(value * 100)
+
+    def process_result_value(self, value, dialect):
+        return None if value is None else value / 100
+
+
 class Document(Base):
     __tablename__ = "documents"
+    __table_args__ = (
+        # Keyset pagination of listings, optionally filtered by status or type
+        Index("ix_documents_created_at_id", "created_at", "id"),
+        Index("ix_documents_status_created_at_id", "status", "created_at", "id"),
+        Index("ix_documents_type_created_at_id", "document_type", "created_at", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     filename = Column(String, nullable=False)
@@ -29,51 +83,174 @@ class Document(Base):
     file_path = Column(String, nullable=False)
     file_size = Column(Integer, nullable=False)
     content_type = Column(String, nullable=False)
+    content_hash = Column(String(64), nullable=True, index=True)  # SHA-256 of file content
     
     # Processing status
     status = Column(String, default=DocumentStatus.PENDING.value)
     document_type = Column(String, nullable=True)
+    classification_confidence = Column(Float, nullable=True)  # 0-1
     
-    # OCR and extracted data
-    ocr_text = Column(Text, nullable=True)
-    extracted_data = Column(JSON, nullable=True)  # Structured data from document
+    # Bulk upload the document arrived in
+    batch_id = Column(Integer, ForeignKey("upload_batches.id"), nullable=True, index=True)
+    
+    # Tax return the document's amounts are counted in
+    tax_return_id = Column(Integer, ForeignKey("tax_returns.id"), nullable=True, index=True)
+    # Amounts this document currently adds to that return's running totals
+    return_contribution = Column(JSON, nullable=True)
     
     # Timestamps
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Set client-side at full precision so listing cursors compare exactly on every backend
+    created_at = Column(DateTime(timezone=True), default=_utcnow, server_default=func.now(), nullable=False)
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     processed_at = Column(DateTime(timezone=True), nullable=True)
+    
+    # OCR text and extracted data live in document_contents, off the rows every
+    # listing and status poll reads. Loaded on first access; async sessions
+    # cannot lazy-load, so they load it up front with selectinload(Document.content)
+    content = relationship(
+        "DocumentContent", uselist=False, cascade="all, delete-orphan", passive_deletes=True
+    )
+    
+    def _writable_content(self) -> "DocumentContent":
+        if self.content is None:
+            self.content = DocumentContent()
+        return self.content
+    
+    @property
+    def ocr_text(self) -> Optional[str]:
+        return self.content.ocr_text if self.content is not None else None
+    
+    @ocr_text.setter
+    def ocr_text(self, value: Optional[str]):
+        self._writable_content().ocr_text = value
+    
+    @property
+    def extracted_data(self) -> Optional[Dict[str, Any]]:
+        return self.content.extracted_data if self.content is not None else None
+    
+    @extracted_data.setter
+    def extracted_data(self, value: Optional[Dict[str, Any]]):
+        self._writable_content().extracted_data = value
+
+
+class UploadBatch(Base):
+    __tablename__ = "upload_batches"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    document_count = Column(Integer, nullable=False, default=0)
+    rejected = Column(JSON, nullable=True)  # [{'filename', 'error'}] for files left out of the batch
+    created_at = Column(DateTime(timezone=True), default=_utcnow, server_default=func.now(), nullable=False)
+
+
+class DocumentContent(Base):
+    __tablename__ = "document_contents"
+    
+    document_id = Column(Integer, ForeignKey("documents.id", ondelete="CASCADE"), primary_key=True)
+    ocr_text = Column(CompressedText, nullable=True)
+    extracted_data = Column(JSON, nullable=True)  # Structured data from document
+
+
+class BankTransaction(Base):
+    __tablename__ = "bank_transactions"
+    __table_args__ = (
+        # Statement order within a document, and date-range lookups
+        Index("ix_bank_transactions_document_row", "document_id", "row_number", unique=True),
+        Index("ix_bank_transactions_document_date", "document_id", "transaction_date"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    document_id = Column(Integer, ForeignKey("documents.id"), nullable=False)
+    row_number = Column(Integer, nullable=False)  # Position in the statement, from 0
+    page = Column(Integer, nullable=True)  # Unknown when parsed from OCR text
+    
+    transaction_date = Column(Date, nullable=True)
+    description = Column(Text, nullable=False, default="")
+    debit = Column("debit_cents", Cents, nullable=True)
+    credit = Column("credit_cents", Cents, nullable=True)
+    balance = Column("balance_cents", Cents, nullable=True)
+
+
+class ProcessingJob(Base):
+    __tablename__ = "processing_jobs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    document_id = Column(Integer, ForeignKey("documents.id"), nullable=False, index=True)
+    
+    # Queue state
+    status = Column(String, default=JobStatus.QUEUED.value, index=True)
+    attempts = Column(Integer, default=0)
+    max_attempts = Column(Integer, default=3)
+    next_run_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+    last_error = Column(Text, nullable=True)
+    
+    # Timestamps
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+
+class ExtractionCacheEntry(Base):
+    __tablename__ = "extraction_cache"
+    
+    # Keyed by file content and the processor version that produced the result
+    content_hash = Column(String(64), primary_key=True)
+    processor_version = Column(String, primary_key=True)
+    
+    # Cached processing output
+    ocr_text = Column(CompressedText, nullable=True)
+    document_type = Column(String, nullable=True)
+    classification_confidence = Column(Float, nullable=True)
+    extracted_data = Column(JSON, nullable=True)
+    
+    # LRU bookkeeping
+    hit_count = Column(Integer, default=0)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    last_used_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
 
 
 class TaxReturn(Base):
     __tablename__ = "tax_returns"
+    # Amounts are float dollars in Python and whole cents (``*_cents`` columns) in the database
     
     id = Column(Integer, primary_key=True, index=True)
     tax_year = Column(String, default="2024-25")
     
     # Income
-    total_income = Column(Float, default=0.0)
-    employment_income = Column(Float, default=0.0)
-    investment_income = Column(Float, default=0.0)
-    business_income = Column(Float, default=0.0)
+    total_income = Column("total_income_cents", Cents, default=0.0)
+    employment_income = Column("employment_income_cents", Cents, default=0.0)
+    investment_income = Column("investment_income_cents", Cents, default=0.0)
+    business_income = Column("business_income_cents", Cents, default=0.0)
     
     # Deductions
-    total_deductions = Column(Float, default=0.0)
-    work_related_expenses = Column(Float, default=0.0)
-    work_from_home_deduction = Column(Float, default=0.0)
+    total_deductions = Column("total_deductions_cents", Cents, default=0.0)
+    work_related_expenses = Column("work_related_expenses_cents", Cents, default=0.0)
+    work_from_home_deduction = Column("work_from_home_deduction_cents", Cents, default=0.0)
+    
+    # Running totals from linked documents, added to the typed-in amounts above:
+    # PAYG gross payments, PAYG tax withheld and receipt totals
+    documented_employment_income = Column(
+        "documented_employment_income_cents", Cents, default=0.0, server_default="0", nullable=False
+    )
+    documented_tax_withheld = Column(
+        "documented_tax_withheld_cents", Cents, default=0.0, server_default="0", nullable=False
+    )
+    documented_deductions = Column(
+        "documented_deductions_cents", Cents, default=0.0, server_default="0", nullable=False
+    )
     
     # Tax calculations
-    taxable_income = Column(Float, default=0.0)
-    income_tax = Column(Float, default=0.0)
-    medicare_levy = Column(Float, default=0.0)
+    taxable_income = Column("taxable_income_cents", Cents, default=0.0)
+    income_tax = Column("income_tax_cents", Cents, default=0.0)
+    medicare_levy = Column("medicare_levy_cents", Cents, default=0.0)
     
     # Offsets
-    low_income_tax_offset = Column(Float, default=0.0)
-    small_business_offset = Column(Float, default=0.0)
+    low_income_tax_offset = Column("low_income_tax_offset_cents", Cents, default=0.0)
+    small_business_offset = Column("small_business_offset_cents", Cents, default=0.0)
     
     # Final calculations
-    total_tax = Column(Float, default=0.0)
-    tax_paid = Column(Float, default=0.0)
-    refund_or_amount_owed = Column(Float, default=0.0)
+    total_tax = Column("total_tax_cents", Cents, default=0.0)
+    tax_paid = Column("tax_paid_cents", Cents, default=0.0)
+    refund_or_amount_owed = Column("refund_or_amount_owed_cents", Cents, default=0.0)
     
     # Status
     is_completed = Column(Boolean, default=False)
@@ -1,11 +1,17 @@
 from .schemas import (
     DocumentBase, DocumentCreate, DocumentResponse,
+    DocumentUploadResponse, ProcessingJobResponse, DocumentStatusResponse,
+    BankTransactionResponse, ExtractionCacheStats, EstimateCacheStats,
     TaxReturnBase, TaxReturnCreate, TaxReturnUpdate, TaxReturnResponse,
-    WorkFromHomeCalculation, WorkFromHomeResponse
+    WorkFromHomeCalculation, WorkFromHomeResponse,
+    BatchTaxCalculationRequest, BatchTaxCalculationResponse
 )
 
 __all__ = [
     "DocumentBase", "DocumentCreate", "DocumentResponse",
+    "DocumentUploadResponse", "ProcessingJobResponse", "DocumentStatusResponse",
+    "BankTransactionResponse", "ExtractionCacheStats", "EstimateCacheStats",
     "TaxReturnBase", "TaxReturnCreate", "TaxReturnUpdate", "TaxReturnResponse", 
-    "WorkFromHomeCalculation", "WorkFromHomeResponse"
+    "WorkFromHomeCalculation", "WorkFromHomeResponse",
+    "BatchTaxCalculationRequest", "BatchTaxCalculationResponse"
 ]
\ No newline at end of file
@@ -1,5 +1,5 @@
-from datetime import datetime
-from typing import Optional, Dict, Any
+from datetime import date, datetime
+from typing import Optional, Dict, Any, List
 from pydantic import BaseModel
 
 
@@ -16,8 +16,12 @@ class DocumentResponse(DocumentBase):
     id: int
     original_filename: str
     file_size: int
+    content_hash: Optional[str] = None
     status: str
     document_type: Optional[str] = None
+    classification_confidence: Optional[float] = None
+    tax_return_id: Optional[int] = None
+    batch_id: Optional[int] = None
     ocr_text: Optional[str] = None
     extracted_data: Optional[Dict[str, Any]] = None
     created_at: datetime
@@ -28,6 +32,85 @@ class DocumentResponse(DocumentBase):
         from_attributes = True
 
 
+class DocumentUploadResponse(DocumentResponse):
+    job_id: Optional[int] = None  # None when served from the extraction cache
+    cached: bool = False
+
+
+class RejectedUpload(BaseModel):
+    filename: str
+    error: str
+
+
+class UploadBatchResponse(BaseModel):
+    id: int
+    created_at: datetime
+    document_count: int
+    rejected: List[RejectedUpload] = []  # Files left out of the batch, with why
+    status_counts: Dict[str, int]  # Documents per status
+    progress: float  # Fraction of the documents completed or failed
+    finished: bool
+
+
+class UploadBatchCreatedResponse(UploadBatchResponse):
+    documents: List[DocumentUploadResponse]
+
+
+class ExtractionCacheStats(BaseModel):
+    hits: int
+    misses: int
+    hit_rate: float
+    evictions: int
+    entries: int
+    max_entries: int
+    processor_version: str
+
+
+class EstimateCacheStats(BaseModel):
+    hits: int
+    misses: int
+    hit_rate: float
+    evictions: int
+    entries: int
+    max_entries: int
+
+
+class ProcessingJobResponse(BaseModel):
+    id: int
+    status: str
+    attempts: int
+    max_attempts: int
+    next_run_at: Optional[datetime] = None
+    last_error: Optional[str] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    
+    class Config:
+        from_attributes = True
+
+
+class DocumentStatusResponse(BaseModel):
+    document_id: int
+    status: str
+    document_type: Optional[str] = None
+    classification_confidence: Optional[float] = None
+    processed_at: Optional[datetime] = None
+    job: Optional[ProcessingJobResponse] = None
+
+
+class BankTransactionResponse(BaseModel):
+    row_number: int
+    page: Optional[int] = None
+    transaction_date: Optional[date] = None
+    description: str
+    debit: Optional[float] = None
+    credit: Optional[float] = None
+    balance: Optional[float] = None
+    
+    class Config:
+        from_attributes = True
+
+
 class TaxReturnBase(BaseModel):
     tax_year: str = "2024-25"
 
@@ -60,6 +143,11 @@ class TaxReturnResponse(TaxReturnBase):
     work_related_expenses: float
     work_from_home_deduction: float
     
+    # Running totals from linked documents
+    documented_employment_income: float
+    documented_tax_withheld: float
+    documented_deductions: float
+    
     # Tax calculations
     taxable_income: float
     income_tax: float
@@ -93,4 +181,48 @@ class WorkFromHomeCalculation(BaseModel):
 class WorkFromHomeResponse(BaseModel):
     hours_worked: float
     rate_per_hour: float
-    total_deduction: float
\ No newline at end of file
+    total_deduction: float
+
+
+class BatchTaxCalculationRequest(BaseModel):
+    # Column arrays with one value per return, keyed like /calculate's dicts
+    income_data: Dict[str, List[float]]
+    deduction_data: Dict[str, List[float]] = {}
+
+
+class BatchTaxCalculationResponse(BaseModel):
+    success: bool
+    count: int
+    data: Dict[str, List[float]]
+    error: Optional[str] = None
+
+class SweepVariableRequest(BaseModel):
+    # An income or deduction field, or salary_sacrifice; amounts are added to the base return's
+    field: str
+    start: float = 0.0
+    stop: float
+    step: float = 100.0
+
+
+class WhatIfRequest(BaseModel):
+    income_data: Dict[str, float] = {}
+    deduction_data: Dict[str, float] = {}
+    tax_return_id: Optional[int] = None  # Start from a stored return's inputs instead
+    sweep: List[SweepVariableRequest]
+
+
+class BreakEvenPoint(BaseModel):
+    value: float
+    marginal_rate_before: float  # Tax change per extra dollar of the variable
+    marginal_rate_after: float
+
+
+class WhatIfResponse(BaseModel):
+    success: bool
+    tax_year: str
+    base: Dict[str, float]
+    values: Dict[str, List[float]]  # Swept amounts per variable
+    data: Dict[str, List[Any]]  # Per field, a list for one variable or rows for two
+    marginal_rates: Dict[str, List[Any]]
+    break_even_points: Dict[str, List[BreakEvenPoint]]
+    error: Optional[str] = None
\ No newline at end of file
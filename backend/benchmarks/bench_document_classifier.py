@@ -0,0 +1,113 @@
+"""
+Accuracy and throughput of document classification
+
+Scores the original first-match keyword classifier and the weighted
+single-scan classifier against the hand-labelled corpus in
+benchmarks/data/classification_corpus.jsonl, then times both on the corpus
+and on long synthetic texts, where the old classifier's cost grows with the
+length it has to scan and the new one's is capped at classifier_max_chars.
+
+Run from the backend directory:
+    python -m benchmarks.bench_document_classifier
+"""
+
+import json
+import os
+import random
+import timeit
+from collections import Counter
+from typing import Callable, Dict, List
+
+from app.core.document_classifier import document_classifier
+from app.models.models import DocumentType
+
+CORPUS_PATH = os.path.join(os.path.dirname(__file__), "data", "classification_corpus.jsonl")
+
+
+# Original implementation, kept as the "before" baseline
+def legacy_classify(text: str, filename: str) -> DocumentType:
+    text_lower = text.lower()
+    filename_lower = filename.lower()
+    payg_indicators = ["payment summary", "payg", "group certificate", "employer",
+                       "gross payments", "tax withheld", "abn", "tfn"]
+    receipt_indicators = ["receipt", "invoice", "tax invoice", "gst", "abn",
+                          "amount paid", "total", "purchase", "sale"]
+    bank_indicators = ["bank statement", "account statement", "transaction",
+                       "balance", "deposit", "withdrawal", "interest"]
+    if any(indicator in text_lower for indicator in payg_indicators):
+        return DocumentType.PAYG_SUMMARY
+    if any(indicator in text_lower for indicator in receipt_indicators):
+        return DocumentType.RECEIPT
+    if any(indicator in text_lower for indicator in bank_indicators):
+        return DocumentType.BANK_STATEMENT
+    if any(term in filename_lower for term in ["payg", "payment", "summary"]):
+        return DocumentType.PAYG_SUMMARY
+    if any(term in filename_lower for term in ["receipt", "invoice"]):
+        return DocumentType.RECEIPT
+    if any(term in filename_lower for term in ["statement", "bank"]):
+        return DocumentType.BANK_STATEMENT
+    return DocumentType.OTHER
+
+
+def classify(text: str, filename: str) -> DocumentType:
+    return document_classifier.classify(text, filename).document_type
+
+
+def load_corpus(path: str = CORPUS_PATH) -> List[Dict[str, str]]:
+    with open(path) as corpus:
+        return [json.loads(line) for line in corpus if line.strip()]
+
+
+def long_statement(rng: random.Random, rows: int) -> str:
+    """A multi-page statement whose only strong indicators are on the first page"""
+    lines = ["Account statement", "Statement period 01/07/2023 to 30/06/2024",
+             "Date Description Debit Credit Balance"]
+    for row in range(rows):
+        lines.append(f"{row % 28 + 1:02d}/07 Card purchase store {rng.randint(1, 999)} "
+                     f"{rng.uniform(1, 200):.2f} {rng.uniform(100, 5000):,.2f}")
+    return "\n".join(lines)
+
+
+def long_letter(rng: random.Random, words: int) -> str:
+    """Long text with no indicators at all, which the first-match classifier scans in full"""
+    vocabulary = "the of and to we our you your please find enclosed regarding meeting project review".split()
+    return " ".join(rng.choice(vocabulary) for _ in range(words))
+
+
+def accuracy(classifier: Callable[[str, str], DocumentType], corpus: List[Dict[str, str]]) -> Dict[str, object]:
+    confusion: Counter = Counter()
+    for sample in corpus:
+        confusion[(sample['label'], classifier(sample['text'], sample['filename']).value)] += 1
+    correct = sum(count for (label, predicted), count in confusion.items() if label == predicted)
+    return {
+        'accuracy': round(correct / len(corpus), 3),
+        'errors': {f"{label} -> {predicted}": count
+                   for (label, predicted), count in sorted(confusion.items()) if label != predicted},
+    }
+
+
+def mb_per_s(classifier: Callable[[str, str], DocumentType], samples: List[Dict[str, str]], repeat: int = 5) -> float:
+    size = sum(len(sample['text']) for sample in samples) / 1e6
+    timer = timeit.Timer(lambda: [classifier(sample['text'], sample['filename']) for sample in samples])
+    number = max(1, int(2e6 / max(1, size * 1e6)))  # At least ~2MB of text per timing
+    return size * number / min(timer.repeat(repeat=repeat, number=number))
+
+
+def run(seed: int = 2024) -> Dict[str, object]:
+    corpus = load_corpus()
+    rng = random.Random(seed)
+    statements = [{'text': long_statement(rng, 20000), 'filename': "statement.pdf"} for _ in range(3)]
+    letters = [{'text': long_letter(rng, 200000), 'filename': "letter.pdf"} for _ in range(3)]
+    results = {'corpus_size': len(corpus)}
+    for name, classifier in (('before', legacy_classify), ('after', classify)):
+        results[name] = {
+            **accuracy(classifier, corpus),
+            'corpus_mb_s': round(mb_per_s(classifier, corpus), 1),
+            'long_statement_mb_s': round(mb_per_s(classifier, statements), 1),
+            'long_unclassifiable_mb_s': round(mb_per_s(classifier, letters), 1),
+        }
+    return results
+
+
+if __name__ == "__main__":
+    print(json.dumps(run(), indent=2))
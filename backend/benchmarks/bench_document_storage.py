@@ -0,0 +1,179 @@
+"""
+documents table size and listing latency with OCR text inline vs in document_contents
+
+Builds a SQLite database in the old layout (ocr_text and extracted_data on
+every documents row) filled with receipts, PAYG summaries and multi-page
+statements, measures it, runs the migration that moves those columns to the
+compressed document_contents table, and measures again:
+
+- file size, and bytes in the documents table itself (from dbstat)
+- a listing page (summary columns, status filter, keyset cursor), on a cold
+  connection (empty SQLite page cache) and a warm one
+- a status poll by id
+
+Run from the backend directory:
+    python -m benchmarks.bench_document_storage [--documents 5000]
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List
+
+from sqlalchemy import JSON, Column, MetaData, Table, Text, create_engine, func, insert, select, text, tuple_
+from sqlalchemy.pool import NullPool
+
+from app.database.migrations import upgrade_database
+from app.models.models import Document, DocumentContent, TaxReturn, UploadBatch
+
+SUMMARY_NAMES = list(Document.__table__.columns.keys())
+WORDS = ("card purchase transfer deposit withdrawal woolworths coles bp opal salary "
+         "rent interest fee eftpos ref invoice gst total balance").split()
+
+
+def ocr_text(rng: random.Random, kind: str) -> str:
+    lines = {'receipt': rng.randint(20, 60), 'payg': 40, 'statement': rng.randint(400, 2000)}[kind]
+    return "\n".join(
+        f"{rng.randint(1, 28):02d}/{rng.randint(1, 12):02d} "
+        + " ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 6)))
+        + f" {rng.uniform(1, 5000):,.2f} {rng.uniform(100, 90000):,.2f}"
+        for _ in range(lines)
+    )
+
+
+def build_legacy_database(path: str, count: int, seed: int):
+    engine = create_engine(f"sqlite:///{path}")
+    legacy_metadata = MetaData()
+    TaxReturn.__table__.to_metadata(legacy_metadata)
+    UploadBatch.__table__.to_metadata(legacy_metadata)
+    legacy = Document.__table__.to_metadata(legacy_metadata)
+    legacy.append_column(Column("ocr_text", Text))
+    legacy.append_column(Column("extracted_data", JSON))
+    legacy_metadata.create_all(engine)
+
+    rng = random.Random(seed)
+    started = datetime(2024, 7, 1, tzinfo=timezone.utc)
+    rows = []
+    for number in range(count):
+        kind = rng.choices(['receipt', 'payg', 'statement'], weights=[6, 2, 2])[0]
+        processed = rng.random() < 0.9
+        row = {
+            'filename': f"{number}.pdf", 'original_filename': f"{kind}_{number}.pdf",
+            'file_path': f"./uploads/{number}.pdf", 'file_size': rng.randint(20000, 4000000),
+            'content_type': "application/pdf", 'content_hash': f"{number:064x}",
+            'status': "completed" if processed else "pending",
+            'document_type': kind if processed else None,
+            'classification_confidence': rng.random() if processed else None,
+            'created_at': started + timedelta(seconds=number * 37),
+            'ocr_text': ocr_text(rng, kind) if processed else None,
+            'extracted_data': {'total_amount': round(rng.uniform(1, 900), 2), 'date': "01/07/2024"}
+            if processed else None,
+        }
+        rows.append(row)
+        if len(rows) == 500:
+            with engine.begin() as connection:
+                connection.execute(insert(legacy), rows)
+            rows = []
+    if rows:
+        with engine.begin() as connection:
+            connection.execute(insert(legacy), rows)
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        connection.execute(text("VACUUM"))
+    engine.dispose()
+
+
+def measure(path: str, count: int, seed: int, repeat: int = 200) -> Dict[str, Any]:
+    engine = create_engine(f"sqlite:///{path}", poolclass=NullPool)
+    documents = Table("documents", MetaData(), autoload_with=engine)
+    summary = [documents.c[name] for name in SUMMARY_NAMES]
+    with engine.connect() as connection:
+        table_bytes = connection.execute(
+            text("SELECT SUM(pgsize) FROM dbstat WHERE name = 'documents'")
+        ).scalar()
+        cursors = connection.execute(
+            select(documents.c.created_at, documents.c.id).order_by(documents.c.created_at, documents.c.id)
+        ).all()
+
+    rng = random.Random(seed)
+
+    def list_page(connection, cursor):
+        return connection.execute(
+            select(*summary)
+            .where(documents.c.status == "completed")
+            .where(tuple_(documents.c.created_at, documents.c.id) > tuple_(*cursor))
+            .order_by(documents.c.created_at, documents.c.id)
+            .limit(100)
+        ).all()
+
+    def status_poll(connection, cursor):
+        return connection.execute(
+            select(documents.c.id, documents.c.status, documents.c.document_type,
+                   documents.c.classification_confidence, documents.c.processed_at)
+            .where(documents.c.id == cursor[1])
+        ).all()
+
+    def timed(query, cold: bool) -> List[float]:
+        samples = []
+        with engine.connect() as warm_connection:
+            for _ in range(repeat):
+                cursor = rng.choice(cursors)
+                if cold:
+                    with engine.connect() as connection:
+                        started = time.perf_counter()
+                        query(connection, cursor)
+                else:
+                    started = time.perf_counter()
+                    query(warm_connection, cursor)
+                samples.append(time.perf_counter() - started)
+        return samples
+
+    def ms(samples: List[float]) -> Dict[str, float]:
+        ordered = sorted(samples)
+        return {'p50_ms': round(statistics.median(ordered) * 1000, 3),
+                'p95_ms': round(ordered[int(len(ordered) * 0.95) - 1] * 1000, 3)}
+
+    results = {
+        'file_mb': round(os.path.getsize(path) / 1e6, 1),
+        'documents_table_mb': round(table_bytes / 1e6, 2),
+        'list_page_cold': ms(timed(list_page, cold=True)),
+        'list_page_warm': ms(timed(list_page, cold=False)),
+        'status_poll_cold': ms(timed(status_poll, cold=True)),
+    }
+    engine.dispose()
+    return results
+
+
+def run(count: int, seed: int = 2024) -> Dict[str, Any]:
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "documents.db")
+        build_legacy_database(path, count, seed)
+        before = measure(path, count, seed)
+
+        engine = create_engine(f"sqlite:///{path}")
+        started = time.perf_counter()
+        upgrade_database(engine)
+        migration_s = time.perf_counter() - started
+        with engine.connect() as connection:
+            moved = connection.execute(select(func.count()).select_from(DocumentContent.__table__)).scalar()
+        engine.dispose()
+
+        after = measure(path, count, seed)
+    return {
+        'documents': count,
+        'migrated_rows': moved,
+        'migration_s': round(migration_s, 2),
+        'before': before,
+        'after': after,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--documents", type=int, default=5000)
+    args = parser.parse_args()
+    print(json.dumps(run(args.documents), indent=2))
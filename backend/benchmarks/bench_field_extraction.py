@@ -0,0 +1,190 @@
+"""
+Throughput of structured field extraction over synthetic OCR text
+
+Generates PAYG summaries, receipts and bank statements (short single-page
+documents and long multi-page ones whose fields sit at the end or are
+missing), checks the compiled extraction profiles give the same fields as
+the original per-field re.search implementation, and reports MB/s for both.
+
+Run from the backend directory:
+    python -m benchmarks.bench_field_extraction
+"""
+
+import random
+import re
+import timeit
+from functools import partial
+from typing import Any, Callable, Dict, List
+
+from app.core.field_extraction import extract_fields
+from app.models.models import DocumentType
+
+FILLER_WORDS = (
+    "the of and to in for on at with from payment transfer store item coffee "
+    "lunch fuel office supplies travel employee period reference description "
+    "Date Amount Balance Credit Debit Details"
+).split()
+
+
+# Original implementation, kept as the "before" baseline
+def _legacy_amount(pattern: str, text: str):
+    match = re.search(pattern, text, re.IGNORECASE)
+    if match:
+        try:
+            return float(match.group(1).replace(',', ''))
+        except ValueError:
+            return None
+    return None
+
+
+def legacy_payg(text: str) -> Dict[str, Any]:
+    data = {}
+    for field, pattern in (('gross_payments', r'gross\s+payments?\s*:?\s*\$?([\d,]+\.?\d*)'),
+                           ('tax_withheld', r'tax\s+withheld\s*:?\s*\$?([\d,]+\.?\d*)')):
+        value = _legacy_amount(pattern, text)
+        if value is not None:
+            data[field] = value
+    tfn_match = re.search(r'tfn\s*:?\s*(\d{3}\s*\d{3}\s*\d{3})', text, re.IGNORECASE)
+    if tfn_match:
+        data['tfn'] = tfn_match.group(1).replace(' ', '')
+    abn_match = re.search(r'abn\s*:?\s*(\d{2}\s*\d{3}\s*\d{3}\s*\d{3})', text, re.IGNORECASE)
+    if abn_match:
+        data['abn'] = abn_match.group(1).replace(' ', '')
+    return data
+
+
+def legacy_receipt(text: str) -> Dict[str, Any]:
+    data = {}
+    for pattern in (r'total\s*:?\s*\$?([\d,]+\.?\d*)', r'amount\s*:?\s*\$?([\d,]+\.?\d*)',
+                    r'grand\s+total\s*:?\s*\$?([\d,]+\.?\d*)'):
+        value = _legacy_amount(pattern, text)
+        if value is not None:
+            data['total_amount'] = value
+            break
+    value = _legacy_amount(r'gst\s*:?\s*\$?([\d,]+\.?\d*)', text)
+    if value is not None:
+        data['gst_amount'] = value
+    for pattern in (r'(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})', r'(\d{1,2}\s+\w+\s+\d{2,4})'):
+        match = re.search(pattern, text)
+        if match:
+            data['date'] = match.group(1)
+            break
+    return data
+
+
+def legacy_bank_statement(text: str) -> Dict[str, Any]:
+    data = {}
+    account_match = re.search(r'account\s+(?:number\s*:?\s*)?(\d{6,})', text, re.IGNORECASE)
+    if account_match:
+        data['account_number'] = account_match.group(1)
+    period_match = re.search(
+        r'statement\s+period\s*:?\s*(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})\s*(?:to|-)?\s*(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})',
+        text, re.IGNORECASE
+    )
+    if period_match:
+        data['period_start'] = period_match.group(1)
+        data['period_end'] = period_match.group(2)
+    for pattern in (r'closing\s+balance\s*:?\s*\$?([\d,]+\.?\d*)', r'final\s+balance\s*:?\s*\$?([\d,]+\.?\d*)'):
+        value = _legacy_amount(pattern, text)
+        if value is not None:
+            data['closing_balance'] = value
+            break
+    return data
+
+
+LEGACY = {
+    DocumentType.PAYG_SUMMARY: legacy_payg,
+    DocumentType.RECEIPT: legacy_receipt,
+    DocumentType.BANK_STATEMENT: legacy_bank_statement,
+}
+
+
+def filler(rng: random.Random, words: int) -> str:
+    lines = []
+    for _ in range(max(1, words // 10)):
+        line = " ".join(rng.choice(FILLER_WORDS) for _ in range(10))
+        if rng.random() < 0.3:
+            line += f" {rng.uniform(1, 5000):,.2f}"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def money(rng: random.Random, high: float) -> str:
+    return f"${rng.uniform(1, high):,.2f}"
+
+
+def payg_summary(rng: random.Random, filler_words: int) -> str:
+    fields = (
+        f"PAYG PAYMENT SUMMARY - INDIVIDUAL NON-BUSINESS\n"
+        f"Payee TFN: {rng.randint(100, 999)} {rng.randint(100, 999)} {rng.randint(100, 999)}\n"
+        f"Payer ABN: {rng.randint(10, 99)} {rng.randint(100, 999)} {rng.randint(100, 999)} {rng.randint(100, 999)}\n"
+        f"Gross payments: {money(rng, 200000)}\nTotal tax withheld: {money(rng, 60000)}\n"
+    )
+    return filler(rng, filler_words) + "\n" + fields
+
+
+def receipt(rng: random.Random, filler_words: int) -> str:
+    day, month = rng.randint(1, 28), rng.randint(1, 12)
+    return (
+        f"TAX INVOICE\nOfficeworks\n{day:02d}/{month:02d}/2024\n"
+        + filler(rng, filler_words)
+        + f"\nGST: {money(rng, 100)}\nTOTAL: {money(rng, 1000)}\n"
+    )
+
+
+def bank_statement(rng: random.Random, filler_words: int) -> str:
+    header = (
+        f"ACCOUNT STATEMENT\nAccount number: {rng.randint(10**7, 10**9)}\n"
+        f"Statement period: 01/07/2024 to 31/12/2024\n"
+    )
+    footer = f"\nClosing balance: {money(rng, 50000)}\n" if rng.random() < 0.8 else "\n"
+    return header + filler(rng, filler_words) + footer
+
+
+GENERATORS = {
+    DocumentType.PAYG_SUMMARY: payg_summary,
+    DocumentType.RECEIPT: receipt,
+    DocumentType.BANK_STATEMENT: bank_statement,
+}
+
+
+def corpus(
+    generator: Callable[[random.Random, int], str],
+    documents: int,
+    filler_words: int,
+    seed: int
+) -> List[str]:
+    rng = random.Random(seed)
+    return [generator(rng, filler_words) for _ in range(documents)]
+
+
+def mb_per_s(function: Callable[[str], Any], texts: List[str], repeat: int = 5) -> float:
+    size = sum(len(text) for text in texts) / 1e6
+    timer = timeit.Timer(lambda: [function(text) for text in texts])
+    return size / min(timer.repeat(repeat=repeat, number=1))
+
+
+def run(seed: int = 2024) -> Dict[str, Dict[str, float]]:
+    # (documents, filler words per document): one-page scans and long multi-page OCR output
+    shapes = {'short': (2000, 60), 'long': (20, 40000)}
+    results = {}
+    for document_type, generator in GENERATORS.items():
+        legacy = LEGACY[document_type]
+        after = partial(extract_fields, document_type=document_type)
+        for shape, (documents, filler_words) in shapes.items():
+            texts = corpus(generator, documents, filler_words, seed)
+            mismatches = sum(legacy(text) != after(text) for text in texts)
+            if mismatches:
+                raise AssertionError(f"{mismatches} {document_type.value} documents extract differently")
+            results[f"{document_type.value} ({shape})"] = {
+                'before_mb_s': round(mb_per_s(legacy, texts), 1),
+                'after_mb_s': round(mb_per_s(after, texts), 1),
+            }
+    return results
+
+
+if __name__ == "__main__":
+    print(f"{'corpus':<26}{'before (MB/s)':>15}{'after (MB/s)':>15}{'speedup':>10}")
+    for name, timing in run().items():
+        speedup = timing['after_mb_s'] / timing['before_mb_s']
+        print(f"{name:<26}{timing['before_mb_s']:>15.1f}{timing['after_mb_s']:>15.1f}{speedup:>9.2f}x")
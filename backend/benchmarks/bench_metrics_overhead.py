@@ -0,0 +1,78 @@
+"""
+Cost of the instrumentation on the request path
+
+Calls a minimal ASGI app directly, with and without MetricsMiddleware, so
+the difference is the middleware alone (timing, the SQL-count context and
+two histogram observations), and times a trivial SQLite query on an engine
+with and without the statement-counting listener.
+
+Run from the backend directory:
+    python -m benchmarks.bench_metrics_overhead [--requests 20000]
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from typing import Any, Dict
+
+from sqlalchemy import create_engine, text
+
+from app.core.metrics import MetricsMiddleware, count_queries
+
+
+class Route:
+    path = "/api/documents/{document_id}"
+
+
+async def endpoint(scope, receive, send):
+    scope["route"] = Route
+    await send({"type": "http.response.start", "status": 200,
+                "headers": [(b"content-type", b"application/json")]})
+    await send({"type": "http.response.body", "body": b"{}"})
+
+
+async def time_requests(app, count: int) -> float:
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        pass
+
+    started = time.perf_counter()
+    for _ in range(count):
+        await app({"type": "http", "method": "GET", "path": "/api/documents/1"}, receive, send)
+    return (time.perf_counter() - started) / count
+
+
+def time_queries(count_statements: bool, count: int) -> float:
+    engine = create_engine("sqlite://")
+    if count_statements:
+        count_queries([engine])
+    with engine.connect() as connection:
+        started = time.perf_counter()
+        for _ in range(count):
+            connection.execute(text("SELECT 1")).scalar()
+        elapsed = time.perf_counter() - started
+    engine.dispose()
+    return elapsed / count
+
+
+def run(count: int) -> Dict[str, Any]:
+    bare = asyncio.run(time_requests(endpoint, count))
+    instrumented = asyncio.run(time_requests(MetricsMiddleware(endpoint), count))
+    query = time_queries(False, count)
+    counted_query = time_queries(True, count)
+    return {
+        'requests': count,
+        'middleware_overhead_us': round((instrumented - bare) * 1e6, 2),
+        'query_us': round(query * 1e6, 2),
+        'query_counting_overhead_us': round((counted_query - query) * 1e6, 2),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=20000)
+    args = parser.parse_args()
+    print(json.dumps(run(args.requests), indent=2))
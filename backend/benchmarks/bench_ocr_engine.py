@@ -0,0 +1,84 @@
+"""
+Per-image OCR latency: a tesseract process per image vs a long-lived engine
+
+Renders small receipt images (the case where process start-up and
+language-data loading dominate) and times reading each one through
+pytesseract, which runs the tesseract binary per image, and through an
+engine pool holding an initialised tesserocr engine. Pool warm-up is timed
+separately, since workers pay it once at start-up. Engines that are not
+installed are reported as skipped.
+
+Run from the backend directory:
+    python -m benchmarks.bench_ocr_engine [--count 20]
+"""
+
+import argparse
+import json
+import random
+import statistics
+import time
+from typing import Any, Dict, List
+
+from PIL import Image, ImageDraw, ImageFont
+
+from app.core import ocr_engine
+from app.core.image_preprocessing import PreprocessOptions
+from app.core.ocr_engine import OcrEnginePool, SubprocessEngine, TesserocrEngine
+
+
+def receipt_images(count: int, seed: int) -> List[Image.Image]:
+    rng = random.Random(seed)
+    font = ImageFont.load_default(size=24)
+    images = []
+    for _ in range(count):
+        lines = ["TAX INVOICE", "CORNER CAFE", *(f"ITEM {n}  {rng.uniform(2, 20):.2f}" for n in range(4)),
+                 f"TOTAL: ${rng.uniform(10, 80):.2f}"]
+        image = Image.new("L", (600, 60 + 36 * len(lines)), 255)
+        draw = ImageDraw.Draw(image)
+        for number, line in enumerate(lines):
+            draw.text((30, 30 + number * 36), line, font=font, fill=0)
+        images.append(image)
+    return images
+
+
+def time_engine(pool: OcrEnginePool, images: List[Image.Image]) -> Dict[str, Any]:
+    started = time.perf_counter()
+    pool.warm_up()
+    warm_up = time.perf_counter() - started
+    latencies = []
+    for image in images:
+        started = time.perf_counter()
+        pool.recognize(image)
+        latencies.append(time.perf_counter() - started)
+    pool.close()
+    return {
+        'warm_up_ms': round(warm_up * 1000, 1),
+        'median_ms': round(statistics.median(latencies) * 1000, 1),
+        'p95_ms': round(sorted(latencies)[int(len(latencies) * 0.95) - 1] * 1000, 1),
+    }
+
+
+def run(count: int, seed: int = 2024) -> Dict[str, Any]:
+    options = PreprocessOptions(page_segmentation_mode=6)
+    images = receipt_images(count, seed)
+    engines = {
+        'subprocess': lambda: SubprocessEngine(options),
+        'tesserocr': lambda: TesserocrEngine(options),
+    }
+    results: Dict[str, Any] = {'images': count}
+    for name, factory in engines.items():
+        if name == 'tesserocr' and ocr_engine.tesserocr is None:
+            results[name] = 'skipped: tesserocr is not installed'
+            continue
+        try:
+            results[name] = time_engine(OcrEnginePool(factory), images)
+        except Exception as e:
+            results[name] = f"skipped: {e}"
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--count", type=int, default=20)
+    args = parser.parse_args()
+    print(json.dumps(run(args.count), indent=2))
@@ -0,0 +1,99 @@
+"""
+Status stream fan-out: memory per idle subscriber and publish-to-delivery latency
+
+Opens thousands of subscriptions on one event loop, each waiting for events
+the way an idle server-sent-events connection does, and measures:
+
+- memory held per waiting subscription (tracemalloc)
+- how long publishing one document's change takes when a single client
+  follows it among all the idle ones, and how long until it is delivered
+- how long a change takes to reach every subscription when all of them
+  follow every document
+
+Run from the backend directory:
+    python -m benchmarks.bench_status_stream [--subscribers 5000]
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+import tracemalloc
+from typing import Any, Dict, List
+
+from app.core.status_events import StatusBroker
+
+
+def ms(samples: List[float]) -> Dict[str, float]:
+    ordered = sorted(samples)
+    return {'p50_ms': round(statistics.median(ordered) * 1000, 3),
+            'p95_ms': round(ordered[int(len(ordered) * 0.95) - 1] * 1000, 3)}
+
+
+async def idle_followers(broker: StatusBroker, count: int, follow_all: bool):
+    subscriptions = [broker.subscribe(None if follow_all else [number]) for number in range(count)]
+    waiters = [asyncio.create_task(subscription.next_events(3600)) for subscription in subscriptions]
+    await asyncio.sleep(0)  # Let every waiter block on its subscription
+    return subscriptions, waiters
+
+
+async def close(broker: StatusBroker, subscriptions, waiters):
+    for waiter in waiters:
+        waiter.cancel()
+    await asyncio.gather(*waiters, return_exceptions=True)
+    for subscription in subscriptions:
+        broker.unsubscribe(subscription)
+
+
+async def measure(count: int, repeat: int) -> Dict[str, Any]:
+    payload = {'document_id': 0, 'status': "completed", 'document_type': "receipt",
+               'extracted_data': {'total_amount': 42.5, 'date': "01/07/2024"}}
+
+    broker = StatusBroker()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    subscriptions, waiters = await idle_followers(broker, count, follow_all=False)
+    grown = sum(stat.size_diff for stat in tracemalloc.take_snapshot().compare_to(before, "filename"))
+    tracemalloc.stop()
+
+    publish, delivery = [], []
+    for number in range(repeat):
+        document_id = number % count
+        started = time.perf_counter()
+        broker.publish(dict(payload, document_id=document_id))
+        publish.append(time.perf_counter() - started)
+        await waiters[document_id]
+        delivery.append(time.perf_counter() - started)
+        waiters[document_id] = asyncio.create_task(subscriptions[document_id].next_events(3600))
+    await close(broker, subscriptions, waiters)
+
+    broker = StatusBroker()
+    subscriptions, waiters = await idle_followers(broker, count, follow_all=True)
+    broadcast = []
+    for _ in range(max(repeat // 20, 5)):
+        started = time.perf_counter()
+        broker.publish(payload)
+        await asyncio.gather(*waiters)
+        broadcast.append(time.perf_counter() - started)
+        waiters = [asyncio.create_task(subscription.next_events(3600)) for subscription in subscriptions]
+    await close(broker, subscriptions, waiters)
+
+    return {
+        'subscribers': count,
+        'bytes_per_idle_subscriber': round(grown / count),
+        'publish_one_follower': ms(publish),
+        'delivery_one_follower': ms(delivery),
+        'delivery_to_all': ms(broadcast),
+    }
+
+
+def run(count: int, repeat: int = 500) -> Dict[str, Any]:
+    return asyncio.run(measure(count, repeat))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--subscribers", type=int, default=5000)
+    args = parser.parse_args()
+    print(json.dumps(run(args.subscribers), indent=2))
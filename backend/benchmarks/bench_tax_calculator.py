@@ -0,0 +1,94 @@
+"""
+Micro-benchmark of per-call TaxCalculator latency
+
+Compares the compiled bracket table / piecewise-linear lookups against the
+original bracket-walking implementation that /estimate used to run.
+
+Run from the backend directory:
+    python -m benchmarks.bench_tax_calculator
+"""
+
+import random
+import timeit
+
+from app.core.tax_calculator import TaxCalculator
+
+
+# Original implementations, kept as the "before" baseline
+def legacy_income_tax(taxable_income: float) -> float:
+    if taxable_income <= 0:
+        return 0.0
+    total_tax = 0.0
+    remaining_income = taxable_income
+    previous_threshold = 0
+    for threshold, rate in TaxCalculator.TAX_BRACKETS:
+        if remaining_income <= 0:
+            break
+        taxable_amount = min(remaining_income, threshold - previous_threshold)
+        total_tax += taxable_amount * rate
+        remaining_income -= taxable_amount
+        previous_threshold = threshold
+    return round(total_tax, 2)
+
+
+def legacy_medicare_levy(taxable_income: float) -> float:
+    if taxable_income <= TaxCalculator.MEDICARE_LEVY_THRESHOLD:
+        return 0.0
+    return round(taxable_income * TaxCalculator.MEDICARE_LEVY_RATE, 2)
+
+
+def legacy_low_income_tax_offset(taxable_income: float) -> float:
+    tc = TaxCalculator
+    if taxable_income <= tc.LITO_THRESHOLD_1:
+        return tc.LITO_MAX_OFFSET
+    elif taxable_income <= tc.LITO_THRESHOLD_2:
+        return max(0, tc.LITO_MAX_OFFSET - (taxable_income - tc.LITO_THRESHOLD_1) * tc.LITO_RATE_1)
+    reduction_1 = (tc.LITO_THRESHOLD_2 - tc.LITO_THRESHOLD_1) * tc.LITO_RATE_1
+    reduction_2 = (taxable_income - tc.LITO_THRESHOLD_2) * tc.LITO_RATE_2
+    return max(0, tc.LITO_MAX_OFFSET - (reduction_1 + reduction_2))
+
+
+def legacy_estimate(taxable_income: float) -> float:
+    return legacy_income_tax(taxable_income) + legacy_medicare_levy(taxable_income) - legacy_low_income_tax_offset(taxable_income)
+
+
+def estimate(taxable_income: float) -> float:
+    return (
+        TaxCalculator.calculate_income_tax(taxable_income)
+        + TaxCalculator.calculate_medicare_levy(taxable_income)
+        - TaxCalculator.calculate_low_income_tax_offset(taxable_income)
+    )
+
+
+CASES = [
+    ("income tax", legacy_income_tax, TaxCalculator.calculate_income_tax),
+    ("medicare levy", legacy_medicare_levy, TaxCalculator.calculate_medicare_levy),
+    ("LITO", legacy_low_income_tax_offset, TaxCalculator.calculate_low_income_tax_offset),
+    ("/estimate maths", legacy_estimate, estimate),
+]
+
+
+def per_call_ns(function, incomes, repeat: int = 5) -> float:
+    """Best-of-``repeat`` mean latency per call in nanoseconds"""
+    timer = timeit.Timer(lambda: [function(income) for income in incomes])
+    return min(timer.repeat(repeat=repeat, number=1)) / len(incomes) * 1e9
+
+
+def run(sample_size: int = 100000, seed: int = 2024) -> dict:
+    rng = random.Random(seed)
+    incomes = [round(rng.uniform(0, 250000), 2) for _ in range(sample_size)]
+
+    results = {}
+    for name, before, after in CASES:
+        results[name] = {
+            'before_ns': round(per_call_ns(before, incomes), 1),
+            'after_ns': round(per_call_ns(after, incomes), 1),
+        }
+    return results
+
+
+if __name__ == "__main__":
+    print(f"{'function':<18}{'before (ns)':>14}{'after (ns)':>14}{'speedup':>10}")
+    for name, timing in run().items():
+        speedup = timing['before_ns'] / timing['after_ns']
+        print(f"{name:<18}{timing['before_ns']:>14.1f}{timing['after_ns']:>14.1f}{speedup:>9.2f}x")
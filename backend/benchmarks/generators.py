@@ -0,0 +1,188 @@
+"""
+Synthetic inputs for the benchmark suite
+
+Everything is derived from a ``random.Random`` so a seed reproduces the same
+tax scenarios, document texts, PDFs and scans between commits.
+"""
+
+import random
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Dict, List, Sequence, Tuple
+
+from PIL import Image, ImageDraw, ImageFont
+
+DOCUMENT_KINDS = ("payg_summary", "receipt", "bank_statement")
+
+MERCHANTS = ("Officeworks", "JB Hi-Fi", "Bunnings Warehouse", "Corner Cafe", "BP Connect", "Coles")
+DESCRIPTIONS = ("EFTPOS WOOLWORTHS", "SALARY ACME PTY LTD", "TRANSFER TO SAVINGS", "BPAY AGL ENERGY",
+                "DIRECT DEBIT TELSTRA", "CARD PURCHASE OPAL", "INTEREST CREDIT", "ATM WITHDRAWAL")
+
+Scenario = Tuple[Dict[str, float], Dict[str, float]]
+
+
+def tax_scenarios(rng: random.Random, count: int) -> List[Scenario]:
+    """Income and deduction dicts shaped like /calculate requests, across every bracket"""
+    scenarios = []
+    for _ in range(count):
+        employment = round(rng.choice((rng.uniform(0, 45000), rng.uniform(45000, 135000),
+                                       rng.uniform(135000, 400000))), 2)
+        income = {
+            'employment_income': employment,
+            'investment_income': round(rng.uniform(0, 20000), 2) if rng.random() < 0.4 else 0.0,
+            'business_income': round(rng.uniform(0, 120000), 2) if rng.random() < 0.2 else 0.0,
+        }
+        deductions = {
+            'work_related_expenses': round(rng.uniform(0, 6000), 2),
+            'work_from_home_deduction': round(rng.uniform(0, 70) * 10, 2) if rng.random() < 0.5 else 0.0,
+        }
+        scenarios.append((income, deductions))
+    return scenarios
+
+
+def tax_columns(scenarios: Sequence[Scenario]) -> Tuple[Dict[str, List[float]], Dict[str, List[float]]]:
+    """The same scenarios as the column arrays /calculate/batch takes"""
+    income_keys = scenarios[0][0].keys() if scenarios else ()
+    deduction_keys = scenarios[0][1].keys() if scenarios else ()
+    return (
+        {key: [income[key] for income, _ in scenarios] for key in income_keys},
+        {key: [deductions[key] for _, deductions in scenarios] for key in deduction_keys},
+    )
+
+
+def taxable_incomes(rng: random.Random, count: int) -> List[float]:
+    return [round(rng.uniform(0, 250000), 2) for _ in range(count)]
+
+
+def payg_summary_lines(rng: random.Random) -> List[str]:
+    gross = rng.uniform(30000, 180000)
+    return [
+        "PAYG PAYMENT SUMMARY - INDIVIDUAL NON-BUSINESS",
+        "Payment summary for year ending 30 June 2024",
+        f"Payee TFN: {rng.randint(100, 999)} {rng.randint(100, 999)} {rng.randint(100, 999)}",
+        f"Payer ABN: {rng.randint(10, 99)} {rng.randint(100, 999)} {rng.randint(100, 999)} {rng.randint(100, 999)}",
+        f"Gross payments: ${gross:,.2f}",
+        f"Total tax withheld: ${gross * rng.uniform(0.1, 0.35):,.2f}",
+        "Total allowances: $0.00",
+    ]
+
+
+def receipt_lines(rng: random.Random) -> List[str]:
+    items = [(f"ITEM {number + 1}", rng.uniform(2, 120)) for number in range(rng.randint(2, 8))]
+    total = sum(price for _, price in items)
+    return [
+        "TAX INVOICE",
+        rng.choice(MERCHANTS),
+        f"ABN {rng.randint(10, 99)} {rng.randint(100, 999)} {rng.randint(100, 999)} {rng.randint(100, 999)}",
+        f"{rng.randint(1, 28):02d}/{rng.randint(1, 12):02d}/2024",
+        *(f"{name}  ${price:.2f}" for name, price in items),
+        f"GST: ${total / 11:.2f}",
+        f"TOTAL: ${total:.2f}",
+    ]
+
+
+def bank_statement_lines(rng: random.Random, rows: int = 40) -> List[str]:
+    balance = rng.uniform(1000, 20000)
+    day = date(2024, 7, 1)
+    lines = [
+        "ACCOUNT STATEMENT",
+        f"Account number: {rng.randint(10**7, 10**9)}",
+        "Statement period: 01/07/2024 to 31/12/2024",
+        "Date Description Debit Credit Balance",
+        f"Opening balance {balance:,.2f}",
+    ]
+    for _ in range(rows):
+        day += timedelta(days=rng.randint(0, 4))
+        amount = rng.uniform(5, 2500)
+        credit = rng.random() < 0.3
+        balance += amount if credit else -amount
+        debit_column, credit_column = ("", f"{amount:,.2f}") if credit else (f"{amount:,.2f}", "")
+        lines.append(" ".join(part for part in (
+            day.strftime("%d/%m/%Y"), rng.choice(DESCRIPTIONS), debit_column, credit_column, f"{balance:,.2f}"
+        ) if part))
+    lines.append(f"Closing balance: ${balance:,.2f}")
+    return lines
+
+
+def document_lines(kind: str, rng: random.Random, rows: int = 40) -> List[str]:
+    """Lines of a synthetic PAYG summary, receipt or bank statement"""
+    if kind == "payg_summary":
+        return payg_summary_lines(rng)
+    if kind == "receipt":
+        return receipt_lines(rng)
+    if kind == "bank_statement":
+        return bank_statement_lines(rng, rows)
+    raise ValueError(f"Unknown document kind: {kind}")
+
+
+def document_texts(kind: str, rng: random.Random, count: int) -> List[str]:
+    return ["\n".join(document_lines(kind, rng)) for _ in range(count)]
+
+
+def _pdf_string(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def write_pdf(path: Path, pages: Sequence[Sequence[str]]) -> Path:
+    """Write a PDF with a text layer, one list of lines per page"""
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # Pages tree, filled in once the page ids are known
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    page_ids = []
+    for lines in pages:
+        stream = " ".join(
+            f"BT /F1 10 Tf 50 {760 - 14 * number} Td ({_pdf_string(line)}) Tj ET"
+            for number, line in enumerate(lines[:52])
+        ).encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        content_id = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id
+        )
+        page_ids.append(len(objects))
+    kids = b" ".join(b"%d 0 R" % page_id for page_id in page_ids)
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(page_ids))
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(output))
+        output += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(output)
+    output += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    output += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    output += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    path.write_bytes(bytes(output))
+    return path
+
+
+def document_pdf(path: Path, kind: str, rng: random.Random, pages: int = 1) -> Path:
+    """A text-layer PDF of a synthetic document; statements run to ``pages`` pages"""
+    if kind == "bank_statement":
+        lines = bank_statement_lines(rng, rows=45 * pages - 8)
+        return write_pdf(path, [lines[start:start + 45] for start in range(0, len(lines), 45)])
+    return write_pdf(path, [document_lines(kind, rng)])
+
+
+def render_scan(lines: Sequence[str], rng: random.Random, dpi: int = 200, skew: float = 2.0) -> Image.Image:
+    """A page of text as a phone or flatbed scan: greyish paper, slight skew, some noise"""
+    width, height = int(8.27 * dpi), int(11.69 * dpi)
+    font = ImageFont.load_default(size=max(12, dpi // 8))
+    page = Image.new("L", (width, height), rng.randint(225, 245))
+    draw = ImageDraw.Draw(page)
+    line_height = dpi // 5
+    for number, line in enumerate(lines):
+        draw.text((dpi // 2, dpi // 2 + number * line_height), line, font=font, fill=rng.randint(10, 60))
+    page = page.rotate(rng.uniform(-skew, skew), fillcolor=235, expand=False)
+    noise = Image.effect_noise(page.size, 12)
+    return Image.blend(page, noise, 0.08)
+
+
+def document_image(path: Path, kind: str, rng: random.Random, dpi: int = 200) -> Path:
+    """A synthetic scanned document saved as PNG or JPEG, by the path's suffix"""
+    image = render_scan(document_lines(kind, rng), rng, dpi)
+    image.save(path, dpi=(dpi, dpi), **({'quality': 85} if path.suffix.lower() in (".jpg", ".jpeg") else {}))
+    return path
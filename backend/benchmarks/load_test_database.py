@@ -0,0 +1,117 @@
+"""
+Concurrent load test of the database-backed API routes
+
+Drives a running server with a mix of tax-return creates, updates and reads
+plus document listings from many concurrent clients, while a probe polls
+/health to show how long the event loop is held up by database work. Run it
+against the same deployment on SQLite and on PostgreSQL (set DATABASE_URL and
+DATABASE_URL_ASYNC for the server) to compare.
+
+    uvicorn app.main:app --port 8000
+    python -m benchmarks.load_test_database --url http://127.0.0.1:8000 --concurrency 50
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+from typing import Dict, List
+
+import httpx
+
+API = "/api/tax-calculator"
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    """p50/p95/p99 in milliseconds"""
+    if not samples:
+        return {'p50_ms': 0.0, 'p95_ms': 0.0, 'p99_ms': 0.0}
+    ordered = sorted(samples)
+
+    def at(fraction: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] * 1000, 2)
+
+    return {'p50_ms': at(0.50), 'p95_ms': at(0.95), 'p99_ms': at(0.99)}
+
+
+async def client_loop(client: httpx.AsyncClient, deadline: float, latencies: List[float], errors: List[str]):
+    """One simulated user creating, updating and reading returns"""
+    rng = random.Random()
+    return_ids: List[int] = []
+    while time.perf_counter() < deadline:
+        action = rng.random()
+        started = time.perf_counter()
+        try:
+            if action < 0.2 or not return_ids:
+                response = await client.post(f"{API}/tax-return", json={"tax_year": "2024-25"})
+                if response.status_code == 200:
+                    return_ids.append(response.json()["id"])
+            elif action < 0.5:
+                response = await client.put(
+                    f"{API}/tax-return/{rng.choice(return_ids)}",
+                    json={"employment_income": round(rng.uniform(20000, 200000), 2)}
+                )
+            elif action < 0.8:
+                response = await client.get(f"{API}/tax-return/{rng.choice(return_ids)}")
+            else:
+                response = await client.get("/api/documents/", params={"limit": 20})
+        except httpx.HTTPError as e:
+            errors.append(type(e).__name__)
+            continue
+        latencies.append(time.perf_counter() - started)
+        if response.status_code >= 400:
+            errors.append(str(response.status_code))
+
+
+async def probe_loop(client: httpx.AsyncClient, deadline: float, latencies: List[float], interval: float):
+    """Time a DB-free request while the load runs"""
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            await client.get("/health")
+        except httpx.HTTPError:
+            pass  # A timed-out probe still counts, at the time it waited
+        latencies.append(time.perf_counter() - started)
+        await asyncio.sleep(interval)
+
+
+async def run(url: str, concurrency: int, duration: float, probe_interval: float) -> Dict[str, object]:
+    limits = httpx.Limits(max_connections=concurrency + 1, max_keepalive_connections=concurrency + 1)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60) as client:
+        latencies: List[float] = []
+        probe_latencies: List[float] = []
+        errors: List[str] = []
+        deadline = time.perf_counter() + duration
+
+        started = time.perf_counter()
+        await asyncio.gather(
+            probe_loop(client, deadline, probe_latencies, probe_interval),
+            *(client_loop(client, deadline, latencies, errors) for _ in range(concurrency))
+        )
+        elapsed = time.perf_counter() - started
+
+    return {
+        'url': url,
+        'concurrency': concurrency,
+        'duration_s': round(elapsed, 2),
+        'requests': len(latencies),
+        'requests_per_s': round(len(latencies) / elapsed, 1),
+        'errors': len(errors),
+        'error_kinds': sorted(set(errors)),
+        'latency': percentiles(latencies),
+        'mean_latency_ms': round(statistics.fmean(latencies) * 1000, 2) if latencies else 0.0,
+        'health_probe': percentiles(probe_latencies),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds to run")
+    parser.add_argument("--probe-interval", type=float, default=0.05, help="Seconds between /health probes")
+    args = parser.parse_args()
+
+    print(json.dumps(asyncio.run(run(args.url, args.concurrency, args.duration, args.probe_interval)), indent=2))
@@ -0,0 +1,505 @@
+"""
+Benchmark suite: tax engine, document processing stages and HTTP throughput
+
+Each benchmark builds synthetic inputs (benchmarks/generators.py) from a
+fixed seed and hands back the call to time and how many items (scenarios,
+documents, requests) one call handles. Calls are repeated until a round
+lasts at least ``--min-time`` seconds, over ``--rounds`` rounds, and the
+per-item times are saved with the commit and environment they came from,
+so two result files can be compared:
+
+    python -m benchmarks.suite --output before.json
+    git checkout my-branch
+    python -m benchmarks.suite --output after.json --compare before.json
+
+``--compare`` exits with status 1 when any benchmark's fastest round is
+more than ``--threshold`` slower than the baseline's; the fastest round is
+the one least disturbed by whatever else the machine was doing. ``-k``
+selects benchmarks whose name contains any of the given substrings.
+Benchmarks that need something not installed here (Tesseract) are reported
+as skipped.
+
+Run from the backend directory.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from benchmarks import generators
+
+
+class Case(NamedTuple):
+    run: Callable[[], Any]
+    items: int  # Items one call of ``run`` handles
+    unit: str = "item"
+
+
+class Skip(Exception):
+    """Raised by a benchmark's setup when it cannot run in this environment"""
+
+
+# name -> setup(rng, work directory) returning the Case to time
+BENCHMARKS: Dict[str, Callable[[random.Random, Path], Case]] = {}
+
+
+def benchmark(name: str):
+    def register(setup: Callable[[random.Random, Path], Case]):
+        BENCHMARKS[name] = setup
+        return setup
+    return register
+
+
+# Tax engine
+
+@benchmark("tax.calculate_total_tax")
+def tax_total(rng: random.Random, workdir: Path) -> Case:
+    from app.core.tax_calculator import TaxCalculator
+    scenarios = generators.tax_scenarios(rng, 1000)
+
+    def run():
+        for income, deductions in scenarios:
+            TaxCalculator.calculate_total_tax(income, deductions)
+    return Case(run, len(scenarios), "scenario")
+
+
+@benchmark("tax.calculate_estimate")
+def tax_estimate(rng: random.Random, workdir: Path) -> Case:
+    from app.core.tax_calculator import TaxCalculator
+    incomes = generators.taxable_incomes(rng, 1000)
+
+    def run():
+        for income in incomes:
+            TaxCalculator.calculate_estimate(income)
+    return Case(run, len(incomes), "scenario")
+
+
+@benchmark("tax.calculate_total_tax_batch")
+def tax_batch(rng: random.Random, workdir: Path) -> Case:
+    from app.core.tax_calculator import TaxCalculator
+    income, deductions = generators.tax_columns(generators.tax_scenarios(rng, 100000))
+    income = {key: np.asarray(values) for key, values in income.items()}
+    deductions = {key: np.asarray(values) for key, values in deductions.items()}
+    return Case(lambda: TaxCalculator.calculate_total_tax_batch(income, deductions), 100000, "scenario")
+
+
+@benchmark("tax.calculate_total_tax_float")
+def tax_total_float(rng: random.Random, workdir: Path) -> Case:
+    from app.core.tax_calculator import TaxCalculator
+    calculator = TaxCalculator.for_year(exact_cents=False)
+    scenarios = generators.tax_scenarios(rng, 1000)
+
+    def run():
+        for income, deductions in scenarios:
+            calculator.calculate_total_tax(income, deductions)
+    return Case(run, len(scenarios), "scenario")
+
+
+@benchmark("tax.calculate_total_tax_decimal")
+def tax_total_decimal(rng: random.Random, workdir: Path) -> Case:
+    """The exact-arithmetic baseline integer cents replaced: Decimal with ROUND_HALF_UP"""
+    from decimal import ROUND_HALF_UP, Decimal
+    from app.core.tax_calculator import TaxCalculator
+    rules = TaxCalculator.RULES
+    cent = Decimal("0.01")
+    brackets = [(None if threshold == float('inf') else Decimal(threshold), Decimal(str(rate)))
+                for threshold, rate in rules.brackets]
+    medicare_rate, medicare_threshold = Decimal(str(rules.medicare_levy_rate)), Decimal(rules.medicare_levy_threshold)
+    lito_1, lito_2 = Decimal(rules.lito_threshold_1), Decimal(rules.lito_threshold_2)
+    lito_rate_1, lito_rate_2 = Decimal(str(rules.lito_rate_1)), Decimal(str(rules.lito_rate_2))
+    scenarios = [
+        ({key: Decimal(str(value)) for key, value in income.items()},
+         {key: Decimal(str(value)) for key, value in deductions.items()})
+        for income, deductions in generators.tax_scenarios(rng, 1000)
+    ]
+
+    def total_tax(income, deductions):
+        taxable = max(Decimal(0), sum(income.values()) - sum(deductions.values()))
+        tax, lower = Decimal(0), Decimal(0)
+        for upper, rate in brackets:
+            if taxable <= lower:
+                break
+            tax += ((taxable if upper is None else min(taxable, upper)) - lower) * rate
+            lower = upper
+        medicare = taxable * medicare_rate if taxable > medicare_threshold else Decimal(0)
+        lito = (Decimal(rules.lito_max_offset) - (min(max(taxable, lito_1), lito_2) - lito_1) * lito_rate_1
+                - max(taxable - lito_2, Decimal(0)) * lito_rate_2)
+        return max(Decimal(0), tax.quantize(cent, ROUND_HALF_UP) + medicare.quantize(cent, ROUND_HALF_UP)
+                   - max(lito, Decimal(0)).quantize(cent, ROUND_HALF_UP))
+
+    def run():
+        for income, deductions in scenarios:
+            total_tax(income, deductions)
+    return Case(run, len(scenarios), "scenario")
+
+
+@benchmark("tax.calculate_total_tax_batch_float")
+def tax_batch_float(rng: random.Random, workdir: Path) -> Case:
+    from app.core.tax_calculator import TaxCalculator
+    calculator = TaxCalculator.for_year(exact_cents=False)
+    income, deductions = generators.tax_columns(generators.tax_scenarios(rng, 100000))
+    income = {key: np.asarray(values) for key, values in income.items()}
+    deductions = {key: np.asarray(values) for key, values in deductions.items()}
+    return Case(lambda: calculator.calculate_total_tax_batch(income, deductions), 100000, "scenario")
+
+
+@benchmark("tax.what_if_sweep")
+def tax_what_if(rng: random.Random, workdir: Path) -> Case:
+    from app.core.tax_calculator import TaxCalculator
+    from app.core.what_if import SweepVariable, what_if
+    income, deductions = generators.tax_scenarios(rng, 1)[0]
+
+    def run():
+        variables = [SweepVariable('work_related_expenses', 0, 20000, 100), SweepVariable('salary_sacrifice', 0, 20000, 100)]
+        what_if(TaxCalculator, income, deductions, variables, 100000)
+    return Case(run, 201 * 201, "point")
+
+
+# Document processing stages
+
+def _document_pdfs(rng: random.Random, workdir: Path) -> List[Tuple[str, Path]]:
+    return [
+        (kind, generators.document_pdf(workdir / f"{kind}.pdf", kind, rng, pages=10 if kind == "bank_statement" else 1))
+        for kind in generators.DOCUMENT_KINDS
+    ]
+
+
+def _labelled_texts(rng: random.Random, per_kind: int) -> List[Tuple[str, str]]:
+    return [(kind, text) for kind in generators.DOCUMENT_KINDS
+            for text in generators.document_texts(kind, rng, per_kind)]
+
+
+@benchmark("processor.pdf_text")
+def processor_pdf_text(rng: random.Random, workdir: Path) -> Case:
+    from app.core.document_processor import extract_pdf_pages, pdf_page_count
+    from app.config import settings
+    pdfs = [(str(path), pdf_page_count(str(path))) for _, path in _document_pdfs(rng, workdir)]
+
+    def run():
+        for path, pages in pdfs:
+            extract_pdf_pages(path, list(range(pages)), settings.ocr_resolution)
+    return Case(run, sum(pages for _, pages in pdfs), "page")
+
+
+@benchmark("processor.image_preprocessing")
+def processor_preprocessing(rng: random.Random, workdir: Path) -> Case:
+    from app.core.image_preprocessing import PreprocessOptions, open_for_ocr, preprocess_for_ocr
+    options = PreprocessOptions.from_settings()
+    paths = [generators.document_image(workdir / f"{kind}.jpg", kind, rng) for kind in generators.DOCUMENT_KINDS]
+
+    def run():
+        for path in paths:
+            image, dpi = open_for_ocr(str(path), options)
+            preprocess_for_ocr(image, options, dpi)
+    return Case(run, len(paths), "image")
+
+
+@benchmark("processor.ocr")
+def processor_ocr(rng: random.Random, workdir: Path) -> Case:
+    import pytesseract
+    from app.core.document_processor import DocumentProcessor
+    if shutil.which(pytesseract.pytesseract.tesseract_cmd) is None:
+        raise Skip("tesseract is not installed")
+    processor = DocumentProcessor()
+    processor.warm_up_ocr()
+    paths = [str(generators.document_image(workdir / f"{kind}.png", kind, rng))
+             for kind in generators.DOCUMENT_KINDS]
+
+    def run():
+        for path in paths:
+            processor.extract_text_from_image(path)
+    return Case(run, len(paths), "image")
+
+
+@benchmark("processor.classification")
+def processor_classification(rng: random.Random, workdir: Path) -> Case:
+    from app.core.document_processor import DocumentProcessor
+    processor = DocumentProcessor()
+    texts = _labelled_texts(rng, 100)
+
+    def run():
+        for _, text in texts:
+            processor.classify(text, "scan.pdf")
+    return Case(run, len(texts), "document")
+
+
+@benchmark("processor.field_extraction")
+def processor_field_extraction(rng: random.Random, workdir: Path) -> Case:
+    from app.core.document_processor import DocumentProcessor
+    from app.models.models import DocumentType
+    processor = DocumentProcessor()
+    texts = [(DocumentType(kind), text) for kind, text in _labelled_texts(rng, 100)]
+
+    def run():
+        for document_type, text in texts:
+            processor.extract_structured_data(text, document_type)
+    return Case(run, len(texts), "document")
+
+
+@benchmark("processor.statement_transactions")
+def processor_transactions(rng: random.Random, workdir: Path) -> Case:
+    from app.core.document_processor import DocumentProcessor
+    processor = DocumentProcessor()
+    texts = ["\n".join(generators.bank_statement_lines(rng, rows=200)) for _ in range(10)]
+    extracted = {'period_start': "01/07/2024"}
+
+    def run():
+        for text in texts:
+            for _ in processor.extract_transactions(text, extracted):
+                pass
+    return Case(run, 200 * len(texts), "row")
+
+
+@benchmark("processor.process_document")
+def processor_end_to_end(rng: random.Random, workdir: Path) -> Case:
+    from app.core.bank_transactions import discard_spill
+    from app.core.document_processor import DocumentProcessor
+    processor = DocumentProcessor()
+    pdfs = [(kind, str(path)) for kind, path in _document_pdfs(rng, workdir)]
+
+    def run():
+        for kind, path in pdfs:
+            result = processor.process_document(path, "application/pdf", f"{kind}.pdf")
+            if result.get('transactions_path'):
+                discard_spill(result['transactions_path'])
+    return Case(run, len(pdfs), "document")
+
+
+# HTTP, through the ASGI app in-process
+
+def _http(send: Callable, requests: int, concurrency: int = 16) -> Callable[[], None]:
+    """A callable running ``send(client, number)`` for every request, ``concurrency`` at a time"""
+    import httpx
+    from app.main import app
+
+    async def drive():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            slots = asyncio.Semaphore(concurrency)
+
+            async def one(number: int):
+                async with slots:
+                    response = await send(client, number)
+                    response.raise_for_status()
+            await asyncio.gather(*(one(number) for number in range(requests)))
+
+    return lambda: asyncio.run(drive())
+
+
+@benchmark("api.estimate")
+def api_estimate(rng: random.Random, workdir: Path) -> Case:
+    from app.core.estimate_cache import estimate_cache
+    incomes = generators.taxable_incomes(rng, 200)
+
+    def send(client, number):
+        return client.get("/api/tax-calculator/estimate", params={'taxable_income': incomes[number]})
+
+    requests = _http(send, len(incomes))
+
+    def run():
+        estimate_cache.clear()  # Every request computes its estimate
+        requests()
+    return Case(run, len(incomes), "request")
+
+
+@benchmark("api.estimate_cached")
+def api_estimate_cached(rng: random.Random, workdir: Path) -> Case:
+    incomes = generators.taxable_incomes(rng, 20)
+
+    def send(client, number):
+        return client.get("/api/tax-calculator/estimate", params={'taxable_income': incomes[number % 20]})
+    return Case(_http(send, 200), 200, "request")
+
+
+@benchmark("api.calculate")
+def api_calculate(rng: random.Random, workdir: Path) -> Case:
+    scenarios = generators.tax_scenarios(rng, 200)
+
+    def send(client, number):
+        income, deductions = scenarios[number]
+        return client.post("/api/tax-calculator/calculate", json={'income_data': income, 'deduction_data': deductions})
+    return Case(_http(send, len(scenarios)), len(scenarios), "request")
+
+
+@benchmark("api.calculate_batch")
+def api_calculate_batch(rng: random.Random, workdir: Path) -> Case:
+    income, deductions = generators.tax_columns(generators.tax_scenarios(rng, 5000))
+
+    def send(client, number):
+        return client.post("/api/tax-calculator/calculate/batch",
+                           json={'income_data': income, 'deduction_data': deductions})
+    return Case(_http(send, 4, concurrency=1), 4 * 5000, "scenario")
+
+
+@benchmark("api.tax_return_roundtrip")
+def api_tax_return(rng: random.Random, workdir: Path) -> Case:
+    from sqlalchemy import create_engine
+    from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+    from sqlalchemy.orm import sessionmaker
+    from app.database.database import Base, engine_options, get_async_db
+    from app.main import app
+
+    # A scratch database, so runs neither touch nor depend on the real one
+    url = f"sqlite:///{workdir / 'bench.db'}"
+    Base.metadata.create_all(create_engine(url))
+    async_url = url.replace("sqlite:", "sqlite+aiosqlite:")
+    async_engine = create_async_engine(async_url, **engine_options(async_url, is_async=True))
+    sessions = sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+    async def scratch_db():
+        async with sessions() as db:
+            yield db
+
+    app.dependency_overrides[get_async_db] = scratch_db
+    scenarios = generators.tax_scenarios(rng, 100)
+
+    async def send(client, number):
+        created = await client.post("/api/tax-calculator/tax-return", json={'tax_year': "2024-25"})
+        tax_return_id = created.json()['id']
+        income, deductions = scenarios[number]
+        await client.put(f"/api/tax-calculator/tax-return/{tax_return_id}", json={**income, **deductions})
+        return await client.get(f"/api/tax-calculator/tax-return/{tax_return_id}")
+
+    return Case(_http(send, len(scenarios), concurrency=4), len(scenarios), "return")
+
+
+def measure(case: Case, rounds: int, min_time: float) -> Dict[str, Any]:
+    """Per-item seconds over ``rounds`` rounds of enough calls to last ``min_time`` each"""
+    case.run()  # Warm caches, imports and lazily built state
+    calls = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(calls):
+            case.run()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time:
+            break
+        calls *= 2
+
+    samples = [elapsed / (calls * case.items)]
+    for _ in range(rounds - 1):
+        started = time.perf_counter()
+        for _ in range(calls):
+            case.run()
+        samples.append((time.perf_counter() - started) / (calls * case.items))
+
+    median = statistics.median(samples)
+    return {
+        'unit': case.unit,
+        'items_per_call': case.items,
+        'calls_per_round': calls,
+        'rounds': rounds,
+        'min_s': min(samples),
+        'median_s': median,
+        'mean_s': statistics.fmean(samples),
+        'stdev_s': statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        'per_s': round(1 / median, 1),
+    }
+
+
+def environment(seed: int) -> Dict[str, Any]:
+    """Where and on what the results were measured"""
+    def git(*args: str) -> Optional[str]:
+        try:
+            return subprocess.run(("git", *args), capture_output=True, text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    return {
+        'commit': git("rev-parse", "HEAD"),
+        'dirty': bool(git("status", "--porcelain", "--untracked-files=no")),
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'seed': seed,
+    }
+
+
+def run(names: Sequence[str], seed: int = 2024, rounds: int = 5, min_time: float = 0.2) -> Dict[str, Any]:
+    results: Dict[str, Any] = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for name in names:
+            workdir = Path(directory) / name
+            workdir.mkdir()
+            try:
+                case = BENCHMARKS[name](random.Random(seed), workdir)
+            except Skip as e:
+                results[name] = {'skipped': str(e)}
+                continue
+            results[name] = measure(case, rounds, min_time)
+    return {'environment': environment(seed), 'benchmarks': results}
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> Tuple[List[str], List[str]]:
+    """A line per benchmark measured in both runs, and the names of those that got slower"""
+    lines, regressions = [], []
+    previous = baseline['benchmarks']
+    for name, result in current['benchmarks'].items():
+        before = previous.get(name, {})
+        if 'min_s' not in result or 'min_s' not in before:
+            continue
+        ratio = result['min_s'] / before['min_s']
+        flag = ""
+        if ratio > 1 + threshold:
+            flag = "  SLOWER"
+            regressions.append(name)
+        elif ratio < 1 / (1 + threshold):
+            flag = "  faster"
+        lines.append(f"{name:<36}{before['min_s'] * 1e6:>12.2f}{result['min_s'] * 1e6:>12.2f}{ratio:>8.2f}x{flag}")
+    return lines, regressions
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("-k", dest="filters", action="append", default=[],
+                        help="Run benchmarks whose name contains this (repeatable)")
+    parser.add_argument("--list", action="store_true", help="List benchmark names and exit")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--min-time", type=float, default=0.2, help="Seconds each round lasts at least")
+    parser.add_argument("--seed", type=int, default=2024)
+    parser.add_argument("--output", type=Path, help="Write results here as JSON")
+    parser.add_argument("--compare", type=Path, help="Baseline results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="Relative slowdown of the fastest round counted as a regression")
+    args = parser.parse_args(argv)
+
+    names = [name for name in BENCHMARKS if not args.filters or any(f in name for f in args.filters)]
+    if args.list:
+        print("\n".join(names))
+        return 0
+
+    results = run(names, args.seed, args.rounds, args.min_time)
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2) + "\n")
+    else:
+        print(json.dumps(results, indent=2))
+
+    if args.compare:
+        lines, regressions = compare(results, json.loads(args.compare.read_text()), args.threshold)
+        print(f"{'benchmark':<36}{'before µs':>12}{'after µs':>12}{'ratio':>9}", file=sys.stderr)
+        print("\n".join(lines), file=sys.stderr)
+        if regressions:
+            print(f"{len(regressions)} benchmark(s) slower than {1 + args.threshold:.2f}x the baseline: "
+                  f"{', '.join(regressions)}", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
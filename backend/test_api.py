@@ -2,12 +2,18 @@ import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.pool import NullPool
 import tempfile
+import io
+import json
 import os
+import threading
+import time
 
 from app.main import app
-from app.database.database import get_db, Base
-from app.models.models import Document, TaxReturn
+from app.database.database import get_async_db, Base
+from app.models.models import Document, TaxReturn, UploadBatch
 
 
 # Create test database
@@ -15,14 +21,17 @@ SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
 engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
-def override_get_db():
-    try:
-        db = TestingSessionLocal()
+# Each TestClient request runs on its own event loop, so async connections are not pooled
+async_engine = create_async_engine("sqlite+aiosqlite:///./test.db", poolclass=NullPool)
+AsyncTestingSessionLocal = sessionmaker(
+    async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+)
+
+async def override_get_async_db():
+    async with AsyncTestingSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
-app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_async_db] = override_get_async_db
 
 
 @pytest.fixture(scope="function")
@@ -52,6 +61,34 @@ def test_health_check(client):
     assert response.json() == {"status": "healthy"}
 
 
+def test_metrics_endpoint(client):
+    """Request latency, SQL statement counts and queue depth in Prometheus text format"""
+    from app.core import metrics
+    
+    metrics.count_queries([engine, async_engine.sync_engine])
+    document_id = add_extracted_document("receipt", {'total_amount': 5.0})
+    for _ in range(3):
+        assert client.get(f"/api/documents/{document_id}").status_code == 200
+    assert client.get("/api/documents/999999").status_code == 404
+    
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    lines = response.text.splitlines()
+    assert "# TYPE http_request_duration_seconds histogram" in lines
+    
+    route = 'method="GET",route="/api/documents/{document_id}"'
+    count = f'http_request_duration_seconds_count{{{route},status="200"}}'
+    assert any(line.startswith(count) and int(line.split()[-1]) >= 3 for line in lines)
+    assert any(line.startswith(f'http_request_duration_seconds_count{{{route},status="404"}}') for line in lines)
+    assert any(line.startswith(f'http_request_duration_seconds_bucket{{{route},status="200",le="+Inf"}}')
+               for line in lines)
+    # Every lookup ran at least one statement
+    no_queries = f'http_request_db_queries_bucket{{{route},le="0"}}'
+    assert any(line.startswith(no_queries) and line.split()[-1] == "0" for line in lines)
+    assert any(line.startswith('document_queue_depth{status="queued"}') for line in lines)
+
+
 def test_tax_brackets_endpoint(client):
     """Test tax brackets endpoint"""
     response = client.get("/api/tax-calculator/brackets")
@@ -63,6 +100,134 @@ def test_tax_brackets_endpoint(client):
     assert data["medicare_levy"]["rate"] == 0.02
 
 
+def test_tax_brackets_for_prior_year(client):
+    """Brackets come from the requested year's rule set"""
+    response = client.get("/api/tax-calculator/brackets?tax_year=2023-24")
+    assert response.status_code == 200
+    assert response.json()["tax_year"] == "2023-24"
+    
+    response = client.get("/api/tax-calculator/brackets?tax_year=1999-00")
+    assert response.status_code == 400
+
+
+def test_tax_return_uses_its_tax_year(client):
+    """Recalculating a return applies the rules for its own tax year"""
+    for tax_year, threshold in (("2023-24", 26000), ("2024-25", 24276)):
+        created = client.post("/api/tax-calculator/tax-return", json={"tax_year": tax_year}).json()
+        response = client.put(
+            f"/api/tax-calculator/tax-return/{created['id']}",
+            json={"employment_income": 25000}
+        )
+        assert response.status_code == 200
+        assert response.json()["tax_year"] == tax_year
+        assert (response.json()["medicare_levy"] > 0) == (25000 > threshold)
+    
+    response = client.post("/api/tax-calculator/tax-return", json={"tax_year": "1999-00"})
+    assert response.status_code == 400
+
+
+def add_extracted_document(document_type, extracted_data, status="completed"):
+    """A processed document straight in the database, as the job queue leaves it"""
+    db = TestingSessionLocal()
+    try:
+        document = Document(
+            filename=f"{document_type}.pdf", original_filename=f"{document_type}.pdf",
+            file_path=f"/nonexistent/{document_type}.pdf", file_size=100,
+            content_type="application/pdf", status=status, document_type=document_type,
+            extracted_data=extracted_data
+        )
+        db.add(document)
+        db.commit()
+        return document.id
+    finally:
+        db.close()
+
+
+def test_linked_documents_feed_tax_return(client):
+    """PAYG summaries and receipts linked to a return update its totals and refund"""
+    tax_return = client.post("/api/tax-calculator/tax-return", json={"tax_year": "2024-25"}).json()
+    payg_id = add_extracted_document("payg_summary", {'gross_payments': 80000.0, 'tax_withheld': 18000.0})
+    receipt_id = add_extracted_document("receipt", {'total_amount': 1500.0})
+    base = f"/api/tax-calculator/tax-return/{tax_return['id']}/documents"
+    
+    response = client.put(f"{base}/{payg_id}")
+    assert response.status_code == 200
+    linked = response.json()
+    assert linked["documented_employment_income"] == 80000.0
+    assert linked["total_income"] == 80000.0
+    assert linked["tax_paid"] == 18000.0
+    assert linked["refund_or_amount_owed"] == round(18000.0 - linked["total_tax"], 2)
+    
+    linked = client.put(f"{base}/{receipt_id}").json()
+    assert linked["documented_deductions"] == 1500.0
+    assert linked["taxable_income"] == 78500.0
+    # Linking again changes nothing
+    assert client.put(f"{base}/{receipt_id}").json() == linked
+    
+    expected = client.post("/api/tax-calculator/calculate", json={
+        "income_data": {"employment_income": 80000, "investment_income": 0, "business_income": 0},
+        "deduction_data": {"work_related_expenses": 1500, "work_from_home_deduction": 0}
+    }).json()["data"]
+    assert linked["total_tax"] == expected["total_tax"]
+    
+    # Moving the receipt to another return takes it out of this one
+    other = client.post("/api/tax-calculator/tax-return", json={"tax_year": "2024-25"}).json()
+    moved = client.put(f"/api/tax-calculator/tax-return/{other['id']}/documents/{receipt_id}").json()
+    assert moved["documented_deductions"] == 1500.0
+    current = client.get(f"/api/tax-calculator/tax-return/{tax_return['id']}").json()
+    assert current["documented_deductions"] == 0.0
+    assert current["taxable_income"] == 80000.0
+    assert client.delete(f"{base}/{receipt_id}").status_code == 404
+    
+    # Unlinking and deleting both subtract
+    unlinked = client.delete(f"{base}/{payg_id}").json()
+    assert unlinked["documented_employment_income"] == 0.0
+    assert unlinked["tax_paid"] == 0.0
+    assert client.delete(f"/api/documents/{receipt_id}").status_code == 200
+    assert client.get(f"/api/tax-calculator/tax-return/{other['id']}").json()["documented_deductions"] == 0.0
+    
+    assert client.put(f"{base}/999999").status_code == 404
+    assert client.put(f"/api/tax-calculator/tax-return/999999/documents/{payg_id}").status_code == 404
+
+
+def test_pending_document_counts_once_processed(client):
+    """Linking a document still in the queue records the link but adds nothing yet"""
+    tax_return = client.post("/api/tax-calculator/tax-return", json={"tax_year": "2024-25"}).json()
+    document_id = add_extracted_document("receipt", None, status="pending")
+    
+    response = client.put(f"/api/tax-calculator/tax-return/{tax_return['id']}/documents/{document_id}")
+    assert response.status_code == 200
+    assert response.json()["documented_deductions"] == 0.0
+    assert client.get(f"/api/documents/{document_id}").json()["tax_return_id"] == tax_return["id"]
+
+
+def test_tax_return_update_recalculates_only_on_changed_inputs(client, monkeypatch):
+    """Updates that leave the calculation's inputs alone skip the tax calculation"""
+    from app.core.tax_calculator import TaxCalculator
+    
+    calls = []
+    calculate_total_tax = TaxCalculator.calculate_total_tax
+    
+    def counting(self, *args, **kwargs):
+        calls.append(1)
+        return calculate_total_tax(self, *args, **kwargs)
+    
+    monkeypatch.setattr(TaxCalculator, "calculate_total_tax", counting)
+    tax_return = client.post("/api/tax-calculator/tax-return", json={"tax_year": "2024-25"}).json()
+    url = f"/api/tax-calculator/tax-return/{tax_return['id']}"
+    
+    updated = client.put(url, json={"employment_income": 70000}).json()
+    assert len(calls) == 1
+    assert updated["total_tax"] > 0
+    
+    # The same values again leave the calculation's inputs unchanged
+    assert client.put(url, json={"employment_income": 70000}).json() == updated
+    assert len(calls) == 1
+    
+    client.put(url, json={"work_from_home_deduction": 300})
+    assert len(calls) == 2
+
+
 def test_tax_calculation(client):
     """Test basic tax calculation"""
     income_data = {
@@ -91,6 +256,143 @@ def test_tax_calculation(client):
     assert calc_data["taxable_income"] == 77500
 
 
+def test_batch_tax_calculation(client):
+    """Test columnar batch tax calculation"""
+    response = client.post("/api/tax-calculator/calculate/batch", json={
+        "income_data": {"employment_income": [80000, 30000, 0]},
+        "deduction_data": {"work_related_expenses": [2500, 0, 0]}
+    })
+    
+    assert response.status_code == 200
+    data = response.json()
+    assert data["success"] is True
+    assert data["count"] == 3
+    assert data["data"]["taxable_income"] == [77500, 30000, 0]
+    
+    single = client.post("/api/tax-calculator/calculate", json={
+        "income_data": {"employment_income": 80000},
+        "deduction_data": {"work_related_expenses": 2500}
+    }).json()["data"]
+    assert data["data"]["total_tax"][0] == single["total_tax"]
+
+
+def test_batch_tax_calculation_mismatched_columns(client):
+    """Test that ragged batch columns are rejected"""
+    response = client.post("/api/tax-calculator/calculate/batch", json={
+        "income_data": {"employment_income": [80000, 30000]},
+        "deduction_data": {"work_related_expenses": [2500]}
+    })
+    assert response.status_code == 400
+
+
+def test_what_if_sweep(client):
+    """A deduction sweep returns the tax curve, marginal rates and break-even points"""
+    response = client.post("/api/tax-calculator/what-if", json={
+        "income_data": {"employment_income": 60000},
+        "sweep": [{"field": "work_related_expenses", "start": 0, "stop": 20000, "step": 100}]
+    })
+    assert response.status_code == 200
+    data = response.json()
+    assert data["tax_year"] == "2024-25"
+    assert len(data["values"]["work_related_expenses"]) == 201
+    assert data["data"]["total_tax"][0] == data["base"]["total_tax"]
+    assert data["data"]["tax_saved"][10] == 360.0  # $1,000 at 36c in the dollar
+    assert data["marginal_rates"]["work_related_expenses"][0] == -0.36
+    assert data["break_even_points"]["work_related_expenses"][0]["value"] == 15000
+    
+    # Starting from a stored return's inputs and tax year
+    tax_return = client.post("/api/tax-calculator/tax-return", json={
+        "tax_year": "2023-24", "employment_income": 60000
+    }).json()
+    stored = client.post("/api/tax-calculator/what-if", json={
+        "tax_return_id": tax_return["id"],
+        "sweep": [{"field": "salary_sacrifice", "stop": 5000, "step": 1000},
+                  {"field": "other_deductions", "stop": 1000, "step": 500}]
+    }).json()
+    assert stored["tax_year"] == "2023-24"
+    assert len(stored["data"]["total_tax"]) == 6 and len(stored["data"]["total_tax"][0]) == 3
+    
+    response = client.post("/api/tax-calculator/what-if", json={
+        "income_data": {"employment_income": 60000},
+        "sweep": [{"field": "employment_income", "start": 0, "stop": 10**9, "step": 1}]
+    })
+    assert response.status_code == 400
+    assert "Sweep too large" in response.json()["detail"]
+    response = client.post("/api/tax-calculator/what-if", json={
+        "income_data": {"employment_income": 60000},
+        "sweep": [{"field": "other_deductions", "stop": 0.01, "step": 0.001}]
+    })
+    assert response.status_code == 400
+    assert "at least 0.01" in response.json()["detail"]
+    response = client.post("/api/tax-calculator/what-if", json={"tax_return_id": 999999, "sweep": []})
+    assert response.status_code == 404
+
+def request_with_timeout(client, method, url, timeout=10, **kwargs):
+    """Send from a daemon thread so a deadlocked endpoint fails instead of hanging"""
+    outcome = {}
+    
+    def send():
+        try:
+            outcome["response"] = client.request(method, url, **kwargs)
+        except Exception as e:
+            outcome["error"] = e
+    
+    worker = threading.Thread(target=send, daemon=True)
+    worker.start()
+    worker.join(timeout)
+    assert not worker.is_alive(), f"{method} {url} did not complete within {timeout}s"
+    if "error" in outcome:
+        raise outcome["error"]
+    return outcome["response"]
+
+
+def post_with_timeout(client, url, timeout=10, **kwargs):
+    return request_with_timeout(client, "POST", url, timeout, **kwargs)
+
+
+def test_streaming_tax_calculation(client):
+    """Test NDJSON streaming bulk calculation"""
+    payload = "\n".join([
+        '{"id": 1, "income_data": {"employment_income": 80000}, "deduction_data": {"work_related_expenses": 2500}}',
+        '{"id": 2, "income_data": {"employment_income": null}}',
+        'oops'
+    ])
+    response = post_with_timeout(
+        client,
+        "/api/tax-calculator/calculate/stream",
+        content=payload,
+        headers={"Content-Type": "application/x-ndjson"}
+    )
+    
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert len(rows) == 3
+    assert rows[0]["data"]["taxable_income"] == 77500
+    assert rows[1]["success"] is True
+    assert rows[2]["success"] is False
+
+
+def test_streaming_tax_calculation_csv_chunked(client):
+    """Test CSV streaming with a request body sent in many chunks"""
+    lines = [b"id,employment_income,work_related_expenses\n"]
+    lines += [f"r{number},{50000 + number},100\n".encode() for number in range(500)]
+    
+    response = post_with_timeout(
+        client,
+        "/api/tax-calculator/calculate/stream",
+        content=iter(lines),
+        headers={"Content-Type": "text/csv"}
+    )
+    
+    assert response.status_code == 200
+    assert "content-length" not in response.headers
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert len(rows) == 500
+    assert all(row["success"] for row in rows)
+    assert rows[-1]["id"] == "r499"
+
+
 def test_work_from_home_calculation(client):
     """Test work from home deduction calculation"""
     response = client.post("/api/tax-calculator/work-from-home", json={
@@ -118,6 +420,52 @@ def test_tax_estimation(client):
     assert "estimated_total_tax" in data
 
 
+def test_tax_estimation_http_caching(client):
+    """Estimates carry an ETag and revalidate to 304 without recomputing"""
+    response = client.get("/api/tax-calculator/estimate?taxable_income=61234.5")
+    assert response.status_code == 200
+    etag = response.headers["etag"]
+    assert "max-age" in response.headers["cache-control"]
+    
+    stats = client.get("/api/tax-calculator/estimate/cache/stats").json()
+    response = client.get(
+        "/api/tax-calculator/estimate?taxable_income=61234.50",
+        headers={"If-None-Match": etag}
+    )
+    assert response.status_code == 304
+    assert response.content == b""
+    assert client.get("/api/tax-calculator/estimate/cache/stats").json() == stats
+    
+    # A different tax year is a different resource
+    response = client.get(
+        "/api/tax-calculator/estimate?taxable_income=61234.5&tax_year=2023-24",
+        headers={"If-None-Match": etag}
+    )
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+
+
+def test_tax_estimation_is_memoized(client):
+    """Repeated estimates for the same cent are served from the memo"""
+    first = client.post("/api/tax-calculator/estimate?taxable_income=48000.004")
+    before = client.get("/api/tax-calculator/estimate/cache/stats").json()
+    second = client.post("/api/tax-calculator/estimate?taxable_income=48000")
+    after = client.get("/api/tax-calculator/estimate/cache/stats").json()
+    
+    assert first.json() == second.json()
+    assert after["hits"] == before["hits"] + 1
+    assert after["misses"] == before["misses"]
+
+
+def test_tax_brackets_etag(client):
+    """Brackets revalidate against the rule set version"""
+    response = client.get("/api/tax-calculator/brackets")
+    etag = response.headers["etag"]
+    
+    response = client.get("/api/tax-calculator/brackets", headers={"If-None-Match": f'W/{etag}, "other"'})
+    assert response.status_code == 304
+
+
 def test_document_upload_invalid_file_type(client):
     """Test document upload with invalid file type"""
     # Create a temporary text file
@@ -138,6 +486,623 @@ def test_document_upload_invalid_file_type(client):
         os.unlink(tmp_path)
 
 
+def test_document_upload_is_queued(client):
+    """Test that uploads return immediately with a queued processing job"""
+    from PIL import Image
+    
+    buffer = io.BytesIO()
+    Image.new("RGB", (32, 32), "white").save(buffer, format="PNG")
+    buffer.seek(0)
+    
+    response = client.post(
+        "/api/documents/upload",
+        files={"file": ("receipt.png", buffer, "image/png")}
+    )
+    
+    assert response.status_code == 202
+    data = response.json()
+    assert data["status"] == "pending"
+    assert data["job_id"] > 0
+    
+    status_response = client.get(f"/api/documents/{data['id']}/status")
+    assert status_response.status_code == 200
+    status_data = status_response.json()
+    assert status_data["status"] == "pending"
+    assert status_data["job"]["id"] == data["job_id"]
+    assert status_data["job"]["status"] == "queued"
+    assert status_data["job"]["attempts"] == 0
+    
+    # Clean up the stored file
+    assert client.delete(f"/api/documents/{data['id']}").status_code == 200
+
+
+def test_document_upload_rejects_oversize_and_mislabelled_files(client, monkeypatch):
+    """Streaming upload enforces the size limit and the sniffed file type"""
+    from app.config import settings
+    
+    monkeypatch.setattr(settings, "max_file_size", 1000)
+    before = set(os.listdir(settings.upload_directory))
+    
+    response = client.post(
+        "/api/documents/upload",
+        files={"file": ("big.pdf", b"%PDF-1.4\n" + b"x" * 5000, "application/pdf")}
+    )
+    assert response.status_code == 400
+    assert "File too large" in response.json()["detail"]
+    
+    response = client.post(
+        "/api/documents/upload",
+        files={"file": ("photo.png", b"GIF89a not a png", "image/png")}
+    )
+    assert response.status_code == 400
+    assert "does not match" in response.json()["detail"]
+    
+    assert set(os.listdir(settings.upload_directory)) == before
+
+
+def test_document_upload_stores_sniffed_type(client):
+    """The stored content type comes from the file's bytes, not the client"""
+    from PIL import Image
+    
+    buffer = io.BytesIO()
+    Image.new("RGB", (8, 8), "white").save(buffer, format="PNG")
+    response = client.post(
+        "/api/documents/upload",
+        files={"file": ("scan.jpg", buffer.getvalue(), "application/octet-stream")}
+    )
+    assert response.status_code == 202
+    data = response.json()
+    assert data["content_type"] == "image/png"
+    assert data["file_size"] == len(buffer.getvalue())
+    
+    client.delete(f"/api/documents/{data['id']}")
+
+
+def test_duplicate_upload_reuses_extraction(client):
+    """Test that re-uploading identical content is served from the cache"""
+    from PIL import Image
+    from app.core.job_queue import job_queue
+    
+    buffer = io.BytesIO()
+    Image.new("RGB", (16, 16), "black").save(buffer, format="PNG")
+    content = buffer.getvalue()
+    
+    first = client.post(
+        "/api/documents/upload",
+        files={"file": ("payg.png", content, "image/png")}
+    ).json()
+    assert first["cached"] is False
+    
+    # Complete the first upload as a worker would
+    db = TestingSessionLocal()
+    try:
+        job_queue.claim_due_jobs(db, limit=10)
+        job_queue.record_result(db, first["job_id"], {
+            'success': True,
+            'ocr_text': "PAYG payment summary",
+            'document_type': "payg_summary",
+            'extracted_data': {'gross_payments': 80000.0},
+            'error': None
+        })
+    finally:
+        db.close()
+    
+    second = client.post(
+        "/api/documents/upload",
+        files={"file": ("payg-copy.png", content, "image/png")}
+    )
+    assert second.status_code == 202
+    data = second.json()
+    assert data["cached"] is True
+    assert data["job_id"] is None
+    assert data["status"] == "completed"
+    assert data["content_hash"] == first["content_hash"]
+    assert data["extracted_data"] == {'gross_payments': 80000.0}
+    
+    stats = client.get("/api/documents/cache/stats").json()
+    assert stats["hits"] >= 1
+    assert stats["entries"] == 1
+    
+    client.delete(f"/api/documents/{first['id']}")
+    client.delete(f"/api/documents/{data['id']}")
+
+
+def test_bulk_upload_creates_batch(client):
+    """Files and ZIP archive members become one batch whose progress can be polled"""
+    import zipfile
+    from PIL import Image
+    from app.core.job_queue import job_queue
+    
+    def png(color):
+        buffer = io.BytesIO()
+        Image.new("RGB", (8, 8), color).save(buffer, format="PNG")
+        return buffer.getvalue()
+    
+    # An earlier extraction of one of the files
+    first = client.post("/api/documents/upload", files={"file": ("payg.png", png("black"), "image/png")}).json()
+    db = TestingSessionLocal()
+    try:
+        job_queue.claim_due_jobs(db, limit=10)
+        job_queue.record_result(db, first["job_id"], {
+            'success': True, 'ocr_text': "PAYG payment summary", 'document_type': "payg_summary",
+            'extracted_data': {'gross_payments': 80000.0}, 'error': None
+        })
+    finally:
+        db.close()
+    
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as zip_file:
+        zip_file.writestr("receipts/one.png", png("red"))
+        zip_file.writestr("receipts/two.png", png("blue"))
+        zip_file.writestr("payg-copy.png", png("black"))
+        zip_file.writestr("readme.txt", "not a document")
+    
+    response = client.post("/api/documents/upload/batch", files=[
+        ("file", ("statement.png", png("white"), "image/png")),
+        ("file", ("shoebox.zip", archive.getvalue(), "application/zip")),
+    ])
+    assert response.status_code == 202
+    batch = response.json()
+    assert batch["document_count"] == 4
+    assert batch["rejected"] == [{'filename': "readme.txt", 'error': "File type not allowed"}]
+    assert batch["status_counts"] == {'pending': 3, 'completed': 1}
+    assert batch["finished"] is False
+    
+    documents = {document["original_filename"]: document for document in batch["documents"]}
+    assert set(documents) == {"statement.png", "receipts/one.png", "receipts/two.png", "payg-copy.png"}
+    assert all(document["batch_id"] == batch["id"] for document in documents.values())
+    assert documents["payg-copy.png"]["cached"] is True
+    assert documents["payg-copy.png"]["document_type"] == "payg_summary"
+    assert client.get(f"/api/documents/{documents['payg-copy.png']['id']}").json()["extracted_data"] == {
+        'gross_payments': 80000.0
+    }
+    
+    # Every other document has its own queued job
+    job_ids = {document["job_id"] for name, document in documents.items() if name != "payg-copy.png"}
+    assert len(job_ids) == 3 and None not in job_ids
+    status = client.get(f"/api/documents/{documents['statement.png']['id']}/status").json()
+    assert status["job"]["id"] == documents["statement.png"]["job_id"]
+    assert status["job"]["status"] == "queued"
+    
+    listed = client.get(f"/api/documents/?batch_id={batch['id']}").json()
+    assert sorted(document["id"] for document in listed) == sorted(document["id"] for document in documents.values())
+    
+    db = TestingSessionLocal()
+    try:
+        for job in job_queue.claim_due_jobs(db, limit=10):
+            job_queue.record_result(db, job.job_id, {
+                'success': True, 'ocr_text': "TAX INVOICE", 'document_type': "receipt",
+                'extracted_data': {'total_amount': 10.0}, 'error': None
+            })
+    finally:
+        db.close()
+    progress = client.get(f"/api/documents/batches/{batch['id']}").json()
+    assert progress["status_counts"] == {'completed': 4}
+    assert progress["progress"] == 1.0
+    assert progress["finished"] is True
+    
+    assert client.get("/api/documents/batches/999999").status_code == 404
+    response = client.post("/api/documents/upload/batch", files={"file": ("notes.txt", b"hello", "text/plain")})
+    assert response.status_code == 400
+    assert "notes.txt: File type not allowed" in response.json()["detail"]
+    
+    for document in [first, *documents.values()]:
+        client.delete(f"/api/documents/{document['id']}")
+
+def test_statement_transactions_listed_and_copied_on_cache_hit(client):
+    """Transactions page by row number and follow the cached extraction to a re-upload"""
+    from datetime import date
+    from PIL import Image
+    from app.core.bank_transactions import Transaction, spill_transactions
+    from app.core.job_queue import job_queue
+    
+    buffer = io.BytesIO()
+    Image.new("RGB", (16, 16), "white").save(buffer, format="PNG")
+    content = buffer.getvalue()
+    
+    first = client.post("/api/documents/upload", files={"file": ("statement.png", content, "image/png")}).json()
+    path, count = spill_transactions(
+        Transaction(None, date(2024, 7, day), f"Row {day}", 1.0, None, 100.0 - day) for day in range(1, 4)
+    )
+    db = TestingSessionLocal()
+    try:
+        job_queue.claim_due_jobs(db, limit=10)
+        job_queue.record_result(db, first["job_id"], {
+            'success': True,
+            'ocr_text': "Bank statement",
+            'document_type': "bank_statement",
+            'extracted_data': {'transaction_count': count},
+            'transactions_path': path,
+            'error': None
+        })
+    finally:
+        db.close()
+        os.remove(path)
+    
+    response = client.get(f"/api/documents/{first['id']}/transactions?limit=2")
+    assert [row["description"] for row in response.json()] == ["Row 1", "Row 2"]
+    assert response.json()[0]["transaction_date"] == "2024-07-01"
+    next_page = client.get(
+        f"/api/documents/{first['id']}/transactions?limit=2&cursor={response.headers['X-Next-Cursor']}"
+    )
+    assert [row["description"] for row in next_page.json()] == ["Row 3"]
+    assert "X-Next-Cursor" not in next_page.headers
+    
+    in_range = client.get(f"/api/documents/{first['id']}/transactions?date_from=2024-07-02&date_to=2024-07-02")
+    assert [row["row_number"] for row in in_range.json()] == [1]
+    
+    second = client.post("/api/documents/upload", files={"file": ("copy.png", content, "image/png")}).json()
+    assert second["cached"] is True
+    copied = client.get(f"/api/documents/{second['id']}/transactions").json()
+    assert [row["description"] for row in copied] == ["Row 1", "Row 2", "Row 3"]
+    assert [(row["debit"], row["balance"]) for row in copied] == [(1.0, 99.0), (1.0, 98.0), (1.0, 97.0)]
+    
+    # Once every copy is deleted the next upload is extracted again
+    client.delete(f"/api/documents/{first['id']}")
+    client.delete(f"/api/documents/{second['id']}")
+    third = client.post("/api/documents/upload", files={"file": ("again.png", content, "image/png")}).json()
+    assert third["cached"] is False
+    client.delete(f"/api/documents/{third['id']}")
+
+
+def parse_server_sent_events(body):
+    events = []
+    for block in body.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines() if not line.startswith(":"))
+        if fields:
+            events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+
+def test_document_events_stream_status_changes(client):
+    """Followed documents' statuses come first, then their changes until all have finished"""
+    from app.core.status_events import status_broker
+    
+    done_id = add_extracted_document("receipt", {'total_amount': 12.5})
+    pending_id = add_extracted_document("receipt", None, status="pending")
+    
+    def finish_pending():
+        deadline = time.monotonic() + 5
+        while pending_id not in status_broker._by_document and time.monotonic() < deadline:
+            time.sleep(0.01)
+        status_broker.publish({'document_id': pending_id, 'status': "completed",
+                               'extracted_data': {'total_amount': 3.0}})
+    
+    threading.Thread(target=finish_pending, daemon=True).start()
+    response = request_with_timeout(
+        client, "GET", f"/api/documents/events?document_id={done_id}&document_id={pending_id}"
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = parse_server_sent_events(response.text)
+    assert [(event, data.get('document_id'), data.get('status')) for event, data in events] == [
+        ("status", done_id, "completed"),
+        ("status", pending_id, "pending"),
+        ("status", pending_id, "completed"),
+        ("done", None, None),
+    ]
+    assert events[0][1]["extracted_data"] == {'total_amount': 12.5}
+    assert events[2][1]["extracted_data"] == {'total_amount': 3.0}
+    assert pending_id not in status_broker._by_document
+    
+    response = client.get(f"/api/documents/events?document_id={done_id}&document_id=999999")
+    assert response.status_code == 404
+    assert "999999" in response.json()["detail"]
+
+
+def test_document_status_not_found(client):
+    """Test polling status of a missing document"""
+    response = client.get("/api/documents/9999/status")
+    assert response.status_code == 404
+
+
+def test_document_list_keyset_pagination(client):
+    """Pages follow (created_at, id) through ties, with heavy fields opt-in"""
+    from datetime import datetime
+    
+    db = TestingSessionLocal()
+    try:
+        created_at = datetime(2024, 7, 1, 9, 30)
+        for number in range(7):
+            db.add(Document(
+                filename=f"doc{number}.pdf",
+                original_filename=f"doc{number}.pdf",
+                file_path=f"/nonexistent/doc{number}.pdf",
+                file_size=100,
+                content_type="application/pdf",
+                status="completed" if number % 2 else "pending",
+                ocr_text="x" * 1000,
+                extracted_data={'number': number},
+                created_at=created_at  # Identical timestamps; id breaks the tie
+            ))
+        db.commit()
+    finally:
+        db.close()
+    
+    seen = []
+    url = "/api/documents/?limit=3"
+    while url:
+        response = client.get(url)
+        assert response.status_code == 200
+        page = response.json()
+        assert all("ocr_text" not in row and "extracted_data" not in row for row in page)
+        seen.extend(row["filename"] for row in page)
+        cursor = response.headers.get("x-next-cursor")
+        assert ("link" in response.headers) == (cursor is not None)
+        url = f"/api/documents/?limit=3&cursor={cursor}" if cursor else None
+    assert seen == [f"doc{number}.pdf" for number in range(7)]
+    
+    response = client.get("/api/documents/?status=completed&include=extracted_data")
+    rows = response.json()
+    assert [row["extracted_data"]["number"] for row in rows] == [1, 3, 5]
+    assert all("ocr_text" not in row for row in rows)
+    
+    assert client.get("/api/documents/?include=file_path").status_code == 400
+    assert client.get("/api/documents/?cursor=not-a-cursor").status_code == 400
+
+
+def test_document_contents_migrated_off_documents_table(tmp_path):
+    """Existing OCR text and extracted data move to document_contents, once"""
+    from sqlalchemy import JSON, Column, MetaData, Text, inspect, insert
+    from app.database.migrations import upgrade_database
+    from app.models.models import DocumentContent
+    
+    legacy_engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    legacy_metadata = MetaData()
+    TaxReturn.__table__.to_metadata(legacy_metadata)
+    UploadBatch.__table__.to_metadata(legacy_metadata)
+    legacy_documents = Document.__table__.to_metadata(legacy_metadata)
+    legacy_documents.append_column(Column("ocr_text", Text))
+    legacy_documents.append_column(Column("extracted_data", JSON))
+    legacy_documents.create(legacy_engine)
+    with legacy_engine.begin() as connection:
+        for number in range(5):
+            row = {'filename': f"doc{number}.pdf", 'original_filename': f"doc{number}.pdf",
+                   'file_path': f"/nonexistent/doc{number}.pdf", 'file_size': 100,
+                   'content_type': "application/pdf"}
+            if number != 2:  # Still pending: nothing extracted yet
+                row.update(ocr_text=f"Receipt {number} " * 50, extracted_data={'number': number})
+            connection.execute(insert(legacy_documents), row)
+    
+    upgrade_database(legacy_engine)
+    assert "ocr_text" not in {column["name"] for column in inspect(legacy_engine).get_columns("documents")}
+    upgrade_database(legacy_engine)
+    
+    db = sessionmaker(bind=legacy_engine)()
+    try:
+        documents = db.query(Document).order_by(Document.id).all()
+        assert [document.extracted_data for document in documents] == [
+            {'number': 0}, {'number': 1}, None, {'number': 3}, {'number': 4}
+        ]
+        assert documents[4].ocr_text == "Receipt 4 " * 50
+        assert db.query(DocumentContent).count() == 4
+        stored = db.query(DocumentContent.ocr_text).filter(DocumentContent.document_id == documents[4].id)
+        assert stored.scalar() == "Receipt 4 " * 50
+    finally:
+        db.close()
+        legacy_engine.dispose()
+
+
+def test_missing_columns_added_to_existing_tables(tmp_path):
+    """Columns added to the models reach databases created before them"""
+    from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, inspect, insert
+    from alembic import command
+    from app.database.migrations import alembic_config, upgrade_database
+    
+    old_engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    old_documents = Table(
+        "documents", MetaData(),
+        Column("id", Integer, primary_key=True, index=True),
+        *(Column(name, String) for name in ("filename", "original_filename", "file_path", "content_type",
+                                            "status", "document_type")),
+        Column("file_size", Integer),
+        *(Column(name, DateTime) for name in ("created_at", "updated_at", "processed_at")),
+    )
+    old_documents.create(old_engine)
+    with old_engine.begin() as connection:
+        connection.execute(insert(old_documents).values(
+            filename="old.pdf", original_filename="old.pdf", file_path="/nonexistent/old.pdf",
+            file_size=100, content_type="application/pdf", status="completed"
+        ))
+    
+    upgrade_database(old_engine)
+    inspector = inspect(old_engine)
+    columns = {column["name"] for column in inspector.get_columns("documents")}
+    assert {"content_hash", "classification_confidence", "tax_return_id", "return_contribution", "batch_id"} <= columns
+    indexes = {index["name"] for index in inspector.get_indexes("documents")}
+    assert {"ix_documents_content_hash", "ix_documents_tax_return_id", "ix_documents_batch_id"} <= indexes
+    assert {key["referred_table"] for key in inspector.get_foreign_keys("documents")} == {"tax_returns", "upload_batches"}
+    
+    db = sessionmaker(bind=old_engine)()
+    try:
+        document = db.query(Document).one()
+        assert document.filename == "old.pdf" and document.batch_id is None
+    finally:
+        db.close()
+    
+    with old_engine.begin() as connection:
+        command.downgrade(alembic_config(connection), "0001")
+    columns = {column["name"] for column in inspect(old_engine).get_columns("documents")}
+    assert not columns & {"content_hash", "tax_return_id", "batch_id"} and "filename" in columns
+    old_engine.dispose()
+
+
+def test_current_databases_only_stamped(tmp_path):
+    """A database already in the models' shape, but never upgraded, only gets its revision recorded"""
+    from sqlalchemy import inspect
+    from alembic.script import ScriptDirectory
+    from app.database.migrations import alembic_config, current_revision, upgrade_database
+    
+    current_engine = create_engine(f"sqlite:///{tmp_path / 'current.db'}")
+    Base.metadata.create_all(bind=current_engine)
+    before = {name: inspect(current_engine).get_columns(name) for name in Base.metadata.tables}
+    assert current_revision(current_engine) is None
+    
+    upgrade_database(current_engine)
+    assert current_revision(current_engine) == ScriptDirectory.from_config(alembic_config(None)).get_current_head()
+    after = {name: inspect(current_engine).get_columns(name) for name in Base.metadata.tables}
+    assert repr(after) == repr(before)
+    current_engine.dispose()
+
+
+def test_tax_return_amounts_converted_to_cents(tmp_path):
+    """Float dollar columns of existing databases become whole-cent columns, once"""
+    from sqlalchemy import Boolean, Column, DateTime, Float, Integer, MetaData, String, Table, inspect, insert
+    from alembic import command
+    from app.database.migrations import alembic_config, upgrade_database
+    from app.models.models import Cents
+    
+    legacy_engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    legacy_returns = Table(
+        "tax_returns", MetaData(),
+        Column("id", Integer, primary_key=True),
+        Column("tax_year", String),
+        Column("is_completed", Boolean),
+        Column("created_at", DateTime),
+        Column("updated_at", DateTime),
+        *(Column(key, Float) for key, model_column in TaxReturn.__mapper__.columns.items()
+          if isinstance(model_column.type, Cents))
+    )
+    legacy_returns.create(legacy_engine)
+    with legacy_engine.begin() as connection:
+        connection.execute(insert(legacy_returns).values(
+            tax_year="2024-25", employment_income=80000.1, documented_deductions=0.1 + 0.2,
+            total_tax=15788.005000000001
+        ))
+        connection.execute(insert(legacy_returns).values(tax_year="2024-25"))
+    
+    upgrade_database(legacy_engine)
+    upgrade_database(legacy_engine)
+    columns = {column["name"]: column for column in inspect(legacy_engine).get_columns("tax_returns")}
+    assert "employment_income" not in columns
+    assert str(columns["employment_income_cents"]["type"]) == "BIGINT"
+    
+    db = sessionmaker(bind=legacy_engine)()
+    try:
+        converted, empty = db.query(TaxReturn).order_by(TaxReturn.id).all()
+        assert converted.employment_income == 80000.1
+        assert converted.documented_deductions == 0.3
+        assert converted.total_tax == 15788.01
+        assert empty.employment_income is None
+    finally:
+        db.close()
+    
+    # And back
+    with legacy_engine.begin() as connection:
+        command.downgrade(alembic_config(connection), "0002")
+        assert connection.exec_driver_sql(
+            "SELECT employment_income, documented_deductions FROM tax_returns ORDER BY id"
+        ).all() == [(80000.1, 0.3), (None, 0.0)]
+    legacy_engine.dispose()
+
+
+def test_extraction_cache_text_compressed(tmp_path):
+    """Cached OCR text stored as plain text is rewritten compressed"""
+    from sqlalchemy import Column, DateTime, Float, Integer, MetaData, String, Table, Text, inspect, insert
+    from app.database.migrations import upgrade_database
+    from app.models.models import ExtractionCacheEntry
+    
+    legacy_engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    legacy_cache = Table(
+        "extraction_cache", MetaData(),
+        Column("content_hash", String(64), primary_key=True),
+        Column("processor_version", String, primary_key=True),
+        Column("ocr_text", Text),
+        Column("document_type", String),
+        Column("classification_confidence", Float),
+        Column("extracted_data", Text),
+        Column("hit_count", Integer),
+        Column("created_at", DateTime),
+        Column("last_used_at", DateTime),
+    )
+    legacy_cache.create(legacy_engine)
+    texts = {f"{number:064x}": None if number == 3 else f"Statement line {number}\n" * 200 for number in range(1200)}
+    with legacy_engine.begin() as connection:
+        connection.execute(insert(legacy_cache), [
+            {'content_hash': content_hash, 'processor_version': "1", 'ocr_text': text}
+            for content_hash, text in texts.items()
+        ])
+    
+    upgrade_database(legacy_engine)
+    columns = {column["name"]: column for column in inspect(legacy_engine).get_columns("extraction_cache")}
+    assert str(columns["ocr_text"]["type"]) == "BLOB"
+    with legacy_engine.connect() as connection:
+        stored = connection.exec_driver_sql(
+            "SELECT ocr_text FROM extraction_cache WHERE content_hash = ?", (f"{0:064x}",)
+        ).scalar()
+        assert isinstance(stored, bytes) and len(stored) < len(texts[f"{0:064x}"]) / 10
+    
+    db = sessionmaker(bind=legacy_engine)()
+    try:
+        entries = db.query(ExtractionCacheEntry).all()
+        assert {entry.content_hash: entry.ocr_text for entry in entries} == texts
+    finally:
+        db.close()
+        legacy_engine.dispose()
+
+
+def test_bank_transaction_amounts_converted_to_cents(tmp_path):
+    """Stored statement amounts become whole cents, and copies of them stay exact"""
+    from sqlalchemy import Column, Date, Float, Integer, MetaData, Table, Text, inspect, insert
+    from app.database.migrations import upgrade_database
+    from app.models.models import BankTransaction
+    
+    legacy_engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    legacy_metadata = MetaData()
+    for model_table in (TaxReturn.__table__, UploadBatch.__table__, Document.__table__):
+        model_table.to_metadata(legacy_metadata)
+    legacy_transactions = Table(
+        "bank_transactions", legacy_metadata,
+        Column("id", Integer, primary_key=True),
+        Column("document_id", Integer),
+        Column("row_number", Integer),
+        Column("page", Integer),
+        Column("transaction_date", Date),
+        Column("description", Text),
+        *(Column(name, Float) for name in ("debit", "credit", "balance")),
+    )
+    legacy_metadata.create_all(legacy_engine)
+    with legacy_engine.begin() as connection:
+        connection.execute(insert(legacy_transactions), [
+            {'document_id': 1, 'row_number': 0, 'description': "Coffee", 'debit': 4.3, 'credit': None,
+             'balance': 0.1 + 0.2},
+            {'document_id': 1, 'row_number': 1, 'description': "Salary", 'debit': None, 'credit': 2500.005,
+             'balance': None},
+        ])
+    
+    upgrade_database(legacy_engine)
+    columns = {column["name"] for column in inspect(legacy_engine).get_columns("bank_transactions")}
+    assert {"debit_cents", "credit_cents", "balance_cents"} <= columns and "debit" not in columns
+    
+    db = sessionmaker(bind=legacy_engine)()
+    try:
+        coffee, salary = db.query(BankTransaction).order_by(BankTransaction.row_number).all()
+        assert (coffee.debit, coffee.credit, coffee.balance) == (4.3, None, 0.3)
+        assert salary.credit == 2500.01
+    finally:
+        db.close()
+        legacy_engine.dispose()
+
+
+def test_running_totals_stay_exact(client):
+    """A thousand 10c receipts add up to exactly $100 in the stored totals"""
+    from app.core.return_totals import _shift_totals
+    
+    tax_return = client.post("/api/tax-calculator/tax-return", json={"tax_year": "2024-25"}).json()
+    db = TestingSessionLocal()
+    try:
+        for _ in range(1000):
+            _shift_totals(db, tax_return["id"], {'documented_deductions': 0.1})
+        db.commit()
+    finally:
+        db.close()
+    
+    stored = client.get(f"/api/tax-calculator/tax-return/{tax_return['id']}").json()
+    assert stored["documented_deductions"] == 100.0
+    with engine.connect() as connection:
+        assert connection.exec_driver_sql("SELECT documented_deductions_cents FROM tax_returns").scalar() == 10000
+
+
 def test_document_list_empty(client):
     """Test listing documents when none exist"""
     response = client.get("/api/documents/")
@@ -0,0 +1,629 @@
+import asyncio
+import hashlib
+import io
+import os
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw, ImageFont
+
+from app.core import document_processor as processor_module
+from app.core.document_processor import DocumentProcessor
+from app.core.bank_transactions import parse_transactions, read_spilled_batches, text_statement_lines
+from app.core.document_classifier import DocumentClassifier, KeywordMatcher
+from app.core.image_preprocessing import (
+    ASSUMED_PAGE_INCHES, PreprocessOptions, estimate_skew, open_for_ocr, preprocess_for_ocr
+)
+from app.core import ocr_engine as ocr_engine_module
+from app.core.ocr_engine import PROBE_TEXT, OcrEnginePool, probe_image
+from app.core.field_extraction import FieldRule, ExtractionProfile, extract_fields
+from app.models.models import DocumentType
+from app.core.upload_stream import (
+    UploadError, UploadTooLargeError, receive_upload, receive_uploads, sniff_content_type
+)
+
+
+def make_pdf(path, pages):
+    """Write a minimal PDF with one text line per page (None for a blank page)
+    
+    A page may instead be a list of ``(x, y, text)`` cells.
+    """
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # Pages tree, filled in once the page ids are known
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    page_ids = []
+    for text in pages:
+        stream = b""
+        if text is not None:
+            cells = [(72, 720, text)] if isinstance(text, str) else text
+            stream = " ".join(f"BT /F1 12 Tf {x} {y} Td ({cell}) Tj ET" for x, y, cell in cells).encode()
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        content_id = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id
+        )
+        page_ids.append(len(objects))
+    kids = b" ".join(b"%d 0 R" % page_id for page_id in page_ids)
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(page_ids))
+    
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(output))
+        output += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref_offset = len(output)
+    output += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        output += b"%010d 00000 n \n" % offset
+    output += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+        len(objects) + 1, xref_offset
+    )
+    with open(path, "wb") as f:
+        f.write(bytes(output))
+    return path
+
+
+@pytest.fixture
+def processor():
+    return DocumentProcessor()
+
+
+class TestPdfExtraction:
+    """Test cases for PDF text extraction"""
+    
+    def test_serial_extraction_keeps_page_order(self, tmp_path, processor):
+        """Small PDFs are extracted in-process, one page after another"""
+        path = make_pdf(tmp_path / "summary.pdf", ["Page one", "Page two", "Page three"])
+        
+        text = processor.extract_text_from_pdf(str(path))
+        assert text == "Page one\nPage two\nPage three"
+    
+    def test_page_batches_cover_every_page_once(self):
+        """Page batches are contiguous, ordered and complete"""
+        batches = processor_module.pdf_page_batches(50, workers=2)
+        assert len(batches) == 8  # batches of ceil(50 / 8) = 7 pages
+        assert [page for batch in batches for page in batch] == list(range(50))
+    
+    def test_only_blank_pages_are_ocrd(self, tmp_path, processor, monkeypatch):
+        """Pages without a text layer fall back to OCR; others do not"""
+        ocr_calls = []
+        
+        def fake_ocr(page, resolution):
+            ocr_calls.append(page.page_number)
+            return "Scanned text"
+        
+        monkeypatch.setattr(processor_module, "_ocr_pdf_page", fake_ocr)
+        path = make_pdf(tmp_path / "scan.pdf", ["Typed text", None, "More typed text"])
+        
+        text = processor.extract_text_from_pdf(str(path))
+        assert text == "Typed text\nScanned text\nMore typed text"
+        assert ocr_calls == [2]
+
+
+def text_image(lines, size=(1400, 1000), angle=0.0):
+    """White page with black text lines, optionally rotated counter-clockwise"""
+    image = Image.new("L", size, 255)
+    draw = ImageDraw.Draw(image)
+    font = ImageFont.load_default(size=28)
+    for number, line in enumerate(lines):
+        draw.text((200, 200 + number * 45), line, font=font, fill=0)
+    if angle:
+        image = image.rotate(angle, Image.BICUBIC, fillcolor=255)
+    return image
+
+
+class TestImagePreprocessing:
+    """Test cases for image preprocessing ahead of OCR"""
+    
+    LINES = [f"Receipt line {number} total 12.50 GST 1.14" for number in range(12)]
+    
+    def test_deskew_recovers_rotation(self):
+        for angle in (3.0, -4.5):
+            skew = estimate_skew(text_image(self.LINES, angle=angle), max_degrees=10)
+            assert skew == pytest.approx(angle, abs=0.5)
+        assert estimate_skew(text_image(self.LINES), max_degrees=10) == pytest.approx(0, abs=0.2)
+    
+    def test_output_is_binary_and_cropped(self):
+        image = text_image(self.LINES).convert("RGB")
+        options = PreprocessOptions(target_dpi=300)
+        
+        prepared = preprocess_for_ocr(image, options, dpi=300)
+        pixels = np.asarray(prepared)
+        assert prepared.mode == "L"
+        assert set(np.unique(pixels)) <= {0, 255}
+        # Margins around the text are cropped away
+        assert prepared.width < image.width - 200 and prepared.height < image.height - 200
+    
+    def test_downscales_to_target_dpi(self):
+        """Images without believable DPI are sized as an A4 page"""
+        image = Image.new("L", (6000, 4000), 255)
+        options = PreprocessOptions(target_dpi=300, deskew=False, crop=False)
+        
+        prepared = preprocess_for_ocr(image, options)
+        assert max(prepared.size) == pytest.approx(ASSUMED_PAGE_INCHES * 300, abs=2)
+        # Never upscaled
+        assert preprocess_for_ocr(image, options, dpi=200).size == image.size
+    
+    def test_jpeg_decoded_at_reduced_size(self, tmp_path):
+        path = tmp_path / "photo.jpg"
+        Image.new("RGB", (6000, 4000), (250, 240, 230)).save(path, "JPEG", dpi=(72, 72))
+        
+        image, dpi = open_for_ocr(str(path), PreprocessOptions(target_dpi=150))
+        assert image.mode == "L"
+        # 1755px is needed; libjpeg's 1/2 scale is the smallest not below it
+        assert image.width == 3000
+        assert dpi == pytest.approx(6000 / ASSUMED_PAGE_INCHES / 2)
+    
+    def test_disabled_returns_rgb(self):
+        image = text_image(self.LINES)
+        prepared = preprocess_for_ocr(image, PreprocessOptions(enabled=False))
+        assert prepared.mode == "RGB" and prepared.size == image.size
+    
+    def test_tesseract_settings_passed_through(self, tmp_path, monkeypatch):
+        calls = []
+        
+        def fake_image_to_string(image, lang=None, config=""):
+            calls.append((image.mode, lang, config))
+            return " Total: $12.50 \n"
+        
+        monkeypatch.setattr(ocr_engine_module, "tesserocr", None)
+        monkeypatch.setattr(ocr_engine_module.pytesseract, "image_to_string", fake_image_to_string)
+        path = tmp_path / "receipt.png"
+        text_image(self.LINES).save(path)
+        processor = DocumentProcessor()
+        processor.ocr_options = PreprocessOptions(
+            page_segmentation_mode=6, language="eng+fra", tessdata_dir="/opt/tessdata"
+        )
+        
+        assert processor.extract_text_from_image(str(path)) == "Total: $12.50"
+        assert calls == [("L", "eng+fra", '--psm 6 --tessdata-dir "/opt/tessdata"')]
+
+
+
+def make_tiff(path, page_count):
+    """Multi-page TIFF whose page n is (n + 1) * 10 pixels wide"""
+    pages = [Image.new("L", ((number + 1) * 10, 20), 255) for number in range(page_count)]
+    pages[0].save(path, save_all=True, append_images=pages[1:])
+    return path
+
+
+def fake_frame_ocr(image, options, dpi=None):
+    """Reads a frame made by make_tiff back as its page number"""
+    return f"Frame {image.width // 10}\n"
+
+
+class TestMultiPageImages:
+    """Test cases for frame-by-frame OCR of TIFF/HEIF scans"""
+    
+    def test_frames_read_in_order(self, tmp_path, processor, monkeypatch):
+        monkeypatch.setattr(processor_module, "ocr_image", fake_frame_ocr)
+        path = make_tiff(tmp_path / "scan.tiff", 3)
+        
+        assert processor_module.image_frame_count(str(path)) == 3
+        assert processor.extract_text(str(path), "image/tiff") == "Frame 1\nFrame 2\nFrame 3"
+    
+    def test_single_frame_uses_image_path(self, tmp_path, processor, monkeypatch):
+        monkeypatch.setattr(processor_module, "ocr_image", fake_frame_ocr)
+        path = make_tiff(tmp_path / "receipt.tif", 1)
+        
+        assert processor.extract_text(str(path), "image/tiff") == "Frame 1"
+
+
+class FakeEngine:
+    """Persistent engine stand-in that records what it read"""
+    
+    persistent = True
+    
+    def __init__(self, reads_probe=True, fail_on=None):
+        self.reads_probe = reads_probe
+        self.fail_on = fail_on
+        self.images = []
+        self.closed = False
+    
+    def recognize(self, image):
+        if image is probe_image():
+            return PROBE_TEXT if self.reads_probe else ""
+        if image == self.fail_on:
+            raise RuntimeError("Tesseract crashed")
+        self.images.append(image)
+        return f"text of {image}"
+    
+    def close(self):
+        self.closed = True
+
+
+class TestOcrEnginePool:
+    """Test cases for the long-lived OCR engine pool"""
+    
+    def make_pool(self, engines, **kwargs):
+        created = iter(engines)
+        return OcrEnginePool(lambda: next(created), **kwargs)
+    
+    def test_engine_reused_across_images(self):
+        engine = FakeEngine()
+        pool = self.make_pool([engine])
+        
+        assert [pool.recognize(name) for name in ("a", "b", "c")] == ["text of a", "text of b", "text of c"]
+        assert engine.images == ["a", "b", "c"]
+        assert pool.status()['jobs'] == 3
+    
+    def test_recycled_after_max_jobs(self):
+        first, second = FakeEngine(), FakeEngine()
+        pool = self.make_pool([first, second], max_jobs=2)
+        
+        for name in ("a", "b", "c"):
+            pool.recognize(name)
+        assert first.images == ["a", "b"] and first.closed
+        assert second.images == ["c"]
+        assert pool.recycled == 1
+    
+    def test_failed_engine_is_replaced(self):
+        first, second = FakeEngine(fail_on="bad"), FakeEngine()
+        pool = self.make_pool([first, second])
+        
+        with pytest.raises(RuntimeError):
+            pool.recognize("bad")
+        assert first.closed
+        assert pool.recognize("good") == "text of good"
+        assert second.images == ["good"]
+        assert pool.replaced == 1
+    
+    def test_idle_engine_probed_before_reuse(self):
+        stale, fresh = FakeEngine(reads_probe=False), FakeEngine()
+        pool = self.make_pool([stale, fresh], health_check_after=0)
+        
+        pool.recognize("a")
+        pool.recognize("b")
+        assert stale.images == ["a"] and stale.closed
+        assert fresh.images == ["b"]
+    
+    def test_warm_up_starts_only_healthy_engines(self):
+        pool = self.make_pool([FakeEngine(), FakeEngine(reads_probe=False)], size=2)
+        
+        status = pool.warm_up()
+        assert status['idle'] == 1
+        assert status['replaced'] == 1
+    
+    def test_concurrent_callers_bounded_by_size(self):
+        active, peak = [], []
+        lock = threading.Lock()
+        
+        class SlowEngine(FakeEngine):
+            def recognize(self, image):
+                with lock:
+                    active.append(image)
+                    peak.append(len(active))
+                time.sleep(0.01)
+                with lock:
+                    active.remove(image)
+                return super().recognize(image)
+        
+        pool = OcrEnginePool(SlowEngine, size=2)
+        with ThreadPoolExecutor(max_workers=6) as executor:
+            texts = list(executor.map(pool.recognize, range(24)))
+        
+        assert texts == [f"text of {number}" for number in range(24)]
+        assert max(peak) <= 2
+        assert pool.status()['idle'] == 2
+
+
+def multipart_body(filename, content, boundary="testboundary"):
+    return (
+        f"--{boundary}\r\n"
+        f'Content-Disposition: form-data; name="note"\r\n\r\n'
+        f"hello\r\n"
+        f"--{boundary}\r\n"
+        f'Content-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+        f"Content-Type: application/octet-stream\r\n\r\n"
+    ).encode() + content + f"\r\n--{boundary}--\r\n".encode()
+
+
+def receive(tmp_path, body, chunk_size, max_size=10000):
+    async def chunks():
+        for start in range(0, len(body), chunk_size):
+            yield body[start:start + chunk_size]
+    
+    return asyncio.run(receive_upload(
+        chunks(),
+        "multipart/form-data; boundary=testboundary",
+        field_name="file",
+        upload_directory=str(tmp_path),
+        max_size=max_size,
+        allowed_extensions=[".pdf", ".png"],
+        make_filename=lambda filename: "stored" + filename[-4:]
+    ))
+
+
+def multipart_files(files, boundary="testboundary"):
+    body = b"".join(
+        (
+            f"--{boundary}\r\n"
+            f'Content-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+            f"Content-Type: application/octet-stream\r\n\r\n"
+        ).encode() + content + b"\r\n"
+        for filename, content in files
+    )
+    return body + f"--{boundary}--\r\n".encode()
+
+
+def zip_archive(members):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, content in members:
+            archive.writestr(name, content)
+    return buffer.getvalue()
+
+
+def receive_many(tmp_path, body, chunk_size=4096, max_size=10000, max_files=10):
+    async def chunks():
+        for start in range(0, len(body), chunk_size):
+            yield body[start:start + chunk_size]
+    
+    names = iter(range(1000))
+    return asyncio.run(receive_uploads(
+        chunks(),
+        "multipart/form-data; boundary=testboundary",
+        field_name="file",
+        upload_directory=str(tmp_path),
+        max_size=max_size,
+        max_files=max_files,
+        max_total_size=1024 * 1024,
+        allowed_extensions=[".pdf", ".png"],
+        make_filename=lambda filename: f"stored{next(names)}{os.path.splitext(filename)[1]}"
+    ))
+
+
+class TestDocumentClassifier:
+    """Test cases for the scored document classifier"""
+    
+    def test_receipt_with_abn_is_a_receipt(self, processor):
+        text = "TAX INVOICE\nBunnings ABN 26 008 672 179\nDrill 29.98\nTotal 29.98\nGST 2.73"
+        classification = processor.classify(text, "IMG_0001.jpg")
+        assert classification.document_type == DocumentType.RECEIPT
+        assert classification.confidence > 0.5
+    
+    def test_confidence_grows_with_evidence(self, processor):
+        weak = processor.classify("Total 12.00", "scan.pdf")
+        strong = processor.classify("Bank statement\nStatement period 01/07/2024\nOpening balance 10.00\nClosing balance 5.00", "scan.pdf")
+        assert weak.document_type == DocumentType.RECEIPT
+        assert strong.document_type == DocumentType.BANK_STATEMENT
+        assert weak.confidence < strong.confidence
+    
+    def test_filename_hints_and_other(self, processor):
+        assert processor.classify_document("Dear customer", "payg_2024.pdf") == DocumentType.PAYG_SUMMARY
+        other = processor.classify("Dear customer, thank you for your letter", "letter.pdf")
+        assert other.document_type == DocumentType.OTHER
+        assert other.confidence == 1.0
+    
+    def test_only_leading_text_is_scored(self):
+        classifier = DocumentClassifier(max_chars=20)
+        assert classifier.classify("x" * 30 + " tax invoice").document_type == DocumentType.OTHER
+    
+    def test_matcher_counts_whole_words_in_one_pass(self):
+        matcher = KeywordMatcher(["tax invoice", "invoice", "sale", "balance"])
+        counts = matcher.count("xtax invoice; resale, sale_1 sale. tax invoice balances balance")
+        assert counts == {'invoice': 1, 'sale': 1, 'tax invoice': 1, 'balance': 1}
+    
+    def test_matcher_counts_overlapping_phrases_once(self):
+        matcher = KeywordMatcher(["opening balance", "balance", "balance date"])
+        # The first match wins; the phrases inside or after it aren't counted again
+        assert matcher.count("opening balance date") == {'opening balance': 1}
+        # A match starting mid-word gives way to a phrase inside it, even one running past its end
+        assert matcher.count("reopening balance date") == {'balance date': 1}
+        assert matcher.count("reopening balance") == {'balance': 1}
+    
+    def test_confidence_in_processing_result(self, processor):
+        result = processor.process_text("PAYG payment summary\nGross payments $50,000", "scan.pdf")
+        assert result['document_type'] == "payg_summary"
+        assert 0 < result['classification_confidence'] <= 1
+
+
+class TestFieldExtraction:
+    """Test cases for the compiled extraction profiles"""
+    
+    def test_payg_fields(self, processor):
+        text = "PAYMENT SUMMARY\nTFN: 123 456 789\nABN 12 345 678 901\nGross Payments: $85,250.50\nTax withheld 21,000"
+        assert processor.extract_structured_data(text, DocumentType.PAYG_SUMMARY) == {
+            'gross_payments': 85250.5,
+            'tax_withheld': 21000.0,
+            'tfn': '123456789',
+            'abn': '12345678901'
+        }
+    
+    def test_patterns_tried_in_priority_order(self):
+        """A later pattern is only used when earlier ones miss or give an unusable value"""
+        assert extract_fields("Amount: 5.00\nTotal: 12.00", DocumentType.RECEIPT)['total_amount'] == 12.0
+        assert extract_fields("Total: ,\nAmount: 5.00", DocumentType.RECEIPT)['total_amount'] == 5.0
+    
+    def test_captured_text_keeps_its_case(self):
+        data = extract_fields("Paid 3 March 2024", DocumentType.RECEIPT)
+        assert data['date'] == "3 March 2024"
+    
+    def test_text_that_changes_length_when_lowered(self):
+        """Falls back to case-insensitive matching on the original text"""
+        data = extract_fields("İstanbul branch\nCLOSING BALANCE: $1,234.56", DocumentType.BANK_STATEMENT)
+        assert data == {'closing_balance': 1234.56}
+    
+    def test_multi_field_rule_and_types_without_rules(self):
+        data = extract_fields("Statement Period: 01/07/2024 to 31/12/2024", DocumentType.BANK_STATEMENT)
+        assert data == {'period_start': '01/07/2024', 'period_end': '31/12/2024'}
+        assert extract_fields("anything", DocumentType.OTHER) == {}
+    
+    def test_case_insensitive_patterns_must_be_lower_case(self):
+        with pytest.raises(ValueError):
+            ExtractionProfile([FieldRule(('x',), (r'Total(\d+)',))])
+
+
+class TestBankTransactions:
+    """Test cases for streaming statement transaction parsing"""
+    
+    def test_text_rows_follow_balance_changes(self):
+        text = "\n".join([
+            "Statement period 01/12/2024 to 31/01/2025",
+            "Opening balance 1,000.00",
+            "15 Dec Salary ACME PTY LTD 2,500.00 3,500.00",
+            "   ref 1234",
+            "28 Dec Rent 1,200.00 2,300.00",
+            "Coffee 4.50 2,295.50",
+            "03 Jan Overdraft fee 2,400.00 104.50DR",
+            "Closing balance 104.50 DR",
+        ])
+        rows = list(parse_transactions(text_statement_lines(text), year_hint=2024))
+        
+        assert [(str(row.date), row.description, row.debit, row.credit, row.balance) for row in rows] == [
+            ("2024-12-15", "Salary ACME PTY LTD ref 1234", None, 2500.0, 3500.0),
+            ("2024-12-28", "Rent", 1200.0, None, 2300.0),
+            ("2024-12-28", "Coffee", 4.5, None, 2295.5),
+            ("2025-01-03", "Overdraft fee", 2400.0, None, -104.5),
+        ]
+    
+    def test_pdf_amounts_placed_by_column(self, tmp_path, processor):
+        """Debit and credit come from the heading each amount sits under, page by page"""
+        heading = [(40, 700, "Date"), (110, 700, "Description"), (300, 700, "Debit"),
+                   (380, 700, "Credit"), (460, 700, "Balance")]
+        path = make_pdf(tmp_path / "statement.pdf", [
+            heading + [(40, 680, "01/07/2024"), (110, 680, "Interest"), (380, 680, "12.00"), (460, 680, "512.00"),
+                       (40, 660, "02/07/2024"), (110, 660, "Groceries"), (300, 660, "45.10"), (460, 660, "466.90")],
+            [(40, 680, "03/07/2024"), (110, 680, "Refund"), (380, 680, "5.00"), (460, 680, "471.90")],
+        ])
+        rows = list(processor.extract_transactions("", {}, str(path), "application/pdf"))
+        
+        assert [(row.page, row.description, row.debit, row.credit, row.balance) for row in rows] == [
+            (1, "Interest", None, 12.0, 512.0),
+            (1, "Groceries", 45.1, None, 466.9),
+            (2, "Refund", None, 5.0, 471.9),
+        ]
+    
+    def test_statement_rows_spilled_for_storage(self, processor):
+        text = "Bank statement\nStatement period: 01/07/2024 to 31/07/2024\n02/07/2024 Transfer 50.00 950.00"
+        result = processor.process_text(text, "statement.png")
+        path = result['transactions_path']
+        try:
+            assert result['extracted_data']['transaction_count'] == 1
+            [[row]] = list(read_spilled_batches(path, batch_size=100))
+            assert row['row_number'] == 0 and row['description'] == "Transfer" and row['balance'] == 950.0
+        finally:
+            os.remove(path)
+        
+        assert processor.process_text("Tax invoice total 5.00", "r.png")['transactions_path'] is None
+
+
+class TestUploadStream:
+    """Test cases for streaming multipart uploads"""
+    
+    @pytest.mark.parametrize("chunk_size", [1, 7, 4096])
+    def test_file_part_written_hashed_and_sniffed(self, tmp_path, chunk_size):
+        """Any chunking of the body yields the same stored file"""
+        content = b"%PDF-1.4\n" + bytes(range(256)) * 4
+        received = receive(tmp_path, multipart_body("statement.pdf", content), chunk_size)
+        
+        assert received.filename == "statement.pdf"
+        assert received.content_type == "application/pdf"
+        assert received.size == len(content)
+        assert received.content_hash == hashlib.sha256(content).hexdigest()
+        assert (tmp_path / "stored.pdf").read_bytes() == content
+    
+    def test_oversize_upload_stops_reading(self, tmp_path):
+        """The body is abandoned as soon as the limit is crossed"""
+        content = b"%PDF-1.4\n" + b"x" * 100000
+        body = multipart_body("big.pdf", content)
+        read = []
+        
+        async def chunks():
+            for start in range(0, len(body), 1000):
+                read.append(start)
+                yield body[start:start + 1000]
+        
+        with pytest.raises(UploadTooLargeError):
+            asyncio.run(receive_upload(
+                chunks(), "multipart/form-data; boundary=testboundary", "file",
+                str(tmp_path), 5000, [".pdf"], lambda filename: "big.pdf"
+            ))
+        assert len(read) < 10
+        assert list(tmp_path.iterdir()) == []
+    
+    def test_content_must_match_an_allowed_type(self, tmp_path):
+        """A renamed file is rejected on its leading bytes"""
+        with pytest.raises(UploadError, match="does not match"):
+            receive(tmp_path, multipart_body("receipt.png", b"MZ\x90\x00 not an image"), 4096)
+        assert list(tmp_path.iterdir()) == []
+    
+    @pytest.mark.parametrize("head, content_type", [
+        (b"II*\x00\x08\x00\x00\x00", "image/tiff"),
+        (b"MM\x00*\x00\x00\x00\x08", "image/tiff"),
+        (b"\x00\x00\x00\x18ftypheic\x00\x00\x00\x00", "image/heic"),
+        (b"\x00\x00\x00\x1cftypmif1\x00\x00\x00\x00", "image/heif"),
+        (b"\x00\x00\x00\x1cftypisom\x00\x00\x02\x00", None),  # MP4 video
+    ])
+    def test_scan_formats_sniffed(self, head, content_type):
+        assert sniff_content_type(head) == content_type
+    
+    def test_extension_checked_before_content(self, tmp_path):
+        with pytest.raises(UploadError, match="File type not allowed"):
+            receive(tmp_path, multipart_body("notes.txt", b"%PDF-1.4"), 4096)
+    
+    def test_missing_file_part(self, tmp_path):
+        body = b"--testboundary\r\nContent-Disposition: form-data; name=\"note\"\r\n\r\nhi\r\n--testboundary--\r\n"
+        with pytest.raises(UploadError, match="No complete 'file'"):
+            receive(tmp_path, body, 4096)
+    
+    @pytest.mark.parametrize("chunk_size", [5, 4096])
+    def test_bulk_upload_unpacks_archives_and_skips_rejects(self, tmp_path, chunk_size):
+        """Files and archive members are kept, each rejected file is recorded"""
+        pdf = b"%PDF-1.4\n" + bytes(range(256))
+        png = b"\x89PNG\r\n\x1a\n" + b"\x00" * 100
+        archive = zip_archive([
+            ("2024/receipt.png", png),
+            ("2024/", b""),
+            ("__MACOSX/2024/._receipt.png", b"metadata"),
+            ("notes.txt", b"hello"),
+            ("renamed.pdf", b"GIF89a"),
+            ("big.pdf", b"%PDF-1.4\n" + b"x" * 20000),
+        ])
+        body = multipart_files([
+            ("statement.pdf", pdf), ("photo.gif", b"GIF89a"), ("shoebox.zip", archive), ("empty.png", b"")
+        ])
+        
+        received, rejected = receive_many(tmp_path, body, chunk_size)
+        
+        assert [(item.filename, item.content_type) for item in received] == [
+            ("statement.pdf", "application/pdf"), ("2024/receipt.png", "image/png")
+        ]
+        assert received[1].content_hash == hashlib.sha256(png).hexdigest()
+        assert (tmp_path / "stored0.pdf").read_bytes() == pdf
+        assert {item.filename: item.error for item in rejected} == {
+            "photo.gif": "File type not allowed",
+            "notes.txt": "File type not allowed",
+            "renamed.pdf": "File content does not match a supported document type",
+            "big.pdf": "File too large. Maximum size: 0.0MB",
+            "empty.png": "File content does not match a supported document type",
+        }
+        # The spooled archive is gone; only the kept documents remain
+        assert sorted(path.name for path in tmp_path.iterdir()) == sorted(
+            os.path.basename(item.file_path) for item in received
+        )
+    
+    def test_bulk_upload_file_limit_discards_everything(self, tmp_path):
+        png = b"\x89PNG\r\n\x1a\n" + b"\x00" * 10
+        archive = zip_archive([(f"{number}.png", png) for number in range(3)])
+        with pytest.raises(UploadError, match="Too many files"):
+            receive_many(tmp_path, multipart_files([("a.png", png), ("box.zip", archive)]), max_files=3)
+        assert list(tmp_path.iterdir()) == []
+    
+    def test_unreadable_archive_is_rejected(self, tmp_path):
+        png = b"\x89PNG\r\n\x1a\n" + b"\x00" * 10
+        body = multipart_files([("a.png", png), ("box.zip", b"PK\x03\x04 truncated")])
+        received, rejected = receive_many(tmp_path, body)
+        assert [item.filename for item in received] == ["a.png"]
+        assert rejected == [("box.zip", "Not a readable ZIP archive")]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
\ No newline at end of file
@@ -0,0 +1,518 @@
+import asyncio
+import json
+import os
+from concurrent.futures import Executor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import date
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.database.database import Base
+from app.models.models import BankTransaction, Document, DocumentStatus, JobStatus, TaxReturn
+from app.core.bank_transactions import Transaction, spill_transactions, store_transactions
+from app.core.extraction_cache import ExtractionCache
+from app.core import job_queue as job_queue_module
+from app.core.job_queue import DocumentJobQueue
+from app.core.status_events import StatusBroker
+
+
+engine = create_engine(
+    "sqlite://",
+    connect_args={"check_same_thread": False},
+    poolclass=StaticPool,
+)
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+@pytest.fixture(scope="function")
+def db():
+    Base.metadata.create_all(bind=engine)
+    session = TestingSessionLocal()
+    yield session
+    session.close()
+    Base.metadata.drop_all(bind=engine)
+
+
+@pytest.fixture
+def cache():
+    return ExtractionCache(max_entries=2)
+
+
+@pytest.fixture
+def events():
+    return StatusBroker(max_pending=3)
+
+
+@pytest.fixture
+def queue(cache, events):
+    return DocumentJobQueue(
+        session_factory=TestingSessionLocal,
+        max_workers=2,
+        max_attempts=2,
+        retry_backoff=0,
+        cache=cache,
+        events=events
+    )
+
+
+def make_result(document_type="receipt"):
+    return {
+        'success': True,
+        'ocr_text': "Tax invoice total $10.00",
+        'document_type': document_type,
+        'extracted_data': {'total_amount': 10.0},
+        'error': None
+    }
+
+
+def make_document(db, queue, content_hash=None):
+    document = Document(
+        filename="abc.png",
+        original_filename="receipt.png",
+        file_path="/tmp/abc.png",
+        file_size=10,
+        content_type="image/png",
+        content_hash=content_hash,
+        status=DocumentStatus.PENDING.value
+    )
+    db.add(document)
+    db.flush()
+    job = queue.enqueue(db, document)
+    db.commit()
+    return document, job
+
+
+class TestDocumentJobQueue:
+    """Test cases for the DB-backed document job queue"""
+    
+    def test_claim_marks_job_running(self, db, queue):
+        """Claiming moves the job to running and the document to processing"""
+        document, job = make_document(db, queue)
+        
+        claimed = queue.claim_due_jobs(db, limit=5)
+        assert len(claimed) == 1
+        assert claimed[0].job_id == job.id
+        assert claimed[0].filename == "receipt.png"
+        
+        db.refresh(job)
+        db.refresh(document)
+        assert job.status == JobStatus.RUNNING.value
+        assert job.attempts == 1
+        assert document.status == DocumentStatus.PROCESSING.value
+        
+        # Nothing left to claim
+        assert queue.claim_due_jobs(db, limit=5) == []
+    
+    def test_successful_result_completes_document(self, db, queue):
+        """A successful result stores extraction output and processed_at"""
+        document, job = make_document(db, queue)
+        queue.claim_due_jobs(db, limit=1)
+        
+        queue.record_result(db, job.id, make_result())
+        
+        db.refresh(job)
+        db.refresh(document)
+        assert job.status == JobStatus.COMPLETED.value
+        assert document.status == DocumentStatus.COMPLETED.value
+        assert document.extracted_data == {'total_amount': 10.0}
+        assert document.processed_at is not None
+    
+    def test_failed_job_is_retried_then_errors(self, db, queue):
+        """Failures are retried until max_attempts, then marked as errors"""
+        document, job = make_document(db, queue)
+        
+        queue.claim_due_jobs(db, limit=1)
+        queue.record_result(db, job.id, {'success': False, 'error': "OCR crashed"})
+        db.refresh(job)
+        db.refresh(document)
+        assert job.status == JobStatus.QUEUED.value
+        assert job.last_error == "OCR crashed"
+        assert document.status == DocumentStatus.PENDING.value
+        
+        assert len(queue.claim_due_jobs(db, limit=1)) == 1
+        queue.record_result(db, job.id, {'success': False, 'error': "OCR crashed"})
+        db.refresh(job)
+        db.refresh(document)
+        assert job.status == JobStatus.FAILED.value
+        assert job.attempts == 2
+        assert document.status == DocumentStatus.ERROR.value
+        assert document.processed_at is not None
+    
+    def test_retry_waits_for_backoff(self, db):
+        """A retried job is not claimable until its backoff has elapsed"""
+        queue = DocumentJobQueue(
+            session_factory=TestingSessionLocal,
+            max_attempts=3,
+            retry_backoff=60
+        )
+        document, job = make_document(db, queue)
+        
+        queue.claim_due_jobs(db, limit=1)
+        queue.record_result(db, job.id, {'success': False, 'error': "timeout"})
+        
+        assert queue.claim_due_jobs(db, limit=1) == []
+    
+    def test_requeue_interrupted(self, db, queue):
+        """Jobs left running by a crashed process are queued again"""
+        document, job = make_document(db, queue)
+        queue.claim_due_jobs(db, limit=1)
+        
+        assert queue.requeue_interrupted(db) == 1
+        db.refresh(job)
+        assert job.status == JobStatus.QUEUED.value
+
+    def test_completed_job_populates_cache(self, db, queue, cache):
+        """Successful results are stored in the extraction cache by hash"""
+        document, job = make_document(db, queue, content_hash="a" * 64)
+        queue.claim_due_jobs(db, limit=1)
+        queue.record_result(db, job.id, make_result())
+        
+        cached = cache.lookup(db, "a" * 64)
+        assert cached['document_type'] == "receipt"
+        assert cached['extracted_data'] == {'total_amount': 10.0}
+
+    def test_broken_pool_is_replaced_and_job_requeued(self, db, queue, monkeypatch):
+        """A dead worker rebuilds the pool and does not use up the job's attempt"""
+        class BrokenExecutor(Executor):
+            def submit(self, fn, *args, **kwargs):
+                raise BrokenProcessPool("A worker process terminated abruptly")
+        
+        replacement = ThreadPoolExecutor(max_workers=1)
+        monkeypatch.setattr(queue, "_create_executor", lambda: replacement)
+        broken = BrokenExecutor()
+        queue._executor = broken
+        
+        document, job = make_document(db, queue)
+        claimed = queue.claim_due_jobs(db, limit=1)
+        asyncio.run(queue._execute(claimed[0]))
+        
+        assert queue._executor is replacement
+        replacement.shutdown()
+        db.refresh(job)
+        db.refresh(document)
+        assert job.status == JobStatus.QUEUED.value
+        assert job.attempts == 0
+        assert document.status == DocumentStatus.PENDING.value
+    
+    def test_failed_result_write_does_not_strand_job(self, db, queue, cache, monkeypatch):
+        """If storing a result raises, the job is retried instead of left running"""
+        def failing_store(*args, **kwargs):
+            raise RuntimeError("database is locked")
+        
+        monkeypatch.setattr(cache, "store", failing_store)
+        monkeypatch.setattr(job_queue_module, "_run_processing", lambda *args: make_result())
+        queue._executor = ThreadPoolExecutor(max_workers=1)
+        
+        document, job = make_document(db, queue, content_hash="a" * 64)
+        claimed = queue.claim_due_jobs(db, limit=1)
+        asyncio.run(queue._execute(claimed[0]))
+        queue._executor.shutdown()
+        
+        db.refresh(job)
+        db.refresh(document)
+        assert job.status == JobStatus.QUEUED.value
+        assert "database is locked" in job.last_error
+        assert document.status == DocumentStatus.PENDING.value
+
+    def test_results_are_stored_off_the_event_loop(self, db, queue, monkeypatch):
+        """Storing a result (transactions, cache, tax return totals) never blocks the loop's thread"""
+        import threading
+        
+        store_threads = []
+        record_result = queue.record_result
+        
+        def recording_record_result(*args, **kwargs):
+            store_threads.append(threading.get_ident())
+            return record_result(*args, **kwargs)
+        
+        monkeypatch.setattr(queue, "record_result", recording_record_result)
+        monkeypatch.setattr(job_queue_module, "_run_processing", lambda *args: make_result())
+        queue._executor = ThreadPoolExecutor(max_workers=1)
+        
+        document, job = make_document(db, queue)
+        claimed = queue.claim_due_jobs(db, limit=1)
+        asyncio.run(queue._execute(claimed[0]))
+        queue._executor.shutdown()
+        
+        assert store_threads and threading.get_ident() not in store_threads
+        db.refresh(job)
+        assert job.status == JobStatus.COMPLETED.value
+
+    def test_large_pdf_pages_fan_out_on_the_shared_pool(self, db, queue, tmp_path, monkeypatch):
+        """Large PDFs are split into page batches on the queue's own pool"""
+        from test_document_processor import make_pdf
+        
+        pages = [f"Gross payments page {number}" for number in range(10)]
+        path = make_pdf(tmp_path / "statement.pdf", pages)
+        monkeypatch.setattr(job_queue_module.settings, "pdf_parallel_min_pages", 4)
+        
+        submitted = []
+        
+        class RecordingExecutor(ThreadPoolExecutor):
+            def submit(self, fn, *args, **kwargs):
+                # Page batches go through a wrapper that also returns their stage timings
+                submitted.append(args[0].__name__ if fn is job_queue_module._run_page_batch else fn.__name__)
+                return super().submit(fn, *args, **kwargs)
+        
+        executor = RecordingExecutor(max_workers=2)
+        job = job_queue_module.ClaimedJob(1, 1, str(path), "application/pdf", "statement.pdf")
+        result = asyncio.run(queue._process(executor, job))
+        executor.shutdown()
+        
+        assert result['success'] is True
+        assert result['ocr_text'] == "\n".join(pages)
+        assert result['ocr_text'] == job_queue_module.DocumentProcessor().extract_text_from_pdf(str(path))
+        assert submitted.count("extract_pdf_pages") > 1
+        assert submitted[-1] == "_run_text_processing"
+        # Stage timings from every page batch and the text processing are merged
+        assert {'pdf_text', 'classification', 'field_extraction'} <= result['stage_seconds'].keys()
+
+    def test_failed_page_batches_fall_back_loudly(self, db, queue, tmp_path, monkeypatch, caplog):
+        """A failing page batch is logged and counted before the whole document is processed"""
+        from test_document_processor import make_pdf
+        from app.core.metrics import page_parallel_fallbacks
+        
+        pages = [f"Gross payments page {number}" for number in range(6)]
+        path = make_pdf(tmp_path / "statement.pdf", pages)
+        monkeypatch.setattr(job_queue_module.settings, "pdf_parallel_min_pages", 4)
+        
+        def failing_batch(*args):
+            raise RuntimeError("page batch exploded")
+        
+        monkeypatch.setattr(job_queue_module, "_run_page_batch", failing_batch)
+        fallbacks = page_parallel_fallbacks.value()
+        executor = ThreadPoolExecutor(max_workers=2)
+        job = job_queue_module.ClaimedJob(7, 1, str(path), "application/pdf", "statement.pdf")
+        result = asyncio.run(queue._process(executor, job))
+        executor.shutdown()
+        
+        assert result['ocr_text'] == "\n".join(pages)
+        assert page_parallel_fallbacks.value() == fallbacks + 1
+        assert "Page-parallel processing failed for job 7" in caplog.text
+        assert "page batch exploded" in caplog.text
+
+    def test_multi_page_scan_frames_fan_out(self, db, queue, tmp_path, monkeypatch):
+        """Frames of a multi-page TIFF are OCRed in batches on the shared pool"""
+        from test_document_processor import fake_frame_ocr, make_tiff
+        
+        path = make_tiff(tmp_path / "scan.tiff", 4)
+        monkeypatch.setattr(job_queue_module.settings, "image_parallel_min_frames", 2)
+        monkeypatch.setattr("app.core.document_processor.ocr_image", fake_frame_ocr)
+        
+        submitted = []
+        
+        class RecordingExecutor(ThreadPoolExecutor):
+            def submit(self, fn, *args, **kwargs):
+                # Page batches go through a wrapper that also returns their stage timings
+                submitted.append(args[0].__name__ if fn is job_queue_module._run_page_batch else fn.__name__)
+                return super().submit(fn, *args, **kwargs)
+        
+        executor = RecordingExecutor(max_workers=2)
+        job = job_queue_module.ClaimedJob(1, 1, str(path), "image/tiff", "scan.tiff")
+        result = asyncio.run(queue._process(executor, job))
+        executor.shutdown()
+        
+        assert result['ocr_text'] == "Frame 1\nFrame 2\nFrame 3\nFrame 4"
+        assert result['ocr_text'] == job_queue_module.DocumentProcessor().extract_text(str(path), "image/tiff")
+        assert submitted.count("extract_image_frames") > 1
+        assert submitted[-1] == "_run_text_processing"
+
+    def test_statement_transactions_stored_from_spill(self, db, queue):
+        """Spilled rows land in bank_transactions and the spill file is removed"""
+        rows = [Transaction(1, date(2024, 7, day), f"Row {day}", 10.0, None, 100.0 - day) for day in range(1, 6)]
+        path, count = spill_transactions(rows)
+        result = dict(make_result("bank_statement"), transactions_path=path,
+                      extracted_data={'transaction_count': count})
+        
+        document, job = make_document(db, queue)
+        claimed = queue.claim_due_jobs(db, limit=1)
+        queue._store_result(claimed[0], result)
+        
+        stored = db.query(BankTransaction).order_by(BankTransaction.row_number).all()
+        assert [row.description for row in stored] == [f"Row {day}" for day in range(1, 6)]
+        assert stored[0].document_id == document.id and stored[0].transaction_date == date(2024, 7, 1)
+        assert (stored[0].debit, stored[0].credit, stored[0].balance) == (10.0, None, 99.0)
+        assert db.execute(text("SELECT debit_cents FROM bank_transactions LIMIT 1")).scalar() == 1000
+        assert not os.path.exists(path)
+        
+        # A rerun replaces the rows rather than adding to them
+        path, _ = spill_transactions(rows[:2])
+        assert store_transactions(db, document.id, path, batch_size=1) == 2
+        db.commit()
+        os.remove(path)
+        assert db.query(BankTransaction).count() == 2
+
+    
+    def test_completed_document_counts_in_linked_tax_return(self, db, queue):
+        """A document linked before processing adds its amounts once it completes"""
+        tax_return = TaxReturn(tax_year="2024-25", employment_income=60000)
+        db.add(tax_return)
+        db.flush()
+        document, job = make_document(db, queue)
+        document.tax_return_id = tax_return.id
+        db.commit()
+        queue.claim_due_jobs(db, limit=1)
+        
+        queue.record_result(db, job.id, make_result())
+        
+        db.refresh(tax_return)
+        db.refresh(document)
+        assert tax_return.documented_deductions == 10.0
+        assert tax_return.total_deductions == 10.0
+        assert tax_return.taxable_income == 59990.0
+        assert document.return_contribution == {'documented_deductions': 10.0}
+
+    
+    def test_status_changes_are_published(self, db, queue, events):
+        """Claiming, retrying and completing each tell the document's followers"""
+        async def follow():
+            document, job = make_document(db, queue)
+            subscription = events.subscribe([document.id])
+            seen = []
+            
+            queue.claim_due_jobs(db, limit=1)
+            seen += await subscription.next_events(timeout=1)
+            queue.record_result(db, job.id, {'success': False, 'error': "OCR crashed"})
+            seen += await subscription.next_events(timeout=1)
+            queue.claim_due_jobs(db, limit=1)
+            queue.record_result(db, job.id, make_result())
+            seen += await subscription.next_events(timeout=1)
+            events.unsubscribe(subscription)
+            return seen
+        
+        seen = asyncio.run(follow())
+        payloads = [json.loads(event.data) for event in seen]
+        # Processing then completed in a row arrive as just the latest status
+        assert [payload['status'] for payload in payloads] == ["processing", "pending", "completed"]
+        assert payloads[1]['error'] == "OCR crashed"
+        assert payloads[2]['extracted_data'] == {'total_amount': 10.0}
+        assert [event.id for event in seen] == sorted(event.id for event in seen)
+        assert events.stats()['subscribers'] == 0
+
+
+class TestStatusBroker:
+    """Test cases for status event fan-out"""
+    
+    def test_only_followers_receive_events(self, events):
+        """Events go to subscriptions following the document or every document"""
+        async def follow():
+            one, other, every = events.subscribe([1]), events.subscribe([2]), events.subscribe()
+            events.publish({'document_id': 1, 'status': "processing"})
+            received = [await subscription.next_events(timeout=0.01) for subscription in (one, other, every)]
+            stats = events.stats()
+            for subscription in (one, other, every):
+                events.unsubscribe(subscription)
+            return received, stats
+        
+        (one, other, every), stats = asyncio.run(follow())
+        assert [event.status for event in one] == ["processing"]
+        assert other == []
+        assert [event.document_id for event in every] == [1]
+        assert stats == {'subscribers': 3, 'followed_documents': 2, 'published': 1}
+        assert events.stats()['followed_documents'] == 0
+    
+    def test_slow_reader_of_every_document_is_told_it_lagged(self, events):
+        """A buffer past max_pending distinct documents is dropped instead of growing"""
+        async def follow():
+            subscription = events.subscribe()
+            for document_id in range(1, 4):
+                events.publish({'document_id': document_id, 'status': "processing"})
+            events.publish({'document_id': 3, 'status': "completed"})
+            within_bound = await subscription.next_events(timeout=0.01)
+            for document_id in range(1, 5):
+                events.publish({'document_id': document_id, 'status': "completed"})
+            lagged = subscription.lagged
+            return within_bound, lagged, await subscription.next_events(timeout=0.01), subscription.dropped
+        
+        within_bound, lagged, after_lag, dropped = asyncio.run(follow())
+        assert [(event.document_id, event.status) for event in within_bound] == [
+            (1, "processing"), (2, "processing"), (3, "completed")
+        ]
+        assert lagged and after_lag == [] and dropped == 4
+    
+    def test_publish_from_another_thread(self, events):
+        """Events published off the subscriber's loop are handed over to it"""
+        async def follow():
+            subscription = events.subscribe([7])
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, events.publish, {'document_id': 7, 'status': "completed"})
+            return await subscription.next_events(timeout=1)
+        
+        assert [event.status for event in asyncio.run(follow())] == ["completed"]
+
+
+class TestExtractionCache:
+    """Test cases for the content-hash extraction cache"""
+    
+    def test_hit_and_miss_counters(self, db, cache):
+        """Lookups are counted as hits or misses"""
+        assert cache.lookup(db, "a" * 64) is None
+        cache.store(db, "a" * 64, make_result())
+        db.commit()
+        
+        assert cache.lookup(db, "a" * 64)['ocr_text'] == "Tax invoice total $10.00"
+        
+        stats = cache.stats(db)
+        assert stats['hits'] == 1
+        assert stats['misses'] == 1
+        assert stats['hit_rate'] == 0.5
+        assert stats['entries'] == 1
+    
+    def test_processor_version_is_part_of_key(self, db, cache):
+        """Results from another processor version are not reused"""
+        cache.store(db, "a" * 64, make_result())
+        db.commit()
+        
+        newer = ExtractionCache(max_entries=2, processor_version="next")
+        assert newer.lookup(db, "a" * 64) is None
+    
+    def test_least_recently_used_entry_is_evicted(self, db, cache):
+        """Storing beyond the cap evicts the least recently used entry"""
+        cache.store(db, "a" * 64, make_result())
+        cache.store(db, "b" * 64, make_result())
+        db.commit()
+        
+        # Touch "a" so "b" becomes the eviction candidate
+        cache.lookup(db, "a" * 64)
+        cache.store(db, "c" * 64, make_result())
+        db.commit()
+        
+        assert cache.lookup(db, "b" * 64) is None
+        assert cache.lookup(db, "a" * 64) is not None
+        assert cache.lookup(db, "c" * 64) is not None
+        assert cache.stats(db)['evictions'] == 1
+    
+    def test_concurrent_identical_stores_do_not_collide(self, db, cache):
+        """A second session storing the same content upserts instead of failing"""
+        other = TestingSessionLocal()
+        try:
+            # Both sessions missed the cache before either stored its result
+            assert cache.lookup(db, "a" * 64) is None
+            assert cache.lookup(other, "a" * 64) is None
+            
+            cache.store(db, "a" * 64, make_result("receipt"))
+            db.commit()
+            cache.store(other, "a" * 64, make_result("invoice"))
+            other.commit()
+        finally:
+            other.close()
+        
+        assert cache.lookup(db, "a" * 64)['document_type'] == "invoice"
+        assert cache.stats(db)['entries'] == 1
+    
+    def test_running_count_tracks_evictions(self, db, cache):
+        """The running entry count stays at the cap across many stores"""
+        for index in range(6):
+            cache.store(db, f"{index:064d}", make_result())
+            db.commit()
+        
+        assert cache._entry_count == 2
+        assert cache.stats(db)['entries'] == 2
+        assert cache.evictions == 4
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
\ No newline at end of file
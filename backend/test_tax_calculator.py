@@ -1,5 +1,18 @@
+import asyncio
+import json
+from decimal import ROUND_HALF_UP, Decimal
+from fractions import Fraction
+from math import lcm
 import pytest
+import numpy as np
 from app.core.tax_calculator import TaxCalculator
+from app.core.estimate_cache import EstimateCache
+from app.core.tax_rules import (
+    BracketTable, PiecewiseLinear, TaxRuleRegistry, TaxRuleSet, UnknownTaxYearError,
+    compile_low_income_tax_offset, rate_units, tax_rules, to_cents
+)
+from app.core.bulk_calculator import stream_calculations
+from app.core.what_if import SweepError, SweepVariable, break_even_points, what_if
 
 
 class TestTaxCalculator:
@@ -108,5 +121,538 @@ class TestTaxCalculator:
         assert result['total_tax'] == 0
 
 
+
+class TestTaxCalculatorBatch:
+    """Test cases for the vectorized batch tax engine"""
+    
+    @pytest.mark.parametrize("exact_cents", [True, False])
+    def test_batch_matches_scalar_to_the_cent(self, exact_cents):
+        """Batch results are identical to the scalar path for every row, in either arithmetic"""
+        calculator = TaxCalculator.for_year(exact_cents=exact_cents)
+        rng = np.random.default_rng(2024)
+        size = 5000
+        income_data = {
+            'employment_income': np.round(rng.uniform(0, 250000, size), 2),
+            'investment_income': np.round(rng.uniform(0, 20000, size), 2),
+            'business_income': np.round(rng.uniform(0, 40000, size), 2)
+        }
+        deduction_data = {
+            'work_related_expenses': np.round(rng.uniform(0, 8000, size), 2),
+            'other_deductions': np.round(rng.uniform(0, 2000, size), 2)
+        }
+        
+        batch = calculator.calculate_total_tax_batch(income_data, deduction_data)
+        
+        for row in range(size):
+            scalar = calculator.calculate_total_tax(
+                {key: float(values[row]) for key, values in income_data.items()},
+                {key: float(values[row]) for key, values in deduction_data.items()}
+            )
+            for field, value in scalar.items():
+                assert batch[field][row] == value, (field, row)
+    
+    def test_batch_at_bracket_thresholds(self):
+        """Cent-level incomes either side of every threshold match the scalar path"""
+        incomes = np.concatenate([
+            np.round(np.arange(threshold - 1, threshold + 1, 0.01), 2)
+            for threshold in (18200, 24276, 37500, 45000, 120000, 180000)
+        ])
+        
+        assert list(TaxCalculator.calculate_income_tax_batch(incomes)) == [
+            TaxCalculator.calculate_income_tax(float(income)) for income in incomes
+        ]
+        assert list(TaxCalculator.calculate_medicare_levy_batch(incomes)) == [
+            TaxCalculator.calculate_medicare_levy(float(income)) for income in incomes
+        ]
+        assert list(TaxCalculator.calculate_low_income_tax_offset_batch(incomes)) == [
+            TaxCalculator.calculate_low_income_tax_offset(float(income)) for income in incomes
+        ]
+    
+    def test_batch_missing_components_default_to_zero(self):
+        """Components absent from the input dicts are treated as zero"""
+        result = TaxCalculator.calculate_total_tax_batch(
+            {'employment_income': [0, 5000, 80000]},
+            {'work_related_expenses': [0, 10000, 2500]}
+        )
+        assert list(result['taxable_income']) == [0, 0, 77500]
+        assert list(result['total_tax'])[:2] == [0, 0]
+
+
+class TestCompiledTaxTables:
+    """Test cases for the precompiled bracket table and piecewise functions"""
+    
+    def test_bracket_table_matches_bracket_walk(self):
+        """Cumulative table lookups equal summing tax bracket by bracket"""
+        def walk(income):
+            tax, previous = 0.0, 0
+            for threshold, rate in TaxCalculator.TAX_BRACKETS:
+                if income <= previous:
+                    break
+                tax += (min(income, threshold) - previous) * rate
+                previous = threshold
+            return round(tax, 2)
+        
+        for income in (0, 18200, 18201, 45000, 45000.01, 119999.99, 120000, 180000, 180001, 1e6):
+            assert TaxCalculator.calculate_income_tax(income) == walk(income)
+    
+    def test_bracket_table_base_tax(self):
+        """Tax owed at each lower bound is precomputed once"""
+        table = BracketTable(TaxCalculator.TAX_BRACKETS)
+        assert table.lower_bounds == (0.0, 18200.0, 45000.0, 120000.0, 180000.0)
+        assert table.base_tax == pytest.approx((0, 0, 5092, 29467, 51667))
+    
+    def test_piecewise_thresholds_are_inclusive(self):
+        """Each segment includes its upper threshold, like the ATO tables"""
+        step = PiecewiseLinear([10], [0, 10], [1, 1], [0, -0.5], minimum=0)
+        assert step(10) == 1
+        assert step(12) == 0
+        assert step(100) == 0
+        assert list(step.evaluate(np.array([10.0, 12.0, 100.0]))) == [1, 0, 0]
+    
+    def test_compiled_lito_cuts_out(self):
+        """The compiled LITO reaches zero exactly at its cut-out income"""
+        lito = compile_low_income_tax_offset(700, 37500, 45000, 0.05, 0.015)
+        assert lito.breakpoints[-1] == pytest.approx(66666.67, abs=0.01)
+        assert lito(66667) == 0
+        assert lito(66000) == pytest.approx(10.0)
+    
+    def test_piecewise_requires_a_line_per_segment(self):
+        with pytest.raises(ValueError):
+            PiecewiseLinear([10, 20], [0, 0], [0, 0], [0, 0])
+
+
+class TestTaxRules:
+    """Test cases for the per-year tax rule sets"""
+    
+    def test_default_year_matches_calculator(self):
+        """TaxCalculator's constants come from the default year's rule set"""
+        assert TaxCalculator.RULES is tax_rules.default
+        assert TaxCalculator.for_year() is TaxCalculator
+        assert TaxCalculator.for_year("2024-25") is TaxCalculator
+        assert TaxCalculator.TAX_BRACKETS[-1] == (float('inf'), 0.45)
+    
+    def test_prior_year_calculator(self):
+        """A prior year's calculator uses that year's thresholds and rates"""
+        calculator = TaxCalculator.for_year("2023-24")
+        assert calculator is TaxCalculator.for_year("2023-24")  # Built once
+        assert calculator.MEDICARE_LEVY_THRESHOLD == 26000
+        assert calculator.calculate_medicare_levy(25000) == 0
+        assert TaxCalculator.calculate_medicare_levy(25000) == 500
+        assert calculator.calculate_work_from_home_deduction(100) == 67
+        assert list(calculator.calculate_medicare_levy_batch([25000, 30000])) == [0, 600]
+    
+    def test_unknown_year(self):
+        with pytest.raises(UnknownTaxYearError):
+            TaxCalculator.for_year("1999-00")
+    
+    def test_summary_matches_brackets(self):
+        """The /brackets description is derived from the compiled rule set"""
+        summary = tax_rules.get("2024-25").summary
+        assert [bracket["min"] for bracket in summary["brackets"]] == [0, 18201, 45001, 120001, 180001]
+        assert summary["brackets"][-1]["max"] is None
+        assert summary["lito"]["max_offset"] == TaxCalculator.LITO_MAX_OFFSET
+    
+    def test_rule_set_is_immutable(self):
+        with pytest.raises(AttributeError):
+            tax_rules.default.medicare_levy_rate = 0.03
+    
+    def test_missing_field_is_reported(self):
+        with pytest.raises(ValueError, match="medicare_levy"):
+            TaxRuleSet.from_dict({'tax_year': "2030-31", 'brackets': []})
+    
+    def test_registry_requires_default_year(self):
+        with pytest.raises(UnknownTaxYearError):
+            TaxRuleRegistry([tax_rules.default], "2030-31")
+
+
+
+class TestEstimateCache:
+    """Test cases for the /estimate memo"""
+    
+    def test_results_match_calculator(self):
+        cache = EstimateCache(max_entries=10)
+        for income in (0, 30000, 45000.01, 150000):
+            assert cache.estimate(TaxCalculator, income) == TaxCalculator.calculate_estimate(income)
+    
+    def test_keyed_on_cents_and_tax_year(self):
+        cache = EstimateCache(max_entries=10)
+        cache.estimate(TaxCalculator, 25000)
+        cache.estimate(TaxCalculator, 25000.001)
+        assert (cache.hits, cache.misses) == (1, 1)
+        
+        prior_year = cache.estimate(TaxCalculator.for_year("2023-24"), 25000)
+        assert cache.misses == 2
+        assert prior_year['medicare_levy'] == 0
+    
+    def test_least_recently_used_evicted(self):
+        cache = EstimateCache(max_entries=2)
+        cache.estimate(TaxCalculator, 1000)
+        cache.estimate(TaxCalculator, 2000)
+        cache.estimate(TaxCalculator, 1000)
+        cache.estimate(TaxCalculator, 3000)  # Evicts 2000
+        
+        assert cache.stats()['evictions'] == 1
+        cache.estimate(TaxCalculator, 1000)
+        assert cache.hits == 2
+        cache.estimate(TaxCalculator, 2000)
+        assert cache.misses == 4
+    
+    def test_returned_results_are_copies(self):
+        cache = EstimateCache(max_entries=2)
+        cache.estimate(TaxCalculator, 1000)['income_tax'] = -1
+        assert cache.estimate(TaxCalculator, 1000)['income_tax'] == 0
+
+
+# Random returns checked against the reference per tax year, in chunks of PROPERTY_CHUNK
+PROPERTY_SAMPLES = 2_000_000
+PROPERTY_CHUNK = 250_000
+
+
+def rule_thresholds(rules):
+    """Every income in cents at which some rule changes"""
+    lito_cutout = rules.lito_threshold_2 + (
+        rules.lito_max_offset - (rules.lito_threshold_2 - rules.lito_threshold_1) * rules.lito_rate_1
+    ) / rules.lito_rate_2
+    return np.array([
+        *(threshold * 100 for threshold, _ in rules.brackets[:-1]),
+        rules.medicare_levy_threshold * 100, rules.lito_threshold_1 * 100, rules.lito_threshold_2 * 100,
+        round(lito_cutout * 100), rules.small_business_threshold * 100, rules.small_business_cutoff * 100,
+    ], dtype=np.int64)
+
+
+def random_returns(rng, rules, size):
+    """Returns in whole cents: incomes in every bracket, up to $10m, and crowded around each threshold"""
+    uniform = rng.integers(0, 250_000_00, size)
+    log_uniform = np.exp(rng.uniform(0, np.log(10_000_000_00), size)).astype(np.int64)
+    near_threshold = rng.choice(rule_thresholds(rules), size) + rng.integers(-500, 501, size)
+    employment = np.choose(rng.integers(0, 3, size), [uniform, log_uniform, near_threshold])
+    business = np.where(
+        rng.random(size) < 0.3,
+        rng.choice(rule_thresholds(rules)[-2:], size) + rng.integers(-100_000, 100_001, size),
+        0
+    )
+    deductions = np.where(rng.random(size) < 0.5, rng.integers(0, 2_000_000, size), 0)
+    return {'employment_income': employment, 'business_income': business}, {'other_deductions': deductions}
+
+
+def ato_reference_cents(rules, income_data, deduction_data):
+    """Independent exact reference over int64 cents
+    
+    Walks the brackets and writes the offsets out as their ATO formulas,
+    with rates as exact fractions of the rule file's decimal literals over
+    a common denominator; each component is rounded to the cent once, half
+    a cent up.
+    """
+    rates = [rate for _, rate in rules.brackets] + [
+        rules.medicare_levy_rate, rules.lito_rate_1, rules.lito_rate_2, rules.small_business_rate
+    ]
+    scale = lcm(*(Fraction(str(rate)).denominator for rate in rates))
+    
+    def units(rate):
+        rate = Fraction(str(rate))
+        return rate.numerator * (scale // rate.denominator)
+    
+    def half_up(scaled):
+        quotient, remainder = np.divmod(scaled, scale)
+        return quotient + (2 * remainder >= scale)
+    
+    business = np.maximum(0, income_data['business_income'])
+    taxable = np.maximum(0, income_data['employment_income'] + income_data['business_income']
+                         - deduction_data['other_deductions'])
+    
+    income_tax = np.zeros_like(taxable)
+    lower = 0
+    for threshold, rate in rules.brackets:
+        width = taxable.max() + 1 if threshold == float('inf') else int(threshold * 100) - lower
+        income_tax += np.clip(taxable - lower, 0, width) * units(rate)
+        lower += width
+    income_tax = half_up(income_tax)
+    
+    medicare_levy = half_up(np.where(
+        taxable > rules.medicare_levy_threshold * 100, taxable * units(rules.medicare_levy_rate), 0
+    ))
+    
+    threshold_1, threshold_2 = int(rules.lito_threshold_1 * 100), int(rules.lito_threshold_2 * 100)
+    lito = half_up(np.maximum(
+        0,
+        int(rules.lito_max_offset * 100) * scale
+        - np.clip(taxable - threshold_1, 0, threshold_2 - threshold_1) * units(rules.lito_rate_1)
+        - np.maximum(0, taxable - threshold_2) * units(rules.lito_rate_2)
+    ))
+    
+    offset_max = int(rules.small_business_offset_max * 100)
+    small_business_offset = np.where(
+        business < rules.small_business_threshold * 100, 0,
+        np.where(business > rules.small_business_cutoff * 100, offset_max,
+                 np.minimum(half_up(business * units(rules.small_business_rate)), offset_max))
+    )
+    
+    return {
+        'taxable_income': taxable,
+        'income_tax': income_tax,
+        'medicare_levy': medicare_levy,
+        'low_income_tax_offset': lito,
+        'small_business_offset': small_business_offset,
+        'total_tax': np.maximum(0, income_tax + medicare_levy - lito - small_business_offset),
+    }
+
+
+def ato_decimal(rules, taxable_income, business_income=0):
+    """The same components for one return with Decimal and ROUND_HALF_UP, straight from the rule wording"""
+    cent = Decimal("0.01")
+    income = Decimal(taxable_income) / 100
+    business = Decimal(business_income) / 100
+    
+    def rate(value):
+        return Decimal(str(value))
+    
+    tax = Decimal(0)
+    lower = Decimal(0)
+    for threshold, bracket_rate in rules.brackets:
+        upper = income if threshold == float('inf') else Decimal(threshold)
+        if income > lower:
+            tax += (min(income, upper) - lower) * rate(bracket_rate)
+        lower = upper
+    medicare_levy = income * rate(rules.medicare_levy_rate) if income > rules.medicare_levy_threshold else 0
+    lito = Decimal(rules.lito_max_offset)
+    lito -= (min(max(income, Decimal(rules.lito_threshold_1)), Decimal(rules.lito_threshold_2))
+             - Decimal(rules.lito_threshold_1)) * rate(rules.lito_rate_1)
+    lito -= max(income - Decimal(rules.lito_threshold_2), Decimal(0)) * rate(rules.lito_rate_2)
+    if business < rules.small_business_threshold:
+        small_business_offset = Decimal(0)
+    else:
+        small_business_offset = min(
+            business * rate(rules.small_business_rate), Decimal(rules.small_business_offset_max)
+        )
+    return {
+        'income_tax': tax.quantize(cent, ROUND_HALF_UP),
+        'medicare_levy': Decimal(medicare_levy).quantize(cent, ROUND_HALF_UP),
+        'low_income_tax_offset': max(lito, Decimal(0)).quantize(cent, ROUND_HALF_UP),
+        'small_business_offset': small_business_offset.quantize(cent, ROUND_HALF_UP),
+    }
+
+
+class TestExactCents:
+    """Test cases for integer-cent arithmetic against ATO rounding"""
+    
+    @pytest.mark.parametrize("tax_year", tax_rules.years)
+    def test_batch_matches_ato_rounding_over_millions_of_returns(self, tax_year):
+        """Every component and the total, for two million random returns, equal the exact reference"""
+        calculator = TaxCalculator.for_year(tax_year, exact_cents=True)
+        rng = np.random.default_rng([2025, int(tax_year[:4])])
+        for _ in range(PROPERTY_SAMPLES // PROPERTY_CHUNK):
+            income_data, deduction_data = random_returns(rng, calculator.RULES, PROPERTY_CHUNK)
+            expected = ato_reference_cents(calculator.RULES, income_data, deduction_data)
+            result = calculator.calculate_total_tax_cents_batch(income_data, deduction_data)
+            for field, values in expected.items():
+                mismatched = np.flatnonzero(result[field] != values)
+                assert not mismatched.size, (field, {
+                    key: column[mismatched[:5]].tolist() for key, column in (*income_data.items(), *deduction_data.items())
+                })
+    
+    @pytest.mark.parametrize("tax_year", tax_rules.years)
+    def test_scalar_matches_decimal_half_up(self, tax_year):
+        """The float-dollar scalar API returns Decimal ROUND_HALF_UP amounts, and so does the reference"""
+        calculator = TaxCalculator.for_year(tax_year, exact_cents=True)
+        rng = np.random.default_rng([2026, int(tax_year[:4])])
+        income_data, deduction_data = random_returns(rng, calculator.RULES, 5000)
+        reference = ato_reference_cents(calculator.RULES, income_data, deduction_data)
+        for row in range(5000):
+            employment, business = int(income_data['employment_income'][row]), int(income_data['business_income'][row])
+            deductions = int(deduction_data['other_deductions'][row])
+            expected = ato_decimal(calculator.RULES, int(reference['taxable_income'][row]), max(business, 0))
+            result = calculator.calculate_total_tax(
+                {'employment_income': employment / 100, 'business_income': business / 100},
+                {'other_deductions': deductions / 100}
+            )
+            for field, amount in expected.items():
+                assert Decimal(str(result[field])) == amount, (field, employment, business, deductions)
+                assert int(reference[field][row]) == amount * 100, (field, employment, business, deductions)
+    
+    def test_half_cents_round_up(self):
+        """Amounts on a half cent round up, where binary floats would round some down"""
+        exact = TaxCalculator.for_year(exact_cents=True)
+        floats = TaxCalculator.for_year(exact_cents=False)
+        assert exact.calculate_income_tax(18202.50) == 0.48  # 2.50 at 19% is 47.5c
+        assert floats.calculate_income_tax(18202.50) == 0.47
+        assert exact.calculate_medicare_levy(24300.25) == 486.01
+        assert list(exact.calculate_medicare_levy_batch([24300.25])) == [486.01]
+    
+    def test_totals_are_exact_sums(self):
+        """Totals are sums of the rounded components with no float residue"""
+        calculator = TaxCalculator.for_year(exact_cents=True)
+        result = calculator.calculate_total_tax(
+            {'employment_income': 0.1, 'investment_income': 0.2, 'business_income': 41234.57},
+            {'work_related_expenses': 0.3}
+        )
+        assert result['total_income'] == 41234.87
+        assert result['taxable_income'] == 41234.57
+        assert result['total_tax_before_offsets'] == round(result['income_tax'] + result['medicare_levy'], 2)
+        cents = calculator.calculate_total_tax_cents({'business_income': 4123457}, {})
+        assert all(isinstance(value, int) for value in cents.values())
+        assert cents['total_tax'] == round(result['total_tax'] * 100)
+    
+    def test_modes_are_separate_calculators(self):
+        assert TaxCalculator.for_year(exact_cents=TaxCalculator.EXACT_CENTS) is TaxCalculator
+        floats = TaxCalculator.for_year("2023-24", exact_cents=False)
+        assert not floats.EXACT_CENTS and floats.RULES.tax_year == "2023-24"
+        assert TaxCalculator.for_year("2023-24", exact_cents=False) is floats
+        assert TaxCalculator.for_year("2023-24", exact_cents=True) is not floats
+    
+    def test_rates_and_amounts_must_be_representable(self):
+        assert rate_units(0.325) == 32500
+        with pytest.raises(ValueError):
+            rate_units(0.123456)
+        assert to_cents(1234.565) in (123456, 123457)
+        with pytest.raises(ValueError):
+            to_cents(float('nan'))
+        with pytest.raises(ValueError):
+            TaxCalculator.for_year(exact_cents=True).calculate_total_tax_batch({'employment_income': [1e15]}, {})
+    
+    def test_integer_tables_match_float_tables_away_from_ties(self):
+        """Both compilations describe the same functions"""
+        rules = tax_rules.default
+        incomes = np.arange(0, 200_000_00, 997, dtype=np.int64)
+        for table in (rules.income_tax, rules.medicare_levy, rules.low_income_tax_offset):
+            assert np.abs(table.evaluate_cents(incomes) / 100 - table.evaluate(incomes / 100)).max() <= 0.005 + 1e-9
+
+
+class TestWhatIf:
+    """Test cases for what-if sweeps"""
+    
+    def test_sweep_matches_scalar_calculations(self):
+        """Every grid point is the tax of the base return plus that amount"""
+        income_data = {'employment_income': 90000, 'business_income': 12000}
+        deduction_data = {'work_related_expenses': 1500}
+        variables = [SweepVariable('work_related_expenses', 0, 3000, 750), SweepVariable('salary_sacrifice', 0, 2000, 1000)]
+        result = what_if(TaxCalculator, income_data, deduction_data, variables, 1000)
+        
+        assert result['values'] == {'work_related_expenses': [0, 750, 1500, 2250, 3000], 'salary_sacrifice': [0, 1000, 2000]}
+        for row, deduction in enumerate(result['values']['work_related_expenses']):
+            for column, sacrifice in enumerate(result['values']['salary_sacrifice']):
+                expected = TaxCalculator.calculate_total_tax(
+                    {'employment_income': 90000 - sacrifice, 'business_income': 12000},
+                    {'work_related_expenses': 1500 + deduction}
+                )
+                for field, value in expected.items():
+                    assert result['data'][field][row][column] == value, (field, row, column)
+                assert result['data']['tax_saved'][row][column] == round(
+                    result['base']['total_tax'] - expected['total_tax'], 2
+                )
+        assert np.array(result['marginal_rates']['work_related_expenses']).shape == (4, 3)
+        assert np.array(result['marginal_rates']['salary_sacrifice']).shape == (5, 2)
+    
+    def test_break_even_points_at_rate_changes(self):
+        """Deductions save less per dollar as taxable income falls through the brackets"""
+        result = what_if(
+            TaxCalculator, {'employment_income': 60000}, {},
+            [SweepVariable('other_deductions', 0, 40000, 100)], 1000
+        )
+        assert result['marginal_rates']['other_deductions'][0] == -0.36  # 32.5% + Medicare + LITO phase-out
+        points = result['break_even_points']['other_deductions']
+        assert [point['value'] for point in points[:2]] == [15000, 22500]  # Taxable income of $45,000, $37,500
+        assert points[0]['marginal_rate_after'] == -0.26
+        # Past the last point further deductions save nothing
+        assert points[-1]['marginal_rate_after'] == 0
+        zero_tax = points[-1]['value']
+        assert TaxCalculator.calculate_total_tax({'employment_income': 60000}, {'other_deductions': zero_tax})['total_tax'] \
+            == pytest.approx(0, abs=0.05)
+    
+    def test_break_even_between_grid_points(self):
+        """A kink inside a step is placed where the neighbouring lines meet"""
+        values = np.arange(0, 1001, 100.0)
+        tax = np.where(values < 450, 0.1 * values, 45 + 0.3 * (values - 450))
+        assert break_even_points(values, tax, 100) == [
+            {'value': 450.0, 'marginal_rate_before': 0.1, 'marginal_rate_after': 0.3}
+        ]
+    
+    @pytest.mark.parametrize("variables, message", [
+        ([SweepVariable('employment_income', 0, 10, 1)] * 2, "only be swept once"),
+        ([SweepVariable('employment_income', 0, 100000, 1)], "Sweep too large"),
+        ([], "one to 2 variables"),
+    ])
+    def test_invalid_sweeps_rejected(self, variables, message):
+        with pytest.raises(SweepError, match=message):
+            what_if(TaxCalculator, {'employment_income': 50000}, {}, variables, 1000)
+    
+    def test_unknown_field_rejected(self):
+        with pytest.raises(SweepError, match="Cannot sweep 'tax_withheld'"):
+            SweepVariable('tax_withheld', 0, 100, 10)
+    
+    def test_sub_cent_steps_rejected(self):
+        with pytest.raises(SweepError, match="at least 0.01"):
+            SweepVariable('other_deductions', 0, 0.01, 0.001)
+    
+    def test_points_rounded_together_stay_finite(self):
+        """Steps that round two points onto the same cent give no NaN rates or break-even points"""
+        variable = SweepVariable('other_deductions', 0.005, 0.195, 0.01)
+        result = what_if(TaxCalculator, {'employment_income': 50000}, {}, [variable], 1000)
+        assert len(set(result['values']['other_deductions'])) < variable.count
+        assert np.isfinite(result['marginal_rates']['other_deductions']).all()
+        json.dumps(result, allow_nan=False)
+
+
+def run_stream(chunks, input_format="ndjson", max_line_bytes=1024):
+    """Feed byte chunks through stream_calculations and decode the result lines"""
+    async def source():
+        for chunk in chunks:
+            yield chunk
+    
+    async def collect():
+        return b"".join([part async for part in stream_calculations(source(), input_format, max_line_bytes)])
+    
+    return [json.loads(line) for line in asyncio.run(collect()).decode().splitlines()]
+
+
+class TestBulkCalculator:
+    """Test cases for streaming bulk calculation"""
+    
+    def test_rows_split_across_chunks(self):
+        """Rows are reassembled regardless of where chunk boundaries fall"""
+        payload = (
+            b'{"id": "a", "income_data": {"employment_income": 80000}}\n'
+            b'{"id": "b", "income_data": {"employment_income": 30000}, "deduction_data": {"other_deductions": 500}}\n'
+        )
+        chunks = [payload[i:i + 7] for i in range(0, len(payload), 7)]
+        
+        results = run_stream(chunks)
+        assert [result['id'] for result in results] == ["a", "b"]
+        assert results[0]['data'] == TaxCalculator.calculate_total_tax({'employment_income': 80000}, {})
+        assert results[1]['data']['taxable_income'] == 29500
+    
+    def test_bad_rows_do_not_fail_the_batch(self):
+        """Malformed rows produce per-row errors while other rows succeed"""
+        results = run_stream([
+            b'{"income_data": {"employment_income": 50000}}\n',
+            b'not json\n',
+            b'{"income_data": {"employment_income": "lots"}}\n',
+            b'{"income_data": {"employment_income": 60000}}'
+        ])
+        assert [result['success'] for result in results] == [True, False, False, True]
+        assert [result['row'] for result in results] == [1, 2, 3, 4]
+        assert "Invalid JSON" in results[1]['error']
+    
+    def test_overlong_line_is_rejected_without_buffering(self):
+        """A line beyond the size limit becomes an error row"""
+        results = run_stream([
+            b'{"income_data": {"employment_income": 1' + b'0' * 600,
+            b'0' * 600 + b'}}\n',
+            b'{"income_data": {"employment_income": 1000}}\n'
+        ], max_line_bytes=512)
+        assert results[0]['success'] is False
+        assert "exceeds" in results[0]['error']
+        assert results[1]['success'] is True
+    
+    def test_csv_input(self):
+        """CSV input maps header columns onto income and deduction fields"""
+        results = run_stream([
+            b"id,employment_income,work_related_expenses\n",
+            b"r1,80000,2500\nr2,abc,0\n"
+        ], input_format="csv")
+        assert results[0]['id'] == "r1"
+        assert results[0]['data']['taxable_income'] == 77500
+        assert results[1]['success'] is False
+
+
 if __name__ == "__main__":
     pytest.main([__file__])
\ No newline at end of file
@@ -122,13 +122,13 @@ export const FileUpload: React.FC<FileUploadProps> = ({ onUploadComplete }) => {
                 Drag and drop your tax documents here, or click to select files
               </p>
               <p className="text-sm text-gray-500 mt-2">
-                Supports PDF, PNG, JPG files up to 10MB
+                Supports PDF, PNG, JPG, TIFF, HEIC files up to 10MB
               </p>
             </div>
             
             <input
               type="file"
-              accept=".pdf,.png,.jpg,.jpeg"
+              accept=".pdf,.png,.jpg,.jpeg,.tif,.tiff,.heic,.heif"
               onChange={handleFileSelect}
               className="hidden"
               id="file-upload"